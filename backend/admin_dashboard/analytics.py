@@ -0,0 +1,247 @@
+# admin_dashboard/analytics.py
+"""
+Trend analytics for the admin dashboard.
+
+The trend reports read their daily series from the fact tables (see
+admin_dashboard.facts) in one grouped query each, load them into pandas and
+derive every metric with vectorized operations: rolling averages, week-over-week
+changes, seasonality indices, no-show rates per doctor and the revenue run-rate.
+No Python loop runs per row or per day except to serialize the results.
+
+Series are loaded from before the requested period (load_start()), so rolling
+windows, the first week-over-week change and the run-rate window are complete
+on the first day of the period; the results are then cut to the period.
+Days without facts count as zero.
+"""
+import calendar
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.db.models import Sum
+
+from appointments.models import AppointmentStatus
+from billing.models import InvoiceStatus
+from users.models import CustomUser
+
+from .fanout import fan_out
+from .models import AppointmentDailyFact, InvoiceDailyFact, PaymentDailyFact
+
+DEFAULT_ROLLING_WINDOWS = (7, 28)
+DEFAULT_RUN_RATE_DAYS = 30
+
+CANCELLED_STATUSES = (AppointmentStatus.CANCELLED_BY_PATIENT, AppointmentStatus.CANCELLED_BY_STAFF)
+
+
+def load_start(date_from, date_to, lookback_days):
+    """
+    First day to load for the period: `lookback_days - 1` days early for trailing windows,
+    and at least the full week before the week of `date_from`, for its week-over-week change.
+    """
+    week_start = date_from - timedelta(days=date_from.weekday())
+    return min(date_from - timedelta(days=lookback_days - 1), week_start - timedelta(days=7))
+
+
+def load_frame(rows, columns, numeric=()):
+    """Returns the rows (dicts) as a DataFrame with a datetime 'date' column and float `numeric` columns."""
+    frame = pd.DataFrame.from_records(list(rows), columns=columns)
+    frame['date'] = pd.to_datetime(frame['date'])
+    for column in numeric:
+        frame[column] = frame[column].astype('float64') # Decimal sums; also types the columns of an empty frame
+    return frame
+
+
+def daily_series(frame, value, days, mask=None):
+    """Sums `value` per day over the DatetimeIndex `days`; days without rows are zero."""
+    if mask is not None:
+        frame = frame[mask]
+    return frame.groupby('date')[value].sum().reindex(days, fill_value=0)
+
+
+def rolling_column(window):
+    return f'rolling_{window}d_avg'
+
+
+def rolling_means(series, windows):
+    return pd.DataFrame({rolling_column(window): series.rolling(window, min_periods=window).mean() for window in windows})
+
+
+def weekly_changes(series):
+    """Monday-to-Sunday totals with the change from the previous week, absolute and in percent."""
+    weekly = series.resample('W-SUN').sum()
+    days = series.resample('W-SUN').count()
+    frame = pd.DataFrame({
+        'total': weekly,
+        'change': weekly.diff(),
+        # A week after a zero week has no percent change.
+        'change_percent': weekly.pct_change(fill_method=None).replace([np.inf, -np.inf], np.nan) * 100,
+        'complete_week': days == 7,
+    })
+    frame.index = frame.index - pd.Timedelta(days=6) # Label weeks by their Monday
+    return frame
+
+
+def seasonality(series, keys, labels):
+    """
+    Average value per day for each key (e.g. weekday) and its index against the overall
+    daily average: 1.2 means 20% busier than an average day. Keys without days are left out.
+    """
+    grouped = series.groupby(keys).agg(['mean', 'count'])
+    overall = series.mean()
+    return pd.DataFrame({
+        'label': [labels[key] for key in grouped.index],
+        'daily_average': grouped['mean'],
+        'index': grouped['mean'] / overall if overall else np.nan,
+        'days': grouped['count'],
+    })
+
+
+def weekday_seasonality(series):
+    return seasonality(series, series.index.dayofweek, list(calendar.day_name))
+
+
+def month_seasonality(series):
+    return seasonality(series, series.index.month, list(calendar.month_name))
+
+
+def no_show_rates(frame):
+    """
+    Per doctor: completed and no-show appointments and the no-show rate in percent
+    (no-shows out of appointments that were due: completed plus no-shows), highest rate first.
+    """
+    counts = frame.pivot_table(index='doctor_id', columns='status', values='total', aggfunc='sum', fill_value=0)
+    counts = counts.reindex(columns=[AppointmentStatus.COMPLETED, AppointmentStatus.NO_SHOW], fill_value=0)
+    completed, no_show = counts[AppointmentStatus.COMPLETED], counts[AppointmentStatus.NO_SHOW]
+    due = completed + no_show
+    rates = pd.DataFrame({
+        'booked': frame.groupby('doctor_id')['total'].sum(),
+        'completed': completed,
+        'no_show': no_show,
+        'no_show_rate_percent': (no_show / due.where(due > 0)) * 100,
+    })
+    return rates.sort_values(['no_show_rate_percent', 'no_show'], ascending=False, na_position='last')
+
+
+def run_rate(series, days):
+    """Revenue collected in the trailing `days` of `series`, its daily average and its 30- and 365-day projections."""
+    window = series.iloc[-days:]
+    daily_average = window.mean() if len(window) else 0.0
+    return {
+        'trailing_days': len(window),
+        'collected_in_window': window.sum(),
+        'daily_average': daily_average,
+        'monthly_run_rate': daily_average * 30,
+        'annual_run_rate': daily_average * 365,
+    }
+
+
+def to_records(frame, index_name, money=(), counts=()):
+    """
+    Serializes a frame as a list of dicts: the index as `index_name` (dates for
+    DatetimeIndex), `money` columns as 2-decimal strings, `counts` as ints,
+    other numbers rounded to 2 decimals, NaN as None.
+    """
+    frame = frame.copy()
+    if isinstance(frame.index, pd.DatetimeIndex):
+        frame.index = frame.index.date
+    for column in frame.columns:
+        values = frame[column]
+        if column in money:
+            frame[column] = values.map(lambda value: f"{value:.2f}" if pd.notna(value) else None)
+        elif column in counts:
+            frame[column] = values.astype('int64').astype(object)
+        elif pd.api.types.is_float_dtype(values):
+            frame[column] = values.round(2).astype(object).where(values.notna(), None)
+    frame.index.name = index_name
+    return frame.reset_index().to_dict('records')
+
+
+def money(value):
+    return f"{value:.2f}"
+
+
+def appointment_trends(date_from, date_to, windows=DEFAULT_ROLLING_WINDOWS):
+    """
+    Daily appointment counts with rolling averages, weekly changes, weekday and month
+    seasonality and no-show rates per doctor for `date_from`..`date_to`.
+    """
+    start = load_start(date_from, date_to, max(windows))
+    facts = AppointmentDailyFact.objects.filter(date__range=[start, date_to], count__gt=0)
+    results = fan_out({
+        'facts': lambda: facts.values('date', 'doctor_id', 'status').annotate(total=Sum('count')),
+        'doctors': lambda: CustomUser.objects.filter(pk__in=facts.filter(date__gte=date_from).values('doctor_id'))
+            .values('id', 'email', 'first_name', 'last_name'),
+    })
+    frame = load_frame(results['facts'], ['date', 'doctor_id', 'status', 'total'], ('total',))
+    days = pd.date_range(start, date_to, freq='D')
+    period = slice(pd.Timestamp(date_from), pd.Timestamp(date_to))
+
+    daily = pd.DataFrame({
+        'count': daily_series(frame, 'total', days),
+        'completed': daily_series(frame, 'total', days, frame['status'] == AppointmentStatus.COMPLETED),
+        'no_show': daily_series(frame, 'total', days, frame['status'] == AppointmentStatus.NO_SHOW),
+        'cancelled': daily_series(frame, 'total', days, frame['status'].isin(CANCELLED_STATUSES)),
+    })
+    daily = daily.join(rolling_means(daily['count'], windows))
+    weekly = weekly_changes(daily['count'])
+    weekly = weekly[weekly.index + pd.Timedelta(days=6) >= pd.Timestamp(date_from)]
+    in_period = daily['count'][period]
+
+    doctor_facts = frame[(frame['date'] >= pd.Timestamp(date_from)) & frame['doctor_id'].notna()]
+    rates = no_show_rates(doctor_facts.astype({'doctor_id': 'int64'}))
+    doctors = {doctor['id']: doctor for doctor in results['doctors']}
+    per_doctor = [
+        {
+            'doctor__email': doctors.get(row['doctor_id'], {}).get('email'),
+            'doctor__first_name': doctors.get(row['doctor_id'], {}).get('first_name'),
+            'doctor__last_name': doctors.get(row['doctor_id'], {}).get('last_name'),
+            **{key: value for key, value in row.items() if key != 'doctor_id'},
+        }
+        for row in to_records(rates, 'doctor_id', counts=('booked', 'completed', 'no_show'))
+    ]
+    counts = ('count', 'completed', 'no_show', 'cancelled')
+    return {
+        'total_appointments_in_period': int(in_period.sum()),
+        'daily_appointments': to_records(daily[period], 'date', counts=counts),
+        'weekly_appointments': to_records(weekly, 'week_start', counts=('total', 'change')),
+        'no_show_rate_per_doctor': per_doctor,
+        'seasonality_by_weekday': to_records(weekday_seasonality(in_period), 'weekday_number', counts=('days',)),
+        'seasonality_by_month': to_records(month_seasonality(in_period), 'month_number', counts=('days',)),
+    }
+
+
+def revenue_trends(date_from, date_to, windows=DEFAULT_ROLLING_WINDOWS, run_rate_days=DEFAULT_RUN_RATE_DAYS):
+    """
+    Daily collected (payments) and invoiced (non-void invoices) amounts with rolling
+    averages, weekly changes, weekday seasonality and the run-rate of the last
+    `run_rate_days` days up to `date_to`.
+    """
+    start = load_start(date_from, date_to, max(*windows, run_rate_days))
+    results = fan_out({
+        'payments': lambda: PaymentDailyFact.objects.filter(date__range=[start, date_to])
+            .values('date').annotate(amount_total=Sum('amount')),
+        'invoices': lambda: InvoiceDailyFact.objects.filter(date__range=[start, date_to])
+            .exclude(status=InvoiceStatus.VOID).values('date').annotate(amount_total=Sum('total_amount')),
+    })
+    days = pd.date_range(start, date_to, freq='D')
+    period = slice(pd.Timestamp(date_from), pd.Timestamp(date_to))
+    collected = daily_series(load_frame(results['payments'], ['date', 'amount_total'], ('amount_total',)), 'amount_total', days)
+    invoiced = daily_series(load_frame(results['invoices'], ['date', 'amount_total'], ('amount_total',)), 'amount_total', days)
+
+    daily = pd.DataFrame({'collected': collected, 'invoiced': invoiced}).join(rolling_means(collected, windows))
+    weekly = weekly_changes(collected)
+    weekly = weekly[weekly.index + pd.Timedelta(days=6) >= pd.Timestamp(date_from)]
+    rate = run_rate(collected, run_rate_days)
+    rolling_columns = tuple(rolling_column(window) for window in windows)
+    return {
+        'total_collected_in_period': money(collected[period].sum()),
+        'total_invoiced_in_period': money(invoiced[period].sum()),
+        'daily_revenue': to_records(daily[period], 'date', money=('collected', 'invoiced', *rolling_columns)),
+        'weekly_revenue': to_records(weekly, 'week_start', money=('total', 'change')),
+        'revenue_run_rate': {
+            'trailing_days': rate['trailing_days'],
+            'window_end': date_to,
+            **{key: money(value) for key, value in rate.items() if key != 'trailing_days'},
+        },
+        'seasonality_by_weekday': to_records(weekday_seasonality(collected[period]), 'weekday_number', counts=('days',)),
+    }
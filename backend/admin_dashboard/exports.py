@@ -0,0 +1,313 @@
+# admin_dashboard/exports.py
+"""
+Streaming export of admin dashboard reports.
+
+A report describes its tabular output as a sequence of ReportSection(title,
+headers, rows). Detail sections take their rows from lazy `.values()` querysets,
+which are read with a server-side cursor (`QuerySet.iterator(chunk_size=...)`)
+while the response is being sent, so memory use stays constant however many
+rows the requested period holds.
+
+Besides CSV, reports export as XLSX and Parquet files (build_export()):
+- XLSX: XlsxWriter in constant_memory mode flushes each row to a temporary file
+  as it is written. The summary rows go on a 'Summary' sheet and every section
+  on its own sheet.
+- Parquet: each section is written in row groups of EXPORT_CHUNK_SIZE rows with
+  pyarrow's ParquetWriter. A single-section report is one .parquet file; several
+  sections become one .parquet file each, bundled in a .zip. The report title,
+  generation time and filters are stored in the file metadata.
+Both file formats are completed before they can be sent; responses stream the
+finished file from disk, and background report jobs (admin_dashboard.jobs)
+write it under MEDIA_ROOT instead.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from collections import namedtuple
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import renderers
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+XLSX_SHEET_NAME_LENGTH = 31
+
+# Export format -> content type of the file; parquet exports of several sections are zipped.
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+    'zip': 'application/zip',
+}
+EXPORT_FORMATS = ('csv', 'xlsx', 'parquet')
+FILE_EXPORT_FORMATS = ('xlsx', 'parquet')
+
+ReportSection = namedtuple('ReportSection', ['title', 'headers', 'rows'])
+ReportSection.__doc__ = """One table of a report export: a title, column headers and an iterable of row lists."""
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'ADMIN_DASHBOARD_REPORTS', {}).get('EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+
+
+def iter_rows(rows):
+    """Iterates a section's source rows; querysets are streamed with a server-side cursor."""
+    if isinstance(rows, QuerySet):
+        return rows.iterator(chunk_size=get_export_chunk_size())
+    return iter(rows)
+
+
+class Echo:
+    """A file-like object whose write() returns the value, so csv.writer can feed a generator."""
+    def write(self, value):
+        return value
+
+
+def stream_csv_response(rows, filename):
+    """Returns a StreamingHttpResponse writing each row of `rows` as CSV as it is produced."""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def iter_batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def counted(rows, progress):
+    for row in rows:
+        yield row
+        progress()
+
+
+def write_csv(path, view, report_data, progress):
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        csv.writer(stream).writerows(counted(view.iter_csv_rows(report_data), progress))
+
+
+def xlsx_cell(value):
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None) # Excel has no time zones
+    if value is None or isinstance(value, (str, bool, int, float, Decimal, datetime.date, datetime.time)):
+        return value
+    return str(value) # e.g. lazy translations, dicts
+
+
+def xlsx_sheet_name(title, used):
+    name = re.sub(r'[\[\]:*?/\\]', ' ', title).strip()[:XLSX_SHEET_NAME_LENGTH] or 'Sheet'
+    candidate, number = name, 2
+    while candidate.lower() in used:
+        suffix = f' ({number})'
+        candidate, number = name[:XLSX_SHEET_NAME_LENGTH - len(suffix)] + suffix, number + 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def write_xlsx(path, summary_rows, sections, progress):
+    import xlsxwriter
+
+    # constant_memory flushes every finished row to a temporary file, so sheets must be written top to bottom.
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'strings_to_numbers': True, # Amounts are formatted as strings for CSV; make them numeric cells
+        'default_date_format': 'yyyy-mm-dd hh:mm',
+    })
+    try:
+        bold = workbook.add_format({'bold': True})
+        used_names = set()
+        sheet = workbook.add_worksheet(xlsx_sheet_name('Summary', used_names))
+        for row_number, row in enumerate(summary_rows):
+            sheet.write_row(row_number, 0, [xlsx_cell(value) for value in row])
+            progress()
+        for section in sections:
+            sheet = workbook.add_worksheet(xlsx_sheet_name(section.title, used_names))
+            sheet.write_row(0, 0, section.headers, bold)
+            for row_number, row in enumerate(section.rows, start=1):
+                sheet.write_row(row_number, 0, [xlsx_cell(value) for value in row])
+                progress()
+    finally:
+        workbook.close()
+
+
+def parquet_column_names(headers):
+    names, used = [], set()
+    for index, header in enumerate(headers):
+        name = str(header) or f'column_{index + 1}'
+        while name in used:
+            name = f'{name}_{index + 1}'
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def parquet_type(values):
+    """Infers a column's type from its first batch; empty or mixed columns are strings, decimals get full precision."""
+    import pyarrow as pa
+
+    try:
+        inferred = pa.array(values).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        return pa.string()
+    if pa.types.is_null(inferred):
+        return pa.string()
+    if pa.types.is_decimal(inferred):
+        return pa.decimal128(38, inferred.scale)
+    return inferred
+
+
+def parquet_array(values, data_type):
+    import pyarrow as pa
+
+    if pa.types.is_string(data_type):
+        values = [None if value is None else str(value) for value in values]
+    elif pa.types.is_decimal(data_type):
+        values = [None if value is None else Decimal(value) for value in values]
+    return pa.array(values, type=data_type)
+
+
+def write_parquet_section(path, section, metadata, progress):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    names = parquet_column_names(section.headers)
+    writer = None
+    try:
+        for batch in iter_batches(section.rows, get_export_chunk_size()):
+            # Rows are padded or cut to the headers, then transposed into columns.
+            columns = list(zip(*(list(row)[:len(names)] + [None] * (len(names) - len(row)) for row in batch)))
+            if writer is None:
+                schema = pa.schema([(name, parquet_type(list(column))) for name, column in zip(names, columns)], metadata=metadata)
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(pa.Table.from_arrays(
+                [parquet_array(list(column), field.type) for column, field in zip(columns, writer.schema)], schema=writer.schema
+            ))
+            for _ in batch:
+                progress()
+        if writer is None: # No rows: an empty file with string columns
+            schema = pa.schema([(name, pa.string()) for name in names], metadata=metadata)
+            writer = pq.ParquetWriter(path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def parquet_metadata(report_data, section):
+    return {
+        'report_title': str(report_data.get('report_title', 'Report')),
+        'report_generated_at': str(report_data.get('report_generated_at', timezone.now())),
+        'filters_applied': json.dumps(report_data.get('filters_applied') or {}, default=str),
+        'section': section.title,
+    }
+
+
+def write_parquet(path, report_data, sections, progress):
+    if len(sections) == 1:
+        write_parquet_section(path, sections[0], parquet_metadata(report_data, sections[0]), progress)
+        return
+    with tempfile.TemporaryDirectory() as directory, zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+        used = set()
+        for section in sections:
+            name = re.sub(r'[^a-z0-9]+', '_', section.title.lower()).strip('_') or 'section'
+            while name in used:
+                name += '_'
+            used.add(name)
+            section_path = os.path.join(directory, f'{name}.parquet')
+            write_parquet_section(section_path, section, parquet_metadata(report_data, section), progress)
+            archive.write(section_path, f'{name}.parquet') # Parquet pages are compressed already
+            os.remove(section_path)
+
+
+def build_export(view, report_data, export_format):
+    """
+    Returns (file extension, write(path, progress)) exporting a report view's data
+    in `export_format` ('csv', 'xlsx' or 'parquet'); `progress()` is called per row written.
+    """
+    if export_format == 'csv':
+        return 'csv', lambda path, progress: write_csv(path, view, report_data, progress)
+    if export_format == 'xlsx':
+        return 'xlsx', lambda path, progress: write_xlsx(
+            path, view.get_csv_summary_rows(report_data), view.get_export_sections(report_data), progress
+        )
+    if export_format == 'parquet':
+        sections = list(view.get_export_sections(report_data)) # Section rows stay lazy
+        extension = 'parquet' if len(sections) == 1 else 'zip'
+        return extension, lambda path, progress: write_parquet(path, report_data, sections, progress)
+    raise ValueError(f"Unsupported export format '{export_format}'.")
+
+
+class TemporaryExportFile(io.FileIO):
+    """A finished export file that is deleted once the response has sent and closed it."""
+    def close(self):
+        super().close()
+        try:
+            os.remove(self.name)
+        except FileNotFoundError:
+            pass
+
+
+def file_export_response(write, filename, extension):
+    """Writes an export to a temporary file and returns a FileResponse streaming it from disk."""
+    handle, path = tempfile.mkstemp(suffix=f'.{extension}', prefix='report_export_')
+    os.close(handle)
+    try:
+        write(path, lambda: None)
+    except BaseException:
+        os.remove(path)
+        raise
+    response = FileResponse(TemporaryExportFile(path, 'rb'), as_attachment=True, filename=filename)
+    response['Content-Type'] = EXPORT_CONTENT_TYPES[extension]
+    return response
+
+
+class ReportCSVRenderer(renderers.BaseRenderer):
+    """
+    Makes "?format=csv" pass DRF content negotiation for report views. Successful
+    exports are streamed by the view itself; this only renders responses the view
+    returns as data (e.g. validation errors) as key/value rows.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for key, value in (data.items() if isinstance(data, dict) else [('detail', data)]):
+            writer.writerow([key, value])
+        return buffer.getvalue().encode(self.charset)
+
+
+class ReportFileRenderer(renderers.BaseRenderer):
+    """
+    Makes "?format=xlsx" and "?format=parquet" pass DRF content negotiation for
+    report views. Successful exports are file responses built by the view; data
+    the view returns (e.g. validation errors) is rendered as JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return renderers.JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class ReportXLSXRenderer(ReportFileRenderer):
+    media_type = EXPORT_CONTENT_TYPES['xlsx']
+    format = 'xlsx'
+
+
+class ReportParquetRenderer(ReportFileRenderer):
+    media_type = EXPORT_CONTENT_TYPES['parquet']
+    format = 'parquet'
@@ -0,0 +1,207 @@
+# admin_dashboard/facts.py
+"""
+Daily fact tables behind the appointment and financial reports.
+
+Grouping Appointment, Invoice and Payment rows at report time scans every row
+of the period, so each has a small fact table keyed by day and the dimensions
+the reports group by (doctor, status, type, payment method), holding counts
+and sums. Each FactTable describes how a source row maps to a fact key and its
+measures; the signal receivers in admin_dashboard.signals apply a row's
+contribution when it is created, move it when its key or measures change, and
+remove it when it is deleted, in the same transaction as the write.
+
+Facts are only as current as the signals: queryset.update(), bulk_create() and
+raw SQL bypass them. `manage.py rebuild_report_facts` recomputes a date range
+from the source tables, for the initial backfill and for repairs.
+"""
+import datetime
+
+from django.db import router, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+REBUILD_CHUNK_SIZE = 2000
+
+
+def to_date(value):
+    """Returns the local date of a datetime, or a date unchanged."""
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+class FactTable:
+    """
+    Maps rows of `source_model` onto rows of `fact_model`.
+    `date_field` is the source field a fact's day comes from and `fields` the source
+    fields the key and measures are computed from;
+    `describe(values)` turns a dict of them into (key, measures); `grouped(source, date_from, date_to)`
+    returns the source rows of a date range grouped into fact rows, for rebuilds.
+    """
+    def __init__(self, source_model, fact_model, date_field, fields, describe, grouped):
+        self.source_model = source_model
+        self.fact_model = fact_model
+        self.date_field = date_field
+        self.fields = fields
+        self.describe = describe
+        self.grouped = grouped
+
+    def values_of(self, instance):
+        return {field: getattr(instance, field) for field in self.fields}
+
+    def apply(self, values, sign, using):
+        """Adds (sign=1) or removes (sign=-1) one source row's contribution to its fact row."""
+        key, measures = self.describe(values)
+        self.apply_to_key(key, {name: sign * value for name, value in measures.items()}, using, create=sign > 0)
+
+    def apply_changes(self, changes, using):
+        """
+        Applies the changes of many source rows, [(previous values or None, current values or None)],
+        netted per fact key: one update per key whose measures change rather than one per row
+        (e.g. after a bulk write that bypassed the signals).
+        """
+        totals = {}
+        for previous, current in changes:
+            for values, sign in ((previous, -1), (current, 1)):
+                if values is None:
+                    continue
+                key, measures = self.describe(values)
+                net = totals.setdefault(tuple(sorted(key.items())), dict.fromkeys(measures, 0))
+                for name, value in measures.items():
+                    net[name] += sign * value
+        for key, increments in totals.items():
+            if any(increments.values()):
+                self.apply_to_key(dict(key), increments, using, create=increments['count'] > 0)
+
+    def apply_to_key(self, key, increments, using, create=True):
+        """Adds the signed `increments` to the measures of the fact row with `key`, creating it if `create`."""
+        if key['date'] is None:
+            return
+        manager = self.fact_model._default_manager.using(using)
+        updates = {name: F(name) + value for name, value in increments.items()}
+        if manager.filter(**key).update(**updates):
+            return
+        if not create:
+            # The row was never counted (written before facts existed); the next rebuild covers it.
+            return
+        fact, created = manager.get_or_create(**key, defaults=increments)
+        if not created:
+            # Another worker created the key between our update and insert.
+            manager.filter(pk=fact.pk).update(**updates)
+
+    def source_date_range(self, using=None):
+        """Returns the (first, last) day of the source rows, or None when there are none."""
+        bounds = self.source_model._default_manager.using(using or router.db_for_read(self.source_model))\
+            .aggregate(first=Min(self.date_field), last=Max(self.date_field))
+        if bounds['first'] is None:
+            return None
+        return to_date(bounds['first']), to_date(bounds['last'])
+
+    def rebuild(self, date_from, date_to, using=None):
+        """
+        Replaces the facts of days `date_from`..`date_to` (inclusive) with rows
+        grouped from the source table, in one transaction. Returns the number of rows written.
+        """
+        using = using or router.db_for_write(self.fact_model)
+        source = self.source_model._default_manager.using(using)
+        manager = self.fact_model._default_manager.using(using)
+        written = 0
+        with transaction.atomic(using=using):
+            manager.filter(date__range=[date_from, date_to]).delete()
+            chunk = []
+            for row in self.grouped(source, date_from, date_to).iterator(chunk_size=REBUILD_CHUNK_SIZE):
+                chunk.append(self.fact_model(**row))
+                if len(chunk) >= REBUILD_CHUNK_SIZE:
+                    written += len(manager.bulk_create(chunk))
+                    chunk = []
+            if chunk:
+                written += len(manager.bulk_create(chunk))
+        return written
+
+
+def day_bounds(date_from, date_to):
+    """Returns aware datetimes [start of date_from, start of the day after date_to) in the current timezone."""
+    tz = timezone.get_current_timezone()
+    day_after = date_to + datetime.timedelta(days=1)
+    return (
+        datetime.datetime(date_from.year, date_from.month, date_from.day, tzinfo=tz),
+        datetime.datetime(day_after.year, day_after.month, day_after.day, tzinfo=tz),
+    )
+
+
+def describe_appointment(values):
+    return (
+        {
+            'date': to_date(values['appointment_date_time']),
+            'doctor_id': values['doctor_id'],
+            'status': values['status'],
+            'appointment_type': values['appointment_type'],
+        },
+        {'count': 1},
+    )
+
+
+def group_appointments(source, date_from, date_to):
+    start, end = day_bounds(date_from, date_to)
+    return source.filter(appointment_date_time__gte=start, appointment_date_time__lt=end)\
+        .annotate(date=TruncDate('appointment_date_time', tzinfo=timezone.get_current_timezone()))\
+        .values('date', 'doctor_id', 'status', 'appointment_type')\
+        .annotate(count=Count('id'))\
+        .order_by()
+
+
+def describe_invoice(values):
+    return (
+        {'date': to_date(values['issue_date']), 'status': values['status']},
+        {'count': 1, 'total_amount': values['total_amount'] or 0, 'paid_amount': values['paid_amount'] or 0},
+    )
+
+
+def group_invoices(source, date_from, date_to):
+    return source.filter(issue_date__range=[date_from, date_to])\
+        .values('status', date=F('issue_date'))\
+        .annotate(count=Count('id'), total_amount=Sum('total_amount'), paid_amount=Sum('paid_amount'))\
+        .order_by()
+
+
+def describe_payment(values):
+    return (
+        {'date': to_date(values['payment_date']), 'payment_method': values['payment_method']},
+        {'count': 1, 'amount': values['amount'] or 0},
+    )
+
+
+def group_payments(source, date_from, date_to):
+    start, end = day_bounds(date_from, date_to)
+    return source.filter(payment_date__gte=start, payment_date__lt=end)\
+        .annotate(date=TruncDate('payment_date', tzinfo=timezone.get_current_timezone()))\
+        .values('date', 'payment_method')\
+        .annotate(count=Count('id'), amount=Sum('amount'))\
+        .order_by()
+
+
+def get_fact_tables():
+    """Returns the FactTable of every source model, keyed by source model."""
+    from appointments.models import Appointment
+    from billing.models import Invoice, Payment
+    from .models import AppointmentDailyFact, InvoiceDailyFact, PaymentDailyFact
+
+    tables = [
+        FactTable(
+            Appointment, AppointmentDailyFact, 'appointment_date_time',
+            ['appointment_date_time', 'doctor_id', 'status', 'appointment_type'],
+            describe_appointment, group_appointments,
+        ),
+        FactTable(
+            Invoice, InvoiceDailyFact, 'issue_date',
+            ['issue_date', 'status', 'total_amount', 'paid_amount'],
+            describe_invoice, group_invoices,
+        ),
+        FactTable(
+            Payment, PaymentDailyFact, 'payment_date',
+            ['payment_date', 'payment_method', 'amount'],
+            describe_payment, group_payments,
+        ),
+    ]
+    return {table.source_model: table for table in tables}
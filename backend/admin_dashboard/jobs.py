@@ -0,0 +1,212 @@
+# admin_dashboard/jobs.py
+"""
+Asynchronous report exports.
+
+A ReportJob names a report view (any BaseReportView subclass, by its URL name)
+and its query parameters. submit_job() deduplicates by a hash of those: a
+pending or running job with the same hash is returned instead of a new one
+(a partial unique constraint settles concurrent submissions), and so is a
+completed job younger than ADMIN_DASHBOARD_REPORTS['JOB_REUSE_TIMEOUT'].
+
+New jobs run after their transaction commits on a local thread pool of
+ADMIN_DASHBOARD_REPORTS['JOB_WORKERS'] threads; no broker is needed. A worker
+claims the job with a conditional update, exports the report as CSV, XLSX or
+Parquet (see admin_dashboard.exports) to a file under MEDIA_ROOT (written to a
+.part file and renamed when complete)
+and records its progress every PROGRESS_INTERVAL rows. Jobs lost in a restart
+stay active until JOB_STALE_TIMEOUT, after which they are marked failed and a
+new submission starts over.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest, QueryDict
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils import timezone
+from rest_framework.request import Request
+
+from .exports import EXPORT_FORMATS, build_export
+from .models import ACTIVE_REPORT_JOB_STATUSES, ReportJob, ReportJobStatus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_JOB_REUSE_TIMEOUT = 300
+DEFAULT_JOB_STALE_TIMEOUT = 3600
+PROGRESS_INTERVAL = 1000
+JOB_FILE_DIRECTORY = 'report_jobs'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_setting(name, default):
+    return getattr(settings, 'ADMIN_DASHBOARD_REPORTS', {}).get(name, default)
+
+
+def resolve_report_view(report):
+    """
+    Returns the BaseReportView subclass served at the admin_dashboard URL name `report`
+    (e.g. 'report_financial'). Raises ValueError for unknown names and non-report views.
+    """
+    from .views import BaseReportView
+
+    name = report.split(':')[-1]
+    try:
+        view_class = getattr(resolve(reverse(f'admin_dashboard:{name}')).func, 'view_class', None)
+    except NoReverseMatch:
+        view_class = None
+    if view_class is None or not issubclass(view_class, BaseReportView):
+        raise ValueError(f"Unknown report '{report}'.")
+    return view_class
+
+
+def normalize_parameters(parameters):
+    """Returns the report's query parameters as a sorted dict of non-empty strings, without 'format'."""
+    normalized = {}
+    for name, value in (parameters or {}).items():
+        value = str(value).strip()
+        if name != 'format' and value:
+            normalized[str(name)] = value
+    return dict(sorted(normalized.items()))
+
+
+def parameters_hash(report, parameters, export_format):
+    raw = json.dumps([report, export_format, parameters], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def expire_stale_jobs(queryset):
+    """Marks active jobs older than JOB_STALE_TIMEOUT (e.g. lost in a restart) as failed."""
+    cutoff = timezone.now() - timedelta(seconds=get_job_setting('JOB_STALE_TIMEOUT', DEFAULT_JOB_STALE_TIMEOUT))
+    return queryset.filter(status__in=ACTIVE_REPORT_JOB_STATUSES, created_at__lt=cutoff).update(
+        status=ReportJobStatus.FAILED, error="The job did not finish in time and was abandoned.", finished_at=timezone.now()
+    )
+
+
+def submit_job(report, parameters, export_format='csv', user=None):
+    """
+    Returns (job, created) for exporting `report` with `parameters`. An equivalent
+    active or recently completed job is returned rather than creating a new one.
+    Raises ValueError for unknown reports or formats.
+    """
+    view_class = resolve_report_view(report)
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}'. Choose from: {', '.join(EXPORT_FORMATS)}.")
+    report = report.split(':')[-1]
+    parameters = normalize_parameters(parameters)
+    digest = parameters_hash(report, parameters, export_format)
+    same_parameters = ReportJob.objects.filter(parameters_hash=digest)
+    expire_stale_jobs(same_parameters)
+
+    reuse_cutoff = timezone.now() - timedelta(seconds=get_job_setting('JOB_REUSE_TIMEOUT', DEFAULT_JOB_REUSE_TIMEOUT))
+    existing = same_parameters.filter(
+        Q(status__in=ACTIVE_REPORT_JOB_STATUSES) | Q(status=ReportJobStatus.COMPLETED, finished_at__gte=reuse_cutoff)
+    ).order_by('-created_at').first()
+    if existing is not None:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            job = ReportJob.objects.create(
+                report=report, parameters=parameters, export_format=export_format,
+                parameters_hash=digest, requested_by=user if user and user.is_authenticated else None,
+            )
+    except IntegrityError:
+        # An identical job was submitted concurrently; the partial unique constraint kept only one.
+        return same_parameters.get(status__in=ACTIVE_REPORT_JOB_STATUSES), False
+    logger.info("Report job %s created for %s (%s) by %s.", job.pk, view_class.__name__, export_format, job.requested_by_id)
+    transaction.on_commit(lambda: enqueue_job(job.pk))
+    return job, True
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_job_setting('JOB_WORKERS', DEFAULT_JOB_WORKERS), thread_name_prefix='report-job'
+            )
+        return _executor
+
+
+def enqueue_job(job_id):
+    get_executor().submit(run_job_in_worker, job_id)
+
+
+def run_job_in_worker(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all() # Worker threads hold their own connections
+
+
+def build_report_request(job):
+    """Returns a GET Request carrying the job's parameters as query parameters, for get_report_data()."""
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    http_request.GET.update(job.parameters)
+    http_request.user = job.requested_by or AnonymousUser()
+    return Request(http_request)
+
+
+def estimate_rows(report_data):
+    """Counts the rows of the report's detail querysets and summary lists, for progress reporting."""
+    return sum(
+        value.count() if isinstance(value, QuerySet) else len(value)
+        for value in report_data.values() if isinstance(value, (QuerySet, list))
+    )
+
+
+def run_job(job_id):
+    """Claims a pending job and renders its file. Returns False if another worker claimed it first."""
+    claimed = ReportJob.objects.filter(pk=job_id, status=ReportJobStatus.PENDING)\
+        .update(status=ReportJobStatus.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return False
+    job = ReportJob.objects.select_related('requested_by').get(pk=job_id)
+    part_path = None
+    try:
+        view_class = resolve_report_view(job.report)
+        request = build_report_request(job)
+        view = view_class()
+        view.setup(request)
+        report_data = view.get_report_data(request)
+        ReportJob.objects.filter(pk=job.pk).update(rows_estimated=estimate_rows(report_data))
+
+        extension, write = build_export(view, report_data, job.export_format)
+        name = f'{JOB_FILE_DIRECTORY}/{job.pk}/{view.get_export_filename(report_data, extension)}'
+        path = job.file.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = path + '.part'
+        rows_written = 0
+
+        def progress():
+            nonlocal rows_written
+            rows_written += 1
+            if rows_written % PROGRESS_INTERVAL == 0:
+                ReportJob.objects.filter(pk=job.pk).update(rows_written=rows_written)
+
+        write(part_path, progress)
+        os.replace(part_path, path)
+        part_path = None
+        ReportJob.objects.filter(pk=job.pk).update(
+            status=ReportJobStatus.COMPLETED, file=name, rows_written=rows_written, finished_at=timezone.now()
+        )
+        logger.info("Report job %s completed: %s rows written to %s.", job.pk, rows_written, name)
+    except Exception as e:
+        logger.exception("Report job %s failed.", job.pk)
+        ReportJob.objects.filter(pk=job.pk).update(status=ReportJobStatus.FAILED, error=str(e), finished_at=timezone.now())
+        if part_path and os.path.exists(part_path):
+            os.remove(part_path)
+    return True
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_dashboard.facts import get_fact_tables
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the daily appointment, invoice and payment fact tables behind the
+    admin dashboard reports from the source tables. The signal receivers keep the
+    facts current as rows are saved; this backfills them (run it once after
+    migrating) or repairs them after bulk changes that bypass signals, such as
+    queryset.update().
+    """
+    help = "Recomputes the daily report fact tables for a date range from appointments, invoices and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-from',
+            default=None,
+            help="First day (YYYY-MM-DD) to rebuild. Defaults to each table's oldest row.",
+        )
+        parser.add_argument(
+            '--date-to',
+            default=None,
+            help="Last day (YYYY-MM-DD) to rebuild. Defaults to each table's newest row.",
+        )
+
+    def parse_date(self, value, option):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid {option} format. Use YYYY-MM-DD.")
+
+    def handle(self, *args, **options):
+        date_from = self.parse_date(options['date_from'], '--date-from') if options['date_from'] else None
+        date_to = self.parse_date(options['date_to'], '--date-to') if options['date_to'] else None
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--date-from must not be after --date-to.")
+
+        for table in get_fact_tables().values():
+            label = table.fact_model._meta.verbose_name_plural
+            source_range = table.source_date_range()
+            if source_range is None and not (date_from and date_to):
+                self.stdout.write(f"No rows to build {label} from.")
+                continue
+            table_from = date_from or source_range[0]
+            table_to = date_to or source_range[1]
+            if table_from > table_to:
+                self.stdout.write(f"No rows to build {label} from in the given range.")
+                continue
+            written = table.rebuild(table_from, table_to)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {written} {label} rows for {table_from:%Y-%m-%d} to {table_to:%Y-%m-%d}."
+            ))
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Issue Date')),
+                ('status', models.CharField(max_length=20, verbose_name='Status')),
+                ('count', models.IntegerField(default=0, verbose_name='Count')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Total Amount')),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Paid Amount')),
+            ],
+            options={
+                'verbose_name': 'Invoice Daily Fact',
+                'verbose_name_plural': 'Invoice Daily Facts',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='invoice_fact_key_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentDailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Payment Date')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Payment Method')),
+                ('count', models.IntegerField(default=0, verbose_name='Count')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Amount')),
+            ],
+            options={
+                'verbose_name': 'Payment Daily Fact',
+                'verbose_name_plural': 'Payment Daily Facts',
+                'constraints': [models.UniqueConstraint(fields=('date', 'payment_method'), name='payment_fact_key_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AppointmentDailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('status', models.CharField(max_length=30, verbose_name='Appointment Status')),
+                ('appointment_type', models.CharField(max_length=50, verbose_name='Appointment Type')),
+                ('count', models.IntegerField(default=0, verbose_name='Count')),
+                ('doctor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Doctor')),
+            ],
+            options={
+                'verbose_name': 'Appointment Daily Fact',
+                'verbose_name_plural': 'Appointment Daily Facts',
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'status', 'appointment_type'), name='appt_fact_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0002_report_daily_facts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(help_text="URL name of the report view, e.g. 'report_financial'.", max_length=100, verbose_name='Report')),
+                ('parameters', models.JSONField(blank=True, default=dict, verbose_name='Parameters')),
+                ('export_format', models.CharField(default='csv', max_length=10, verbose_name='Export Format')),
+                ('parameters_hash', models.CharField(db_index=True, max_length=64, verbose_name='Parameters Hash')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20, verbose_name='Status')),
+                ('rows_written', models.PositiveIntegerField(default=0, verbose_name='Rows Written')),
+                ('rows_estimated', models.PositiveIntegerField(blank=True, null=True, verbose_name='Estimated Rows')),
+                ('file', models.FileField(blank=True, upload_to='report_jobs/', verbose_name='File')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Requested By')),
+            ],
+            options={
+                'verbose_name': 'Report Job',
+                'verbose_name_plural': 'Report Jobs',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'RUNNING'])), fields=('parameters_hash',), name='report_job_active_params_uniq')],
+            },
+        ),
+    ]
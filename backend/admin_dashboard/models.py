@@ -66,6 +66,135 @@ class DashboardPreference(models.Model):
         """
         return f"Dashboard Preferences for {self.user.username}"
 
+class AppointmentDailyFact(models.Model):
+    """
+    Number of appointments per (local) day of appointment_date_time, doctor, status and type.
+    Maintained incrementally from Appointment post_save/post_delete signals (see
+    admin_dashboard.facts) and rebuilt with `manage.py rebuild_report_facts`.
+    """
+    date = models.DateField(verbose_name=_("Date"))
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False, # Facts keep a deleted doctor's history until the next rebuild
+        null=True, blank=True,
+        related_name='+',
+        verbose_name=_("Doctor")
+    )
+    status = models.CharField(max_length=30, verbose_name=_("Appointment Status"))
+    appointment_type = models.CharField(max_length=50, verbose_name=_("Appointment Type"))
+    count = models.IntegerField(default=0, verbose_name=_("Count"))
+
+    class Meta:
+        verbose_name = _("Appointment Daily Fact")
+        verbose_name_plural = _("Appointment Daily Facts")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'doctor', 'status', 'appointment_type'], name='appt_fact_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - Doctor ID {self.doctor_id} - {self.status}/{self.appointment_type}: {self.count}"
+
+class InvoiceDailyFact(models.Model):
+    """
+    Number and value of invoices per issue date and status.
+    Maintained incrementally from Invoice post_save/post_delete signals (see admin_dashboard.facts).
+    """
+    date = models.DateField(verbose_name=_("Issue Date"))
+    status = models.CharField(max_length=20, verbose_name=_("Status"))
+    count = models.IntegerField(default=0, verbose_name=_("Count"))
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name=_("Total Amount"))
+    paid_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name=_("Paid Amount"))
+
+    class Meta:
+        verbose_name = _("Invoice Daily Fact")
+        verbose_name_plural = _("Invoice Daily Facts")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='invoice_fact_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.status}: {self.count} ({self.total_amount})"
+
+class PaymentDailyFact(models.Model):
+    """
+    Number and sum of payments per (local) payment day and payment method.
+    Maintained incrementally from Payment post_save/post_delete signals (see admin_dashboard.facts).
+    """
+    date = models.DateField(verbose_name=_("Payment Date"))
+    payment_method = models.CharField(max_length=20, verbose_name=_("Payment Method"))
+    count = models.IntegerField(default=0, verbose_name=_("Count"))
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name=_("Amount"))
+
+    class Meta:
+        verbose_name = _("Payment Daily Fact")
+        verbose_name_plural = _("Payment Daily Facts")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_method'], name='payment_fact_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.payment_method}: {self.count} ({self.amount})"
+
+class ReportJobStatus(models.TextChoices):
+    PENDING = 'PENDING', _('Pending')
+    RUNNING = 'RUNNING', _('Running')
+    COMPLETED = 'COMPLETED', _('Completed')
+    FAILED = 'FAILED', _('Failed')
+
+ACTIVE_REPORT_JOB_STATUSES = [ReportJobStatus.PENDING, ReportJobStatus.RUNNING]
+
+class ReportJob(models.Model):
+    """
+    A report export rendered to a file under MEDIA_ROOT by the local worker pool
+    (see admin_dashboard.jobs) instead of in the request. Jobs are deduplicated by
+    parameters_hash: at most one pending or running job exists per report and parameters.
+    """
+    report = models.CharField(max_length=100, verbose_name=_("Report"), help_text=_("URL name of the report view, e.g. 'report_financial'."))
+    parameters = models.JSONField(default=dict, blank=True, verbose_name=_("Parameters"))
+    export_format = models.CharField(max_length=10, default='csv', verbose_name=_("Export Format"))
+    parameters_hash = models.CharField(max_length=64, db_index=True, verbose_name=_("Parameters Hash"))
+    status = models.CharField(
+        max_length=20, choices=ReportJobStatus.choices, default=ReportJobStatus.PENDING, verbose_name=_("Status")
+    )
+    rows_written = models.PositiveIntegerField(default=0, verbose_name=_("Rows Written"))
+    rows_estimated = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Estimated Rows"))
+    file = models.FileField(upload_to='report_jobs/', blank=True, verbose_name=_("File"))
+    error = models.TextField(blank=True, verbose_name=_("Error"))
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='report_jobs',
+        verbose_name=_("Requested By")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Started At"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Finished At"))
+
+    class Meta:
+        verbose_name = _("Report Job")
+        verbose_name_plural = _("Report Jobs")
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['parameters_hash'], condition=models.Q(status__in=ACTIVE_REPORT_JOB_STATUSES),
+                name='report_job_active_params_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Report job {self.pk} ({self.report}, {self.export_format}) - {self.get_status_display()}"
+
+    @property
+    def progress_percent(self):
+        if self.status == ReportJobStatus.COMPLETED:
+            return 100
+        if not self.rows_estimated:
+            return 0
+        # The estimate leaves out titles, headers and summary rows, so stay below 100 until the file is complete.
+        return min(99, self.rows_written * 100 // self.rows_estimated)
+
 # Other potential models for an admin_dashboard could include:
 #
 # class SystemAnnouncement(models.Model):
@@ -0,0 +1,31 @@
+# admin_dashboard/pagination.py
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination
+
+
+class ReportDetailPagination(PageNumberPagination):
+    """
+    Page-number pagination of one detail section of a report (e.g. the invoice list).
+    Each section reads its page from '<section>_page', so the sections of one
+    response page independently; 'page_size' applies to all of them. Rows are
+    ordered by the queryset's ordering with the primary key as tie-breaker, so
+    pages do not overlap.
+    """
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+
+    def __init__(self, section):
+        self.page_query_param = f'{section}_page'
+        self.page_size = getattr(settings, 'ADMIN_DASHBOARD_REPORTS', {}).get('DETAIL_PAGE_SIZE', self.page_size)
+
+    def paginate_section(self, queryset, request):
+        """Returns {'count', 'next', 'previous', 'results'} for the requested page of `queryset`."""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        results = self.paginate_queryset(queryset.order_by(*ordering, 'pk'), request)
+        return {
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': results,
+        }
@@ -0,0 +1,256 @@
+# admin_dashboard/report_cache.py
+"""
+Caching of admin dashboard report data.
+
+Reports are cached per (report view, normalized query parameters). Each report
+declares the data topics it reads (e.g. 'appointments', 'billing'); every topic
+has a version counter in the cache, and the signal receivers connected by
+connect_invalidation_signals() bump it when a row of one of its models is saved
+or deleted. The versions are part of the cache key, so a write makes the next
+request miss instead of deleting keys by pattern.
+
+Identical requests that miss at the same time are coalesced (single-flight):
+the first claims a compute lock with cache.add() and computes, the others poll
+for its result and only compute themselves if it fails or the wait times out.
+With a shared cache (Redis, memcached) this holds across workers.
+
+For the dashboard overview, get_or_revalidate() serves a stale entry at once
+and recomputes it in a background thread (stale-while-revalidate).
+
+Lazy detail querysets in the report data are cached as their SQL query and
+rebuilt on a hit, so they are never evaluated just to be cached.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TIMEOUT = 300
+DEFAULT_STALE_TIMEOUT = 3600
+DEFAULT_COMPUTE_LOCK_TIMEOUT = 60
+WAIT_POLL_INTERVAL = 0.05
+
+# Models whose writes invalidate the reports reading each topic.
+CACHE_TOPIC_MODELS = {
+    'appointments': ['appointments.Appointment'],
+    'billing': ['billing.Invoice', 'billing.InvoiceItem', 'billing.Payment'],
+    'patients': ['patients.Patient', 'users.CustomUser'],
+    'staff': ['users.CustomUser'],
+}
+
+MODEL_TOPICS = {
+    label: [topic for topic, labels in CACHE_TOPIC_MODELS.items() if label in labels]
+    for labels in CACHE_TOPIC_MODELS.values() for label in labels
+}
+
+# Saves touching only these fields (e.g. the last_login update on every login) invalidate nothing.
+IGNORED_UPDATE_FIELDS = {'last_login'}
+
+# Cache states reported by get_or_compute()/get_or_revalidate().
+HIT, MISS, STALE = 'hit', 'miss', 'stale'
+
+
+def get_cache_config():
+    return getattr(settings, 'ADMIN_DASHBOARD_REPORTS', {})
+
+
+def get_cache():
+    return caches[get_cache_config().get('CACHE_ALIAS', 'default')]
+
+
+def normalize_filters(query_params, ignored=('format',)):
+    """Returns the query parameters as a sorted tuple, without ignored and empty parameters."""
+    return tuple(sorted(
+        (name, tuple(value.strip() for value in values if value.strip()))
+        for name, values in query_params.lists()
+        if name not in ignored and any(value.strip() for value in values)
+    ))
+
+
+def version_key(topic):
+    return f'admin_dashboard:report_version:{topic}'
+
+
+def get_versions(cache, topics):
+    versions = cache.get_many([version_key(topic) for topic in topics])
+    return tuple(versions.get(version_key(topic), 0) for topic in topics)
+
+
+def bump_version(topic):
+    cache = get_cache()
+    key = version_key(topic)
+    try:
+        cache.incr(key)
+    except ValueError: # Not set yet (or evicted): any new value invalidates the old keys.
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_topics(topics, using=None):
+    """
+    Invalidates the cached reports reading any of `topics`. Bumped at once, so reads
+    inside the writing transaction miss, and again after commit, so results computed
+    from the pre-commit data in between are not reused.
+    """
+    def bump():
+        for topic in topics:
+            try:
+                bump_version(topic)
+            except Exception:
+                # A cache outage must not fail the write; entries expire after their timeout.
+                logger.exception("Could not invalidate the '%s' report cache topic.", topic)
+    bump()
+    transaction.on_commit(bump, using=using)
+
+
+def report_cache_key(name, filters, topics, versions):
+    raw_key = repr((name, filters, tuple(zip(topics, versions))))
+    # Hashed so any filter value is a valid (memcached-safe) key.
+    return 'admin_dashboard:report:' + hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+class CachedQuery:
+    """A lazy queryset in cached report data: its model and SQL query, not its rows."""
+    def __init__(self, queryset):
+        self.model_label = queryset.model._meta.label
+        self.query = queryset.query
+
+    def to_queryset(self):
+        queryset = apps.get_model(self.model_label)._default_manager.all()
+        queryset.query = self.query # Also restores values() row dicts
+        return queryset
+
+
+def freeze(report_data):
+    return {key: CachedQuery(value) if isinstance(value, QuerySet) else value for key, value in report_data.items()}
+
+
+def thaw(report_data):
+    return {key: value.to_queryset() if isinstance(value, CachedQuery) else value for key, value in report_data.items()}
+
+
+def wait_for_result(cache, key, lock_key, wait_timeout):
+    """Polls for the result of the request holding `lock_key`; None if it fails or takes too long."""
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None: # The computing request finished without a result (e.g. it raised)
+            return cache.get(key)
+    return None
+
+
+def compute_and_store(cache, key, compute, timeout, make_entry=lambda data: data):
+    data = compute()
+    try:
+        cache.set(key, make_entry(freeze(data)), timeout=timeout)
+    except Exception:
+        logger.exception("Could not store a report in the cache.")
+    return data
+
+
+def get_or_compute(name, filters, topics, compute, timeout=None):
+    """
+    Returns (report data, HIT or MISS) for the report `name` with `filters`,
+    computing it with `compute()` at most once across concurrent identical requests.
+    """
+    config = get_cache_config()
+    timeout = timeout or config.get('CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+    lock_timeout = config.get('COMPUTE_LOCK_TIMEOUT', DEFAULT_COMPUTE_LOCK_TIMEOUT)
+    try:
+        cache = get_cache()
+        key = report_cache_key(name, filters, topics, get_versions(cache, topics))
+        cached = cache.get(key)
+    except Exception:
+        logger.exception("Report cache unavailable; computing the report directly.")
+        return compute(), MISS
+    if cached is not None:
+        return thaw(cached), HIT
+
+    lock_key = key + ':lock'
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            return compute_and_store(cache, key, compute, timeout), MISS
+        finally:
+            cache.delete(lock_key)
+    cached = wait_for_result(cache, key, lock_key, lock_timeout)
+    if cached is not None:
+        return thaw(cached), HIT
+    return compute(), MISS
+
+
+def start_revalidation(target):
+    """Runs `target` in a daemon thread, closing the thread's database connections afterwards."""
+    def run():
+        try:
+            target()
+        except Exception:
+            logger.exception("Background report revalidation failed.")
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, name='report-revalidation', daemon=True).start()
+
+
+def get_or_revalidate(name, filters, topics, compute, timeout=None):
+    """
+    Stale-while-revalidate variant of get_or_compute(). Entries are kept for
+    ADMIN_DASHBOARD_REPORTS['STALE_TIMEOUT'] under a key without topic versions;
+    one that is older than `timeout` or whose topics changed is returned as STALE
+    while a single background thread recomputes it. Only a missing entry is
+    computed in the request.
+    """
+    config = get_cache_config()
+    timeout = timeout or config.get('CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+    stale_timeout = max(config.get('STALE_TIMEOUT', DEFAULT_STALE_TIMEOUT), timeout)
+    lock_timeout = config.get('COMPUTE_LOCK_TIMEOUT', DEFAULT_COMPUTE_LOCK_TIMEOUT)
+    try:
+        cache = get_cache()
+        versions = get_versions(cache, topics)
+        key = report_cache_key(name, filters, topics, ()) + ':swr'
+        cached = cache.get(key)
+    except Exception:
+        logger.exception("Report cache unavailable; computing the report directly.")
+        return compute(), MISS
+
+    def make_entry(data):
+        # Versions are read before computing, so a write during the computation leaves the entry stale.
+        return {'versions': versions, 'computed_at': time.time(), 'data': data}
+
+    if cached is None:
+        return compute_and_store(cache, key, compute, stale_timeout, make_entry), MISS
+    if cached['versions'] == versions and time.time() - cached['computed_at'] < timeout:
+        return thaw(cached['data']), HIT
+
+    lock_key = key + ':lock'
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        def revalidate():
+            try:
+                compute_and_store(cache, key, compute, stale_timeout, make_entry)
+            finally:
+                cache.delete(lock_key)
+        start_revalidation(revalidate)
+    return thaw(cached['data']), STALE
+
+
+def invalidate_on_write(sender, using=None, update_fields=None, **kwargs):
+    if kwargs.get('raw') or (update_fields and set(update_fields) <= IGNORED_UPDATE_FIELDS):
+        return
+    invalidate_topics(MODEL_TOPICS.get(sender._meta.label, ()), using=using)
+
+
+def connect_invalidation_signals():
+    """Connects the invalidation receivers for every model in CACHE_TOPIC_MODELS."""
+    for label in MODEL_TOPICS:
+        model = apps.get_model(label)
+        post_save.connect(invalidate_on_write, sender=model, dispatch_uid=f'report_cache_post_save_{label}')
+        post_delete.connect(invalidate_on_write, sender=model, dispatch_uid=f'report_cache_post_delete_{label}')
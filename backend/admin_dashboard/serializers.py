@@ -1,6 +1,7 @@
 # admin_dashboard/serializers.py
 from rest_framework import serializers
-from .models import DashboardPreference
+from django.urls import reverse
+from .models import DashboardPreference, ReportJob, ReportJobStatus
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -83,3 +84,36 @@ class DashboardPreferenceSerializer(serializers.ModelSerializer):
                 )
 
         return super().update(instance, validated_data)
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """
+    Read-only representation of a ReportJob for the status polling endpoint,
+    including its progress and, once completed, its download URL.
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress_percent = serializers.IntegerField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report', 'parameters', 'export_format', 'status', 'status_display',
+            'rows_written', 'rows_estimated', 'progress_percent', 'error',
+            'created_at', 'started_at', 'finished_at', 'download_url',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ReportJobStatus.COMPLETED or not obj.file:
+            return None
+        url = reverse('admin_dashboard:report_job_download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    """Validates a report job submission: the report's URL name, its query parameters and the export format."""
+    report = serializers.CharField(max_length=100, help_text="URL name of the report, e.g. 'report_financial'.")
+    parameters = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False, default=dict)
+    export_format = serializers.CharField(max_length=10, required=False, default='csv')
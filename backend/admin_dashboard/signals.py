@@ -1,20 +1,92 @@
 # admin_dashboard/signals.py
-from django.db.models.signals import post_save, post_delete
+"""
+Keeps the daily report fact tables (see admin_dashboard.facts) in step with
+appointments, invoices and payments. pre_save reads the row's previous values,
+post_save moves its contribution from the old fact key to the new one, and
+post_delete removes the contribution pre_delete read from the database. Saves
+whose update_fields touch none of a table's fields (e.g. notes edits) are
+skipped without a query.
+
+It also connects the receivers invalidating cached report data
+(see admin_dashboard.report_cache), and does both for the bulk appointment
+writes of appointments.bulk, which send `bulk_saved` instead of post_save.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.conf import settings
-from .models import SomeModelInAdminDashboard # Example if you had models here
-from audit_log.models import create_audit_log_entry, AuditLogAction # If logging actions from here
-
-# Example signal receiver (customize as needed)
-@receiver(post_save, sender=SomeModelInAdminDashboard)
-def log_admin_dashboard_change(sender, instance, created, **kwargs):
-    action = AuditLogAction.CREATED if created else AuditLogAction.UPDATED
-    # Assuming get_current_user and other necessary context is available or passed
-    # create_audit_log_entry(user=None, action=action, target_object=instance, details=f"Admin dashboard item {instance} changed.")
-    pass
-
-# Add other signal handlers relevant to the admin_dashboard app below.
-# For instance, if specific actions within the admin dashboard need to trigger
-# notifications or other side effects, those signals would be defined and connected here.
-
-# print("admin_dashboard signals loaded") # Optional: for debugging signal loading
+
+from appointments.bulk import bulk_saved
+from appointments.models import Appointment
+
+from .facts import get_fact_tables
+from .report_cache import MODEL_TOPICS, connect_invalidation_signals, invalidate_topics
+
+FACT_TABLES = get_fact_tables()
+
+
+def touches_facts(table, update_fields):
+    return update_fields is None or any(
+        field in update_fields or field.removesuffix('_id') in update_fields for field in table.fields
+    )
+
+
+def stored_values(table, sender, instance, using):
+    return sender._default_manager.using(using).filter(pk=instance.pk).values(*table.fields).first()
+
+
+def fact_pre_save_handler(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    table = FACT_TABLES[sender]
+    instance._report_fact_previous = None
+    if raw or instance.pk is None or not touches_facts(table, update_fields):
+        return
+    instance._report_fact_previous = stored_values(table, sender, instance, using)
+
+
+def fact_post_save_handler(sender, instance, created, raw=False, using=None, update_fields=None, **kwargs):
+    table = FACT_TABLES[sender]
+    if raw or not touches_facts(table, update_fields):
+        return
+    previous = getattr(instance, '_report_fact_previous', None)
+    current = table.values_of(instance)
+    if previous is not None and update_fields is not None:
+        # Only update_fields were written; the instance may hold unsaved changes to the other fields.
+        current = {
+            field: current[field] if field in update_fields or field.removesuffix('_id') in update_fields else value
+            for field, value in previous.items()
+        }
+    if previous is not None and table.describe(previous) == table.describe(current):
+        return
+    if previous is not None:
+        table.apply(previous, -1, using)
+    table.apply(current, 1, using)
+
+
+def fact_pre_delete_handler(sender, instance, using=None, **kwargs):
+    # The instance may hold unsaved changes; the stored row is what was counted.
+    instance._report_fact_previous = stored_values(FACT_TABLES[sender], sender, instance, using)
+
+
+def fact_post_delete_handler(sender, instance, using=None, **kwargs):
+    previous = getattr(instance, '_report_fact_previous', None)
+    if previous is not None:
+        FACT_TABLES[sender].apply(previous, -1, using)
+
+
+@receiver(bulk_saved, sender=Appointment, dispatch_uid='report_fact_bulk_saved_appointments')
+def fact_bulk_saved_handler(sender, created, updated, using=None, **kwargs):
+    table = FACT_TABLES[sender]
+    table.apply_changes(
+        [(None, table.values_of(instance)) for instance in created]
+        + [({field: previous[field] for field in table.fields}, table.values_of(instance)) for instance, previous in updated],
+        using,
+    )
+    invalidate_topics(MODEL_TOPICS.get(sender._meta.label, ()), using=using)
+
+
+for source_model in FACT_TABLES:
+    pre_save.connect(fact_pre_save_handler, sender=source_model, dispatch_uid=f'report_fact_pre_save_{source_model._meta.label}')
+    post_save.connect(fact_post_save_handler, sender=source_model, dispatch_uid=f'report_fact_post_save_{source_model._meta.label}')
+    pre_delete.connect(fact_pre_delete_handler, sender=source_model, dispatch_uid=f'report_fact_pre_delete_{source_model._meta.label}')
+    post_delete.connect(fact_post_delete_handler, sender=source_model, dispatch_uid=f'report_fact_post_delete_{source_model._meta.label}')
+
+# Invalidates cached report data when appointments, billing records, patients or users change.
+connect_invalidation_signals()
@@ -1,3 +1,626 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from django.db.models import F
+from rest_framework import status
+from rest_framework.test import APIClient
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+import io
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
 
-# Create your tests here.
+import pyarrow.parquet as pq
+
+from audit_log.models import AuditActivityRollup, AuditLogAction
+from patients.models import Patient
+from billing.models import Invoice, InvoiceStatus, Payment, PaymentMethod
+from appointments.models import Appointment, AppointmentStatus, AppointmentType
+from decimal import Decimal
+from users.models import UserRole
+from .models import AppointmentDailyFact, InvoiceDailyFact, PaymentDailyFact
+from . import report_cache
+from .jobs import run_job
+from .fanout import fan_out
+from .models import ReportJob, ReportJobStatus
+
+UserModel = get_user_model()
+
+def create_patient(username, **profile):
+    user = UserModel.objects.create_user(
+        username=username, email=f'{username}@example.com', password='password', role=UserRole.PATIENT
+    )
+    patient, _ = Patient.objects.update_or_create(user=user, defaults=profile)
+    return patient
+
+
+class StaffActivityReportViewTests(TestCase):
+    """Tests for the staff activity report, which reads the daily audit activity rollups."""
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='report_admin', email='report_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.doctor_user = UserModel.objects.create_user(
+            username='report_doctor', email='report_doctor@example.com', password='password', role=UserRole.DOCTOR
+        )
+        self.patient_user = UserModel.objects.create_user(
+            username='report_patient', email='report_patient@example.com', password='password', role=UserRole.PATIENT
+        )
+        today = timezone.localdate()
+        AuditActivityRollup.objects.bulk_create([
+            AuditActivityRollup(user=self.doctor_user, action=AuditLogAction.VIEWED, date=today, count=5),
+            AuditActivityRollup(user=self.doctor_user, action=AuditLogAction.PRESCRIPTION_ISSUED, date=today - timedelta(days=1), count=2),
+            AuditActivityRollup(user=self.doctor_user, action=AuditLogAction.VIEWED, date=today - timedelta(days=60), count=40),
+            AuditActivityRollup(user=self.patient_user, action=AuditLogAction.VIEWED, date=today, count=9), # Not staff
+        ])
+        self.url = reverse('admin_dashboard:report_staff_activity')
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(user=self.doctor_user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_default_period_counts_staff_activity_from_rollups(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_staff_actions_in_period'], 7)
+        self.assertEqual(response.data['staff_activity_by_action'][0], {'action': 'Viewed Record', 'count': 5})
+        doctor_row, = response.data['staff_activity_per_user']
+        self.assertEqual((doctor_row['email'], doctor_row['total_actions'], doctor_row['active_days']), ('report_doctor@example.com', 7, 2))
+
+    def test_date_range(self):
+        self.client.force_authenticate(user=self.admin_user)
+        date_from = (timezone.localdate() - timedelta(days=90)).isoformat()
+        response = self.client.get(self.url, {'date_from': date_from, 'date_to': timezone.localdate().isoformat()})
+        self.assertEqual(response.data['total_staff_actions_in_period'], 47)
+        self.assertEqual(self.client.get(self.url, {'date_from': 'not-a-date'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_csv_export_is_streamed(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Staff Activity Per User', content)
+        self.assertIn('report_doctor@example.com', content)
+
+        response = self.client.get(self.url, {'format': 'csv', 'date_from': 'not-a-date'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PatientStatisticsReportViewTests(TestCase):
+    """Tests for the patient statistics report, aggregated in the database."""
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='stats_admin', email='stats_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        today = timezone.localdate()
+        birthday = lambda years, days=0: today.replace(year=today.year - years, day=min(today.day, 28)) - timedelta(days=days)
+        create_patient('stats_child', date_of_birth=birthday(17, days=-1), gender='FEMALE') # Turns 17 tomorrow
+        create_patient('stats_adult', date_of_birth=birthday(18), gender='MALE') # Turned 18 this month
+        create_patient('stats_senior', date_of_birth=birthday(61), gender='FEMALE')
+        create_patient('stats_unknown')
+        self.url = reverse('admin_dashboard:report_patient_statistics')
+
+    def test_age_gender_and_registrations_in_two_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report_queries = [q for q in queries.captured_queries if 'patients_patient' in q['sql']]
+        self.assertEqual(len(report_queries), 2)
+        self.assertEqual(response.data['total_patients'], 4)
+        self.assertEqual(
+            response.data['patient_age_distribution'],
+            {'under_18': 1, '18_40': 1, '41_60': 0, 'over_60': 1, 'unknown_age': 1}
+        )
+        self.assertEqual(
+            response.data['patients_by_gender'],
+            [{'gender': '', 'count': 1}, {'gender': 'FEMALE', 'count': 2}, {'gender': 'MALE', 'count': 1}]
+        )
+        self.assertEqual(sum(row['count'] for row in response.data['recent_registrations_last_30_days']), 4)
+        self.assertEqual(sum(row['count'] for row in response.data['registrations_by_month_current_year']), 4)
+
+    def test_custom_age_buckets(self):
+        response = self.client.get(self.url, {'age_buckets': '10,60'})
+        self.assertEqual(
+            response.data['patient_age_distribution'],
+            {'under_10': 0, '10_59': 2, 'over_59': 1, 'unknown_age': 1}
+        )
+        self.assertEqual(self.client.get(self.url, {'age_buckets': '40,18'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FinancialReportViewTests(TestCase):
+    """Tests for the financial report's database-aggregated receivables figures."""
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='finance_admin', email='finance_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.patient = create_patient('finance_patient')
+        today = timezone.localdate()
+        # (days past due, total, paid, status)
+        for days_past_due, total, paid, invoice_status in [
+            (-5, '100.00', '0.00', InvoiceStatus.SENT), # current
+            (10, '200.00', '50.00', InvoiceStatus.PARTIALLY_PAID), # 0-30
+            (45, '300.00', '0.00', InvoiceStatus.OVERDUE), # 31-60
+            (120, '400.00', '100.00', InvoiceStatus.OVERDUE), # over 90
+            (20, '500.00', '500.00', InvoiceStatus.PAID), # Settled: not outstanding
+            (20, '600.00', '0.00', InvoiceStatus.VOID), # Not billed
+        ]:
+            invoice = Invoice.objects.create(patient=self.patient, issue_date=today, due_date=today)
+            # Totals and status are normally derived from items and payments; set them directly here.
+            Invoice.objects.filter(pk=invoice.pk).update(
+                due_date=today - timedelta(days=days_past_due), total_amount=Decimal(total),
+                paid_amount=Decimal(paid), status=invoice_status
+            )
+        # queryset.update() bypasses the fact signals; rebuild the facts as after any bulk change.
+        call_command('rebuild_report_facts', stdout=StringIO())
+        self.url = reverse('admin_dashboard:report_financial')
+
+    def test_receivables_and_collection_figures(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_outstanding_revenue_all_time'], '850.00')
+        self.assertEqual(response.data['outstanding_invoice_count_all_time'], 4)
+        self.assertEqual(response.data['overdue_amount_all_time'], '750.00')
+        self.assertEqual(response.data['overdue_invoice_count_all_time'], 3)
+        self.assertEqual(
+            [(row['bucket'], row['count'], row['amount_due']) for row in response.data['receivables_aging_all_time']],
+            [('current', 1, '100.00'), ('0_30', 1, '150.00'), ('31_60', 1, '300.00'), ('61_90', 0, '0.00'), ('over_90', 1, '300.00')]
+        )
+        # Period invoices exclude VOID: 1500 invoiced, 650 collected.
+        self.assertEqual(response.data['total_invoiced_in_period'], '1500.00')
+        self.assertEqual(response.data['total_collected_on_period_invoices'], '650.00')
+        self.assertEqual(response.data['amount_due_on_period_invoices'], '850.00')
+        self.assertEqual(response.data['collection_rate_percent_in_period'], '43.33')
+
+    def test_csv_export_streams_detail_rows(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertIn('Total Outstanding Revenue (All Time),850.00', lines)
+        self.assertIn('over_90,1,300.00', lines)
+        invoice_rows = lines[lines.index('Detailed Invoice List for Period') + 2:lines.index('Detailed Payment List for Period') - 1]
+        self.assertEqual(len(invoice_rows), 6)
+
+    def test_sections_compute_only_what_is_requested(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'sections': 'by_status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('invoices_by_status_in_period', response.data)
+        for key in ('total_revenue_in_period', 'receivables_aging_all_time', 'raw_invoice_data_csv', 'raw_payment_data_csv'):
+            self.assertNotIn(key, response.data)
+        # Only the report's own tables: other work in the request (e.g. the audit writer) does not count.
+        report_tables = ('admin_dashboard_invoicedailyfact', 'admin_dashboard_paymentdailyfact', 'billing_invoice', 'billing_payment')
+        selects = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and any(f'"{table}"' in query['sql'] for table in report_tables)
+        ]
+        self.assertEqual(len(selects), 1) # Only the invoice facts by status
+        self.assertIn('"admin_dashboard_invoicedailyfact"', selects[0])
+
+        response = self.client.get(self.url, {'sections': 'summary,aging'})
+        self.assertEqual(response.data['total_outstanding_revenue_all_time'], '850.00')
+        self.assertEqual(len(response.data['receivables_aging_all_time']), 5)
+        self.assertNotIn('invoices_by_status_in_period', response.data)
+
+        response = self.client.get(self.url, {'sections': 'summary,refunds'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_sections_are_paginated_separately(self):
+        response = self.client.get(self.url, {'sections': 'invoices,payments', 'page_size': 4, 'invoices_page': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        invoices = response.data['raw_invoice_data_csv']
+        self.assertEqual((invoices['count'], len(invoices['results'])), (6, 2))
+        self.assertIsNotNone(invoices['previous'])
+        self.assertIsNone(invoices['next'])
+        self.assertEqual(response.data['raw_payment_data_csv']['count'], 0)
+
+        first_page = self.client.get(self.url, {'sections': 'invoices', 'page_size': 4})
+        numbers = [row['invoice_number'] for row in first_page.data['raw_invoice_data_csv']['results'] + invoices['results']]
+        self.assertEqual(len(set(numbers)), 6)
+        self.assertEqual(first_page['X-Report-Cache'], 'miss') # Other pages reuse one cache entry per section selection
+
+        response = self.client.get(self.url, {'sections': 'invoices', 'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertNotIn('Summary Metric,Value', lines)
+        self.assertEqual(len(lines[lines.index('Detailed Invoice List for Period') + 2:]), 7) # 6 rows and a blank line
+
+    def test_xlsx_export_has_a_sheet_per_section(self):
+        response = self.client.get(self.url, {'format': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as workbook:
+            sheets = [name for name in workbook.namelist() if name.startswith('xl/worksheets/sheet')]
+            workbook_xml = workbook.read('xl/workbook.xml').decode()
+        self.assertEqual(len(sheets), 6) # Summary and five sections
+        self.assertIn('name="Summary"', workbook_xml)
+        self.assertIn('name="Detailed Invoice List for Perio"', workbook_xml) # Sheet names are cut to 31 characters
+
+    def test_parquet_export_writes_a_file_per_section(self):
+        response = self.client.get(self.url, {'format': 'parquet'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.namelist()), 5)
+            invoices = pq.read_table(io.BytesIO(archive.read('detailed_invoice_list_for_period.parquet')))
+        self.assertEqual(invoices.num_rows, 6)
+        self.assertEqual(invoices.column_names[0], 'Invoice Number')
+        self.assertEqual(invoices.schema.metadata[b'report_title'], b'Financial Report')
+
+
+class AppointmentReportViewTests(TestCase):
+    """Tests for the appointment report's JSON and streamed CSV output."""
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='appt_report_admin', email='appt_report_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        doctor = UserModel.objects.create_user(
+            username='appt_report_doctor', email='appt_report_doctor@example.com', password='password', role=UserRole.DOCTOR
+        )
+        patient = create_patient('appt_report_patient')
+        for days_ago in (1, 2, 3):
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_type=AppointmentType.GENERAL_CONSULTATION,
+                appointment_date_time=timezone.now() - timedelta(days=days_ago), status=AppointmentStatus.COMPLETED
+            )
+        self.url = reverse('admin_dashboard:report_appointment')
+
+    def test_json_and_csv_include_detail_rows(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_appointments_in_period'], 3)
+        details = response.json()['raw_data_for_csv'] # Paginated separately
+        self.assertEqual((details['count'], len(details['results']), details['next']), (3, 3, None))
+
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        detail_rows = lines[lines.index('Detailed Data') + 2:]
+        self.assertEqual(len([line for line in detail_rows if line]), 3)
+
+    def test_breakdowns_come_from_daily_facts(self):
+        AppointmentDailyFact.objects.update(count=F('count') + 1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total_appointments_in_period'], 6)
+        self.assertEqual(response.data['appointments_per_doctor'][0]['count'], 6)
+
+
+class TrendReportViewTests(TestCase):
+    """Tests for the pandas-computed appointment and revenue trend reports."""
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='trend_admin', email='trend_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.doctor, self.other_doctor = [
+            UserModel.objects.create_user(username=name, email=f'{name}@example.com', password='password', role=UserRole.DOCTOR)
+            for name in ('trend_doctor', 'trend_other_doctor')
+        ]
+        # Two full weeks, Monday 2025-03-03 to Sunday 2025-03-16, after a week of lookback.
+        self.period = {'date_from': '2025-03-03', 'date_to': '2025-03-16'}
+        self.first_day = date(2025, 2, 24)
+
+    def days(self, count, start=None):
+        return [(start or self.first_day) + timedelta(days=offset) for offset in range(count)]
+
+    def add_appointment_fact(self, day, doctor, appointment_status, count):
+        AppointmentDailyFact.objects.create(
+            date=day, doctor=doctor, status=appointment_status, appointment_type=AppointmentType.GENERAL_CONSULTATION, count=count
+        )
+
+    def test_appointment_trends(self):
+        for day in self.days(21):
+            self.add_appointment_fact(day, self.doctor, AppointmentStatus.COMPLETED, 1)
+        self.add_appointment_fact(date(2025, 3, 12), self.doctor, AppointmentStatus.NO_SHOW, 2)
+        self.add_appointment_fact(date(2025, 3, 5), self.other_doctor, AppointmentStatus.COMPLETED, 3)
+
+        response = self.client.get(reverse('admin_dashboard:report_appointment_trends'), self.period)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['total_appointments_in_period'], 19)
+        self.assertEqual(len(data['daily_appointments']), 14)
+        first_day = data['daily_appointments'][0]
+        self.assertEqual((first_day['date'], first_day['count'], first_day['rolling_7d_avg']), (date(2025, 3, 3), 1, 1.0))
+        # The week before the period is loaded for the first week-over-week change.
+        self.assertEqual(
+            [(week['week_start'], week['total'], week['change'], week['change_percent']) for week in data['weekly_appointments']],
+            [(date(2025, 3, 3), 10, 3, 42.86), (date(2025, 3, 10), 9, -1, -10.0)]
+        )
+        rates = data['no_show_rate_per_doctor']
+        self.assertEqual(
+            [(row['doctor__email'], row['completed'], row['no_show'], row['no_show_rate_percent']) for row in rates],
+            [('trend_doctor@example.com', 14, 2, 12.5), ('trend_other_doctor@example.com', 3, 0, 0.0)]
+        )
+        self.assertEqual(response.json()['weekly_appointments'][0]['week_start'], '2025-03-03')
+        wednesday = next(row for row in data['seasonality_by_weekday'] if row['label'] == 'Wednesday')
+        self.assertEqual((wednesday['daily_average'], wednesday['days']), (3.5, 2))
+
+    def test_revenue_trends_and_run_rate(self):
+        for day in self.days(30, start=date(2025, 2, 15)):
+            PaymentDailyFact.objects.create(date=day, payment_method=PaymentMethod.CASH, count=1, amount=Decimal('100.00'))
+        InvoiceDailyFact.objects.create(date=date(2025, 3, 4), status=InvoiceStatus.SENT, count=1, total_amount=Decimal('500.00'), paid_amount=Decimal('0.00'))
+        InvoiceDailyFact.objects.create(date=date(2025, 3, 4), status=InvoiceStatus.VOID, count=1, total_amount=Decimal('900.00'), paid_amount=Decimal('0.00'))
+        url = reverse('admin_dashboard:report_revenue_trends')
+
+        response = self.client.get(url, self.period)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_collected_in_period'], '1400.00')
+        self.assertEqual(response.data['total_invoiced_in_period'], '500.00')
+        self.assertEqual(response.data['revenue_run_rate']['monthly_run_rate'], '3000.00')
+        self.assertEqual(response.data['revenue_run_rate']['annual_run_rate'], '36500.00')
+        self.assertEqual(response.json()['daily_revenue'][0]['rolling_7d_avg'], '100.00')
+
+        response = self.client.get(url, {**self.period, 'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertIn('Annual Run-Rate,36500.00', lines)
+        self.assertIn('Daily Revenue', lines)
+
+    def test_rejects_inverted_period(self):
+        response = self.client.get(reverse('admin_dashboard:report_revenue_trends'), {'date_from': '2025-03-16', 'date_to': '2025-03-03'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReportFactTests(TestCase):
+    """Tests for the incremental maintenance and rebuild of the daily report facts."""
+    def setUp(self):
+        self.doctor = UserModel.objects.create_user(
+            username='fact_doctor', email='fact_doctor@example.com', password='password', role=UserRole.DOCTOR
+        )
+        self.patient = create_patient('fact_patient')
+        self.when = timezone.now() - timedelta(days=1)
+
+    def appointment_facts(self):
+        return {
+            (fact.date, fact.doctor_id, fact.status): fact.count
+            for fact in AppointmentDailyFact.objects.filter(count__gt=0)
+        }
+
+    def test_appointment_facts_follow_saves_and_deletes(self):
+        day = timezone.localdate(self.when)
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_type=AppointmentType.GENERAL_CONSULTATION,
+            appointment_date_time=self.when, status=AppointmentStatus.SCHEDULED
+        )
+        self.assertEqual(self.appointment_facts(), {(day, self.doctor.pk, AppointmentStatus.SCHEDULED): 1})
+
+        appointment.status = AppointmentStatus.COMPLETED
+        appointment.save(update_fields=['status'])
+        self.assertEqual(self.appointment_facts(), {(day, self.doctor.pk, AppointmentStatus.COMPLETED): 1})
+
+        appointment.notes = "Follow up in two weeks."
+        with self.assertNumQueries(1): # The update only; notes are not a fact dimension
+            appointment.save(update_fields=['notes'])
+
+        appointment.delete()
+        self.assertEqual(self.appointment_facts(), {})
+
+    def test_invoice_and_payment_facts_track_totals(self):
+        today = timezone.localdate()
+        invoice = Invoice.objects.create(
+            patient=self.patient, issue_date=today, due_date=today + timedelta(days=30),
+            total_amount=Decimal('300.00'), status=InvoiceStatus.SENT
+        )
+        Payment.objects.create(invoice=invoice, amount=Decimal('120.00'), payment_method=PaymentMethod.CASH)
+
+        payment_fact = PaymentDailyFact.objects.get()
+        self.assertEqual((payment_fact.payment_method, payment_fact.count, payment_fact.amount), (PaymentMethod.CASH, 1, Decimal('120.00')))
+        invoice.refresh_from_db()
+        invoice_totals = InvoiceDailyFact.objects.filter(count__gt=0).values_list('status', 'count', 'total_amount', 'paid_amount')
+        self.assertEqual(list(invoice_totals), [(invoice.status, 1, invoice.total_amount, invoice.paid_amount)])
+
+    def test_rebuild_matches_incremental_facts(self):
+        for offset, appointment_status in [(0, AppointmentStatus.SCHEDULED), (1, AppointmentStatus.COMPLETED), (2, AppointmentStatus.COMPLETED)]:
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, appointment_type=AppointmentType.GENERAL_CONSULTATION,
+                appointment_date_time=self.when - timedelta(hours=offset), status=appointment_status
+            )
+        incremental = self.appointment_facts()
+        AppointmentDailyFact.objects.all().delete()
+
+        call_command('rebuild_report_facts', stdout=StringIO())
+        self.assertEqual(self.appointment_facts(), incremental)
+
+
+class ReportCacheTests(TestCase):
+    """Tests for report caching, signal-driven invalidation, single-flight and stale-while-revalidate."""
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='cache_admin', email='cache_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.doctor = UserModel.objects.create_user(
+            username='cache_doctor', email='cache_doctor@example.com', password='password', role=UserRole.DOCTOR
+        )
+        self.patient = create_patient('cache_patient')
+        self.add_appointment(days_ago=1)
+
+    def add_appointment(self, days_ago):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_type=AppointmentType.GENERAL_CONSULTATION,
+            appointment_date_time=timezone.now() - timedelta(days=days_ago), status=AppointmentStatus.COMPLETED
+        )
+
+    def test_identical_filters_hit_and_writes_invalidate(self):
+        url = reverse('admin_dashboard:report_appointment')
+        today = timezone.localdate()
+        filters = {'date_from': f'{today - timedelta(days=10):%Y-%m-%d}', 'date_to': f'{today:%Y-%m-%d}'}
+        response = self.client.get(url, filters)
+        self.assertEqual(response['X-Report-Cache'], report_cache.MISS)
+        self.assertEqual(response.data['total_appointments_in_period'], 1)
+
+        # Same filters in another order (plus an empty parameter) share the entry.
+        response = self.client.get(f"{url}?date_to={filters['date_to']}&age_buckets=&date_from={filters['date_from']}")
+        self.assertEqual(response['X-Report-Cache'], report_cache.HIT)
+        self.assertEqual(response.json()['raw_data_for_csv']['count'], 1) # Cached detail queryset is rebuilt
+
+        self.add_appointment(days_ago=2)
+        response = self.client.get(url, filters)
+        self.assertEqual(response['X-Report-Cache'], report_cache.MISS)
+        self.assertEqual(response.data['total_appointments_in_period'], 2)
+
+    def test_concurrent_identical_requests_compute_once(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(report_cache.get_or_compute('test.report', (), ('billing',), compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([data for data, _ in results], [{'value': 42}] * 4)
+        self.assertEqual(sorted(state for _, state in results), [report_cache.HIT] * 3 + [report_cache.MISS])
+
+    @patch('admin_dashboard.report_cache.start_revalidation', side_effect=lambda target: target())
+    def test_overview_serves_stale_while_revalidating(self, start_revalidation):
+        url = reverse('admin_dashboard:dashboard_overview')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Report-Cache'], report_cache.MISS)
+        self.assertEqual(response.data['total_patients'], 1)
+
+        create_patient('cache_patient_2')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Report-Cache'], report_cache.STALE)
+        self.assertEqual(response.data['total_patients'], 1)
+        start_revalidation.assert_called_once()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Report-Cache'], report_cache.HIT)
+        self.assertEqual(response.data['total_patients'], 2)
+
+
+class ReportJobTests(TestCase):
+    """Tests for background report jobs: submission, deduplication, rendering and download."""
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='job_admin', email='job_admin@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        doctor = UserModel.objects.create_user(
+            username='job_doctor', email='job_doctor@example.com', password='password', role=UserRole.DOCTOR
+        )
+        patient = create_patient('job_patient')
+        for days_ago in (1, 2):
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_type=AppointmentType.GENERAL_CONSULTATION,
+                appointment_date_time=timezone.now() - timedelta(days=days_ago), status=AppointmentStatus.COMPLETED
+            )
+        self.url = reverse('admin_dashboard:report_job_create')
+        today = timezone.localdate()
+        self.parameters = {'date_from': f'{today - timedelta(days=7):%Y-%m-%d}', 'date_to': f'{today:%Y-%m-%d}'}
+
+    def test_identical_submissions_share_a_job(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(self.url, {'report': 'report_appointment', 'parameters': self.parameters}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], ReportJobStatus.PENDING)
+        self.assertEqual(len(callbacks), 1) # Queued on the worker pool after commit
+
+        reordered = dict(reversed(list(self.parameters.items())), format='csv')
+        response_again = self.client.post(self.url, {'report': 'admin_dashboard:report_appointment', 'parameters': reordered}, format='json')
+        self.assertEqual(response_again.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_again.data['id'], response.data['id'])
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_rejects_unknown_reports_and_formats(self):
+        for payload in [{'report': 'report_missing'}, {'report': 'report_list'}, {'report': 'report_financial', 'export_format': 'pdf'}]:
+            response = self.client.post(self.url, payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+
+    def test_job_renders_file_and_downloads(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            job_id = self.client.post(self.url, {'report': 'report_appointment', 'parameters': self.parameters}, format='json').data['id']
+        download_url = reverse('admin_dashboard:report_job_download', kwargs={'pk': job_id})
+        self.assertEqual(self.client.get(download_url).status_code, status.HTTP_409_CONFLICT)
+
+        self.assertTrue(run_job(job_id))
+        self.assertFalse(run_job(job_id)) # Already claimed
+
+        response = self.client.get(reverse('admin_dashboard:report_job_detail', kwargs={'pk': job_id}))
+        self.assertEqual(response.data['status'], ReportJobStatus.COMPLETED)
+        self.assertEqual(response.data['progress_percent'], 100)
+        self.assertTrue(response.data['download_url'].endswith(download_url))
+
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Appointment Report')
+        detail_rows = lines[lines.index('Detailed Data') + 2:]
+        self.assertEqual(len([line for line in detail_rows if line]), 2)
+
+    def test_job_exports_xlsx(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(
+                self.url, {'report': 'report_appointment', 'parameters': self.parameters, 'export_format': 'xlsx'}, format='json'
+            )
+        self.assertTrue(run_job(response.data['id']))
+        job = ReportJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.status, ReportJobStatus.COMPLETED, job.error)
+        self.assertTrue(job.file.name.endswith('.xlsx'))
+        with zipfile.ZipFile(job.file.path) as workbook:
+            self.assertIn('xl/workbook.xml', workbook.namelist())
+
+
+class FanOutTests(SimpleTestCase):
+    """Tests for running independent report queries concurrently."""
+    def slow_task(self, value):
+        def task():
+            time.sleep(0.2)
+            return value, threading.get_ident(), timezone.get_current_timezone_name()
+        return task
+
+    def test_tasks_run_concurrently_in_the_callers_timezone(self):
+        started = time.monotonic()
+        with timezone.override('Asia/Tokyo'):
+            results = fan_out({name: self.slow_task(name) for name in ('a', 'b', 'c')})
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([value for value, _, _ in results.values()], ['a', 'b', 'c'])
+        self.assertEqual(len({thread for _, thread, _ in results.values()}), 3)
+        self.assertEqual({tz for _, _, tz in results.values()}, {'Asia/Tokyo'})
+
+    def test_exceptions_propagate(self):
+        def fail():
+            raise ValueError("boom")
+        with self.assertRaisesMessage(ValueError, "boom"):
+            fan_out({'ok': self.slow_task(1), 'fail': fail})
+
+    @override_settings(ADMIN_DASHBOARD_REPORTS={'FANOUT_WORKERS': 1})
+    def test_single_worker_runs_inline(self):
+        results = fan_out({name: self.slow_task(name) for name in ('a', 'b')})
+        self.assertEqual({thread for _, thread, _ in results.values()}, {threading.get_ident()})
@@ -6,6 +6,12 @@ from .views import (
     AppointmentReportView,
     FinancialReportView,
     StaffActivityReportView,
+    AppointmentTrendsReportView,
+    RevenueTrendsReportView,
+    DashboardOverviewView,
+    ReportJobCreateView,
+    ReportJobDetailView,
+    ReportJobDownloadView,
     # Placeholder for future views if DashboardPreference API is needed:
     # DashboardPreferenceAPIView,
 )
@@ -15,10 +21,18 @@ app_name = 'admin_dashboard'
 urlpatterns = [
     # Report Views
     path('reports/', ReportListView.as_view(), name='report_list'),
+    path('reports/overview/', DashboardOverviewView.as_view(), name='dashboard_overview'),
     path('reports/patient-statistics/', PatientStatisticsReportView.as_view(), name='report_patient_statistics'),
     path('reports/appointment-report/', AppointmentReportView.as_view(), name='report_appointment'),
     path('reports/financial-report/', FinancialReportView.as_view(), name='report_financial'),
     path('reports/staff-activity-report/', StaffActivityReportView.as_view(), name='report_staff_activity'),
+    path('reports/appointment-trends/', AppointmentTrendsReportView.as_view(), name='report_appointment_trends'),
+    path('reports/revenue-trends/', RevenueTrendsReportView.as_view(), name='report_revenue_trends'),
+
+    # Background report exports
+    path('reports/jobs/', ReportJobCreateView.as_view(), name='report_job_create'),
+    path('reports/jobs/<int:pk>/', ReportJobDetailView.as_view(), name='report_job_detail'),
+    path('reports/jobs/<int:pk>/download/', ReportJobDownloadView.as_view(), name='report_job_download'),
 
     # Example URL for DashboardPreference API (if implemented)
     # This would typically be a RetrieveUpdateAPIView for the logged-in admin user's preferences.
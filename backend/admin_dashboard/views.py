@@ -1,29 +1,39 @@
-from rest_framework import views, permissions, status
+from rest_framework import views, status
 from rest_framework.response import Response
+from rest_framework.generics import get_object_or_404
+from django.http import FileResponse, HttpResponse
 from django.utils import timezone
-from django.db.models import Count, Sum, Q, F
-from django.db.models.functions import TruncDate, TruncMonth
-from django.http import HttpResponse
-import csv
+from django.db.models import Count, Sum, Q, F, DecimalField, ExpressionWrapper
+from django.db.models.functions import TruncDate
+from django.conf import settings
+from rest_framework.settings import api_settings
 from datetime import timedelta, datetime
+from decimal import Decimal
 
 # Import models from their respective apps
-from patients.models import Patient # Removed MedicalRecord as it's not directly used in this view's queries
+from patients.models import Patient, Gender # Removed MedicalRecord as it's not directly used in this view's queries
 from appointments.models import Appointment, AppointmentStatus, AppointmentType
 from billing.models import Invoice, InvoiceStatus, Payment, PaymentMethod
 from users.models import CustomUser, UserRole
+from users.permissions import IsHospitalAdmin
+from audit_log.models import AuditActivityRollup, AuditLogAction
+from .models import AppointmentDailyFact, InvoiceDailyFact, PaymentDailyFact, ReportJob, ReportJobStatus
+from .serializers import ReportJobCreateSerializer, ReportJobSerializer
+
+from .exports import (
+    EXPORT_CONTENT_TYPES, FILE_EXPORT_FORMATS, ReportCSVRenderer, ReportParquetRenderer, ReportSection, ReportXLSXRenderer,
+    build_export, file_export_response, iter_rows, stream_csv_response,
+)
+from .report_cache import get_or_compute, get_or_revalidate, normalize_filters
+from .jobs import expire_stale_jobs, get_job_setting, submit_job
+from .fanout import fan_out
+from .pagination import ReportDetailPagination
+from .analytics import DEFAULT_ROLLING_WINDOWS, DEFAULT_RUN_RATE_DAYS, appointment_trends, revenue_trends
 
 # Import serializers if creating API views for models in this app
 # from .serializers import DashboardPreferenceSerializer
 # from .models import DashboardPreference
 
-class IsHospitalAdmin(permissions.BasePermission):
-    """
-    Custom permission to only allow access to hospital administrators.
-    """
-    def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.role == UserRole.ADMIN
-
 class ReportListView(views.APIView):
     """
     Lists all available reports in the admin dashboard.
@@ -33,18 +43,50 @@ class ReportListView(views.APIView):
 
     def get(self, request, *args, **kwargs):
         available_reports = [
-            {'name': 'Patient Statistics Report', 'endpoint': 'admin_dashboard:report_patient_statistics', 'description': 'Summary of patient demographics and registration trends. Add "?format=csv" for CSV download.'},
-            {'name': 'Appointment Report', 'endpoint': 'admin_dashboard:report_appointment', 'description': 'Overview of appointment statuses, types, and scheduling. Add "?format=csv&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD" for CSV download within a date range.'},
-            {'name': 'Billing and Financial Report', 'endpoint': 'admin_dashboard:report_financial', 'description': 'Summary of invoices, payments, and outstanding amounts. Add "?format=csv&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD" for CSV download within a date range.'},
-            {'name': 'Staff Activity Report', 'endpoint': 'admin_dashboard:report_staff_activity', 'description': 'Overview of staff roles and system activity (basic counts).'},
+            {'name': 'Dashboard Overview', 'endpoint': 'admin_dashboard:dashboard_overview', 'description': 'Headline patient, appointment and billing figures for the dashboard landing page. May be served slightly stale while it is refreshed in the background.'},
+            {'name': 'Patient Statistics Report', 'endpoint': 'admin_dashboard:report_patient_statistics', 'description': 'Summary of patient demographics and registration trends. Add "?format=csv", "?format=xlsx" or "?format=parquet" to download it.'},
+            {'name': 'Appointment Report', 'endpoint': 'admin_dashboard:report_appointment', 'description': 'Overview of appointment statuses, types, and scheduling. Select parts with "?sections=summary,by_status,by_type,per_doctor,by_date,details"; the details are paginated ("?details_page=2"). Add "?format=csv" (or xlsx, parquet) and "&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD" to download it for a date range.'},
+            {'name': 'Billing and Financial Report', 'endpoint': 'admin_dashboard:report_financial', 'description': 'Summary of invoices, payments, and outstanding amounts. Select parts with "?sections=summary,aging,by_status,by_method,invoices,payments"; invoices and payments are paginated ("?invoices_page=2"). Add "?format=csv" (or xlsx, parquet) and "&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD" to download it for a date range.'},
+            {'name': 'Appointment Trends Report', 'endpoint': 'admin_dashboard:report_appointment_trends', 'description': 'Daily appointments with rolling averages, week-over-week changes, weekday and month seasonality and no-show rates per doctor. Defaults to the last 90 days; accepts date_from/date_to and the export formats.'},
+            {'name': 'Revenue Trends Report', 'endpoint': 'admin_dashboard:report_revenue_trends', 'description': 'Daily collected and invoiced amounts with rolling averages, week-over-week changes, weekday seasonality and the revenue run-rate. Defaults to the last 90 days; accepts date_from/date_to and the export formats.'},
+            {'name': 'Report Jobs', 'endpoint': 'admin_dashboard:report_job_create', 'description': 'POST {"report": "<report URL name>", "parameters": {...}} to export any report in the background; poll the returned job and download its file when completed.'},
+            {'name': 'Staff Activity Report', 'endpoint': 'admin_dashboard:report_staff_activity', 'description': 'Staff counts by role and audited staff activity per user, action and day. Add "?format=csv" (or xlsx, parquet) and "&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD" to download it for a date range.'},
         ]
         return Response(available_reports)
 
 class BaseReportView(views.APIView):
     """
-    Base class for report views to handle common CSV export logic.
+    Base class for report views to handle common CSV, XLSX and Parquet export logic.
+    CSV exports are streamed; XLSX and Parquet files are written to a temporary
+    file with constant memory and then streamed (see admin_dashboard.exports).
+    Report data is cached per normalized filters and invalidated when rows of the
+    `cache_topics` change (see admin_dashboard.report_cache); views without topics are not cached.
+    Sectioned reports compute only the `sections` listed in "?sections=" (all by default);
+    their `detail_sections` are paginated separately in JSON responses (see ReportDetailPagination).
     """
     permission_classes = [IsHospitalAdmin]
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES, ReportCSVRenderer, ReportXLSXRenderer, ReportParquetRenderer,
+    ] # Accepts "?format=csv", "?format=xlsx" and "?format=parquet"
+    cache_topics = ()
+    cache_timeout = None # Defaults to ADMIN_DASHBOARD_REPORTS['CACHE_TIMEOUT']
+    stale_while_revalidate = False
+    sections = () # Section names "?sections=" can select; empty if the report is not sectioned
+    detail_sections = {} # Detail section name -> report data key of its lazy queryset
+
+    def get_requested_sections(self, request):
+        """
+        Returns the names of the sections to compute: those listed (comma-separated)
+        in "?sections=", or all of them when it is absent. Raises ValueError for unknown names.
+        """
+        value = request.query_params.get('sections', '')
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        if not self.sections or not requested:
+            return set(self.sections)
+        unknown = requested - set(self.sections)
+        if unknown:
+            raise ValueError(f"Unknown report sections: {', '.join(sorted(unknown))}. Choose from: {', '.join(self.sections)}.")
+        return requested
 
     def get_report_data(self, request):
         """
@@ -64,126 +106,210 @@ class BaseReportView(views.APIView):
         """
         raise NotImplementedError("Subclasses must implement get_csv_row for detailed CSV.")
 
-    def _write_summary_to_csv(self, writer, report_data):
+    def get_export_filename(self, report_data, extension):
+        return f'{report_data.get("report_title", "report").lower().replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.{extension}'
+
+    def get_csv_summary_rows(self, report_data):
         """
-        Writes common summary metrics to the CSV.
+        Yields the common summary rows at the top of the CSV.
         Subclasses can override or extend this.
         """
-        writer.writerow([report_data.get('report_title', 'Report')])
-        writer.writerow(['Generated At', report_data.get('report_generated_at', timezone.now()).strftime('%Y-%m-%d %H:%M:%S')])
+        yield [report_data.get('report_title', 'Report')]
+        yield ['Generated At', report_data.get('report_generated_at', timezone.now()).strftime('%Y-%m-%d %H:%M:%S')]
         if report_data.get('filters_applied'):
-            writer.writerow(['Filters Applied', str(report_data.get('filters_applied'))])
-        writer.writerow([]) # Blank line
+            yield ['Filters Applied', str(report_data.get('filters_applied'))]
+        yield [] # Blank line
 
-    def _write_detailed_data_to_csv(self, writer, report_data, data_key):
+    def get_export_sections(self, report_data):
         """
-        Writes detailed data list to CSV.
+        Yields the report's tables as ReportSection(title, headers, rows).
+        By default: every list of dicts in the report data, then the detailed rows of
+        'raw_data_for_csv' (a lazy queryset, streamed) formatted with get_csv_headers/get_csv_row.
         """
-        detailed_data = report_data.get(data_key, [])
-        if detailed_data:
-            headers = self.get_csv_headers()
-            writer.writerow(headers)
-            for item in detailed_data:
-                writer.writerow(self.get_csv_row(item))
-            writer.writerow([]) # Blank line after section
+        for key, value in report_data.items():
+            if isinstance(value, list) and value and isinstance(value[0], dict): # Simple list of dicts
+                headers = list(value[0].keys())
+                yield ReportSection(
+                    key.replace('_', ' ').title(), [h.replace('_', ' ').title() for h in headers],
+                    ([str(item.get(h, '')) for h in headers] for item in value)
+                )
+        if 'raw_data_for_csv' in report_data:
+            try:
+                headers = self.get_csv_headers()
+            except NotImplementedError:
+                # If detailed methods are not implemented, this section is skipped for generic CSV.
+                return
+            yield ReportSection(
+                'Detailed Data', headers, (self.get_csv_row(item) for item in iter_rows(report_data['raw_data_for_csv']))
+            )
+
+    def iter_csv_rows(self, report_data):
+        """Yields every CSV row of the report, section by section, as they are produced."""
+        yield from self.get_csv_summary_rows(report_data)
+        for section in self.get_export_sections(report_data):
+            yield [section.title]
+            yield section.headers
+            yield from section.rows
+            yield [] # Blank line after section
+
+    def get_cached_report_data(self, request):
+        """Returns (report data, cache state), computing the report only on a cache miss."""
+        if not self.cache_topics:
+            return self.get_report_data(request), None
+        lookup = get_or_revalidate if self.stale_while_revalidate else get_or_compute
+        return lookup(
+            f'{type(self).__module__}.{type(self).__qualname__}', self.get_cache_filters(request),
+            self.cache_topics, lambda: self.get_report_data(request), timeout=self.cache_timeout
+        )
 
+    def get_cache_filters(self, request):
+        # Pages are cut from the cached detail querysets, so they share one entry.
+        ignored = ('format', 'page_size', *(f'{name}_page' for name in self.detail_sections))
+        return normalize_filters(request.query_params, ignored=ignored)
+
+    def paginate_detail_sections(self, report_data, request):
+        """Returns the report data with each detail queryset replaced by its requested page."""
+        paginated = dict(report_data)
+        for name, key in self.detail_sections.items():
+            if key in paginated:
+                paginated[key] = ReportDetailPagination(name).paginate_section(paginated[key], request)
+        return paginated
 
     def get(self, request, *args, **kwargs):
         try:
-            report_data = self.get_report_data(request)
+            report_data, cache_state = self.get_cached_report_data(request)
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except NotImplementedError as e:
              return Response({"error": f"Report configuration error: {str(e)}"}, status=status.HTTP_501_NOT_IMPLEMENTED)
 
-
         export_format = request.query_params.get('format')
         if export_format == 'csv':
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="{report_data.get("report_title", "report").lower().replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.csv"'
-            writer = csv.writer(response)
-            self._write_summary_to_csv(writer, report_data) # Common summary
-
-            # Specific sections - subclasses should manage this part more granularly
-            # This is a generic example; specific reports will have more tailored CSV structures.
-            for key, value in report_data.items():
-                if isinstance(value, list) and key not in ['raw_data_for_csv']: # Avoid double printing raw data if handled by _write_detailed_data_to_csv
-                    if value and isinstance(value[0], dict): # Simple list of dicts
-                        writer.writerow([key.replace('_', ' ').title()])
-                        headers = list(value[0].keys())
-                        writer.writerow([h.replace('_', ' ').title() for h in headers])
-                        for item in value:
-                            writer.writerow([str(item.get(h, '')) for h in headers])
-                        writer.writerow([])
-            
-            # Example for a specific detailed data section if 'raw_data_for_csv' exists
-            if 'raw_data_for_csv' in report_data and hasattr(self, 'get_csv_headers') and hasattr(self, 'get_csv_row'):
-                 try:
-                    self._write_detailed_data_to_csv(writer, report_data, 'raw_data_for_csv')
-                 except NotImplementedError:
-                     # If detailed methods are not implemented, this section is skipped for generic CSV.
-                     pass
-
-            return response
-        return Response(report_data)
-
+            # Rows are written while the response is sent; detail rows are read from server-side cursors.
+            response = stream_csv_response(self.iter_csv_rows(report_data), self.get_export_filename(report_data, 'csv'))
+        elif export_format in FILE_EXPORT_FORMATS:
+            extension, write = build_export(self, report_data, export_format)
+            response = file_export_response(write, self.get_export_filename(report_data, extension), extension)
+        else:
+            response = Response(self.paginate_detail_sections(report_data, request))
+        if cache_state:
+            response['X-Report-Cache'] = cache_state
+        return response
+
+
+def years_before(day, years):
+    """The same calendar day `years` years before `day` (Feb 29 falls back to Feb 28)."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+def get_report_setting(name, default):
+    return getattr(settings, 'ADMIN_DASHBOARD_REPORTS', {}).get(name, default)
 
 class PatientStatisticsReportView(BaseReportView):
     """
     Generates a report on patient statistics including demographics and registration trends.
+    Age buckets are bounded by ADMIN_DASHBOARD_REPORTS['PATIENT_AGE_BUCKET_EDGES'], or by
+    "?age_buckets=18,41,61" (ages at which a new bucket starts).
     Supports JSON and CSV export.
     """
-    def get_report_data(self, request):
-        total_patients = Patient.objects.count()
-        patients_by_gender = Patient.objects.values('gender').annotate(count=Count('user_id')).order_by('gender')
+    DEFAULT_AGE_BUCKET_EDGES = [18, 41, 61]
+    cache_topics = ('patients',)
+
+    def get_age_bucket_edges(self, request):
+        edges_str = request.query_params.get('age_buckets')
+        if not edges_str:
+            return list(get_report_setting('PATIENT_AGE_BUCKET_EDGES', self.DEFAULT_AGE_BUCKET_EDGES))
+        try:
+            edges = [int(edge) for edge in edges_str.split(',')]
+        except ValueError:
+            raise ValueError("Invalid age_buckets. Use ascending whole ages, e.g. 18,41,61.")
+        if not edges or edges[0] < 1 or any(lo >= hi for lo, hi in zip(edges, edges[1:])):
+            raise ValueError("Invalid age_buckets. Use ascending whole ages, e.g. 18,41,61.")
+        return edges
+
+    def get_age_buckets(self, edges, today):
+        """
+        Returns (label, Q) pairs over date_of_birth for ages [edge_i, edge_i+1). Ages are
+        compared through birth-date cutoffs computed once here, so the database filters
+        on the plain (indexable) column instead of computing an age per row.
+        """
+        cutoffs = [years_before(today, edge) for edge in edges] # Born on or before cutoff i: aged at least edge i
+        buckets = [(f'under_{edges[0]}', Q(date_of_birth__gt=cutoffs[0]))]
+        for (lo, hi), (lo_cutoff, hi_cutoff) in zip(zip(edges, edges[1:]), zip(cutoffs, cutoffs[1:])):
+            buckets.append((f'{lo}_{hi - 1}', Q(date_of_birth__lte=lo_cutoff, date_of_birth__gt=hi_cutoff)))
+        buckets.append((f'over_{edges[-1] - 1}', Q(date_of_birth__lte=cutoffs[-1])))
+        return buckets
 
-        thirty_days_ago = timezone.now().date() - timedelta(days=30)
-        recent_registrations = Patient.objects.filter(user__date_joined__date__gte=thirty_days_ago)\
+    def get_report_data(self, request):
+        today = timezone.localdate()
+        age_buckets = self.get_age_bucket_edges(request)
+
+        # Round trip 1: total, gender and age distribution as conditional counts in one aggregate.
+        aggregates = {'total_patients': Count('pk'), 'unknown_age': Count('pk', filter=Q(date_of_birth__isnull=True))}
+        for label, condition in self.get_age_buckets(age_buckets, today):
+            aggregates[f'age__{label}'] = Count('pk', filter=condition)
+        for gender in [''] + list(Gender.values):
+            aggregates[f'gender__{gender}'] = Count('pk', filter=Q(gender=gender))
+        counts = Patient.objects.aggregate(**aggregates)
+
+        # Round trip 2: daily registrations since the earlier of Jan 1 and 30 days ago; the
+        # last-30-days and per-month series are both derived from these (at most ~400) rows.
+        thirty_days_ago = today - timedelta(days=30)
+        year_start = today.replace(month=1, day=1)
+        registrations_by_date = Patient.objects.filter(user__date_joined__date__gte=min(thirty_days_ago, year_start))\
             .annotate(date=TruncDate('user__date_joined'))\
             .values('date')\
             .annotate(count=Count('user_id'))\
             .order_by('date')
-
-        current_year = timezone.now().year
-        registrations_by_month = Patient.objects.filter(user__date_joined__year=current_year)\
-            .annotate(month=TruncMonth('user__date_joined'))\
-            .values('month')\
-            .annotate(count=Count('user_id'))\
-            .order_by('month')
-
-        age_groups = {'under_18': 0, '18_40': 0, '41_60': 0, 'over_60': 0, 'unknown_age': 0}
-        today = timezone.now().date()
-        for patient in Patient.objects.filter(date_of_birth__isnull=False).select_related('user'):
-            if patient.date_of_birth:
-                age = today.year - patient.date_of_birth.year - ((today.month, today.day) < (patient.date_of_birth.month, patient.date_of_birth.day))
-                if age < 18: age_groups['under_18'] += 1
-                elif age <= 40: age_groups['18_40'] += 1
-                elif age <= 60: age_groups['41_60'] += 1
-                else: age_groups['over_60'] += 1
-        age_groups['unknown_age'] = Patient.objects.filter(date_of_birth__isnull=True).count()
+        recent_registrations = []
+        registrations_by_month = {}
+        for row in registrations_by_date:
+            if row['date'] >= thirty_days_ago:
+                recent_registrations.append(row)
+            if row['date'].year == today.year:
+                month = row['date'].replace(day=1)
+                registrations_by_month[month] = registrations_by_month.get(month, 0) + row['count']
+        tz = timezone.get_current_timezone()
 
         return {
             'report_title': 'Patient Statistics Report',
             'report_generated_at': timezone.now(),
-            'total_patients': total_patients,
-            'patients_by_gender': list(patients_by_gender),
-            'recent_registrations_last_30_days': list(recent_registrations),
-            'registrations_by_month_current_year': list(registrations_by_month),
-            'patient_age_distribution': age_groups,
+            'total_patients': counts['total_patients'],
+            'patients_by_gender': [
+                {'gender': gender, 'count': counts[f'gender__{gender}']}
+                for gender in sorted([''] + list(Gender.values)) if counts[f'gender__{gender}']
+            ],
+            'recent_registrations_last_30_days': recent_registrations,
+            'registrations_by_month_current_year': [
+                {'month': datetime(month.year, month.month, 1, tzinfo=tz), 'count': count}
+                for month, count in sorted(registrations_by_month.items())
+            ],
+            'patient_age_distribution': {
+                **{key[len('age__'):]: value for key, value in counts.items() if key.startswith('age__')},
+                'unknown_age': counts['unknown_age'],
+            },
         }
-    
-    # Override _write_summary_to_csv for more specific formatting if needed, or rely on BaseReportView's generic loop.
+
+    # Override get_csv_summary_rows/get_export_sections for more specific formatting if needed, or rely on BaseReportView's generic loop.
     # For this report, the generic loop in BaseReportView might be sufficient for the JSON structure.
 
 class AppointmentReportView(BaseReportView):
     """
     Generates a report on appointments, including statuses, types, and scheduling trends.
-    Supports date filtering and JSON/CSV export.
+    The breakdowns are read from the daily appointment facts (see admin_dashboard.facts);
+    only the detail rows come from the Appointment table.
+    Supports date filtering, "?sections=" (e.g. "summary,by_status") and JSON/CSV/XLSX/Parquet export.
     """
+    cache_topics = ('appointments', 'staff') # Doctor names come from the users table
+    sections = ('summary', 'by_status', 'by_type', 'per_doctor', 'by_date', 'details')
+    detail_sections = {'details': 'raw_data_for_csv'}
     def get_report_data(self, request):
         date_from_str = request.query_params.get('date_from')
         date_to_str = request.query_params.get('date_to')
         queryset = Appointment.objects.select_related('doctor', 'patient__user').all()
+        facts = AppointmentDailyFact.objects.all()
         date_filter_applied_label = "all time (default last 30 days if no dates specified)"
 
         date_from, date_to = None, None
@@ -196,50 +322,67 @@ class AppointmentReportView(BaseReportView):
 
         if date_from and date_to:
             queryset = queryset.filter(appointment_date_time__date__range=[date_from, date_to])
+            facts = facts.filter(date__range=[date_from, date_to])
             date_filter_applied_label = f"{date_from_str} to {date_to_str}"
         elif date_from:
             queryset = queryset.filter(appointment_date_time__date__gte=date_from)
+            facts = facts.filter(date__gte=date_from)
             date_filter_applied_label = f"from {date_from_str}"
         elif date_to:
             queryset = queryset.filter(appointment_date_time__date__lte=date_to)
+            facts = facts.filter(date__lte=date_to)
             date_filter_applied_label = f"up to {date_to_str}"
-        else: # Default to last 30 days if no specific range
-            thirty_days_ago = timezone.now() - timedelta(days=30)
-            queryset = queryset.filter(appointment_date_time__gte=thirty_days_ago)
+        else: # Default to the last 30 days (whole days, as the facts are daily)
+            thirty_days_ago = timezone.localdate() - timedelta(days=30)
+            queryset = queryset.filter(appointment_date_time__date__gte=thirty_days_ago)
+            facts = facts.filter(date__gte=thirty_days_ago)
             date_filter_applied_label = "last 30 days"
-        
-        total_appointments = queryset.count()
-        appointments_by_status = queryset.values('status').annotate(count=Count('id')).order_by('status')
-        appointments_by_type = queryset.values('appointment_type').annotate(count=Count('id')).order_by('appointment_type')
-        
-        appointments_per_doctor = queryset.filter(doctor__isnull=False)\
-            .values('doctor__email', 'doctor__first_name', 'doctor__last_name')\
-            .annotate(count=Count('id'))\
-            .order_by('-count')
-            
-        appointments_by_date = queryset.annotate(date=TruncDate('appointment_date_time'))\
-            .values('date')\
-            .annotate(count=Count('id'))\
-            .order_by('date')
 
-        # Prepare detailed data for CSV
-        raw_data_for_csv = list(queryset.values(
-            'id', 'patient__user__first_name', 'patient__user__last_name', 'patient__user__email',
-            'doctor__first_name', 'doctor__last_name', 'doctor__email',
-            'appointment_type', 'appointment_date_time', 'status', 'reason'
-        ))
+        # Fact rows are summed per dimension; keys whose appointments all moved away keep a zero count, so they are dropped.
+        # Only the requested breakdowns run; they are independent, so they run concurrently (see admin_dashboard.fanout).
+        sections = self.get_requested_sections(request)
+        queries = {
+            'summary': lambda: facts.aggregate(total=Sum('count'))['total'] or 0,
+            'by_status': lambda: facts.values('status').annotate(total=Sum('count')).filter(total__gt=0).order_by('status'),
+            'by_type': lambda: facts.values('appointment_type').annotate(total=Sum('count')).filter(total__gt=0).order_by('appointment_type'),
+            'per_doctor': lambda: facts.filter(doctor__isnull=False)\
+                .values('doctor__email', 'doctor__first_name', 'doctor__last_name')\
+                .annotate(total=Sum('count'))\
+                .filter(total__gt=0)\
+                .order_by('-total'),
+            'by_date': lambda: facts.values('date')\
+                .annotate(total=Sum('count'))\
+                .filter(total__gt=0)\
+                .order_by('date'),
+        }
+        results = fan_out({name: query for name, query in queries.items() if name in sections})
 
-        return {
+        report_data = {
             'report_title': 'Appointment Report',
             'report_generated_at': timezone.now(),
             'filters_applied': {'period': date_filter_applied_label, 'date_from': date_from_str, 'date_to': date_to_str},
-            'total_appointments_in_period': total_appointments,
-            'appointments_by_status': [{'status': AppointmentStatus(s['status']).label if s['status'] else 'N/A', 'count': s['count']} for s in appointments_by_status],
-            'appointments_by_type': [{'type': AppointmentType(t['appointment_type']).label if t['appointment_type'] else 'N/A', 'count': t['count']} for t in appointments_by_type],
-            'appointments_per_doctor': list(appointments_per_doctor),
-            'appointments_by_date_in_period': list(appointments_by_date),
-            'raw_data_for_csv': raw_data_for_csv
         }
+        if 'summary' in results:
+            report_data['total_appointments_in_period'] = results['summary']
+        if 'by_status' in results:
+            report_data['appointments_by_status'] = [{'status': AppointmentStatus(s['status']).label if s['status'] else 'N/A', 'count': s['total']} for s in results['by_status']]
+        if 'by_type' in results:
+            report_data['appointments_by_type'] = [{'type': AppointmentType(t['appointment_type']).label if t['appointment_type'] else 'N/A', 'count': t['total']} for t in results['by_type']]
+        if 'per_doctor' in results:
+            report_data['appointments_per_doctor'] = [
+                {'doctor__email': d['doctor__email'], 'doctor__first_name': d['doctor__first_name'], 'doctor__last_name': d['doctor__last_name'], 'count': d['total']}
+                for d in results['per_doctor']
+            ]
+        if 'by_date' in results:
+            report_data['appointments_by_date_in_period'] = [{'date': d['date'], 'count': d['total']} for d in results['by_date']]
+        if 'details' in sections:
+            # Detailed data for CSV, as a lazy queryset: streamed row by row for exports, one page at a time for JSON.
+            report_data['raw_data_for_csv'] = queryset.values(
+                'id', 'patient__user__first_name', 'patient__user__last_name', 'patient__user__email',
+                'doctor__first_name', 'doctor__last_name', 'doctor__email',
+                'appointment_type', 'appointment_date_time', 'status', 'reason'
+            )
+        return report_data
 
     def get_csv_headers(self):
         return ['ID', 'Patient First Name', 'Patient Last Name', 'Patient Email',
@@ -258,15 +401,69 @@ class AppointmentReportView(BaseReportView):
 
 class FinancialReportView(BaseReportView):
     """
-    Generates a financial report including revenue, outstanding invoices, and payment methods.
-    Supports date filtering and JSON/CSV export.
+    Generates a financial report including revenue, outstanding invoices, receivables aging,
+    and payment methods. Period figures are read from the daily invoice and payment facts
+    (see admin_dashboard.facts); all-time receivables are aggregated from the Invoice table.
+    Supports date filtering, "?sections=" (e.g. "summary,aging") and JSON/CSV/XLSX/Parquet export.
     """
+    cache_topics = ('billing',)
+    sections = ('summary', 'aging', 'by_status', 'by_method', 'invoices', 'payments')
+    detail_sections = {'invoices': 'raw_invoice_data_csv', 'payments': 'raw_payment_data_csv'}
+    # Section -> the queries it is computed from
+    SECTION_QUERIES = {
+        'summary': ('invoices_by_status', 'payments_by_method', 'receivables'),
+        'aging': ('receivables',),
+        'by_status': ('invoices_by_status',),
+        'by_method': ('payments_by_method',),
+    }
+    OUTSTANDING_STATUSES = [InvoiceStatus.SENT, InvoiceStatus.PARTIALLY_PAID, InvoiceStatus.OVERDUE]
+    UNBILLED_STATUSES = [InvoiceStatus.DRAFT, InvoiceStatus.VOID] # Excluded from invoiced totals and the collection rate
+    # (label, min days past due, max days past due); None means unbounded. 'current' is not yet due.
+    AGING_BUCKETS = [('current', None, -1), ('0_30', 0, 30), ('31_60', 31, 60), ('61_90', 61, 90), ('over_90', 91, None)]
+
+    def get_receivables_summary(self, today):
+        """
+        Sums the amount due (total_amount - paid_amount) of all outstanding invoices, overall,
+        overdue (due_date before today), and per aging bucket of days past due_date, in one query.
+        """
+        amount_due = ExpressionWrapper(F('total_amount') - F('paid_amount'), output_field=DecimalField(max_digits=14, decimal_places=2))
+        aggregates = {
+            'outstanding_amount': Sum(amount_due),
+            'outstanding_count': Count('id'),
+            'overdue_amount': Sum(amount_due, filter=Q(due_date__lt=today)),
+            'overdue_count': Count('id', filter=Q(due_date__lt=today)),
+        }
+        for label, min_days, max_days in self.AGING_BUCKETS:
+            condition = Q()
+            if min_days is not None:
+                condition &= Q(due_date__lte=today - timedelta(days=min_days))
+            if max_days is not None:
+                condition &= Q(due_date__gte=today - timedelta(days=max_days))
+            aggregates[f'aging_{label}_amount'] = Sum(amount_due, filter=condition)
+            aggregates[f'aging_{label}_count'] = Count('id', filter=condition)
+        totals = Invoice.objects.filter(status__in=self.OUTSTANDING_STATUSES).aggregate(**aggregates)
+        return {
+            'outstanding_amount': totals['outstanding_amount'] or Decimal('0.00'),
+            'outstanding_count': totals['outstanding_count'],
+            'overdue_amount': totals['overdue_amount'] or Decimal('0.00'),
+            'overdue_count': totals['overdue_count'],
+            'aging': [
+                {
+                    'bucket': label, 'count': totals[f'aging_{label}_count'],
+                    'amount_due': f"{totals[f'aging_{label}_amount'] or 0:.2f}",
+                }
+                for label, _, _ in self.AGING_BUCKETS
+            ],
+        }
+
     def get_report_data(self, request):
         date_from_str = request.query_params.get('date_from')
         date_to_str = request.query_params.get('date_to')
 
         invoice_queryset_period = Invoice.objects.select_related('patient__user', 'created_by').all()
         payment_queryset_period = Payment.objects.select_related('invoice__patient__user', 'recorded_by').all()
+        invoice_facts = InvoiceDailyFact.objects.all()
+        payment_facts = PaymentDailyFact.objects.all()
         date_filter_applied_label = "all time (default last 30 days if no dates specified)"
         
         date_from, date_to = None, None
@@ -280,123 +477,390 @@ class FinancialReportView(BaseReportView):
         if date_from and date_to:
             invoice_queryset_period = invoice_queryset_period.filter(issue_date__range=[date_from, date_to])
             payment_queryset_period = payment_queryset_period.filter(payment_date__date__range=[date_from, date_to])
+            invoice_facts = invoice_facts.filter(date__range=[date_from, date_to])
+            payment_facts = payment_facts.filter(date__range=[date_from, date_to])
             date_filter_applied_label = f"{date_from_str} to {date_to_str}"
         elif date_from:
             invoice_queryset_period = invoice_queryset_period.filter(issue_date__gte=date_from)
             payment_queryset_period = payment_queryset_period.filter(payment_date__date__gte=date_from)
+            invoice_facts = invoice_facts.filter(date__gte=date_from)
+            payment_facts = payment_facts.filter(date__gte=date_from)
             date_filter_applied_label = f"from {date_from_str}"
         elif date_to:
             invoice_queryset_period = invoice_queryset_period.filter(issue_date__lte=date_to)
             payment_queryset_period = payment_queryset_period.filter(payment_date__date__lte=date_to)
+            invoice_facts = invoice_facts.filter(date__lte=date_to)
+            payment_facts = payment_facts.filter(date__lte=date_to)
             date_filter_applied_label = f"up to {date_to_str}"
         else: # Default to last 30 days
             thirty_days_ago_date = timezone.now().date() - timedelta(days=30)
             invoice_queryset_period = invoice_queryset_period.filter(issue_date__gte=thirty_days_ago_date)
             payment_queryset_period = payment_queryset_period.filter(payment_date__date__gte=thirty_days_ago_date)
+            invoice_facts = invoice_facts.filter(date__gte=thirty_days_ago_date)
+            payment_facts = payment_facts.filter(date__gte=thirty_days_ago_date)
             date_filter_applied_label = "last 30 days"
 
-        total_revenue_in_period = payment_queryset_period.aggregate(total=Sum('amount'))['total'] or 0
-        outstanding_invoices_all_time = Invoice.objects.filter(
-            Q(status=InvoiceStatus.SENT) | Q(status=InvoiceStatus.PARTIALLY_PAID) | Q(status=InvoiceStatus.OVERDUE)
-        )
-        total_outstanding_amount_all_time = sum(inv.amount_due for inv in outstanding_invoices_all_time)
-        invoices_by_status_period = invoice_queryset_period.values('status').annotate(count=Count('id'), total_value=Sum('total_amount')).order_by('status')
-        payments_by_method_period = payment_queryset_period.values('payment_method').annotate(count=Count('id'), total_paid=Sum('amount')).order_by('payment_method')
-
-        raw_invoice_data_csv = list(invoice_queryset_period.values(
-            'invoice_number', 'patient__user__first_name', 'patient__user__last_name',
-            'issue_date', 'due_date', 'total_amount', 'paid_amount', 'status'
-        ))
-        raw_payment_data_csv = list(payment_queryset_period.values(
-            'id', 'invoice__invoice_number', 'payment_date', 'amount', 'payment_method', 'transaction_id',
-            'recorded_by__first_name', 'recorded_by__last_name'
-        ))
+        # Period figures: two small grouped queries over the daily facts; the totals are summed from their (at most a dozen) rows.
+        # All-time receivables: outstanding and overdue totals and the aging breakdown in one aggregate.
+        # Only the queries the requested sections need run; they are independent, so they run concurrently (see admin_dashboard.fanout).
+        sections = self.get_requested_sections(request)
+        needed = {query for section in sections for query in self.SECTION_QUERIES.get(section, ())}
+        queries = {
+            'invoices_by_status': lambda: invoice_facts.values('status').annotate(
+                invoice_count=Sum('count'), total_value=Sum('total_amount'), paid_value=Sum('paid_amount')
+            ).filter(invoice_count__gt=0).order_by('status'),
+            'payments_by_method': lambda: payment_facts.values('payment_method').annotate(
+                payment_count=Sum('count'), total_paid=Sum('amount')
+            ).filter(payment_count__gt=0).order_by('payment_method'),
+            'receivables': lambda: self.get_receivables_summary(timezone.localdate()),
+        }
+        results = fan_out({name: query for name, query in queries.items() if name in needed})
 
-        return {
+        report_data = {
             'report_title': 'Financial Report',
             'report_generated_at': timezone.now(),
             'filters_applied': {'period': date_filter_applied_label, 'date_from': date_from_str, 'date_to': date_to_str},
-            'total_revenue_in_period': f"{total_revenue_in_period:.2f}",
-            'total_outstanding_revenue_all_time': f"{total_outstanding_amount_all_time:.2f}",
-            'invoices_by_status_in_period': [{'status': InvoiceStatus(s['status']).label if s['status'] else 'N/A', 'count': s['count'], 'total_value': f"{s.get('total_value', 0):.2f}"} for s in invoices_by_status_period],
-            'payments_by_method_in_period': [{'method': PaymentMethod(p['payment_method']).label if p['payment_method'] else 'N/A', 'count': p['count'], 'total_paid': f"{p.get('total_paid', 0):.2f}"} for p in payments_by_method_period],
-            'raw_invoice_data_csv': raw_invoice_data_csv, # For specific CSV handling
-            'raw_payment_data_csv': raw_payment_data_csv   # For specific CSV handling
         }
+        if 'summary' in sections:
+            invoices_by_status_period = results['invoices_by_status']
+            receivables = results['receivables']
+            total_revenue_in_period = sum((p['total_paid'] or 0 for p in results['payments_by_method']), Decimal('0.00'))
+            billed_in_period = [s for s in invoices_by_status_period if s['status'] not in self.UNBILLED_STATUSES]
+            total_invoiced_in_period = sum((s['total_value'] or 0 for s in billed_in_period), Decimal('0.00'))
+            total_collected_in_period = sum((s['paid_value'] or 0 for s in billed_in_period), Decimal('0.00'))
+            collection_rate_in_period = (
+                f"{total_collected_in_period / total_invoiced_in_period * 100:.2f}" if total_invoiced_in_period else None
+            )
+            report_data.update({
+                'total_revenue_in_period': f"{total_revenue_in_period:.2f}",
+                'total_outstanding_revenue_all_time': f"{receivables['outstanding_amount']:.2f}",
+                'outstanding_invoice_count_all_time': receivables['outstanding_count'],
+                'overdue_amount_all_time': f"{receivables['overdue_amount']:.2f}",
+                'overdue_invoice_count_all_time': receivables['overdue_count'],
+                'total_invoiced_in_period': f"{total_invoiced_in_period:.2f}",
+                'total_collected_on_period_invoices': f"{total_collected_in_period:.2f}",
+                'amount_due_on_period_invoices': f"{total_invoiced_in_period - total_collected_in_period:.2f}",
+                'collection_rate_percent_in_period': collection_rate_in_period,
+            })
+        if 'aging' in sections:
+            report_data['receivables_aging_all_time'] = results['receivables']['aging']
+        if 'by_status' in sections:
+            report_data['invoices_by_status_in_period'] = [{'status': InvoiceStatus(s['status']).label if s['status'] else 'N/A', 'count': s['invoice_count'], 'total_value': f"{s['total_value'] or 0:.2f}"} for s in results['invoices_by_status']]
+        if 'by_method' in sections:
+            report_data['payments_by_method_in_period'] = [{'method': PaymentMethod(p['payment_method']).label if p['payment_method'] else 'N/A', 'count': p['payment_count'], 'total_paid': f"{p['total_paid'] or 0:.2f}"} for p in results['payments_by_method']]
+
+        # Lazy querysets: streamed row by row for exports, one page at a time for JSON.
+        if 'invoices' in sections:
+            report_data['raw_invoice_data_csv'] = invoice_queryset_period.values(
+                'invoice_number', 'patient__user__first_name', 'patient__user__last_name',
+                'issue_date', 'due_date', 'total_amount', 'paid_amount', 'status'
+            )
+        if 'payments' in sections:
+            report_data['raw_payment_data_csv'] = payment_queryset_period.values(
+                'id', 'invoice__invoice_number', 'payment_date', 'amount', 'payment_method', 'transaction_id',
+                'recorded_by__first_name', 'recorded_by__last_name'
+            )
+        return report_data
+
+    def get_csv_summary_rows(self, report_data): # Extends the common summary with the headline figures
+        yield from super().get_csv_summary_rows(report_data)
+        if 'total_revenue_in_period' not in report_data: # The summary section was not requested
+            return
+        yield ['Summary Metric', 'Value']
+        yield ['Total Revenue in Period', report_data['total_revenue_in_period']]
+        yield ['Total Outstanding Revenue (All Time)', report_data['total_outstanding_revenue_all_time']]
+        yield ['Overdue Amount (All Time)', report_data['overdue_amount_all_time']]
+        yield ['Total Invoiced in Period', report_data['total_invoiced_in_period']]
+        yield ['Collected on Period Invoices', report_data['total_collected_on_period_invoices']]
+        yield ['Collection Rate in Period (%)', report_data['collection_rate_percent_in_period'] or 'N/A']
+        yield []
+
+    def get_export_sections(self, report_data): # Custom sections instead of the generic loop; skips sections not requested
+        if 'receivables_aging_all_time' in report_data:
+            yield ReportSection(
+                'Receivables Aging (All Time, Days Past Due)', ['Bucket', 'Count', 'Amount Due'],
+                ([item['bucket'], item['count'], item['amount_due']] for item in report_data['receivables_aging_all_time'])
+            )
+        if 'invoices_by_status_in_period' in report_data:
+            yield ReportSection(
+                'Invoices by Status (Period)', ['Status', 'Count', 'Total Value'],
+                ([item['status'], item['count'], item['total_value']] for item in report_data['invoices_by_status_in_period'])
+            )
+        if 'payments_by_method_in_period' in report_data:
+            yield ReportSection(
+                'Payments by Method (Period)', ['Method', 'Count', 'Total Paid'],
+                ([item['method'], item['count'], item['total_paid']] for item in report_data['payments_by_method_in_period'])
+            )
+        if 'raw_invoice_data_csv' in report_data:
+            yield ReportSection(
+                'Detailed Invoice List for Period',
+                ['Invoice Number', 'Patient First Name', 'Patient Last Name', 'Issue Date', 'Due Date', 'Total Amount', 'Paid Amount', 'Status'],
+                (self.get_invoice_csv_row(inv) for inv in iter_rows(report_data['raw_invoice_data_csv']))
+            )
+        if 'raw_payment_data_csv' in report_data:
+            yield ReportSection(
+                'Detailed Payment List for Period',
+                ['Payment ID', 'Invoice Number', 'Payment Date', 'Amount', 'Method', 'Transaction ID', 'Recorded By First Name', 'Recorded By Last Name'],
+                (self.get_payment_csv_row(pay) for pay in iter_rows(report_data['raw_payment_data_csv']))
+            )
+
+    def get_invoice_csv_row(self, inv):
+        return [
+            inv['invoice_number'], inv['patient__user__first_name'], inv['patient__user__last_name'],
+            inv['issue_date'].strftime('%Y-%m-%d') if inv['issue_date'] else 'N/A',
+            inv['due_date'].strftime('%Y-%m-%d') if inv['due_date'] else 'N/A',
+            f"{inv['total_amount']:.2f}", f"{inv['paid_amount']:.2f}",
+            InvoiceStatus(inv['status']).label if inv['status'] else 'N/A'
+        ]
 
-    def get(self, request, *args, **kwargs): # Override get for custom CSV structure
-        try:
-            report_data = self.get_report_data(request)
-        except ValueError as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        export_format = request.query_params.get('format')
-        if export_format == 'csv':
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="{report_data["report_title"].lower().replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.csv"'
-            writer = csv.writer(response)
-            self._write_summary_to_csv(writer, report_data)
-
-            writer.writerow(['Summary Metric', 'Value'])
-            writer.writerow(['Total Revenue in Period', report_data['total_revenue_in_period']])
-            writer.writerow(['Total Outstanding Revenue (All Time)', report_data['total_outstanding_revenue_all_time']])
-            writer.writerow([])
-
-            writer.writerow(['Invoices by Status (Period)'])
-            writer.writerow(['Status', 'Count', 'Total Value'])
-            for item in report_data['invoices_by_status_in_period']:
-                writer.writerow([item['status'], item['count'], item['total_value']])
-            writer.writerow([])
-
-            writer.writerow(['Payments by Method (Period)'])
-            writer.writerow(['Method', 'Count', 'Total Paid'])
-            for item in report_data['payments_by_method_in_period']:
-                writer.writerow([item['method'], item['count'], item['total_paid']])
-            writer.writerow([])
-            
-            writer.writerow(['Detailed Invoice List for Period'])
-            writer.writerow(['Invoice Number', 'Patient First Name', 'Patient Last Name', 'Issue Date', 'Due Date', 'Total Amount', 'Paid Amount', 'Status'])
-            for inv in report_data['raw_invoice_data_csv']:
-                writer.writerow([
-                    inv['invoice_number'], inv['patient__user__first_name'], inv['patient__user__last_name'],
-                    inv['issue_date'].strftime('%Y-%m-%d') if inv['issue_date'] else 'N/A',
-                    inv['due_date'].strftime('%Y-%m-%d') if inv['due_date'] else 'N/A',
-                    f"{inv['total_amount']:.2f}", f"{inv['paid_amount']:.2f}",
-                    InvoiceStatus(inv['status']).label if inv['status'] else 'N/A'
-                ])
-            writer.writerow([])
-
-            writer.writerow(['Detailed Payment List for Period'])
-            writer.writerow(['Payment ID', 'Invoice Number', 'Payment Date', 'Amount', 'Method', 'Transaction ID', 'Recorded By First Name', 'Recorded By Last Name'])
-            for pay in report_data['raw_payment_data_csv']:
-                writer.writerow([
-                    pay['id'], pay['invoice__invoice_number'],
-                    pay['payment_date'].strftime('%Y-%m-%d %H:%M') if pay['payment_date'] else 'N/A',
-                    f"{pay['amount']:.2f}",
-                    PaymentMethod(pay['payment_method']).label if pay['payment_method'] else 'N/A',
-                    pay['transaction_id'],
-                    pay['recorded_by__first_name'], pay['recorded_by__last_name']
-                ])
-            return response
-        return Response(report_data)
+    def get_payment_csv_row(self, pay):
+        return [
+            pay['id'], pay['invoice__invoice_number'],
+            pay['payment_date'].strftime('%Y-%m-%d %H:%M') if pay['payment_date'] else 'N/A',
+            f"{pay['amount']:.2f}",
+            PaymentMethod(pay['payment_method']).label if pay['payment_method'] else 'N/A',
+            pay['transaction_id'],
+            pay['recorded_by__first_name'], pay['recorded_by__last_name']
+        ]
 
 
 class StaffActivityReportView(BaseReportView):
     """
-    Generates a basic report on staff activity, currently showing staff counts by role.
+    Generates a report on staff activity: staff counts by role and audited actions
+    per staff member, action and day, read from the daily audit activity rollups
+    (audit_log.AuditActivityRollup) rather than from the audit log itself.
+    Supports date filtering and JSON/CSV export.
     """
+    STAFF_ROLES = [UserRole.ADMIN, UserRole.DOCTOR, UserRole.NURSE, UserRole.RECEPTIONIST]
+    cache_topics = ('staff',)
+    cache_timeout = 60 # Audit rollups are written continuously and do not invalidate the cache
+
     def get_report_data(self, request):
-        staff_by_role = CustomUser.objects.filter(role__in=[UserRole.ADMIN, UserRole.DOCTOR, UserRole.NURSE, UserRole.RECEPTIONIST])\
+        date_from_str = request.query_params.get('date_from')
+        date_to_str = request.query_params.get('date_to')
+
+        date_from, date_to = None, None
+        if date_from_str:
+            try: date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
+            except ValueError: raise ValueError("Invalid date_from format. Use YYYY-MM-DD.")
+        if date_to_str:
+            try: date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+            except ValueError: raise ValueError("Invalid date_to format. Use YYYY-MM-DD.")
+
+        rollups = AuditActivityRollup.objects.filter(user__role__in=self.STAFF_ROLES)
+        if date_from and date_to:
+            rollups = rollups.filter(date__range=[date_from, date_to])
+            date_filter_applied_label = f"{date_from_str} to {date_to_str}"
+        elif date_from:
+            rollups = rollups.filter(date__gte=date_from)
+            date_filter_applied_label = f"from {date_from_str}"
+        elif date_to:
+            rollups = rollups.filter(date__lte=date_to)
+            date_filter_applied_label = f"up to {date_to_str}"
+        else: # Default to last 30 days
+            rollups = rollups.filter(date__gte=timezone.localdate() - timedelta(days=30))
+            date_filter_applied_label = "last 30 days"
+
+        staff_by_role = CustomUser.objects.filter(role__in=self.STAFF_ROLES)\
             .values('role').annotate(count=Count('id')).order_by('role')
 
+        # Each aggregate reads at most (days x staff x actions) rollup rows, independent of audit volume.
+        total_actions = rollups.aggregate(total=Sum('count'))['total'] or 0
+        activity_by_action = rollups.values('action').annotate(count=Sum('count')).order_by('-count', 'action')
+        activity_per_staff = rollups\
+            .values('user_id', 'user__email', 'user__first_name', 'user__last_name', 'user__role')\
+            .annotate(total_actions=Sum('count'), active_days=Count('date', distinct=True))\
+            .order_by('-total_actions', 'user__email')
+        activity_by_date = rollups.values('date').annotate(count=Sum('count')).order_by('date')
+
         return {
             'report_title': 'Staff Activity Report',
             'report_generated_at': timezone.now(),
-            'message': 'Staff Activity Report - Basic staff counts. Detailed activity logging requires further implementation (e.g., audit log integration).',
+            'filters_applied': {'period': date_filter_applied_label, 'date_from': date_from_str, 'date_to': date_to_str},
             'staff_counts_by_role': [{'role': UserRole(s['role']).label, 'count': s['count']} for s in staff_by_role],
+            'total_staff_actions_in_period': total_actions,
+            'staff_activity_by_action': [{'action': AuditLogAction(a['action']).label if a['action'] in AuditLogAction.values else a['action'], 'count': a['count']} for a in activity_by_action],
+            'staff_activity_per_user': [
+                {
+                    'user_id': u['user_id'], 'email': u['user__email'],
+                    'first_name': u['user__first_name'], 'last_name': u['user__last_name'],
+                    'role': UserRole(u['user__role']).label, 'total_actions': u['total_actions'], 'active_days': u['active_days'],
+                }
+                for u in activity_per_staff
+            ],
+            'staff_activity_by_date_in_period': list(activity_by_date),
         }
     # CSV for this report will be handled by the BaseReportView's generic loop.
 
+class TrendReportView(BaseReportView):
+    """
+    Base class for the trend reports computed by admin_dashboard.analytics.
+    The period defaults to the last ADMIN_DASHBOARD_REPORTS['TREND_DEFAULT_DAYS'] days up to today.
+    """
+    def get_trend_period(self, request):
+        """Returns (date_from, date_to, filters_applied) from the date_from/date_to query parameters."""
+        date_from_str = request.query_params.get('date_from')
+        date_to_str = request.query_params.get('date_to')
+        date_to = timezone.localdate()
+        if date_to_str:
+            try: date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+            except ValueError: raise ValueError("Invalid date_to format. Use YYYY-MM-DD.")
+        date_from = date_to - timedelta(days=get_report_setting('TREND_DEFAULT_DAYS', 90) - 1)
+        if date_from_str:
+            try: date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
+            except ValueError: raise ValueError("Invalid date_from format. Use YYYY-MM-DD.")
+        if date_from > date_to:
+            raise ValueError("date_from must not be after date_to.")
+        filters_applied = {'period': f"{date_from:%Y-%m-%d} to {date_to:%Y-%m-%d}", 'date_from': date_from_str, 'date_to': date_to_str}
+        return date_from, date_to, filters_applied
+
+    def get_rolling_windows(self):
+        return tuple(get_report_setting('TREND_ROLLING_WINDOWS', DEFAULT_ROLLING_WINDOWS))
+
+class AppointmentTrendsReportView(TrendReportView):
+    """
+    Appointment trends: daily counts with rolling averages, week-over-week changes,
+    weekday and month seasonality and no-show rates per doctor, computed from the
+    daily appointment facts with pandas (see admin_dashboard.analytics).
+    Supports date filtering and JSON/CSV/XLSX/Parquet export.
+    """
+    cache_topics = ('appointments', 'staff')
+
+    def get_report_data(self, request):
+        date_from, date_to, filters_applied = self.get_trend_period(request)
+        return {
+            'report_title': 'Appointment Trends Report',
+            'report_generated_at': timezone.now(),
+            'filters_applied': filters_applied,
+            **appointment_trends(date_from, date_to, self.get_rolling_windows()),
+        }
+    # CSV for this report will be handled by the BaseReportView's generic loop.
+
+class RevenueTrendsReportView(TrendReportView):
+    """
+    Revenue trends: daily collected and invoiced amounts with rolling averages,
+    week-over-week changes, weekday seasonality and the run-rate of the last
+    ADMIN_DASHBOARD_REPORTS['RUN_RATE_DAYS'] days, computed from the daily invoice
+    and payment facts with pandas (see admin_dashboard.analytics).
+    Supports date filtering and JSON/CSV/XLSX/Parquet export.
+    """
+    cache_topics = ('billing',)
+
+    def get_report_data(self, request):
+        date_from, date_to, filters_applied = self.get_trend_period(request)
+        return {
+            'report_title': 'Revenue Trends Report',
+            'report_generated_at': timezone.now(),
+            'filters_applied': filters_applied,
+            **revenue_trends(
+                date_from, date_to, self.get_rolling_windows(), get_report_setting('RUN_RATE_DAYS', DEFAULT_RUN_RATE_DAYS)
+            ),
+        }
+
+    def get_csv_summary_rows(self, report_data): # Adds the totals and run-rate to the common summary
+        yield from super().get_csv_summary_rows(report_data)
+        run_rate = report_data['revenue_run_rate']
+        yield ['Summary Metric', 'Value']
+        yield ['Total Collected in Period', report_data['total_collected_in_period']]
+        yield ['Total Invoiced in Period', report_data['total_invoiced_in_period']]
+        yield [f"Collected in Last {run_rate['trailing_days']} Days", run_rate['collected_in_window']]
+        yield ['Daily Average Collected', run_rate['daily_average']]
+        yield ['Monthly Run-Rate', run_rate['monthly_run_rate']]
+        yield ['Annual Run-Rate', run_rate['annual_run_rate']]
+        yield []
+
+class DashboardOverviewView(BaseReportView):
+    """
+    Headline figures for the admin dashboard landing page, read from the daily facts
+    and the receivables aggregate. Served stale-while-revalidate: after a change or once
+    the cache timeout passes, the previous figures are returned at once while they are
+    recomputed in the background, so the landing page never waits on the aggregates.
+    """
+    cache_topics = ('patients', 'appointments', 'billing')
+    stale_while_revalidate = True
+    UPCOMING_STATUSES = [AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED]
+
+    def get_report_data(self, request):
+        today = timezone.localdate()
+        appointments_today = AppointmentDailyFact.objects.filter(date=today)\
+            .values('status').annotate(total=Sum('count')).filter(total__gt=0).order_by('status')
+        upcoming = AppointmentDailyFact.objects.filter(
+            date__range=[today + timedelta(days=1), today + timedelta(days=7)], status__in=self.UPCOMING_STATUSES
+        ).aggregate(total=Sum('count'))['total'] or 0
+        revenue = PaymentDailyFact.objects.filter(date__gte=today - timedelta(days=30))\
+            .aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        receivables = FinancialReportView().get_receivables_summary(today)
+
+        return {
+            'report_title': 'Dashboard Overview',
+            'report_generated_at': timezone.now(),
+            'total_patients': Patient.objects.count(),
+            'appointments_today': sum(s['total'] for s in appointments_today),
+            'appointments_today_by_status': [{'status': AppointmentStatus(s['status']).label, 'count': s['total']} for s in appointments_today],
+            'upcoming_appointments_next_7_days': upcoming,
+            'revenue_last_30_days': f"{revenue:.2f}",
+            'total_outstanding_revenue_all_time': f"{receivables['outstanding_amount']:.2f}",
+            'overdue_amount_all_time': f"{receivables['overdue_amount']:.2f}",
+        }
+
+class ReportJobCreateView(views.APIView):
+    """
+    Queues a report export to run in the background (see admin_dashboard.jobs).
+    POST {"report": "report_financial", "parameters": {"date_from": "...", "date_to": "..."}, "export_format": "csv"}.
+    Returns 202 with the new job, or 200 with an equivalent active or recently completed job.
+    """
+    permission_classes = [IsHospitalAdmin]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ReportJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job, created = submit_job(user=request.user, **serializer.validated_data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            ReportJobSerializer(job, context={'request': request}).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
+
+class ReportJobDetailView(views.APIView):
+    """
+    Returns a report job's status and progress, for polling until it is completed or failed.
+    """
+    permission_classes = [IsHospitalAdmin]
+
+    def get(self, request, pk, *args, **kwargs):
+        expire_stale_jobs(ReportJob.objects.filter(pk=pk))
+        job = get_object_or_404(ReportJob, pk=pk)
+        return Response(ReportJobSerializer(job, context={'request': request}).data)
+
+class ReportJobDownloadView(views.APIView):
+    """
+    Serves a completed report job's file. The file is streamed from disk with FileResponse,
+    or handed to the web server with X-Accel-Redirect when
+    ADMIN_DASHBOARD_REPORTS['JOB_DOWNLOAD_ACCEL_PREFIX'] is set (an internal location mapped to MEDIA_ROOT).
+    """
+    permission_classes = [IsHospitalAdmin]
+
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(ReportJob, pk=pk)
+        if job.status != ReportJobStatus.COMPLETED or not job.file:
+            return Response({"error": "The report job has not completed."}, status=status.HTTP_409_CONFLICT)
+        filename = job.file.name.rsplit('/', 1)[-1]
+        content_type = EXPORT_CONTENT_TYPES.get(filename.rsplit('.', 1)[-1], 'application/octet-stream')
+        accel_prefix = get_job_setting('JOB_DOWNLOAD_ACCEL_PREFIX', None)
+        if accel_prefix:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{job.file.name}"
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        try:
+            response = FileResponse(job.file.open('rb'), as_attachment=True, filename=filename)
+        except FileNotFoundError:
+            return Response({"error": "The report file is no longer available."}, status=status.HTTP_410_GONE)
+        response['Content-Type'] = content_type
+        return response
+
 # If you add views for DashboardPreference:
 # class DashboardPreferenceDetailView(generics.RetrieveUpdateAPIView):
 #     serializer_class = DashboardPreferenceSerializer
@@ -0,0 +1,223 @@
+# appointments/availability.py
+"""
+Free-slot search across doctors.
+
+A doctor's day is a bitmap of SLOT_MINUTES slots (96 for 15 minutes) in local
+time. The busy bitmap of each (doctor, day) is built from the doctor
+busy-interval index (see appointments.busy) and cached packed (12 bytes per day);
+the free slots are the working-hours bitmap of the weekday (WORKING_HOURS, the
+same for every doctor) without the busy ones. find_free_slots() stacks the
+bitmaps of all matching doctors into one (doctors, days, slots) array and finds
+every run of free slots long enough for the requested duration with NumPy,
+without a Python loop per doctor or slot.
+
+Cached bitmaps are keyed by a per-doctor version that the appointment and
+telemedicine signal receivers bump whenever the doctor's busy intervals change
+(invalidate_availability()), so a booking makes the next search rebuild only
+that doctor's bitmaps, from one query.
+"""
+import logging
+import math
+import time as time_module
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .busy import busy_intervals_between
+
+logger = logging.getLogger(__name__)
+
+DAY_MINUTES = 24 * 60
+DEFAULT_SLOT_MINUTES = 15
+DEFAULT_WORKING_HOURS = {weekday: [('09:00', '17:00')] for weekday in range(5)} # Monday to Friday
+DEFAULT_MAX_SEARCH_DAYS = 31
+DEFAULT_MAX_RESULTS = 20
+MAX_AVAILABILITY_RESULTS = 100
+DEFAULT_CACHE_TIMEOUT = 3600
+
+
+def get_availability_setting(name, default):
+    return getattr(settings, 'APPOINTMENT_AVAILABILITY', {}).get(name, default)
+
+
+def get_cache():
+    return caches[get_availability_setting('CACHE_ALIAS', 'default')]
+
+
+def get_slot_minutes():
+    return get_availability_setting('SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+
+
+def minutes_of(value):
+    """Minutes since midnight of an 'HH:MM' time; '24:00' is the end of the day."""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def working_hours_mask(slot_minutes):
+    """(7, slots per day) bool array, Monday first: True for slots wholly inside the weekday's working hours."""
+    slot_starts = np.arange(DAY_MINUTES // slot_minutes) * slot_minutes
+    mask = np.zeros((7, len(slot_starts)), dtype=bool)
+    for weekday, spans in get_availability_setting('WORKING_HOURS', DEFAULT_WORKING_HOURS).items():
+        for start, end in spans:
+            mask[int(weekday)] |= (slot_starts >= minutes_of(start)) & (slot_starts + slot_minutes <= minutes_of(end))
+    return mask
+
+
+def version_key(doctor_id):
+    return f'appointments:availability_version:{doctor_id}'
+
+
+def bump_version(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError: # Not set yet (or evicted): any new value invalidates the old keys.
+        cache.set(key, time_module.time_ns(), timeout=None)
+
+
+def invalidate_availability(doctor_ids=None, using=None):
+    """
+    Invalidates the cached busy bitmaps of `doctor_ids`, or of every doctor if None.
+    Bumped at once and again after commit, like the report cache versions, so bitmaps
+    built from the pre-commit rows in between are not reused.
+    """
+    if doctor_ids is not None and not doctor_ids:
+        return
+    keys = [version_key(doctor_id) for doctor_id in doctor_ids] if doctor_ids is not None else [version_key('all')]
+
+    def bump():
+        try:
+            cache = get_cache()
+            for key in keys:
+                bump_version(cache, key)
+        except Exception:
+            # A cache outage must not fail the booking; bitmaps expire after CACHE_TIMEOUT.
+            logger.exception("Could not invalidate cached doctor availability.")
+
+    bump()
+    transaction.on_commit(bump, using=using)
+
+
+def bitmap_key(doctor_id, day, slot_minutes, versions):
+    return f'appointments:busy_bitmap:{doctor_id}:{day:%Y%m%d}:{slot_minutes}:{versions[0]}:{versions[1]}'
+
+
+def day_bounds(days):
+    """The aware start of the first day and end of the last day of `days`, in the current time zone."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(days[0], time.min), tz),
+        timezone.make_aware(datetime.combine(days[-1] + timedelta(days=1), time.min), tz),
+    )
+
+
+def build_busy_bitmaps(doctor_ids, days, slot_minutes):
+    """
+    (len(doctor_ids), len(days), slots per day) bool array of the slots each doctor's
+    busy intervals overlap, from one query. Intervals are widened to whole slots.
+    """
+    slots_per_day = DAY_MINUTES // slot_minutes
+    total_slots = len(days) * slots_per_day
+    range_start, range_end = day_bounds(days)
+    rows = list(busy_intervals_between(doctor_ids, range_start, range_end).values_list('doctor_id', 'start', 'end'))
+    # One row of boundary counts per doctor: +1 where an interval starts, -1 where it ends.
+    edges = np.zeros((len(doctor_ids), total_slots + 1), dtype=np.int32)
+    if rows:
+        row_of = {doctor_id: index for index, doctor_id in enumerate(doctor_ids)}
+        doctors, starts, ends = zip(*rows)
+        tz = timezone.get_current_timezone()
+        origin = pd.Timestamp(datetime.combine(days[0], time.min))
+        slot = pd.Timedelta(minutes=slot_minutes)
+        # Wall-clock offsets from the first day's midnight, so slots line up with local working hours.
+        first = np.floor((pd.DatetimeIndex(starts).tz_convert(tz).tz_localize(None) - origin) / slot)
+        last = np.ceil((pd.DatetimeIndex(ends).tz_convert(tz).tz_localize(None) - origin) / slot)
+        doctor_rows = np.array([row_of[doctor_id] for doctor_id in doctors])
+        np.add.at(edges, (doctor_rows, np.clip(first, 0, total_slots).astype(int)), 1)
+        np.add.at(edges, (doctor_rows, np.clip(last, 0, total_slots).astype(int)), -1)
+    busy = np.cumsum(edges[:, :total_slots], axis=1) > 0
+    return busy.reshape(len(doctor_ids), len(days), slots_per_day)
+
+
+def get_busy_bitmaps(doctor_ids, days, slot_minutes):
+    """
+    build_busy_bitmaps() through the cache: the bitmaps of doctors with every day
+    cached are unpacked, and those of the others are built in one query and cached.
+    """
+    cache = get_cache()
+    slots_per_day = DAY_MINUTES // slot_minutes
+    version_keys = [version_key('all')] + [version_key(doctor_id) for doctor_id in doctor_ids]
+    stored_versions = cache.get_many(version_keys)
+    global_version = stored_versions.get(version_key('all'), 0)
+    keys = {
+        (doctor_id, day): bitmap_key(doctor_id, day, slot_minutes, (global_version, stored_versions.get(version_key(doctor_id), 0)))
+        for doctor_id in doctor_ids for day in days
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    busy = np.zeros((len(doctor_ids), len(days), slots_per_day), dtype=bool)
+    missing = []
+    for index, doctor_id in enumerate(doctor_ids):
+        packed = [cached.get(keys[doctor_id, day]) for day in days]
+        if any(value is None for value in packed):
+            missing.append(index)
+            continue
+        busy[index] = np.unpackbits(np.frombuffer(b''.join(packed), dtype=np.uint8).reshape(len(days), -1), axis=1, count=slots_per_day)
+    if missing:
+        missing_ids = [doctor_ids[index] for index in missing]
+        built = build_busy_bitmaps(missing_ids, days, slot_minutes)
+        busy[missing] = built
+        cache.set_many({
+            keys[doctor_id, day]: np.packbits(built[row, column]).tobytes()
+            for row, doctor_id in enumerate(missing_ids) for column, day in enumerate(days)
+        }, timeout=get_availability_setting('CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+    return busy
+
+
+def find_free_slots(doctor_ids, date_from, date_to, duration_minutes, limit=DEFAULT_MAX_RESULTS, not_before=None):
+    """
+    Returns up to `limit` candidate slots of `duration_minutes` with any of `doctor_ids`
+    between `date_from` and `date_to` (inclusive), as dicts with 'doctor_id', 'start'
+    and 'end' (aware datetimes). Slots start on the slot grid, lie within the working
+    hours of one day and start after `not_before` (default: now). They are ranked by
+    start time, then by how busy the doctor is that day (least first), then doctor id.
+    """
+    if not doctor_ids:
+        return []
+    slot_minutes = get_slot_minutes()
+    length = math.ceil(duration_minutes / slot_minutes)
+    slots_per_day = DAY_MINUTES // slot_minutes
+    if length > slots_per_day:
+        return []
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    working = working_hours_mask(slot_minutes)[[day.weekday() for day in days]]
+    busy = get_busy_bitmaps(doctor_ids, days, slot_minutes)
+    free = working[np.newaxis] & ~busy
+
+    # fits[doctor, day, s]: slots s .. s + length - 1 of the day are all free.
+    runs = np.cumsum(np.pad(free, ((0, 0), (0, 0), (1, 0))), axis=2, dtype=np.int32)
+    fits = (runs[:, :, length:] - runs[:, :, :-length]) == length
+    # Slot number of each candidate start counted from the first day's midnight; drop those already started.
+    positions = np.arange(len(days))[:, np.newaxis] * slots_per_day + np.arange(fits.shape[2])[np.newaxis, :]
+    range_start, _ = day_bounds(days)
+    elapsed = (timezone.localtime(not_before or timezone.now()).replace(tzinfo=None) - range_start.replace(tzinfo=None))
+    fits &= positions[np.newaxis] >= math.ceil(elapsed / timedelta(minutes=slot_minutes))
+
+    doctor_index, day_index, slot_index = np.nonzero(fits)
+    load = busy.sum(axis=2)[doctor_index, day_index]
+    order = np.lexsort((np.asarray(doctor_ids)[doctor_index], load, positions[day_index, slot_index]))[:limit]
+    slots = []
+    for candidate in order:
+        start = timezone.make_aware(
+            datetime.combine(days[day_index[candidate]], time.min) + timedelta(minutes=int(slot_index[candidate]) * slot_minutes)
+        )
+        slots.append({
+            'doctor_id': doctor_ids[doctor_index[candidate]],
+            'start': start,
+            'end': start + timedelta(minutes=duration_minutes),
+        })
+    return slots
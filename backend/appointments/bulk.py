@@ -0,0 +1,238 @@
+# appointments/bulk.py
+"""
+Bulk booking and rescheduling of appointments.
+
+book_appointments() takes a batch of bookings, each a new appointment or a
+reschedule of an existing one. A reschedule follows AppointmentSerializer.create():
+a new appointment linked by original_appointment, with the original marked
+RESCHEDULED. The whole batch is checked against the doctors' busy intervals
+(see appointments.busy) with one query, and against itself, then written in one
+transaction:
+- the appointments with bulk_create(), their end times set here since save() is bypassed;
+- the originals' status with one bulk_update();
+- the busy intervals of both in one delete and one insert;
+- one audit entry per appointment, written together when the transaction commits
+  (see audit_log.writer).
+
+bulk_create() and bulk_update() send no post_save, so the receivers' work is
+done here in bulk, and `bulk_saved` is sent for other apps to do theirs
+(admin_dashboard updates its report facts and cache from it).
+"""
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from audit_log.middleware import get_current_request
+from audit_log.models import AuditLogAction, create_audit_log_entry
+from audit_log.utils import get_client_ip, get_user_agent
+from patients.models import Patient
+from users.models import CustomUser, UserRole
+
+from .availability import invalidate_availability
+from .busy import BUSY_CHUNK_MINUTES, CONFLICT_MESSAGES, busy_intervals_between, lock_doctor_schedules, replace_busy_intervals
+from .models import Appointment, AppointmentStatus, BusySource
+
+MAX_BULK_BOOKINGS = 500
+
+# Originals in these statuses keep them when rescheduled, as in AppointmentSerializer.create().
+FINAL_STATUSES = [
+    AppointmentStatus.CANCELLED_BY_PATIENT, AppointmentStatus.CANCELLED_BY_STAFF,
+    AppointmentStatus.COMPLETED, AppointmentStatus.NO_SHOW,
+]
+
+# Sent after a bulk write with `created` (new Appointments) and `updated` ([(appointment, values of its
+# concrete fields by attname before the write)]), and `using`.
+bulk_saved = Signal()
+
+# Fields a reschedule copies from the original appointment unless the booking sets them.
+RESCHEDULE_DEFAULTS = ('patient', 'doctor', 'appointment_type', 'estimated_duration_minutes', 'reason')
+
+
+def field_values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def resolve_bookings(bookings, errors):
+    """
+    Replaces the patient, doctor and original_appointment ids of `bookings` (dicts with an
+    'index') by instances, fetched with one query each, and fills reschedules from their
+    originals. Bookings that cannot be resolved get their errors in `errors` (by index).
+    """
+    original_ids = {booking['original_appointment'] for booking in bookings if booking.get('original_appointment')}
+    originals = Appointment.objects.select_related('patient__user', 'doctor').in_bulk(original_ids)
+    rescheduled = set()
+    for booking in bookings:
+        original_id = booking.get('original_appointment')
+        if not original_id:
+            continue
+        original = originals.get(original_id)
+        if original is None:
+            errors[booking['index']] = {'original_appointment': [_("Appointment %(id)s does not exist.") % {'id': original_id}]}
+        elif original_id in rescheduled:
+            errors[booking['index']] = {'original_appointment': [_("Appointment %(id)s is rescheduled twice in this batch.") % {'id': original_id}]}
+        else:
+            rescheduled.add(original_id)
+            booking['original_appointment'] = original
+            for field in RESCHEDULE_DEFAULTS:
+                if booking.get(field) in (None, ''):
+                    booking[field] = getattr(original, f'{field}_id' if field in ('patient', 'doctor') else field)
+
+    bookings = [booking for booking in bookings if booking['index'] not in errors]
+    patients = Patient.objects.select_related('user').in_bulk({booking.get('patient') for booking in bookings} - {None})
+    doctors = CustomUser.objects.filter(role=UserRole.DOCTOR, is_active=True)\
+        .in_bulk({booking.get('doctor') for booking in bookings} - {None})
+    for booking in bookings:
+        booking_errors = {}
+        booking['patient'] = patients.get(booking.get('patient'))
+        booking['doctor'] = doctors.get(booking.get('doctor'))
+        if booking['patient'] is None:
+            booking_errors['patient'] = [_("A valid patient is required.")]
+        if booking['doctor'] is None:
+            booking_errors['doctor'] = [_("A valid, active doctor is required.")]
+        if not booking_errors and booking['patient'].user_id == booking['doctor'].pk:
+            booking_errors['non_field_errors'] = [_("A doctor cannot book an appointment for themselves with themselves as the patient.")]
+        if booking_errors:
+            errors[booking['index']] = booking_errors
+    return [booking for booking in bookings if booking['index'] not in errors]
+
+
+def check_conflicts(bookings, errors):
+    """
+    Checks `bookings` (resolved, with 'start' and 'end') against the doctors' busy intervals,
+    read with one query, and against the earlier bookings of the batch. The originals being
+    rescheduled do not count. Conflicting bookings get their errors in `errors`.
+    """
+    if not bookings:
+        return []
+    excluded = [booking['original_appointment'].pk for booking in bookings if booking.get('original_appointment')]
+    intervals = busy_intervals_between(
+        {booking['doctor'].pk for booking in bookings},
+        min(booking['start'] for booking in bookings), max(booking['end'] for booking in bookings),
+    ).exclude(source=BusySource.APPOINTMENT, source_id__in=excluded).order_by('start')
+    busy = defaultdict(list) # doctor id -> [(start, end, source)] by start
+    for doctor_id, start, end, source in intervals.values_list('doctor_id', 'start', 'end', 'source'):
+        busy[doctor_id].append((start, end, source))
+    starts = {doctor_id: [interval[0] for interval in spans] for doctor_id, spans in busy.items()}
+
+    chunk = timedelta(minutes=BUSY_CHUNK_MINUTES)
+    accepted = defaultdict(list) # doctor id -> bookings of the batch that passed
+    for booking in bookings:
+        doctor, start, end = booking['doctor'], booking['start'], booking['end']
+        spans = busy[doctor.pk]
+        # Busy intervals are at most a chunk long, so only those starting in (start - chunk, end) can overlap.
+        first, last = bisect.bisect_right(starts.get(doctor.pk, []), start - chunk), bisect.bisect_left(starts.get(doctor.pk, []), end)
+        conflict = next((span for span in spans[first:last] if span[1] > start), None)
+        if conflict is not None:
+            errors[booking['index']] = {'appointment_date_time': [CONFLICT_MESSAGES[conflict[2]] % {
+                'doctor_name': doctor.full_name_display,
+                'start': timezone.localtime(conflict[0]).strftime('%Y-%m-%d %H:%M'),
+                'end': timezone.localtime(conflict[1]).strftime('%H:%M'),
+            }]}
+            continue
+        clash = next((other for other in accepted[doctor.pk] if other['start'] < end and other['end'] > start), None)
+        if clash is not None:
+            errors[booking['index']] = {'appointment_date_time': [
+                _("Overlaps booking %(index)s of this batch with Dr. %(doctor_name)s.") % {
+                    'index': clash['index'], 'doctor_name': doctor.full_name_display,
+                }
+            ]}
+            continue
+        accepted[doctor.pk].append(booking)
+    return [booking for booking in bookings if booking['index'] not in errors]
+
+
+def audit_bulk_booking(appointments, originals, user, batch_size):
+    """Queues the audit entries AppointmentSerializer saves would produce: one per new appointment and rescheduled original."""
+    request = get_current_request()
+    ip_address, user_agent = get_client_ip(request), get_user_agent(request)
+    for appointment in appointments:
+        create_audit_log_entry(
+            user=user, action=AuditLogAction.APPOINTMENT_SCHEDULED, target_object=appointment,
+            details=_("Appointment (ID: %(id)s) for %(patient_name)s with Dr. %(doctor_name)s scheduled for %(datetime)s.") % {
+                'id': appointment.id,
+                'patient_name': appointment.patient.user.full_name_display,
+                'doctor_name': appointment.doctor.full_name_display,
+                'datetime': appointment.appointment_date_time.strftime('%Y-%m-%d %H:%M'),
+            },
+            ip_address=ip_address, user_agent=user_agent,
+            additional_info={
+                'appointment_id': appointment.id, 'patient_id': appointment.patient.user_id,
+                'doctor_id': appointment.doctor_id, 'new_status': appointment.status,
+                'original_appointment_id': appointment.original_appointment_id, 'bulk_batch_size': batch_size,
+            },
+        )
+    for original in originals:
+        create_audit_log_entry(
+            user=user, action=AuditLogAction.APPOINTMENT_RESCHEDULED, target_object=original,
+            details=_("Appointment (ID: %(id)s) for %(patient_name)s updated. Status: %(status)s.") % {
+                'id': original.id,
+                'patient_name': original.patient.user.full_name_display,
+                'status': original.get_status_display(),
+            },
+            ip_address=ip_address, user_agent=user_agent,
+            additional_info={
+                'appointment_id': original.id, 'patient_id': original.patient.user_id, 'doctor_id': original.doctor_id,
+                'new_status': original.status, 'changed_fields': ['status'], 'bulk_batch_size': batch_size,
+            },
+        )
+
+
+def book_appointments(bookings, user, atomic=True, errors=None, using=None):
+    """
+    Books `bookings`: dicts with their 'index' in the batch, 'appointment_date_time' and
+    either 'patient' and 'doctor' ids or an 'original_appointment' id to reschedule, plus
+    optional 'appointment_type', 'estimated_duration_minutes', 'reason', 'notes', and
+    'series' and 'series_index' for occurrences of a series (see appointments.series).
+    `errors` holds the errors (by index) found before, e.g. by field validation.
+
+    Returns (appointments by index, errors by index). With `atomic`, nothing is written
+    unless every booking is valid; otherwise the valid bookings are written.
+    """
+    errors = dict(errors or {})
+    default_duration = Appointment._meta.get_field('estimated_duration_minutes').default
+    with transaction.atomic(using=using):
+        bookings = resolve_bookings([dict(booking) for booking in bookings if booking['index'] not in errors], errors)
+        for booking in bookings:
+            booking['start'] = booking['appointment_date_time']
+            booking['end'] = booking['start'] + timedelta(minutes=booking.get('estimated_duration_minutes') or default_duration)
+        lock_doctor_schedules(sorted({booking['doctor'].pk for booking in bookings}))
+        bookings = check_conflicts(bookings, errors)
+        if not bookings or (atomic and errors):
+            return {}, errors
+
+        appointments = []
+        for booking in bookings:
+            appointment = Appointment(
+                patient=booking['patient'], doctor=booking['doctor'], scheduled_by=user,
+                appointment_type=booking.get('appointment_type') or Appointment._meta.get_field('appointment_type').default,
+                appointment_date_time=booking['start'],
+                estimated_duration_minutes=booking.get('estimated_duration_minutes') or default_duration,
+                reason=booking.get('reason') or '', notes=booking.get('notes') or '',
+                original_appointment=booking.get('original_appointment'),
+                series=booking.get('series'), series_index=booking.get('series_index'),
+                status=AppointmentStatus.SCHEDULED,
+            )
+            appointment.appointment_end_time = appointment.compute_end_time()
+            appointments.append(appointment)
+        Appointment.objects.using(using).bulk_create(appointments)
+
+        originals, previous = [], []
+        now = timezone.now()
+        for appointment in appointments:
+            original = appointment.original_appointment
+            if original is not None and original.status not in FINAL_STATUSES:
+                previous.append(field_values(original))
+                original.status, original.updated_at = AppointmentStatus.RESCHEDULED, now
+                originals.append(original)
+        if originals:
+            Appointment.objects.using(using).bulk_update(originals, ['status', 'updated_at'])
+
+        invalidate_availability(replace_busy_intervals(BusySource.APPOINTMENT, appointments + originals, using), using)
+        audit_bulk_booking(appointments, originals, user, len(appointments))
+        bulk_saved.send(sender=Appointment, created=appointments, updated=list(zip(originals, previous)), using=using)
+    return {booking['index']: appointment for booking, appointment in zip(bookings, appointments)}, errors
@@ -0,0 +1,170 @@
+# appointments/busy.py
+"""
+The doctor busy-interval index.
+
+DoctorBusyInterval holds the spans of doctors' time taken by active appointments
+and telemedicine sessions, so a doctor conflict check is one query over one table
+instead of loading the doctor's appointments and sessions and comparing them in
+Python. The receivers in appointments.signals and telemedicine.signals call
+sync_busy_intervals() when a row is saved and delete_busy_intervals() when it is
+deleted. queryset.update(), bulk_create() and raw SQL bypass them; run
+`manage.py rebuild_busy_intervals` after such changes.
+
+Spans are stored as consecutive rows of at most BUSY_CHUNK_MINUTES. Every row
+therefore starts less than that before its end, so the rows overlapping
+[start, end) all start within [start - BUSY_CHUNK_MINUTES, end): a bounded range
+scan of the (doctor, start, end) index whose length depends on how busy the
+doctor is around the requested time, not on the doctor's history.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from users.models import CustomUser
+
+from .models import (
+    ACTIVE_APPOINTMENT_STATUSES, MAX_APPOINTMENT_DURATION_MINUTES, Appointment, BusySource, DoctorBusyInterval,
+)
+
+BUSY_CHUNK_MINUTES = MAX_APPOINTMENT_DURATION_MINUTES
+REBUILD_BATCH_SIZE = 1000
+
+CONFLICT_MESSAGES = {
+    BusySource.APPOINTMENT: _("Dr. %(doctor_name)s has a conflicting appointment from %(start)s to %(end)s."),
+    BusySource.TELEMEDICINE: _("Dr. %(doctor_name)s has a conflicting telemedicine session from %(start)s to %(end)s."),
+}
+
+
+def busy_chunks(start, end):
+    """Splits [start, end) into consecutive spans of at most BUSY_CHUNK_MINUTES."""
+    chunk = timedelta(minutes=BUSY_CHUNK_MINUTES)
+    while start < end:
+        yield start, min(start + chunk, end)
+        start += chunk
+
+
+def linked_appointment_id(source, instance):
+    return instance.pk if source == BusySource.APPOINTMENT else instance.appointment_id
+
+
+def busy_interval_rows(source, instance):
+    """Unsaved DoctorBusyInterval rows for `instance` (an Appointment or TelemedicineSession)."""
+    span = instance.get_busy_span()
+    if span is None:
+        return []
+    return [
+        DoctorBusyInterval(
+            doctor_id=instance.doctor_id, source=source, source_id=instance.pk,
+            linked_appointment_id=linked_appointment_id(source, instance), start=start, end=end,
+        )
+        for start, end in busy_chunks(*span)
+    ]
+
+
+def sync_busy_intervals(source, instance, using=None):
+    """
+    Replaces the busy intervals of `instance` with its current span (none if it is inactive).
+    Returns the ids of the doctors whose intervals changed: its previous and current doctor.
+    """
+    rows = busy_interval_rows(source, instance)
+    previous = DoctorBusyInterval.objects.using(using).filter(source=source, source_id=instance.pk)
+    with transaction.atomic(using=using):
+        doctor_ids = set(previous.values_list('doctor_id', flat=True))
+        previous.delete()
+        DoctorBusyInterval.objects.using(using).bulk_create(rows)
+    return doctor_ids | {row.doctor_id for row in rows}
+
+
+def replace_busy_intervals(source, instances, using=None):
+    """
+    sync_busy_intervals() for many rows of one source, e.g. after bulk_create() or bulk_update(),
+    in one delete and one insert. Returns the ids of the doctors whose intervals changed.
+    """
+    rows = [row for instance in instances for row in busy_interval_rows(source, instance)]
+    previous = DoctorBusyInterval.objects.using(using).filter(source=source, source_id__in=[instance.pk for instance in instances])
+    with transaction.atomic(using=using):
+        doctor_ids = set(previous.values_list('doctor_id', flat=True))
+        previous.delete()
+        DoctorBusyInterval.objects.using(using).bulk_create(rows)
+    return doctor_ids | {row.doctor_id for row in rows}
+
+
+def delete_busy_intervals(source, source_id, using=None):
+    """Deletes the busy intervals of a deleted appointment or session. Returns the ids of their doctors."""
+    intervals = DoctorBusyInterval.objects.using(using).filter(source=source, source_id=source_id)
+    doctor_ids = set(intervals.values_list('doctor_id', flat=True))
+    if doctor_ids:
+        intervals.delete()
+    return doctor_ids
+
+
+def busy_intervals_between(doctor_ids, start, end):
+    """The busy intervals of `doctor_ids` overlapping [`start`, `end`), as a bounded range query."""
+    return DoctorBusyInterval.objects.filter(
+        doctor_id__in=doctor_ids,
+        start__gt=start - timedelta(minutes=BUSY_CHUNK_MINUTES), start__lt=end, end__gt=start,
+    )
+
+
+def lock_doctor_schedule(doctor):
+    """
+    Locks the doctor's user row until the end of the transaction, so concurrent bookings
+    with the same doctor check and write their intervals one after another, while
+    bookings with other doctors are not blocked.
+    """
+    lock_doctor_schedules([doctor.pk])
+
+
+def lock_doctor_schedules(doctor_ids):
+    """lock_doctor_schedule() for several doctors at once, locked in id order so concurrent batches cannot deadlock."""
+    list(CustomUser.objects.select_for_update().filter(pk__in=doctor_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def find_conflict(doctor, start, end, exclude=None):
+    """
+    Returns the earliest busy interval of `doctor` overlapping [`start`, `end`), or None.
+    `exclude` is a Q of intervals to ignore, such as those of the row being saved.
+    """
+    conflicts = DoctorBusyInterval.objects.filter(
+        doctor=doctor,
+        start__gt=start - timedelta(minutes=BUSY_CHUNK_MINUTES), start__lt=end, end__gt=start,
+    )
+    if exclude is not None:
+        conflicts = conflicts.exclude(exclude)
+    return conflicts.order_by('start').first()
+
+
+def conflict_message(doctor, interval):
+    """The validation message for a conflict with `interval`, giving the full span of its appointment or session."""
+    span = DoctorBusyInterval.objects.filter(source=interval.source, source_id=interval.source_id)\
+        .aggregate(start=Min('start'), end=Max('end'))
+    return CONFLICT_MESSAGES[interval.source] % {
+        'doctor_name': doctor.full_name_display,
+        'start': timezone.localtime(span['start']).strftime('%Y-%m-%d %H:%M'),
+        'end': timezone.localtime(span['end']).strftime('%H:%M'),
+    }
+
+
+def rebuild_busy_intervals():
+    """Recomputes every busy interval from the active appointments and sessions. Returns the number of rows written."""
+    from telemedicine.models import ACTIVE_SESSION_STATUSES, TelemedicineSession # telemedicine depends on appointments
+
+    sources = (
+        (BusySource.APPOINTMENT, Appointment.objects.filter(status__in=ACTIVE_APPOINTMENT_STATUSES)),
+        (BusySource.TELEMEDICINE, TelemedicineSession.objects.filter(status__in=ACTIVE_SESSION_STATUSES)),
+    )
+    written = 0
+    with transaction.atomic():
+        DoctorBusyInterval.objects.all().delete()
+        for source, queryset in sources:
+            batch = []
+            for instance in queryset.filter(doctor__isnull=False).order_by().iterator(chunk_size=REBUILD_BATCH_SIZE):
+                batch.extend(busy_interval_rows(source, instance))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    written += len(DoctorBusyInterval.objects.bulk_create(batch))
+                    batch = []
+            written += len(DoctorBusyInterval.objects.bulk_create(batch))
+    return written
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from appointments.series import materialize_due_series
+
+
+class Command(BaseCommand):
+    """
+    Books the occurrences of active recurring appointment series that fall into
+    the rolling window (APPOINTMENT_SERIES['WINDOW_DAYS'] from now) and were not
+    generated yet. Run it daily (e.g. from cron) so the window keeps moving on.
+    """
+    help = "Books the upcoming occurrences of recurring appointment series within the rolling window."
+
+    def handle(self, *args, **options):
+        booked, skipped = materialize_due_series()
+        self.stdout.write(self.style.SUCCESS(f"Booked {booked} occurrences; skipped {skipped} conflicting ones."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from appointments.availability import invalidate_availability
+from appointments.busy import rebuild_busy_intervals
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the doctor busy-interval index from the active appointments and
+    telemedicine sessions. The signal receivers keep the index current as rows
+    are saved; this repairs it after bulk changes that bypass signals, such as
+    queryset.update() or bulk_create(), and invalidates the cached availability
+    bitmaps built from it.
+    """
+    help = "Recomputes the doctor busy-interval index from active appointments and telemedicine sessions."
+
+    def handle(self, *args, **options):
+        written = rebuild_busy_intervals()
+        invalidate_availability()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} doctor busy intervals."))
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:20
+
+import datetime
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def compute_end_times(apps, schema_editor):
+    """Sets appointment_end_time = start + estimated duration for existing appointments."""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    appointments = Appointment.objects.using(schema_editor.connection.alias)
+    # One UPDATE per distinct duration (a handful), not per row.
+    for minutes in appointments.values_list('estimated_duration_minutes', flat=True).order_by().distinct():
+        appointments.filter(estimated_duration_minutes=minutes).update(
+            appointment_end_time=models.F('appointment_date_time') + datetime.timedelta(minutes=minutes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='appointment_end_time',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Appointment End Time', help_text='Start time plus the estimated duration; computed on save.'),
+        ),
+        migrations.RunPython(compute_end_times, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='appointment_end_time',
+            field=models.DateTimeField(editable=False, verbose_name='Appointment End Time', help_text='Start time plus the estimated duration; computed on save.'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='estimated_duration_minutes',
+            field=models.PositiveIntegerField(default=30, help_text='Estimated duration of the appointment in minutes.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)], verbose_name='Estimated Duration (minutes)'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ['SCHEDULED', 'CONFIRMED'])), fields=['doctor', 'appointment_date_time', 'appointment_end_time'], name='appointment_doctor_active_idx'),
+        ),
+    ]
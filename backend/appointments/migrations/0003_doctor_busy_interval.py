@@ -0,0 +1,84 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:15
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BUSY_CHUNK = datetime.timedelta(days=1)
+ACTIVE_APPOINTMENT_STATUSES = ['SCHEDULED', 'CONFIRMED']
+ACTIVE_SESSION_STATUSES = ['SCHEDULED', 'AWAITING_HOST', 'AWAITING_GUEST', 'IN_PROGRESS']
+
+
+def chunk_rows(DoctorBusyInterval, doctor_id, source, source_id, linked_appointment_id, start, end):
+    rows = []
+    while start < end:
+        rows.append(DoctorBusyInterval(
+            doctor_id=doctor_id, source=source, source_id=source_id,
+            linked_appointment_id=linked_appointment_id, start=start, end=min(start + BUSY_CHUNK, end),
+        ))
+        start += BUSY_CHUNK
+    return rows
+
+
+def build_busy_intervals(apps, schema_editor):
+    """Indexes the active appointments and telemedicine sessions (see appointments.busy)."""
+    alias = schema_editor.connection.alias
+    DoctorBusyInterval = apps.get_model('appointments', 'DoctorBusyInterval')
+    Appointment = apps.get_model('appointments', 'Appointment')
+    TelemedicineSession = apps.get_model('telemedicine', 'TelemedicineSession')
+
+    rows = []
+    appointments = Appointment.objects.using(alias).filter(status__in=ACTIVE_APPOINTMENT_STATUSES, doctor__isnull=False)
+    for appointment in appointments.iterator(chunk_size=1000):
+        rows += chunk_rows(
+            DoctorBusyInterval, appointment.doctor_id, 'APPOINTMENT', appointment.pk, appointment.pk,
+            appointment.appointment_date_time, appointment.appointment_end_time,
+        )
+    sessions = TelemedicineSession.objects.using(alias).filter(status__in=ACTIVE_SESSION_STATUSES, doctor__isnull=False)
+    for session in sessions.iterator(chunk_size=1000):
+        end = session.session_end_time
+        if not end or end <= session.session_start_time:
+            end = session.session_start_time + datetime.timedelta(minutes=session.estimated_duration_minutes or 30)
+        rows += chunk_rows(
+            DoctorBusyInterval, session.doctor_id, 'TELEMEDICINE', session.pk, session.appointment_id,
+            session.session_start_time, end,
+        )
+    DoctorBusyInterval.objects.using(alias).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_end_time'),
+        ('telemedicine', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorBusyInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('APPOINTMENT', 'Appointment'), ('TELEMEDICINE', 'Telemedicine Session')], max_length=20, verbose_name='Source')),
+                ('source_id', models.PositiveBigIntegerField(verbose_name='Source ID')),
+                ('linked_appointment_id', models.PositiveBigIntegerField(blank=True, help_text='The appointment itself, or the appointment a telemedicine session is linked to.', null=True, verbose_name='Linked Appointment ID')),
+                ('start', models.DateTimeField(verbose_name='Start')),
+                ('end', models.DateTimeField(verbose_name='End')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='busy_intervals', to=settings.AUTH_USER_MODEL, verbose_name='Doctor')),
+            ],
+            options={
+                'verbose_name': 'Doctor Busy Interval',
+                'verbose_name_plural': 'Doctor Busy Intervals',
+                'ordering': ['doctor', 'start'],
+                'indexes': [models.Index(fields=['doctor', 'start', 'end'], name='busy_interval_doctor_span_idx'), models.Index(fields=['source', 'source_id'], name='busy_interval_source_idx')],
+            },
+        ),
+        migrations.RunPython(build_busy_intervals, migrations.RunPython.noop),
+        # Overlap checks read the busy intervals now; the partial appointment index had no other use.
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_doctor_active_idx',
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:37
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_doctor_busy_interval'),
+        ('patients', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='series_index',
+            field=models.PositiveIntegerField(blank=True, help_text='Position of this occurrence in its series, counting from 0.', null=True, verbose_name='Occurrence Number'),
+        ),
+        migrations.CreateModel(
+            name='AppointmentSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_type', models.CharField(choices=[('GENERAL_CONSULTATION', 'General Consultation'), ('SPECIALIST_VISIT', 'Specialist Visit'), ('FOLLOW_UP', 'Follow-up'), ('TELEMEDICINE', 'Telemedicine'), ('PROCEDURE', 'Procedure'), ('CHECK_UP', 'Check-up'), ('EMERGENCY', 'Emergency')], default='FOLLOW_UP', max_length=50, verbose_name='Appointment Type')),
+                ('estimated_duration_minutes', models.PositiveIntegerField(default=30, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)], verbose_name='Estimated Duration (minutes)')),
+                ('reason', models.TextField(blank=True, verbose_name='Reason for Appointments')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('first_occurrence', models.DateTimeField(help_text='Start of the first occurrence; later ones keep its local time of day.', verbose_name='First Occurrence')),
+                ('frequency', models.CharField(choices=[('DAILY', 'Daily'), ('WEEKLY', 'Weekly'), ('MONTHLY', 'Monthly')], default='WEEKLY', max_length=10, verbose_name='Frequency')),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Repeat every this many days, weeks or months.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Interval')),
+                ('weekdays', models.JSONField(blank=True, default=list, help_text="Weekdays the series falls on (0 = Monday); empty for the first occurrence's weekday.", verbose_name='Weekdays')),
+                ('occurrence_count', models.PositiveIntegerField(blank=True, help_text='Total number of occurrences; leave empty for an end date or an open-ended series.', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Number of Occurrences')),
+                ('until', models.DateField(blank=True, help_text='Last (local) date an occurrence may fall on.', null=True, verbose_name='Last Date')),
+                ('materialized_count', models.PositiveIntegerField(default=0, help_text='Number of occurrences generated so far, including skipped ones.', verbose_name='Materialized Occurrences')),
+                ('materialized_until', models.DateTimeField(blank=True, help_text='Occurrences starting before this time have been generated.', null=True, verbose_name='Materialized Until')),
+                ('is_active', models.BooleanField(default=True, help_text='Inactive series (ended, or split by an edit) generate no more occurrences.', verbose_name='Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('doctor', models.ForeignKey(limit_choices_to={'role': 'DOCTOR'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='doctor_appointment_series', to=settings.AUTH_USER_MODEL, verbose_name='Doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_series', to='patients.patient', verbose_name='Patient')),
+                ('scheduled_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_appointment_series', to=settings.AUTH_USER_MODEL, verbose_name='Scheduled By')),
+            ],
+            options={
+                'verbose_name': 'Appointment Series',
+                'verbose_name_plural': 'Appointment Series',
+                'ordering': ['first_occurrence'],
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='series',
+            field=models.ForeignKey(blank=True, help_text='The recurring series this appointment is an occurrence of, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='appointments.appointmentseries', verbose_name='Series'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('series', 'series_index'), name='unique_series_occurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['is_active', 'materialized_until'], name='appointment_series_due_idx'),
+        ),
+    ]
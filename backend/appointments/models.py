@@ -3,7 +3,10 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db.models import Q # Ensure Q is imported if used in constraints
+from datetime import datetime, time, timedelta
+from dateutil import rrule
 
 from patients.models import Patient
 from users.models import UserRole # CustomUser is implicitly used via settings.AUTH_USER_MODEL
@@ -26,6 +29,11 @@ class AppointmentType(models.TextChoices):
     CHECK_UP = 'CHECK_UP', _('Check-up')
     EMERGENCY = 'EMERGENCY', _('Emergency') # Added emergency type
 
+# Appointments holding the doctor's time; only these can conflict.
+ACTIVE_APPOINTMENT_STATUSES = [AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED]
+# Upper bound on an appointment's duration, so an overlap check only scans appointments starting up to this long before.
+MAX_APPOINTMENT_DURATION_MINUTES = 24 * 60
+
 class Appointment(models.Model):
     """
     Represents a scheduled appointment between a patient and a doctor.
@@ -65,9 +73,15 @@ class Appointment(models.Model):
     )
     estimated_duration_minutes = models.PositiveIntegerField(
         default=30,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_APPOINTMENT_DURATION_MINUTES)],
         verbose_name=_("Estimated Duration (minutes)"),
         help_text=_("Estimated duration of the appointment in minutes.")
     )
+    appointment_end_time = models.DateTimeField(
+        editable=False,
+        verbose_name=_("Appointment End Time"),
+        help_text=_("Start time plus the estimated duration; computed on save.")
+    )
     status = models.CharField(
         max_length=30,
         choices=AppointmentStatus.choices,
@@ -94,6 +108,21 @@ class Appointment(models.Model):
         verbose_name=_("Original Appointment (if rescheduled)"),
         help_text=_("Link to the original appointment if this is a rescheduled one.")
     )
+    series = models.ForeignKey(
+        'AppointmentSeries',
+        on_delete=models.SET_NULL, # Occurrences already booked outlive their series
+        null=True,
+        blank=True,
+        related_name='occurrences',
+        verbose_name=_("Series"),
+        help_text=_("The recurring series this appointment is an occurrence of, if any.")
+    )
+    series_index = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("Occurrence Number"),
+        help_text=_("Position of this occurrence in its series, counting from 0.")
+    )
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
@@ -113,7 +142,8 @@ class Appointment(models.Model):
                 name='unique_doctor_time_appointment',
                 # Condition to apply the constraint only for active/pending appointments
                 condition=models.Q(status__in=[AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED])
-            )
+            ),
+            models.UniqueConstraint(fields=['series', 'series_index'], name='unique_series_occurrence'),
         ]
 
     def __str__(self):
@@ -178,4 +208,216 @@ class Appointment(models.Model):
         if not self.doctor and self.appointment_type != AppointmentType.EMERGENCY: # Doctor is usually required
             # This might be redundant if `blank=False` on doctor field, but can be an explicit check.
             pass
+        self.appointment_end_time = self.compute_end_time()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'appointment_date_time', 'estimated_duration_minutes'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'appointment_end_time'}
         super().save(*args, **kwargs)
+
+    def compute_end_time(self):
+        """The end of the appointment: its start plus the estimated duration."""
+        if self.appointment_date_time is None:
+            return None
+        return self.appointment_date_time + timedelta(minutes=self.estimated_duration_minutes or 0)
+
+    def get_busy_span(self):
+        """The (start, end) of the doctor's time this appointment holds, or None if it holds none."""
+        if self.status not in ACTIVE_APPOINTMENT_STATUSES or not self.doctor_id or not self.appointment_date_time:
+            return None
+        return self.appointment_date_time, self.appointment_end_time or self.compute_end_time()
+
+
+class SeriesFrequency(models.TextChoices):
+    DAILY = 'DAILY', _('Daily')
+    WEEKLY = 'WEEKLY', _('Weekly')
+    MONTHLY = 'MONTHLY', _('Monthly')
+
+
+RRULE_FREQUENCIES = {
+    SeriesFrequency.DAILY: rrule.DAILY,
+    SeriesFrequency.WEEKLY: rrule.WEEKLY,
+    SeriesFrequency.MONTHLY: rrule.MONTHLY,
+}
+
+
+class AppointmentSeries(models.Model):
+    """
+    A recurring appointment, following an RRULE-style recurrence (frequency, interval,
+    weekdays, and an optional count or end date) from its first occurrence, in local
+    wall-clock time. Occurrences are Appointment rows created ahead of time within a
+    rolling window (see appointments.series); materialized_count is the number of
+    occurrences generated so far, i.e. the series_index of the next one.
+    """
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='appointment_series',
+        verbose_name=_("Patient")
+    )
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=False,
+        related_name='doctor_appointment_series',
+        limit_choices_to={'role': UserRole.DOCTOR},
+        verbose_name=_("Doctor")
+    )
+    scheduled_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scheduled_appointment_series',
+        verbose_name=_("Scheduled By")
+    )
+    appointment_type = models.CharField(
+        max_length=50,
+        choices=AppointmentType.choices,
+        default=AppointmentType.FOLLOW_UP,
+        verbose_name=_("Appointment Type")
+    )
+    estimated_duration_minutes = models.PositiveIntegerField(
+        default=30,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_APPOINTMENT_DURATION_MINUTES)],
+        verbose_name=_("Estimated Duration (minutes)")
+    )
+    reason = models.TextField(blank=True, verbose_name=_("Reason for Appointments"))
+    notes = models.TextField(blank=True, verbose_name=_("Notes"))
+    # Recurrence
+    first_occurrence = models.DateTimeField(
+        verbose_name=_("First Occurrence"),
+        help_text=_("Start of the first occurrence; later ones keep its local time of day.")
+    )
+    frequency = models.CharField(
+        max_length=10,
+        choices=SeriesFrequency.choices,
+        default=SeriesFrequency.WEEKLY,
+        verbose_name=_("Frequency")
+    )
+    interval = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Interval"),
+        help_text=_("Repeat every this many days, weeks or months.")
+    )
+    weekdays = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_("Weekdays"),
+        help_text=_("Weekdays the series falls on (0 = Monday); empty for the first occurrence's weekday.")
+    )
+    occurrence_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Number of Occurrences"),
+        help_text=_("Total number of occurrences; leave empty for an end date or an open-ended series.")
+    )
+    until = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name=_("Last Date"),
+        help_text=_("Last (local) date an occurrence may fall on.")
+    )
+    # Materialization state
+    materialized_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Materialized Occurrences"),
+        help_text=_("Number of occurrences generated so far, including skipped ones.")
+    )
+    materialized_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Materialized Until"),
+        help_text=_("Occurrences starting before this time have been generated.")
+    )
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name=_("Active"),
+        help_text=_("Inactive series (ended, or split by an edit) generate no more occurrences.")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("Appointment Series")
+        verbose_name_plural = _("Appointment Series")
+        ordering = ['first_occurrence']
+        indexes = [
+            models.Index(fields=['is_active', 'materialized_until'], name='appointment_series_due_idx'),
+        ]
+
+    def __str__(self):
+        return _("%(frequency)s series for %(patient)s with Dr. %(doctor)s from %(date)s") % {
+            'frequency': self.get_frequency_display(),
+            'patient': self.patient.user.full_name_display if self.patient_id else _("N/A"),
+            'doctor': self.doctor.full_name_display if self.doctor else _("Unassigned"),
+            'date': self.first_occurrence.strftime('%Y-%m-%d %H:%M') if self.first_occurrence else _("N/A"),
+        }
+
+    def get_rule(self):
+        """The dateutil rrule of the occurrences' local (naive) start times."""
+        return rrule.rrule(
+            RRULE_FREQUENCIES[self.frequency],
+            dtstart=timezone.localtime(self.first_occurrence).replace(tzinfo=None),
+            interval=self.interval,
+            byweekday=sorted(self.weekdays) or None,
+            count=self.occurrence_count,
+            until=datetime.combine(self.until, time.max) if self.until else None,
+        )
+
+    def occurrence_starts(self, first_index, before):
+        """
+        Returns ([(series_index, aware start)] of the occurrences from `first_index` starting
+        before `before`, whether the recurrence ends there).
+        """
+        starts = []
+        for index, start in enumerate(self.get_rule()):
+            start = timezone.make_aware(start)
+            if start >= before:
+                return starts, False
+            if index >= first_index:
+                starts.append((index, start))
+        return starts, True
+
+
+class BusySource(models.TextChoices):
+    APPOINTMENT = 'APPOINTMENT', _('Appointment')
+    TELEMEDICINE = 'TELEMEDICINE', _('Telemedicine Session')
+
+
+class DoctorBusyInterval(models.Model):
+    """
+    A span of a doctor's time held by an active appointment or telemedicine session.
+    Maintained from their post_save/post_delete signals (see appointments.busy), so
+    doctor conflict checks query this one table. Spans longer than a day are stored
+    as consecutive rows of at most a day each.
+    """
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='busy_intervals',
+        verbose_name=_("Doctor")
+    )
+    source = models.CharField(max_length=20, choices=BusySource.choices, verbose_name=_("Source"))
+    source_id = models.PositiveBigIntegerField(verbose_name=_("Source ID"))
+    linked_appointment_id = models.PositiveBigIntegerField(
+        null=True, blank=True,
+        verbose_name=_("Linked Appointment ID"),
+        help_text=_("The appointment itself, or the appointment a telemedicine session is linked to.")
+    )
+    start = models.DateTimeField(verbose_name=_("Start"))
+    end = models.DateTimeField(verbose_name=_("End"))
+
+    class Meta:
+        verbose_name = _("Doctor Busy Interval")
+        verbose_name_plural = _("Doctor Busy Intervals")
+        ordering = ['doctor', 'start']
+        indexes = [
+            models.Index(fields=['doctor', 'start', 'end'], name='busy_interval_doctor_span_idx'),
+            models.Index(fields=['source', 'source_id'], name='busy_interval_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()} {self.source_id}: doctor {self.doctor_id} busy {self.start:%Y-%m-%d %H:%M} - {self.end:%Y-%m-%d %H:%M}"
@@ -1,6 +1,17 @@
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from .models import Appointment, AppointmentStatus, AppointmentType
+from django.utils.translation import gettext_lazy as _
+from datetime import timedelta
+from .availability import DEFAULT_MAX_RESULTS, DEFAULT_MAX_SEARCH_DAYS, MAX_AVAILABILITY_RESULTS, get_availability_setting
+from .bulk import MAX_BULK_BOOKINGS
+from .busy import conflict_message, find_conflict, lock_doctor_schedule
+from .models import (
+    ACTIVE_APPOINTMENT_STATUSES, MAX_APPOINTMENT_DURATION_MINUTES, Appointment, AppointmentSeries, AppointmentStatus,
+    AppointmentType, BusySource,
+)
+from .series import materialize_series
 from patients.serializers import PatientSerializer # For displaying nested patient details
 from users.serializers import CustomUserSerializer    # For displaying nested doctor/scheduler details
 from users.models import CustomUser, UserRole         # For queryset filtering and validation
@@ -11,7 +22,12 @@ class AppointmentSerializer(serializers.ModelSerializer):
     Serializer for the Appointment model.
     Handles serialization and deserialization of Appointment instances,
     including validation and representation of related objects.
+    Saving an active appointment checks the doctor's other appointments and
+    telemedicine sessions for overlaps (see check_doctor_availability).
     """
+    # Changes to these fields can create an overlap with another appointment.
+    SCHEDULING_FIELDS = ('doctor', 'appointment_date_time', 'estimated_duration_minutes', 'status')
+
     # Read-only fields for displaying details of related objects
     patient_details = PatientSerializer(source='patient', read_only=True)
     doctor_details = CustomUserSerializer(source='doctor', read_only=True)
@@ -50,19 +66,22 @@ class AppointmentSerializer(serializers.ModelSerializer):
         model = Appointment
         fields = (
             'id', 'patient', 'doctor', 'appointment_type', 'appointment_date_time',
-            'estimated_duration_minutes', 'status', 'reason', 'notes',
-            'original_appointment', 'created_at', 'updated_at', 'scheduled_by',
+            'estimated_duration_minutes', 'appointment_end_time', 'status', 'reason', 'notes',
+            'original_appointment', 'series', 'series_index', 'created_at', 'updated_at', 'scheduled_by',
             # Detailed representations (read-only)
             'patient_details', 'doctor_details', 'scheduled_by_details',
             'status_display', 'appointment_type_display',
             'is_upcoming', 'is_past'
         )
         read_only_fields = (
-            'id', 'created_at', 'updated_at',
+            'id', 'appointment_end_time', 'series', 'series_index', 'created_at', 'updated_at',
             'patient_details', 'doctor_details', 'scheduled_by_details',
             'status_display', 'appointment_type_display',
             'is_upcoming', 'is_past'
         )
+        # The unique_doctor_time_appointment constraint's exact-start clashes are overlaps too,
+        # reported by check_doctor_availability with the conflicting appointment's times.
+        validators = []
         extra_kwargs = {
             # Example: if you want 'reason' to be optional on create but required on update for certain statuses
             # 'reason': {'required': False}
@@ -109,31 +128,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
         Checks for conflicting appointments and other business rules.
         """
         doctor = data.get('doctor')
-        appointment_date_time = data.get('appointment_date_time')
-        estimated_duration = data.get('estimated_duration_minutes', self.Meta.model.estimated_duration_minutes.field.default)
-
-        # Exclude self if updating an existing appointment
-        instance_id = self.instance.id if self.instance else None
-
-        if doctor and appointment_date_time:
-            # Check for doctor's conflicting appointments
-            # This simple check is for exact start time. A more robust check would consider duration.
-            # The model's UniqueConstraint handles exact time conflicts for active appointments.
-            # For overlapping appointments, more complex logic is needed here or in a dedicated service.
-            
-            # Example of a more complex check (if not using DB constraint for overlaps):
-            # appointment_end_time = appointment_date_time + timezone.timedelta(minutes=estimated_duration)
-            # conflicting_appointments = Appointment.objects.filter(
-            #     doctor=doctor,
-            #     appointment_date_time__lt=appointment_end_time, # Starts before this one ends
-            #     # Need to calculate end time of existing appointments to check if this one starts before they end
-            #     # This requires storing/calculating end_time for existing appointments.
-            # ).exclude(pk=instance_id).exclude(status__in=[AppointmentStatus.CANCELLED_BY_PATIENT, ...]) # Exclude final states
-            # if conflicting_appointments.exists():
-            #     raise serializers.ValidationError(
-            #         _("Dr. %(doctor_name)s already has an overlapping appointment at this time.") % {'doctor_name': doctor.full_name}
-            #     )
-            pass # Relying on DB constraint for now for exact time for active appointments.
+
+        # Overlapping appointments of the doctor are checked when saving (see check_doctor_availability),
+        # in the transaction that writes the appointment, so concurrent bookings cannot both pass.
 
         # Ensure patient is not the same as the doctor
         patient = data.get('patient')
@@ -149,6 +146,43 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
         return data
 
+    def check_doctor_availability(self, validated_data):
+        """
+        Raises a ValidationError if the doctor's time overlaps the appointment being saved:
+        another active appointment or a telemedicine session (except one linked to this
+        appointment). Must run in the transaction that saves it: the doctor's schedule is
+        locked first, so concurrent bookings with the same doctor are checked one after
+        another. The overlap itself is one bounded query of the busy-interval index
+        (see appointments.busy).
+        """
+        instance = self.instance
+        if instance is not None and not any(field in validated_data for field in self.SCHEDULING_FIELDS):
+            return # e.g. a notes edit
+
+        def value(field):
+            return validated_data[field] if field in validated_data else getattr(instance, field, None)
+
+        doctor, start = value('doctor'), value('appointment_date_time')
+        appointment_status = value('status') or AppointmentStatus.SCHEDULED
+        if not doctor or not start or appointment_status not in ACTIVE_APPOINTMENT_STATUSES:
+            return
+        duration = value('estimated_duration_minutes')
+        if duration is None:
+            duration = Appointment._meta.get_field('estimated_duration_minutes').default
+        end = start + timedelta(minutes=duration)
+
+        exclude = None
+        if instance is not None:
+            exclude = Q(linked_appointment_id=instance.pk) # The appointment itself and its telemedicine session
+        elif value('original_appointment'):
+            # Marked rescheduled in the same save
+            exclude = Q(source=BusySource.APPOINTMENT, source_id=value('original_appointment').pk)
+        lock_doctor_schedule(doctor)
+        conflict = find_conflict(doctor, start, end, exclude)
+        if conflict is not None:
+            raise serializers.ValidationError({'appointment_date_time': [conflict_message(doctor, conflict)]})
+
+    @transaction.atomic
     def create(self, validated_data):
         """
         Custom create method for an appointment.
@@ -157,7 +191,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if 'scheduled_by' not in validated_data and request and hasattr(request, 'user') and request.user.is_authenticated:
             validated_data['scheduled_by'] = request.user
-        
+        self.check_doctor_availability(validated_data)
+
         # If an original_appointment is provided, update its status
         original_appointment = validated_data.get('original_appointment')
         if original_appointment:
@@ -169,6 +204,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
         return super().create(validated_data)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Custom update method for an appointment.
@@ -184,4 +220,159 @@ class AppointmentSerializer(serializers.ModelSerializer):
             # Add cancellation reason to notes if not already there, or use a dedicated field.
             # instance.notes = (instance.notes or "") + f"\nCancelled: {validated_data.get('cancellation_reason', 'No reason provided.')}"
 
+        self.check_doctor_availability(validated_data)
         return super().update(instance, validated_data)
+
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    """
+    Query parameters of the free-slot search (see appointments.availability).
+    Without dates it searches the week starting today.
+    """
+    specialization = serializers.CharField(required=False, help_text=_("Doctor specialization, matched case-insensitively."))
+    doctor = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        help_text=_("Limit the search to these doctor IDs (repeat the parameter for several).")
+    )
+    duration_minutes = serializers.IntegerField(min_value=1, max_value=MAX_APPOINTMENT_DURATION_MINUTES, default=30)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_AVAILABILITY_RESULTS, default=DEFAULT_MAX_RESULTS)
+
+    def validate(self, data):
+        data.setdefault('date_from', timezone.localdate())
+        data.setdefault('date_to', data['date_from'] + timedelta(days=6))
+        if data['date_to'] < data['date_from']:
+            raise serializers.ValidationError({'date_to': _("date_to must not be before date_from.")})
+        max_days = get_availability_setting('MAX_SEARCH_DAYS', DEFAULT_MAX_SEARCH_DAYS)
+        if (data['date_to'] - data['date_from']).days + 1 > max_days:
+            raise serializers.ValidationError({'date_to': _("Search at most %(days)s days at a time.") % {'days': max_days}})
+        return data
+
+
+class BulkAppointmentItemSerializer(serializers.Serializer):
+    """
+    One booking of a bulk request (see appointments.bulk): a new appointment, or a
+    reschedule of `original_appointment`, whose other fields default to the original's.
+    References are checked by book_appointments() for the whole batch at once.
+    """
+    original_appointment = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    patient = serializers.IntegerField(min_value=1, required=False)
+    doctor = serializers.IntegerField(min_value=1, required=False)
+    appointment_type = serializers.ChoiceField(choices=AppointmentType.choices, required=False)
+    appointment_date_time = serializers.DateTimeField()
+    estimated_duration_minutes = serializers.IntegerField(min_value=1, max_value=MAX_APPOINTMENT_DURATION_MINUTES, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_appointment_date_time(self, value):
+        if value < timezone.now():
+            raise serializers.ValidationError(_("Cannot schedule an appointment in the past."))
+        return value
+
+    def validate(self, data):
+        if not data.get('original_appointment') and not (data.get('patient') and data.get('doctor')):
+            raise serializers.ValidationError(_("Either original_appointment or both patient and doctor are required."))
+        return data
+
+
+class BulkAppointmentSerializer(serializers.Serializer):
+    """
+    Body of a bulk booking request. With `atomic` (the default) nothing is booked
+    unless every item is valid; otherwise the valid items are booked. Items are
+    validated one by one by the view so that errors can be reported per index.
+    """
+    atomic = serializers.BooleanField(default=True)
+    appointments = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=MAX_BULK_BOOKINGS,
+    )
+
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    """
+    Serializer for AppointmentSeries. Creating a series books its occurrences within
+    the rolling window (see appointments.series); if any of them conflicts, the series
+    is rejected with the conflicts by occurrence, unless skip_conflicts is set.
+    """
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+    doctor = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.filter(role=UserRole.DOCTOR, is_active=True))
+    weekdays = serializers.ListField(child=serializers.IntegerField(min_value=0, max_value=6), required=False)
+    skip_conflicts = serializers.BooleanField(
+        write_only=True, default=False,
+        help_text=_("Book the other occurrences and skip those that conflict, instead of rejecting the series.")
+    )
+    skipped_occurrences = serializers.SerializerMethodField()
+    frequency_display = serializers.CharField(source='get_frequency_display', read_only=True)
+
+    class Meta:
+        model = AppointmentSeries
+        fields = (
+            'id', 'patient', 'doctor', 'scheduled_by', 'appointment_type', 'estimated_duration_minutes',
+            'reason', 'notes', 'first_occurrence', 'frequency', 'frequency_display', 'interval', 'weekdays',
+            'occurrence_count', 'until', 'materialized_count', 'materialized_until', 'is_active',
+            'created_at', 'updated_at', 'skip_conflicts', 'skipped_occurrences',
+        )
+        read_only_fields = (
+            'id', 'scheduled_by', 'materialized_count', 'materialized_until', 'is_active', 'created_at', 'updated_at',
+        )
+
+    def get_skipped_occurrences(self, obj):
+        return getattr(obj, 'skipped_occurrences', [])
+
+    def validate_first_occurrence(self, value):
+        if value < timezone.now():
+            raise serializers.ValidationError(_("A series cannot start in the past."))
+        return value
+
+    def validate_weekdays(self, value):
+        return sorted(set(value))
+
+    def validate(self, data):
+        if data.get('occurrence_count') and data.get('until'):
+            raise serializers.ValidationError(_("Give either the number of occurrences or the last date, not both."))
+        first = timezone.localtime(data['first_occurrence'])
+        if data.get('until') and data['until'] < first.date():
+            raise serializers.ValidationError({'until': _("The last date must not be before the first occurrence.")})
+        if data.get('weekdays') and first.weekday() not in data['weekdays']:
+            raise serializers.ValidationError({'weekdays': _("The first occurrence must fall on one of the weekdays.")})
+        if data['doctor'] == data['patient'].user:
+            raise serializers.ValidationError(_("A doctor cannot book an appointment for themselves with themselves as the patient."))
+        return data
+
+    def create(self, validated_data):
+        skip_conflicts = validated_data.pop('skip_conflicts', False)
+        validated_data['scheduled_by'] = self.context['request'].user
+        with transaction.atomic():
+            series = super().create(validated_data)
+            appointments, errors = materialize_series(series, atomic=not skip_conflicts)
+            if errors and not skip_conflicts:
+                raise serializers.ValidationError({
+                    'occurrences': [{'index': index, 'errors': occurrence_errors} for index, occurrence_errors in sorted(errors.items())]
+                })
+        series.skipped_occurrences = sorted(errors)
+        return series
+
+
+class FollowingOccurrencesUpdateSerializer(serializers.Serializer):
+    """
+    An edit of an occurrence of a series and the following ones (see appointments.series.update_following).
+    A new appointment_date_time moves them all by the same offset.
+    """
+    appointment_date_time = serializers.DateTimeField(required=False)
+    doctor = serializers.PrimaryKeyRelatedField(
+        queryset=CustomUser.objects.filter(role=UserRole.DOCTOR, is_active=True), required=False
+    )
+    estimated_duration_minutes = serializers.IntegerField(min_value=1, max_value=MAX_APPOINTMENT_DURATION_MINUTES, required=False)
+    appointment_type = serializers.ChoiceField(choices=AppointmentType.choices, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_appointment_date_time(self, value):
+        if value < timezone.now():
+            raise serializers.ValidationError(_("Cannot move appointments into the past."))
+        return value
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError(_("No changes given."))
+        return data
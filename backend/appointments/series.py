@@ -0,0 +1,242 @@
+# appointments/series.py
+"""
+Recurring appointment series.
+
+An AppointmentSeries holds the recurrence; its occurrences are ordinary
+Appointment rows (with series and series_index), so everything reading
+appointments sees them unchanged. They are created lazily: materialize_series()
+books the not yet generated occurrences starting within WINDOW_DAYS from now
+through book_appointments() (see appointments.bulk), so the whole horizon is
+checked against the busy-interval index with one query and written with one
+insert. `manage.py materialize_appointment_series` rolls the window on.
+
+update_following() applies an edit to an occurrence and the later ones of its
+series ("this and following") with one UPDATE. Unless the edited occurrence is
+the first, the series is split there: it ends before the occurrence, and a new
+series with the edited template takes over the following occurrences and those
+not generated yet.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from audit_log.middleware import get_current_request
+from audit_log.models import AuditLogAction, create_audit_log_entry
+from audit_log.utils import get_client_ip, get_user_agent
+
+from .availability import invalidate_availability
+from .bulk import book_appointments, bulk_saved, check_conflicts, field_values
+from .busy import lock_doctor_schedules, replace_busy_intervals
+from .models import ACTIVE_APPOINTMENT_STATUSES, Appointment, AppointmentSeries, BusySource
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_DAYS = 90
+
+# Fields an edit of "this and following" occurrences may change. All but the start are also series template fields.
+FOLLOWING_FIELDS = ('appointment_date_time', 'doctor', 'estimated_duration_minutes', 'appointment_type', 'reason', 'notes')
+SCHEDULING_FIELDS = {'appointment_date_time', 'doctor', 'estimated_duration_minutes'}
+
+
+def get_series_setting(name, default):
+    return getattr(settings, 'APPOINTMENT_SERIES', {}).get(name, default)
+
+
+def materialization_horizon(now=None):
+    """The end of the rolling window occurrences are booked in."""
+    return (now or timezone.now()) + timedelta(days=get_series_setting('WINDOW_DAYS', DEFAULT_WINDOW_DAYS))
+
+
+def lock_series(series):
+    """Locks the series row until the end of the transaction and reloads `series` from it."""
+    list(AppointmentSeries.objects.select_for_update().filter(pk=series.pk).values_list('pk', flat=True))
+    series.refresh_from_db()
+
+
+def materialize_series(series, until=None, atomic=False):
+    """
+    Books the occurrences of `series` starting before `until` (default: the end of the rolling
+    window) that were not generated yet; those already past are skipped. Returns (appointments
+    by series_index, errors by series_index), as book_appointments() does.
+    Occurrences that conflict are skipped and not retried; with `atomic`, nothing is booked
+    and the series is left as it was if any does.
+    """
+    until = until or materialization_horizon()
+    with transaction.atomic():
+        lock_series(series)
+        if not series.is_active or (series.materialized_until is not None and series.materialized_until >= until):
+            return {}, {}
+        starts, ended = series.occurrence_starts(series.materialized_count, until)
+        now = timezone.now()
+        appointments, errors = book_appointments(
+            [
+                {
+                    'index': index, 'series': series, 'series_index': index,
+                    'patient': series.patient_id, 'doctor': series.doctor_id,
+                    'appointment_type': series.appointment_type, 'appointment_date_time': start,
+                    'estimated_duration_minutes': series.estimated_duration_minutes,
+                    'reason': series.reason, 'notes': series.notes,
+                }
+                for index, start in starts if start >= now
+            ],
+            series.scheduled_by, atomic=atomic,
+        )
+        if atomic and errors:
+            return appointments, errors
+        if starts:
+            series.materialized_count = starts[-1][0] + 1
+        series.materialized_until = until
+        series.is_active = not ended
+        series.save(update_fields=['materialized_count', 'materialized_until', 'is_active', 'updated_at'])
+    if errors:
+        logger.warning("Skipped %s conflicting occurrences of appointment series %s.", len(errors), series.pk)
+    return appointments, errors
+
+
+def materialize_due_series(until=None):
+    """Rolls the window of every active series on, one transaction per series. Returns (occurrences booked, skipped)."""
+    until = until or materialization_horizon()
+    due = AppointmentSeries.objects.filter(is_active=True)\
+        .filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=until))
+    booked = skipped = 0
+    for series in due.order_by('pk').iterator():
+        appointments, errors = materialize_series(series, until)
+        booked += len(appointments)
+        skipped += len(errors)
+    return booked, skipped
+
+
+def check_following(following, offset, changes):
+    """
+    Checks the new spans of the `following` occurrences against the doctors' busy intervals
+    (one query) and against each other. Returns the errors by series_index.
+    """
+    bookings = []
+    for appointment in following:
+        doctor = changes.get('doctor', appointment.doctor)
+        if doctor is None:
+            continue
+        start = appointment.appointment_date_time + offset
+        duration = changes.get('estimated_duration_minutes', appointment.estimated_duration_minutes)
+        bookings.append({
+            'index': appointment.series_index, 'doctor': doctor, 'original_appointment': appointment,
+            'start': start, 'end': start + timedelta(minutes=duration),
+        })
+    lock_doctor_schedules(sorted({booking['doctor'].pk for booking in bookings}))
+    errors = {}
+    check_conflicts(bookings, errors)
+    if offset:
+        # The UPDATE moves the rows one by one, and active appointments are unique per (doctor, start):
+        # an occurrence must not move onto the current start of another one.
+        current = {(appointment.doctor_id, appointment.appointment_date_time) for appointment in following}
+        for booking in bookings:
+            if (booking['doctor'].pk, booking['start']) in current:
+                errors.setdefault(booking['index'], {'appointment_date_time': [
+                    _("Moves onto the current time of another occurrence; move the occurrences by less than the time between them.")
+                ]})
+    return errors
+
+
+def audit_following(appointments, user, changed_fields):
+    request = get_current_request()
+    ip_address, user_agent = get_client_ip(request), get_user_agent(request)
+    for appointment in appointments:
+        create_audit_log_entry(
+            user=user, action=AuditLogAction.APPOINTMENT_UPDATED, target_object=appointment,
+            details=_("Appointment (ID: %(id)s) for %(patient_name)s updated. Status: %(status)s.") % {
+                'id': appointment.id,
+                'patient_name': appointment.patient.user.full_name_display,
+                'status': appointment.get_status_display(),
+            },
+            ip_address=ip_address, user_agent=user_agent,
+            additional_info={
+                'appointment_id': appointment.id, 'patient_id': appointment.patient.user_id,
+                'doctor_id': appointment.doctor_id, 'changed_fields': changed_fields,
+                'series_id': appointment.series_id, 'series_index': appointment.series_index,
+            },
+        )
+
+
+def split_series(series, index, template):
+    """
+    Ends `series` before occurrence `index` and returns a new series continuing it from there
+    with `template` (the new first_occurrence, weekdays and changed template fields).
+    """
+    successor = AppointmentSeries.objects.create(**{
+        'patient_id': series.patient_id, 'doctor': series.doctor, 'scheduled_by': series.scheduled_by,
+        'appointment_type': series.appointment_type, 'estimated_duration_minutes': series.estimated_duration_minutes,
+        'reason': series.reason, 'notes': series.notes,
+        'frequency': series.frequency, 'interval': series.interval, 'until': series.until,
+        'occurrence_count': series.occurrence_count - index if series.occurrence_count else None,
+        'materialized_count': max(series.materialized_count - index, 0),
+        'materialized_until': series.materialized_until, 'is_active': series.is_active,
+        **template,
+    })
+    if series.occurrence_count:
+        series.occurrence_count = index
+    else:
+        series.until = timezone.localdate(timezone.make_aware(series.get_rule()[index])) - timedelta(days=1)
+    series.materialized_count = min(series.materialized_count, index)
+    series.is_active = False
+    series.save(update_fields=['occurrence_count', 'until', 'materialized_count', 'is_active', 'updated_at'])
+    return successor
+
+
+def update_following(occurrence, changes, user):
+    """
+    Applies `changes` (values of FOLLOWING_FIELDS, 'doctor' an instance) to `occurrence` and the
+    active later occurrences of its series with one UPDATE, and to the series template for the
+    occurrences not generated yet. A new appointment_date_time moves them all by the same offset.
+    Returns (the updated appointments, errors by series_index); nothing is written if the new
+    spans conflict with the doctors' other bookings or with each other.
+    """
+    changes = {field: value for field, value in changes.items() if field in FOLLOWING_FIELDS}
+    with transaction.atomic():
+        series = occurrence.series
+        lock_series(series)
+        following = list(
+            series.occurrences.filter(series_index__gte=occurrence.series_index, status__in=ACTIVE_APPOINTMENT_STATUSES)
+            .select_related('patient__user', 'doctor').order_by('series_index')
+        )
+        if not following or not changes:
+            return following, {}
+        offset = changes['appointment_date_time'] - occurrence.appointment_date_time if 'appointment_date_time' in changes else timedelta(0)
+        if SCHEDULING_FIELDS & set(changes):
+            errors = check_following(following, offset, changes)
+            if errors:
+                return [], errors
+
+        # The template of the occurrences not generated yet: the recurrence moves with the edited occurrence.
+        rule_start = timezone.make_aware(series.get_rule()[occurrence.series_index]) + offset
+        day_shift = (timezone.localdate(rule_start) - timezone.localdate(rule_start - offset)).days
+        template = {field: value for field, value in changes.items() if field != 'appointment_date_time'}
+        template.update(first_occurrence=rule_start, weekdays=sorted((weekday + day_shift) % 7 for weekday in series.weekdays))
+        updates = {field: value for field, value in changes.items() if field != 'appointment_date_time'}
+        if occurrence.series_index:
+            target = split_series(series, occurrence.series_index, template)
+            updates.update(series=target, series_index=F('series_index') - occurrence.series_index)
+        else:
+            for field, value in template.items():
+                setattr(series, field, value)
+            series.save()
+
+        if offset:
+            updates['appointment_date_time'] = F('appointment_date_time') + offset
+        if 'estimated_duration_minutes' in changes:
+            updates['appointment_end_time'] = F('appointment_date_time') + offset + timedelta(minutes=changes['estimated_duration_minutes'])
+        elif offset:
+            updates['appointment_end_time'] = F('appointment_end_time') + offset
+        updates['updated_at'] = timezone.now()
+        previous = {appointment.pk: field_values(appointment) for appointment in following}
+        Appointment.objects.filter(pk__in=previous).update(**updates)
+
+        updated = list(Appointment.objects.filter(pk__in=previous).select_related('patient__user', 'doctor').order_by('series_index'))
+        invalidate_availability(replace_busy_intervals(BusySource.APPOINTMENT, updated))
+        audit_following(updated, user, sorted(changes))
+        bulk_saved.send(sender=Appointment, created=[], updated=[(appointment, previous[appointment.pk]) for appointment in updated], using=None)
+    return updated, {}
@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
-from .models import Appointment, AppointmentStatus
+from .availability import invalidate_availability
+from .busy import delete_busy_intervals, sync_busy_intervals
+from .models import Appointment, AppointmentStatus, BusySource
 from audit_log.models import AuditLogAction, create_audit_log_entry
 from audit_log.utils import get_client_ip, get_user_agent # Ensure these utilities handle None request gracefully
 from audit_log.middleware import get_current_request
@@ -86,3 +88,20 @@ def appointment_pre_save_handler(sender, instance, **kwargs):
     # Ensure estimated_duration_minutes is positive
     if instance.estimated_duration_minutes is not None and instance.estimated_duration_minutes <= 0:
         instance.estimated_duration_minutes = Appointment._meta.get_field('estimated_duration_minutes').default # Reset to default
+
+# Fields that decide the doctor's busy interval for an appointment (see appointments.busy).
+BUSY_INTERVAL_FIELDS = {'doctor', 'appointment_date_time', 'estimated_duration_minutes', 'appointment_end_time', 'status'}
+
+@receiver(post_save, sender=Appointment)
+def appointment_busy_interval_handler(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """Keeps the doctor busy-interval index, and the cached availability built from it, in step with the appointment."""
+    if raw or (update_fields is not None and not BUSY_INTERVAL_FIELDS & set(update_fields)):
+        return
+    if update_fields is not None:
+        # Only update_fields were written; the instance may hold unsaved changes to the other fields.
+        instance = sender._default_manager.using(using).get(pk=instance.pk)
+    invalidate_availability(sync_busy_intervals(BusySource.APPOINTMENT, instance, using), using)
+
+@receiver(post_delete, sender=Appointment)
+def appointment_busy_interval_delete_handler(sender, instance, using=None, **kwargs):
+    invalidate_availability(delete_busy_intervals(BusySource.APPOINTMENT, instance.pk, using), using)
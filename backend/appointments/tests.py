@@ -4,13 +4,23 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-from users.models import UserRole
+from users.models import DoctorProfile, UserRole
 from patients.models import Patient
-from .models import Appointment, AppointmentType, AppointmentStatus
+from telemedicine.models import TelemedicineSession, TelemedicineSessionStatus
+from .availability import build_busy_bitmaps
+from .busy import rebuild_busy_intervals
+from .models import Appointment, AppointmentSeries, AppointmentType, AppointmentStatus, BusySource, DoctorBusyInterval
+from .series import materialize_due_series
 from audit_log.models import AuditLogEntry, AuditLogAction
+from admin_dashboard.models import AppointmentDailyFact
 
 UserModel = get_user_model()
 
@@ -231,6 +241,78 @@ class AppointmentAPITests(TestCase):
             , response.content
         )
     
+    def test_overlapping_appointment_is_rejected(self):
+        self._login_user(self.receptionist_user)
+        start = timezone.now() + timedelta(days=7)
+        first = dict(self.appointment_data, appointment_date_time=start.isoformat(), estimated_duration_minutes=60)
+        self.assertEqual(self.client.post(self.list_create_url, first, format='json').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Appointment.objects.get().appointment_end_time, start + timedelta(minutes=60))
+
+        # Starts half-way through the first appointment
+        overlapping = dict(self.appointment_data, patient=self.other_patient_profile.pk,
+                           appointment_date_time=(start + timedelta(minutes=30)).isoformat())
+        response = self.client.post(self.list_create_url, overlapping, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+        self.assertIn("conflicting appointment", str(response.data['appointment_date_time'][0]))
+
+        # Back-to-back with the first appointment, and the same time with another doctor
+        adjacent = dict(overlapping, appointment_date_time=(start + timedelta(minutes=60)).isoformat())
+        self.assertEqual(self.client.post(self.list_create_url, adjacent, format='json').status_code, status.HTTP_201_CREATED)
+        other_doctor = dict(overlapping, doctor=self.other_doctor_user.pk)
+        self.assertEqual(self.client.post(self.list_create_url, other_doctor, format='json').status_code, status.HTTP_201_CREATED)
+
+    def test_cancelled_appointment_does_not_block_the_slot(self):
+        self._login_user(self.receptionist_user)
+        response = self.client.post(self.list_create_url, self.appointment_data, format='json')
+        appointment = Appointment.objects.get(pk=response.data['id'])
+        appointment.status = AppointmentStatus.CANCELLED_BY_PATIENT
+        appointment.save(update_fields=['status'])
+        self.assertFalse(DoctorBusyInterval.objects.filter(source_id=appointment.pk).exists())
+        conflicting_data = dict(self.appointment_data, patient=self.other_patient_profile.pk)
+        response = self.client.post(self.list_create_url, conflicting_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+
+    def test_appointment_overlapping_telemedicine_session_is_rejected(self):
+        start = timezone.now() + timedelta(days=7)
+        session = TelemedicineSession.objects.create(
+            patient=self.other_patient_profile, doctor=self.doctor_user,
+            session_start_time=start, estimated_duration_minutes=45,
+        )
+        self.assertEqual(
+            list(DoctorBusyInterval.objects.values_list('source', 'source_id', 'start', 'end')),
+            [(BusySource.TELEMEDICINE, session.pk, start, start + timedelta(minutes=45))]
+        )
+
+        self._login_user(self.receptionist_user)
+        data = dict(self.appointment_data, appointment_date_time=(start + timedelta(minutes=30)).isoformat())
+        response = self.client.post(self.list_create_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+        self.assertIn("conflicting telemedicine session", str(response.data['appointment_date_time'][0]))
+
+        session.status = TelemedicineSessionStatus.COMPLETED
+        session.save()
+        response = self.client.post(self.list_create_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+
+    def test_rebuild_busy_intervals_splits_long_spans(self):
+        start = timezone.now() + timedelta(days=7)
+        session = TelemedicineSession.objects.create(
+            patient=self.other_patient_profile, doctor=self.doctor_user,
+            session_start_time=start, session_end_time=start + timedelta(hours=30),
+        )
+        DoctorBusyInterval.objects.all().delete() # As after a bulk change that bypassed the signals
+        self.assertEqual(rebuild_busy_intervals(), 2)
+        self.assertEqual(
+            list(DoctorBusyInterval.objects.filter(source_id=session.pk).values_list('start', 'end')),
+            [(start, start + timedelta(days=1)), (start + timedelta(days=1), start + timedelta(hours=30))]
+        )
+
+        # Overlaps the second day only
+        self._login_user(self.receptionist_user)
+        data = dict(self.appointment_data, appointment_date_time=(start + timedelta(hours=29)).isoformat())
+        response = self.client.post(self.list_create_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
     def test_reschedule_appointment(self):
         self._login_user(self.receptionist_user)
         # Create original appointment
@@ -254,3 +336,286 @@ class AppointmentAPITests(TestCase):
         self.assertEqual(new_appointment.original_appointment, original_appointment)
         self.assertEqual(original_appointment.status, AppointmentStatus.RESCHEDULED)
         self.assertEqual(new_appointment.status, AppointmentStatus.SCHEDULED) # New one is scheduled
+
+
+class DoctorAvailabilityAPITests(TestCase):
+    """Tests for the free-slot search across doctors (working hours 09:00-17:00 on weekdays)."""
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.receptionist = UserModel.objects.create_user(
+            username='avail_receptionist', email='avail_receptionist@example.com',
+            password='StrongPassword123!', role=UserRole.RECEPTIONIST
+        )
+        self.busy_doctor, self.free_doctor, self.dermatologist = [
+            UserModel.objects.create_user(
+                username=f'avail_doctor_{index}', email=f'avail_doctor_{index}@example.com',
+                password='StrongPassword123!', role=UserRole.DOCTOR, first_name="Avail", last_name=f"Doctor {index}"
+            )
+            for index in range(3)
+        ]
+        DoctorProfile.objects.filter(user__in=[self.busy_doctor, self.free_doctor]).update(specialization='Cardiology')
+        DoctorProfile.objects.filter(user=self.dermatologist).update(specialization='Dermatology')
+        self.patient_user = UserModel.objects.create_user(
+            username='avail_patient', email='avail_patient@example.com',
+            password='StrongPassword123!', role=UserRole.PATIENT
+        )
+        self.patient = Patient.objects.get(user=self.patient_user)
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.url = reverse('appointments:doctor-availability')
+        self.client.force_authenticate(user=self.receptionist)
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.monday, time(hour, minute)))
+
+    def book(self, doctor, start, minutes):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor, appointment_date_time=start, estimated_duration_minutes=minutes
+        )
+
+    def search(self, **params):
+        params = {'date_from': self.monday.isoformat(), 'date_to': self.monday.isoformat(), **params}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.data
+
+    def test_search_ranks_slots_across_doctors_of_a_specialization(self):
+        self.book(self.busy_doctor, self.at(9), 60)
+        data = self.search(specialization='cardiology', duration_minutes=30, limit=3)
+        self.assertEqual(data['doctors_searched'], 2)
+        self.assertEqual(
+            [(slot['doctor']['id'], slot['start']) for slot in data['results']],
+            [(self.free_doctor.id, self.at(9)), (self.free_doctor.id, self.at(9, 15)), (self.free_doctor.id, self.at(9, 30))]
+        )
+        self.assertEqual(data['results'][0]['end'], self.at(9, 30))
+
+        data = self.search(specialization='Cardiology', doctor=[self.busy_doctor.id], duration_minutes=30, limit=1)
+        self.assertEqual(data['results'][0]['start'], self.at(10))
+
+    def test_slots_stay_within_working_hours_and_free_time(self):
+        self.book(self.dermatologist, self.at(10), 360) # 10:00-16:00
+        data = self.search(doctor=[self.dermatologist.id], duration_minutes=60, limit=10)
+        self.assertEqual(
+            [slot['start'] for slot in data['results']],
+            [self.at(9), self.at(16)]
+        )
+        # Saturday and Sunday are days off
+        weekend = self.monday + timedelta(days=5)
+        data = self.search(doctor=[self.dermatologist.id], date_from=weekend.isoformat(), date_to=(weekend + timedelta(days=1)).isoformat())
+        self.assertEqual(data['results'], [])
+
+    def test_booking_invalidates_cached_availability(self):
+        with mock.patch('appointments.availability.build_busy_bitmaps', wraps=build_busy_bitmaps) as build:
+            self.assertEqual(self.search(doctor=[self.dermatologist.id], limit=1)['results'][0]['start'], self.at(9))
+            self.search(doctor=[self.dermatologist.id], limit=1)
+            self.assertEqual(build.call_count, 1) # The second search used the cached bitmaps
+        appointment = self.book(self.dermatologist, self.at(9), 30)
+        self.assertEqual(self.search(doctor=[self.dermatologist.id], limit=1)['results'][0]['start'], self.at(9, 30))
+        appointment.status = AppointmentStatus.CANCELLED_BY_STAFF
+        appointment.save(update_fields=['status'])
+        self.assertEqual(self.search(doctor=[self.dermatologist.id], limit=1)['results'][0]['start'], self.at(9))
+
+    def test_patients_cannot_search_doctors_schedules(self):
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(self.url, {'date_from': self.monday.isoformat(), 'date_to': self.monday.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get(self.url, {'date_from': '2030-01-10', 'date_to': '2030-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('date_to', response.data)
+
+
+class BulkAppointmentAPITests(TestCase):
+    """Tests for booking and rescheduling many appointments in one request."""
+    def setUp(self):
+        self.client = APIClient()
+        self.receptionist = UserModel.objects.create_user(
+            username='bulk_receptionist', email='bulk_receptionist@example.com',
+            password='StrongPassword123!', role=UserRole.RECEPTIONIST
+        )
+        self.doctor = UserModel.objects.create_user(
+            username='bulk_doctor', email='bulk_doctor@example.com',
+            password='StrongPassword123!', role=UserRole.DOCTOR, first_name="Bulk", last_name="Doctor"
+        )
+        patient_user = UserModel.objects.create_user(
+            username='bulk_patient', email='bulk_patient@example.com',
+            password='StrongPassword123!', role=UserRole.PATIENT
+        )
+        self.patient = Patient.objects.get(user=patient_user)
+        self.start = (timezone.now() + timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.url = reverse('appointments:appointment-bulk')
+        self.client.force_authenticate(user=self.receptionist)
+
+    def item(self, hours, **fields):
+        return {
+            'patient': self.patient.pk, 'doctor': self.doctor.pk,
+            'appointment_date_time': (self.start + timedelta(hours=hours)).isoformat(), **fields
+        }
+
+    def test_bulk_books_and_reschedules(self):
+        original = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date_time=self.start, estimated_duration_minutes=60
+        )
+        with self.captureOnCommitCallbacks(execute=True): # Audit entries are written on commit
+            response = self.client.post(self.url, {'appointments': [
+                self.item(1),
+                {'original_appointment': original.pk, 'appointment_date_time': (self.start + timedelta(hours=2)).isoformat()},
+            ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.data['errors'], [])
+        rescheduled = Appointment.objects.get(pk=response.data['created'][1]['id'])
+        self.assertEqual(rescheduled.original_appointment, original)
+        self.assertEqual(rescheduled.estimated_duration_minutes, 60) # Copied from the original
+        self.assertEqual(rescheduled.appointment_end_time, self.start + timedelta(hours=3))
+        original.refresh_from_db()
+        self.assertEqual(original.status, AppointmentStatus.RESCHEDULED)
+        self.assertEqual(
+            set(DoctorBusyInterval.objects.values_list('source_id', flat=True)),
+            {item['id'] for item in response.data['created']}
+        )
+        self.assertTrue(AuditLogEntry.objects.filter(action=AuditLogAction.APPOINTMENT_RESCHEDULED, target_object_id=str(original.pk)).exists())
+        self.assertEqual(
+            dict(AppointmentDailyFact.objects.filter(doctor=self.doctor).values_list('status', 'count')),
+            {AppointmentStatus.SCHEDULED: 2, AppointmentStatus.RESCHEDULED: 1}
+        )
+
+    def test_atomic_batch_with_a_conflict_books_nothing(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date_time=self.start)
+        response = self.client.post(self.url, {'appointments': [self.item(1), self.item(0.25)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], [])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertIn('appointment_date_time', response.data['errors'][0]['errors'])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_non_atomic_batch_books_the_valid_items(self):
+        response = self.client.post(self.url, {'atomic': False, 'appointments': [
+            self.item(0), self.item(0.5, estimated_duration_minutes=0), self.item(-100),
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual([item['index'] for item in response.data['created']], [0])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_items_overlapping_each_other_are_rejected(self):
+        response = self.client.post(self.url, {'atomic': False, 'appointments': [
+            self.item(0, estimated_duration_minutes=60), self.item(0.5),
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('booking 0', str(response.data['errors'][0]['errors']['appointment_date_time'][0]))
+
+    def test_patients_cannot_bulk_book(self):
+        self.client.force_authenticate(user=self.patient.user)
+        response = self.client.post(self.url, {'appointments': [self.item(0)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(APPOINTMENT_SERIES={'WINDOW_DAYS': 21})
+class AppointmentSeriesAPITests(TestCase):
+    """Tests for recurring appointment series and their lazily booked occurrences."""
+    def setUp(self):
+        self.client = APIClient()
+        self.receptionist = UserModel.objects.create_user(
+            username='series_receptionist', email='series_receptionist@example.com',
+            password='StrongPassword123!', role=UserRole.RECEPTIONIST
+        )
+        self.doctor = UserModel.objects.create_user(
+            username='series_doctor', email='series_doctor@example.com',
+            password='StrongPassword123!', role=UserRole.DOCTOR, first_name="Series", last_name="Doctor"
+        )
+        patient_user = UserModel.objects.create_user(
+            username='series_patient', email='series_patient@example.com',
+            password='StrongPassword123!', role=UserRole.PATIENT
+        )
+        self.patient = Patient.objects.get(user=patient_user)
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.url = reverse('appointments:appointment-series-list-create')
+        self.client.force_authenticate(user=self.receptionist)
+
+    def at(self, weeks, hour=10, minute=0):
+        return timezone.make_aware(datetime.combine(self.monday + timedelta(weeks=weeks), time(hour, minute)))
+
+    def create_series(self, **fields):
+        return self.client.post(self.url, {
+            'patient': self.patient.pk, 'doctor': self.doctor.pk, 'first_occurrence': self.at(0).isoformat(),
+            'frequency': 'WEEKLY', 'occurrence_count': 10, **fields
+        }, format='json')
+
+    def occurrences(self, series_id):
+        return list(Appointment.objects.filter(series_id=series_id).order_by('series_index')
+                    .values_list('series_index', 'appointment_date_time', 'estimated_duration_minutes'))
+
+    def test_series_books_occurrences_within_the_window(self):
+        response = self.create_series()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        series_id = response.data['id']
+        booked = self.occurrences(series_id)
+        self.assertTrue(2 <= len(booked) <= 3) # The 21-day window from now reaches the second or third Monday
+        self.assertEqual([start for _, start, _ in booked], [self.at(week) for week in range(len(booked))])
+        self.assertEqual(DoctorBusyInterval.objects.filter(doctor=self.doctor).count(), len(booked))
+
+        booked_count, skipped = materialize_due_series(until=self.at(20))
+        self.assertEqual((booked_count, skipped), (10 - len(booked), 0))
+        self.assertEqual([index for index, _, _ in self.occurrences(series_id)], list(range(10)))
+        self.assertFalse(AppointmentSeries.objects.get(pk=series_id).is_active) # All 10 occurrences are booked
+
+    def test_conflicting_occurrence_rejects_the_series_unless_skipped(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date_time=self.at(1, 9, 45))
+        response = self.create_series()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([occurrence['index'] for occurrence in response.data['occurrences']], ['1'])
+        self.assertFalse(AppointmentSeries.objects.exists())
+
+        response = self.create_series(skip_conflicts=True)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.data['skipped_occurrences'], [1])
+        self.assertNotIn(1, [index for index, _, _ in self.occurrences(response.data['id'])])
+
+    def test_edit_this_and_following_occurrences_with_one_update(self):
+        series_id = self.create_series(weekdays=[0, 3]).data['id']
+        materialize_due_series(until=self.at(3))
+        occurrence = Appointment.objects.get(series_id=series_id, series_index=2) # The second Monday
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                reverse('appointments:appointment-following-update', kwargs={'id': occurrence.id}),
+                {'appointment_date_time': self.at(1, 11).isoformat(), 'estimated_duration_minutes': 45}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        appointment_updates = [query for query in queries.captured_queries
+                               if query['sql'].startswith('UPDATE "appointments_appointment"')]
+        self.assertEqual(len(appointment_updates), 1)
+
+        successor = response.data['series']
+        self.assertNotEqual(successor, series_id)
+        self.assertEqual(
+            [start for _, start, _ in self.occurrences(series_id)], [self.at(0), self.at(0, 10) + timedelta(days=3)]
+        )
+        moved = self.occurrences(successor)
+        self.assertEqual(moved[0], (0, self.at(1, 11), 45))
+        self.assertEqual(moved[1], (1, self.at(1, 11) + timedelta(days=3), 45))
+        self.assertFalse(AppointmentSeries.objects.get(pk=series_id).is_active)
+        self.assertEqual(
+            DoctorBusyInterval.objects.get(source=BusySource.APPOINTMENT, source_id=occurrence.id).end, self.at(1, 11, 45)
+        )
+
+        # Occurrences generated later follow the edited template.
+        materialize_due_series(until=self.at(5))
+        self.assertEqual(self.occurrences(successor)[-1][1:], (self.at(4, 11) + timedelta(days=3), 45))
+        self.assertEqual(len(self.occurrences(series_id)) + len(self.occurrences(successor)), 10)
+
+    def test_edit_following_rejects_conflicts(self):
+        series_id = self.create_series().data['id']
+        occurrence = Appointment.objects.get(series_id=series_id, series_index=1)
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date_time=self.at(1, 12))
+        response = self.client.patch(
+            reverse('appointments:appointment-following-update', kwargs={'id': occurrence.id}),
+            {'appointment_date_time': self.at(1, 11, 45).isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['occurrences'][0]['index'], 1)
+        occurrence.refresh_from_db()
+        self.assertEqual(occurrence.appointment_date_time, self.at(1))
@@ -2,8 +2,12 @@ from django.urls import path
 from .views import (
     AppointmentListCreateAPIView,
     AppointmentDetailAPIView,
+    DoctorAvailabilityAPIView,
+    BulkAppointmentAPIView,
+    AppointmentSeriesListCreateAPIView,
+    AppointmentSeriesDetailAPIView,
+    FollowingOccurrencesUpdateAPIView,
     # Add other views here if created, e.g., for specific appointment actions
-    # DoctorAvailabilityAPIView,
     # PatientAppointmentHistoryAPIView,
 )
 
@@ -17,6 +21,17 @@ urlpatterns = [
     # The <int:id> part captures the appointment's primary key from the URL.
     path('<int:id>/', AppointmentDetailAPIView.as_view(), name='appointment-detail'),
     
+    # Free slots across doctors (GET), e.g. ?specialization=Cardiology&duration_minutes=30
+    path('availability/', DoctorAvailabilityAPIView.as_view(), name='doctor-availability'),
+
+    # Book and reschedule many appointments at once (POST), checked and written as one batch
+    path('bulk/', BulkAppointmentAPIView.as_view(), name='appointment-bulk'),
+
+    # Recurring series (GET/POST), and edits of an occurrence together with the following ones (PATCH)
+    path('series/', AppointmentSeriesListCreateAPIView.as_view(), name='appointment-series-list-create'),
+    path('series/<int:id>/', AppointmentSeriesDetailAPIView.as_view(), name='appointment-series-detail'),
+    path('<int:id>/following/', FollowingOccurrencesUpdateAPIView.as_view(), name='appointment-following-update'),
+
     # Example: URL for a doctor to view their schedule for a specific day
     # path('doctor-schedule/<int:doctor_id>/<str:date>/', DoctorScheduleView.as_view(), name='doctor-schedule'),
     
@@ -1,11 +1,18 @@
 # appointments/views.py
 from rest_framework import generics, permissions, status, serializers as drf_serializers
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.utils.translation import gettext_lazy as _
 
-from .models import Appointment, AppointmentStatus
-from .serializers import AppointmentSerializer
-from users.models import UserRole
+from .availability import find_free_slots, get_slot_minutes
+from .bulk import book_appointments
+from .models import ACTIVE_APPOINTMENT_STATUSES, Appointment, AppointmentSeries, AppointmentStatus
+from .serializers import (
+    AppointmentSerializer, AppointmentSeriesSerializer, AvailabilitySearchSerializer, BulkAppointmentItemSerializer,
+    BulkAppointmentSerializer, FollowingOccurrencesUpdateSerializer,
+)
+from .series import update_following
+from users.models import CustomUser, UserRole
 from patients.models import Patient
 
 from audit_log.models import AuditLogAction, create_audit_log_entry
@@ -54,6 +61,26 @@ class IsOwnerOrStaffForAppointment(permissions.BasePermission):
 
         return False
 
+class IsAdminOrReceptionistForBulk(permissions.BasePermission):
+    """
+    Permission for bulk booking and recurring series: only Admins and Receptionists,
+    the roles with full access to any appointment, may book or change many at once.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.role in [UserRole.ADMIN, UserRole.RECEPTIONIST])
+
+class IsStaffForAvailability(permissions.BasePermission):
+    """
+    Permission for the free-slot search: only staff (Admin, Receptionist, Doctor, Nurse),
+    as it exposes every doctor's schedule gaps and contact details.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.role in [
+            UserRole.ADMIN, UserRole.RECEPTIONIST, UserRole.DOCTOR, UserRole.NURSE
+        ])
+
 class IsStaffToCreateOrPatientForSelf(permissions.BasePermission):
     """
     Permission to allow staff (Admin, Receptionist, Doctor, Nurse) to create any appointment,
@@ -196,3 +223,141 @@ class AppointmentDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
+
+class DoctorAvailabilityAPIView(APIView):
+    """
+    API endpoint searching free appointment slots across doctors, e.g. the next free
+    30 minutes with any cardiologist this week:
+    GET ?specialization=Cardiology&duration_minutes=30
+    Returns the candidate slots, earliest first (see appointments.availability).
+    """
+    permission_classes = [permissions.IsAuthenticated, IsStaffForAvailability]
+
+    def get(self, request, *args, **kwargs):
+        params = AvailabilitySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        search = params.validated_data
+
+        doctors = CustomUser.objects.filter(role=UserRole.DOCTOR, is_active=True)
+        if search.get('specialization'):
+            doctors = doctors.filter(doctor_profile__specialization__iexact=search['specialization'].strip())
+        if search.get('doctor'):
+            doctors = doctors.filter(pk__in=search['doctor'])
+        doctors = {
+            doctor['id']: doctor for doctor in doctors.order_by('pk').values(
+                'id', 'email', 'first_name', 'last_name', 'doctor_profile__specialization'
+            )
+        }
+
+        slots = find_free_slots(
+            list(doctors), search['date_from'], search['date_to'], search['duration_minutes'], limit=search['limit']
+        )
+        return Response({
+            'date_from': search['date_from'],
+            'date_to': search['date_to'],
+            'duration_minutes': search['duration_minutes'],
+            'slot_minutes': get_slot_minutes(),
+            'doctors_searched': len(doctors),
+            'results': [
+                {
+                    'doctor': {
+                        'id': slot['doctor_id'],
+                        'email': doctors[slot['doctor_id']]['email'],
+                        'first_name': doctors[slot['doctor_id']]['first_name'],
+                        'last_name': doctors[slot['doctor_id']]['last_name'],
+                        'specialization': doctors[slot['doctor_id']]['doctor_profile__specialization'],
+                    },
+                    'start': slot['start'],
+                    'end': slot['end'],
+                }
+                for slot in slots
+            ],
+        })
+
+class BulkAppointmentAPIView(APIView):
+    """
+    API endpoint booking and rescheduling many appointments in one request:
+    POST {"atomic": true, "appointments": [{"patient": 1, "doctor": 2, "appointment_date_time": ...},
+                                           {"original_appointment": 7, "appointment_date_time": ...}]}
+    The batch is checked for conflicts with one query and written in one transaction
+    (see appointments.bulk). Returns the created appointments and the errors by item
+    index; 201 if anything was booked, 400 otherwise.
+    """
+    permission_classes = [IsAdminOrReceptionistForBulk]
+
+    def post(self, request, *args, **kwargs):
+        body = BulkAppointmentSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+
+        bookings, errors = [], {}
+        for index, item in enumerate(body.validated_data['appointments']):
+            serializer = BulkAppointmentItemSerializer(data=item)
+            if serializer.is_valid():
+                bookings.append({'index': index, **serializer.validated_data})
+            else:
+                errors[index] = serializer.errors
+        appointments, errors = book_appointments(bookings, request.user, atomic=body.validated_data['atomic'], errors=errors)
+
+        return Response({
+            'created': [
+                {
+                    'index': index,
+                    'id': appointment.id,
+                    'original_appointment': appointment.original_appointment_id,
+                    'doctor': appointment.doctor_id,
+                    'appointment_date_time': appointment.appointment_date_time,
+                    'appointment_end_time': appointment.appointment_end_time,
+                }
+                for index, appointment in sorted(appointments.items())
+            ],
+            'errors': [{'index': index, 'errors': item_errors} for index, item_errors in sorted(errors.items())],
+        }, status=status.HTTP_201_CREATED if appointments else status.HTTP_400_BAD_REQUEST)
+
+class AppointmentSeriesListCreateAPIView(generics.ListCreateAPIView):
+    """
+    API endpoint for listing and creating recurring appointment series, e.g. weekly
+    on Mondays and Thursdays for three months:
+    POST {"patient": 1, "doctor": 2, "first_occurrence": ..., "frequency": "WEEKLY",
+          "weekdays": [0, 3], "until": "2026-12-31"}
+    Occurrences are booked as appointments within a rolling window (see appointments.series).
+    """
+    queryset = AppointmentSeries.objects.select_related('patient__user', 'doctor').all()
+    serializer_class = AppointmentSeriesSerializer
+    permission_classes = [IsAdminOrReceptionistForBulk]
+    filterset_fields = ['is_active', 'frequency', 'doctor__id', 'patient__user__id']
+
+class AppointmentSeriesDetailAPIView(generics.RetrieveAPIView):
+    """API endpoint for retrieving a recurring appointment series. Its occurrences are listed as appointments."""
+    queryset = AppointmentSeries.objects.select_related('patient__user', 'doctor').all()
+    serializer_class = AppointmentSeriesSerializer
+    permission_classes = [IsAdminOrReceptionistForBulk]
+    lookup_field = 'id'
+
+class FollowingOccurrencesUpdateAPIView(APIView):
+    """
+    API endpoint editing an occurrence of a series and all its following ones at once:
+    PATCH {"appointment_date_time": ..., "doctor": 3}
+    The occurrences are updated with one query, and the series' later occurrences follow
+    the edit. Returns the updated appointments, or the conflicts by occurrence.
+    """
+    permission_classes = [IsAdminOrReceptionistForBulk]
+
+    def patch(self, request, id, *args, **kwargs):
+        occurrence = generics.get_object_or_404(Appointment.objects.select_related('series'), id=id)
+        if occurrence.series is None or occurrence.status not in ACTIVE_APPOINTMENT_STATUSES:
+            return Response(
+                {'detail': _("Only active occurrences of a series can be edited with their following ones.")},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        changes = FollowingOccurrencesUpdateSerializer(data=request.data)
+        changes.is_valid(raise_exception=True)
+        updated, errors = update_following(occurrence, changes.validated_data, request.user)
+        if errors:
+            return Response(
+                {'occurrences': [{'index': index, 'errors': occurrence_errors} for index, occurrence_errors in sorted(errors.items())]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'series': updated[0].series_id if updated else occurrence.series_id,
+            'appointments': AppointmentSerializer(updated, many=True, context={'request': request}).data,
+        })
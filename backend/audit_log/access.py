@@ -0,0 +1,233 @@
+# audit_log/access.py
+"""
+Aggregated read-access (VIEWED) audit logging for patient data.
+
+Logging every read as its own row would roughly double audit write volume, so
+reads are counted in memory per (user, patient, endpoint, time bucket) and
+written as one VIEWED entry per key with the number of reads, once the bucket
+has closed. Recording a read is only a dictionary update under a lock that is
+waited on for at most MAX_RECORD_LATENCY_MS. Closed buckets are turned into
+entries by a periodic task on the buffered audit writer's background thread,
+which the first read after a bucket closes (or the counter table fills up)
+wakes; nothing is queried or written in the request. Open buckets are written
+when the writer shuts down.
+
+Reads of another person's data are always counted. Reads flagged non-sensitive
+(by default, patients reading their own records) are sampled with
+SAMPLE_RATES[endpoint] or DEFAULT_SAMPLE_RATE; sampled entries record their
+`sample_rate` so `count / sample_rate` estimates the real number of reads.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .context import get_current_request
+from .utils import get_client_ip, get_user_agent
+from .writer import audit_log_writer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKET_SECONDS = 300
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_MAX_RECORD_LATENCY_MS = 2
+DEFAULT_MAX_PENDING_KEYS = 10000
+
+
+class _ReadCounter:
+    __slots__ = ('count', 'first_seen', 'last_seen', 'ip_address', 'user_agent', 'sample_rate')
+
+    def __init__(self, now, ip_address, user_agent, sample_rate):
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.sample_rate = sample_rate
+
+
+class ReadAccessAggregator:
+    """
+    In-process aggregation of patient-data reads into counted VIEWED audit entries.
+    """
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._oldest_bucket = None # Oldest bucket with pending counters
+        self._force_flush = False # The counter table overflowed: write open buckets too
+        self.dropped = 0 # Reads not recorded because the latency cap was hit
+
+    # --- Configuration ---
+
+    @property
+    def config(self):
+        return getattr(settings, 'AUDIT_LOG_READ_ACCESS', {})
+
+    @property
+    def enabled(self):
+        return self.config.get('ENABLED', True)
+
+    @property
+    def bucket_seconds(self):
+        return self.config.get('BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS)
+
+    @property
+    def max_latency(self):
+        return self.config.get('MAX_RECORD_LATENCY_MS', DEFAULT_MAX_RECORD_LATENCY_MS) / 1000
+
+    def sample_rate(self, endpoint, sensitive):
+        if sensitive:
+            return 1.0 # Reads of someone else's PHI are never sampled
+        return self.config.get('SAMPLE_RATES', {}).get(endpoint, self.config.get('DEFAULT_SAMPLE_RATE', DEFAULT_SAMPLE_RATE))
+
+    # --- Recording ---
+
+    def record(self, user, patient_id, endpoint, sensitive=True, request=None):
+        """
+        Counts one read of `patient_id`'s data by `user` through `endpoint`.
+        Returns True if the read was counted (False if sampled out, disabled, or
+        dropped because the lock could not be taken within the latency cap).
+        """
+        if not self.enabled or user is None or not user.is_authenticated or patient_id is None:
+            return False
+        sample_rate = self.sample_rate(endpoint, sensitive)
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return False
+
+        now = time.time()
+        bucket = int(now // self.bucket_seconds)
+        key = (user.pk, str(patient_id), endpoint, bucket)
+        if not self._lock.acquire(timeout=self.max_latency):
+            self.dropped += 1
+            return False
+        try:
+            counter = self._counters.get(key)
+            if counter is None:
+                request = request if request is not None else get_current_request()
+                counter = self._counters[key] = _ReadCounter(
+                    now, get_client_ip(request), get_user_agent(request), sample_rate
+                )
+                if self._oldest_bucket is None:
+                    self._oldest_bucket = bucket
+            counter.count += 1
+            counter.last_seen = now
+            bucket_closed = self._oldest_bucket < bucket
+            # Too many open counters: write them early, splitting their buckets.
+            if len(self._counters) >= self.config.get('MAX_PENDING_KEYS', DEFAULT_MAX_PENDING_KEYS):
+                self._force_flush = True
+            flush_due = bucket_closed or self._force_flush
+        finally:
+            self._lock.release()
+
+        if flush_due:
+            audit_log_writer.wake()
+        return True
+
+    def detach_user(self, user_id):
+        """Moves a deleted user's pending reads to counters without a user, as their entries will have none."""
+        with self._lock:
+            for key in [key for key in self._counters if key[0] == user_id]:
+                counter = self._counters.pop(key)
+                existing = self._counters.setdefault((None,) + key[1:], counter)
+                if existing is not counter:
+                    existing.count += counter.count
+                    existing.first_seen = min(existing.first_seen, counter.first_seen)
+                    existing.last_seen = max(existing.last_seen, counter.last_seen)
+
+    # --- Flushing ---
+
+    def flush_due(self, final=False):
+        """Periodic task of the audit writer's flusher thread (see BufferedAuditLogWriter.add_periodic_task)."""
+        self.flush(force=final or self._force_flush)
+
+    def flush(self, force=False):
+        """
+        Queues one VIEWED entry per closed bucket (every bucket with `force`) on
+        the buffered audit writer, leaving the database write to the writer.
+        Returns the number of entries queued.
+        """
+        current_bucket = int(time.time() // self.bucket_seconds)
+        with self._lock:
+            ready = {key: counter for key, counter in self._counters.items() if force or key[3] < current_bucket}
+            for key in ready:
+                del self._counters[key]
+            self._oldest_bucket = min((key[3] for key in self._counters), default=None)
+            self._force_flush = False
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning("Read-access audit: %d reads were not recorded (latency cap reached).", dropped)
+        if not ready:
+            return 0
+
+        from django.contrib.contenttypes.models import ContentType
+        from patients.models import Patient
+        from .models import AuditLogAction, AuditLogEntry
+
+        patient_type = ContentType.objects.get_for_model(Patient)
+        for (user_id, patient_id, endpoint, bucket), counter in ready.items():
+            bucket_start = datetime.fromtimestamp(bucket * self.bucket_seconds, tz=dt_timezone.utc)
+            additional_info = {
+                'endpoint': endpoint,
+                'count': counter.count,
+                'bucket_start': bucket_start.isoformat(),
+                'bucket_seconds': self.bucket_seconds,
+                'last_seen': datetime.fromtimestamp(counter.last_seen, tz=dt_timezone.utc).isoformat(),
+            }
+            if counter.sample_rate < 1.0:
+                additional_info['sample_rate'] = counter.sample_rate
+            audit_log_writer.enqueue(AuditLogEntry(
+                user_id=user_id,
+                action=AuditLogAction.VIEWED.value,
+                timestamp=datetime.fromtimestamp(counter.first_seen, tz=dt_timezone.utc),
+                details=f"Patient data viewed {counter.count} time(s) via {endpoint}.",
+                ip_address=counter.ip_address,
+                user_agent=counter.user_agent,
+                target_content_type=patient_type,
+                target_object_id=patient_id,
+                target_object_repr=f"Patient ID {patient_id}",
+                additional_info=additional_info,
+            ), defer_flush=True)
+        return len(ready)
+
+
+read_access_log = ReadAccessAggregator()
+# Closed buckets are queued by the writer's flusher thread, and every pending counter when it shuts down.
+audit_log_writer.add_periodic_task(read_access_log.flush_due)
+
+
+class AuditReadAccessMixin:
+    """
+    DRF view mixin that records successful GETs of a patient's data with
+    `read_access_log`. The patient is taken from the `patient_user_id` or
+    `user__id` URL kwarg ('/me/' resolves to the requesting patient).
+    Reads of a patient's own data count as non-sensitive and are sampled.
+    """
+    audit_read_access = True
+
+    def get_audited_patient_id(self):
+        if self.kwargs.get('user__id_alt_lookup') == 'me':
+            return self.request.user.pk
+        return self.kwargs.get('patient_user_id', self.kwargs.get('user__id'))
+
+    def is_sensitive_read(self, patient_id):
+        return str(self.request.user.pk) != str(patient_id)
+
+    def get_audited_endpoint(self, request):
+        # The app's URL name, e.g. 'patients:patient-detail', is the same under every API version prefix.
+        match = request.resolver_match
+        if match is None or not match.url_name:
+            return type(self).__name__
+        return f"{match.app_name}:{match.url_name}" if match.app_name else match.url_name
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.audit_read_access and request.method == 'GET' and 200 <= response.status_code < 300:
+            patient_id = self.get_audited_patient_id()
+            endpoint = self.get_audited_endpoint(request)
+            read_access_log.record(
+                request.user, patient_id, endpoint, sensitive=self.is_sensitive_read(patient_id), request=request
+            )
+        return response
@@ -7,6 +7,44 @@ import json # For pretty printing JSON in additional_info
 
 from .models import AuditLogEntry, AuditLogAction
 
+class AuditPeriodFilter(admin.SimpleListFilter):
+    """
+    Limits the list to the hot window of recent monthly partitions unless 'All time'
+    or another date filter is chosen, so the default changelist does not scan the
+    whole audit history.
+    """
+    title = _('Period')
+    parameter_name = 'period'
+
+    def __init__(self, request, params, model, model_admin):
+        self.has_date_lookup = any(key.startswith('timestamp__') for key in request.GET)
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return (
+            ('recent', _('Recent months')),
+            ('all', _('All time')),
+        )
+
+    def value(self):
+        value = super().value()
+        if value is None and not self.has_date_lookup:
+            return 'recent'
+        return value
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() == 'recent':
+            return queryset.recent()
+        return queryset
+
 @admin.register(AuditLogEntry)
 class AuditLogEntryAdmin(admin.ModelAdmin):
     """
@@ -21,16 +59,18 @@ class AuditLogEntryAdmin(admin.ModelAdmin):
         'ip_address',
         'details_summary',
     )
-    list_filter = ('action', 'timestamp', ('user', admin.RelatedOnlyFieldListFilter), 'target_content_type')
+    list_filter = (AuditPeriodFilter, 'action', 'timestamp', ('user', admin.RelatedOnlyFieldListFilter), 'target_content_type')
     search_fields = (
         'user__email__icontains',
         'user__username__icontains',
         'details__icontains',
         'ip_address__icontains',
         'target_object_repr__icontains',
-        'user_agent__icontains'
+        'attempted_identifier',
+        'user_agent_ref__value__icontains'
     )
     ordering = ('-timestamp',)
+    show_full_result_count = False # Avoid a COUNT(*) over every partition on each page
     date_hierarchy = 'timestamp'
 
     # Define fields to be displayed in the detail view (all read-only)
@@ -43,6 +83,7 @@ class AuditLogEntryAdmin(admin.ModelAdmin):
         'user_agent',
         'target_object_link', # Custom method for link
         'target_object_repr',
+        'attempted_identifier',
         'additional_info_pretty', # Custom method for pretty JSON
     )
     # Make all fields read-only
@@ -112,5 +153,5 @@ class AuditLogEntryAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         # Optimize query by prefetching related user and content type
-        return super().get_queryset(request).select_related('user', 'target_content_type')
+        return super().get_queryset(request).select_related('user', 'target_content_type', 'user_agent_ref')
 
@@ -19,8 +19,9 @@ class AuditLogConfig(AppConfig):
         This is a good place to import signals if this app itself had models
         that needed to trigger actions based on other apps' signals, or if
         it needed to register its own signal receivers that are defined elsewhere.
-        Currently, audit_log.signals registers receivers for common Django signals
-        and model signals from other apps.
+        Currently, audit_log.signals registers receivers for common Django signals,
+        and the CRUD audit receivers are connected here, per audited model, through
+        the audit registry so that unaudited models never reach them.
         """
         try:
             # Import signals to ensure they are connected when the app is ready.
@@ -28,4 +29,13 @@ class AuditLogConfig(AppConfig):
         except ImportError:
             # Gracefully pass if signals.py has an issue or doesn't exist,
             # though it's critical for this app's functionality.
-            pass
+            return
+
+        from .registry import audit_registry
+        audit_log.signals.register_audited_models()
+        audit_registry.connect()
+
+        # Keeps the coming months' partitions created (see audit_log.partitioning).
+        from .partitioning import premake_partitions
+        from .writer import audit_log_writer
+        audit_log_writer.add_periodic_task(premake_partitions)
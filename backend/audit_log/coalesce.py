@@ -0,0 +1,108 @@
+# audit_log/coalesce.py
+"""
+Merges audit entries that describe the same change within one transaction.
+
+A single save can produce several entries for one object: the generic CRUD
+entry from audit_log.signals plus a domain entry from the app's own signals
+(e.g. CREATED + APPOINTMENT_SCHEDULED), and cascaded saves such as
+Invoice.update_invoice_totals_and_status() repeat UPDATED for the same invoice.
+EntryCoalescer keeps one entry per target and action, folding generic CRUD
+entries into a domain-specific or CREATED entry for the same target.
+"""
+
+# Plain strings rather than AuditLogAction: audit_log.models imports the writer.
+CREATED = 'CREATED'
+UPDATED = 'UPDATED'
+GENERIC_ACTIONS = (CREATED, UPDATED)
+CRUD_ACTIONS = (CREATED, UPDATED, 'DELETED')
+# Counted read entries (audit_log.access) are aggregated per user already.
+UNCOALESCED_ACTIONS = ('VIEWED',)
+
+
+def _target_key(entry):
+    if entry.target_content_type_id is None or not entry.target_object_id or entry.action in UNCOALESCED_ACTIONS:
+        return None
+    return (entry.target_content_type_id, entry.target_object_id)
+
+
+def _absorbs(existing_action, new_action):
+    """Whether an entry with `existing_action` can absorb a new entry with `new_action`."""
+    if existing_action == new_action:
+        return True
+    if new_action == UPDATED:
+        # An update of an object created (or given a domain event) in this transaction.
+        return existing_action not in CRUD_ACTIONS or existing_action == CREATED
+    if new_action == CREATED:
+        return existing_action not in CRUD_ACTIONS
+    return False
+
+
+def merge_entries(kept, other, adopt_action=False):
+    """
+    Merges `other` into `kept`. The first timestamp and request metadata are kept;
+    the latest details, representation and additional_info values win, and
+    `changed_fields` lists are combined. With `adopt_action`, `kept` takes the
+    action and details of `other` (a domain entry replacing a generic one).
+    """
+    absorbed_action = kept.action if adopt_action else other.action
+    if adopt_action:
+        kept.action = other.action
+        kept.details = other.details
+    elif kept.action == other.action:
+        kept.details = other.details
+    kept.target_object_repr = other.target_object_repr or kept.target_object_repr
+    if kept.user_id is None and other.user_id is not None:
+        kept.user = other.user
+    kept.ip_address = kept.ip_address or other.ip_address
+    kept.user_agent = kept.user_agent or other.user_agent
+
+    kept_info, other_info = kept.additional_info or {}, other.additional_info or {}
+    info = dict(kept_info)
+    info.update({key: value for key, value in other_info.items() if value is not None})
+    changed_fields = set(kept_info.get('changed_fields') or []) | set(other_info.get('changed_fields') or [])
+    if changed_fields:
+        info['changed_fields'] = sorted(changed_fields)
+    info['coalesced_count'] = kept_info.get('coalesced_count', 1) + other_info.get('coalesced_count', 1)
+    coalesced_actions = set(kept_info.get('coalesced_actions', [])) | set(other_info.get('coalesced_actions', []))
+    if absorbed_action != kept.action:
+        coalesced_actions.add(absorbed_action)
+    if coalesced_actions:
+        info['coalesced_actions'] = sorted(coalesced_actions)
+    kept.additional_info = info
+
+
+class EntryCoalescer:
+    """
+    Ordered collection of the entries queued in one transaction batch.
+    Entries without a target object, or added while `enabled` is False, are
+    never merged.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.entries = []
+        self._by_target = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        key = _target_key(entry) if self.enabled else None
+        if key is None:
+            self.entries.append(entry)
+            return
+        candidates = self._by_target.setdefault(key, [])
+        for existing in candidates:
+            if _absorbs(existing.action, entry.action):
+                merge_entries(existing, entry)
+                return
+        for existing in candidates:
+            if existing.action in GENERIC_ACTIONS and _absorbs(entry.action, existing.action):
+                merge_entries(existing, entry, adopt_action=True)
+                return
+        candidates.append(entry)
+        self.entries.append(entry)
+
+    def take(self):
+        """Returns the collected entries and empties the collection."""
+        entries, self.entries, self._by_target = self.entries, [], {}
+        return entries
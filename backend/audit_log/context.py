@@ -0,0 +1,103 @@
+# audit_log/context.py
+"""
+Per-request context used for audit attribution.
+
+The current request and its request id are kept in a ContextVar rather than
+thread-local storage, so they follow the request across `await` points in
+async views, into `sync_to_async`/`async_to_sync` calls (asgiref copies the
+context), and, via `run_in_context`/`wrap_with_context`, into work offloaded to
+thread pools. Concurrent requests served by one event loop thread each see
+their own request.
+"""
+import contextvars
+import functools
+import re
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_current_request = contextvars.ContextVar('audit_log_current_request', default=None)
+_current_request_id = contextvars.ContextVar('audit_log_current_request_id', default=None)
+
+# Incoming request ids are accepted only if they look like an id, not arbitrary header content.
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+
+def get_request_id_header():
+    """The META key of the incoming request id header, e.g. 'HTTP_X_REQUEST_ID'."""
+    return getattr(settings, 'AUDIT_LOG_REQUEST_ID_HEADER', 'HTTP_X_REQUEST_ID')
+
+
+def resolve_request_id(request):
+    """Returns the request id sent by the client/proxy, or a new random one."""
+    incoming = request.META.get(get_request_id_header(), '') if request is not None else ''
+    if incoming and _REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def request_context(request, request_id=None):
+    """
+    Makes `request` the current request for the duration of the block.
+    The previous values are restored on exit, so contexts nest safely.
+    """
+    if request_id is None:
+        request_id = resolve_request_id(request)
+    if request is not None:
+        request.request_id = request_id
+    request_token = _current_request.set(request)
+    request_id_token = _current_request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _current_request_id.reset(request_id_token)
+        _current_request.reset(request_token)
+
+
+def get_current_request():
+    """
+    Retrieves the current request object from the request context.
+    Returns None if no request is found (e.g., in a non-request context).
+    """
+    return _current_request.get()
+
+
+def get_current_user():
+    """
+    Retrieves the currently authenticated user from the current request.
+    Returns None if no request is found or if the user is not authenticated.
+    """
+    request = get_current_request()
+    if request and hasattr(request, 'user') and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+def get_request_id():
+    """Returns the id of the current request, or None outside a request."""
+    return _current_request_id.get()
+
+
+def run_in_context(func, *args, **kwargs):
+    """
+    Calls `func` in a copy of the current context. Use when submitting work to a
+    thread pool, which does not carry the caller's context by itself:
+    `executor.submit(run_in_context, func, arg)`.
+    """
+    return contextvars.copy_context().run(func, *args, **kwargs)
+
+
+def wrap_with_context(func):
+    """
+    Returns a callable that runs `func` in the context captured now, e.g. for
+    `executor.map(wrap_with_context(func), items)` or threading.Thread targets.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A Context can only be entered by one thread at a time, so run in a copy of it.
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,32 @@
+# audit_log/filters.py
+import django_filters
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import gettext_lazy as _
+
+from .models import AuditLogEntry, AuditLogAction
+
+class AuditLogEntryFilter(django_filters.FilterSet):
+    """
+    Filters for the audit log API. Each filter (alone or combined with the time
+    range) is served by one of the (…, timestamp, id) indexes on AuditLogEntry.
+    """
+    user = django_filters.NumberFilter(field_name='user_id')
+    action = django_filters.MultipleChoiceFilter(choices=AuditLogAction.choices)
+    target_content_type = django_filters.CharFilter(
+        method='filter_target_content_type', help_text=_("Target model as 'app_label.model', e.g. 'patients.patient'.")
+    )
+    target_object_id = django_filters.CharFilter()
+    since = django_filters.IsoDateTimeFilter(field_name='timestamp', lookup_expr='gte')
+    until = django_filters.IsoDateTimeFilter(field_name='timestamp', lookup_expr='lt')
+
+    class Meta:
+        model = AuditLogEntry
+        fields = ['user', 'action', 'target_content_type', 'target_object_id', 'since', 'until']
+
+    def filter_target_content_type(self, queryset, name, value):
+        app_label, _sep, model = value.lower().partition('.')
+        try:
+            content_type = ContentType.objects.get_by_natural_key(app_label, model)
+        except ContentType.DoesNotExist:
+            return queryset.none()
+        return queryset.filter(target_content_type=content_type)
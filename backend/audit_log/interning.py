@@ -0,0 +1,101 @@
+# audit_log/interning.py
+"""
+Dictionary encoding of audit log user agents.
+
+A few hundred distinct User-Agent strings cover nearly all traffic, so audit
+entries reference a UserAgent row by id instead of repeating the text. The
+buffered writer interns each batch just before bulk_create: ids come from a
+process-local LRU, and only strings missing from it cost one lookup query (plus
+one insert for strings never seen before) per batch, not per entry.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def user_agent_digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """A small thread-safe least-recently-used mapping."""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def update(self, items):
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_agent_ids = LRUCache(getattr(settings, 'AUDIT_LOG_BUFFER', {}).get('USER_AGENT_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+
+def intern_user_agents(entries, using):
+    """
+    Sets `user_agent_ref_id` on each unsaved entry from the user agent string it
+    was created with, creating missing UserAgent rows. Must run inside the
+    transaction that writes the entries; new ids only enter the LRU once that
+    transaction commits, so a rollback cannot leave dangling ids in the cache.
+    """
+    from .models import UserAgent
+
+    pending = {}
+    for entry in entries:
+        value = entry.__dict__.get('_user_agent_value')
+        if value is None:
+            continue # Loaded from the database or already resolved
+        if not value:
+            entry.user_agent_ref_id = None
+            continue
+        pending.setdefault(value, []).append(entry)
+    if not pending:
+        return
+
+    ids = {}
+    missing = {}
+    for value in pending:
+        cached = user_agent_ids.get(value)
+        if cached is None:
+            missing[user_agent_digest(value)] = value
+        else:
+            ids[value] = cached
+
+    if missing:
+        manager = UserAgent._default_manager.using(using)
+        found = dict(manager.filter(digest__in=list(missing)).values_list('digest', 'id'))
+        new_digests = [digest for digest in missing if digest not in found]
+        if new_digests:
+            # ignore_conflicts: another worker may insert the same string concurrently.
+            manager.bulk_create(
+                [UserAgent(digest=digest, value=missing[digest]) for digest in new_digests], ignore_conflicts=True
+            )
+            found.update(manager.filter(digest__in=new_digests).values_list('digest', 'id'))
+        resolved = {missing[digest]: pk for digest, pk in found.items()}
+        ids.update(resolved)
+        transaction.on_commit(lambda: user_agent_ids.update(resolved), using=using)
+
+    for value, group in pending.items():
+        for entry in group:
+            entry.user_agent_ref_id = ids[value]
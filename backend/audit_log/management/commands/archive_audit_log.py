@@ -0,0 +1,83 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from audit_log.models import AuditLogEntry
+from audit_log.partitioning import (
+    DEFAULT_RETENTION_MONTHS, add_months, archive_month, ensure_partitions,
+    get_partitioning_config, list_months, month_start,
+)
+
+
+class Command(BaseCommand):
+    """
+    Maintains the monthly audit log partitions: pre-creates the partitions for
+    the coming months, then archives every month older than the retention period
+    to a compressed JSON-lines file and removes it from the database once the
+    archived row count has been verified.
+
+    Run it monthly (e.g. from cron on the 1st). Future partitions do not depend on
+    it: the audit writer's flusher also creates them daily (see
+    audit_log.partitioning.premake_partitions).
+    """
+    help = "Archives audit log months older than the retention period to .jsonl.gz files and drops them."
+
+    def add_arguments(self, parser):
+        config = get_partitioning_config()
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            default=config.get('RETENTION_MONTHS', DEFAULT_RETENTION_MONTHS),
+            help="Number of months (including the current one) to keep in the database.",
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help="Directory for the archive files. Defaults to AUDIT_LOG_PARTITIONING['ARCHIVE_DIR'].",
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help="Write the archive files but keep the rows in the database.",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only list the months that would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        retention_months = options['retention_months']
+        if retention_months < 1:
+            raise CommandError("--retention-months must be at least 1.")
+        archive_dir = options['archive_dir'] or get_partitioning_config().get('ARCHIVE_DIR')
+        if not archive_dir:
+            raise CommandError("No archive directory given and AUDIT_LOG_PARTITIONING['ARCHIVE_DIR'] is not set.")
+        archive_dir = Path(archive_dir)
+
+        if not options['dry_run']:
+            created = ensure_partitions(AuditLogEntry)
+            if created:
+                self.stdout.write(f"Partitions present up to {created[-1]:%Y-%m}.")
+
+        cutoff = add_months(month_start(timezone.localdate()), -(retention_months - 1))
+        months = [month for month in list_months(AuditLogEntry) if month < cutoff]
+        if not months:
+            self.stdout.write(f"No audit log months before {cutoff:%Y-%m} to archive.")
+            return
+
+        total = 0
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {month:%Y-%m}.")
+                continue
+            try:
+                archive_path, archived = archive_month(AuditLogEntry, month, archive_dir, drop=not options['keep'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Failed to archive audit log month {month:%Y-%m}: {e}") from e
+            total += archived
+            self.stdout.write(f"Archived {archived} entries for {month:%Y-%m} to {archive_path}.")
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Archived {total} audit log entries from {len(months)} month(s)."))
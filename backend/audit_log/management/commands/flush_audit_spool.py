@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_log.writer import audit_log_writer
+
+
+class Command(BaseCommand):
+    """
+    Replays audit log entries that the buffered writer spooled to disk because
+    they could not be written to the database (e.g. during an outage or a
+    worker shutdown), then removes the replayed spool files.
+    """
+    help = "Writes spooled audit log entries to the database and removes the spool files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spool-dir',
+            default=None,
+            help="Directory containing audit-spool-*.jsonl files. Defaults to AUDIT_LOG_BUFFER['SPOOL_DIR'].",
+        )
+
+    def handle(self, *args, **options):
+        spool_dir = Path(options['spool_dir']) if options['spool_dir'] else audit_log_writer.spool_dir
+        if not spool_dir.is_dir():
+            self.stdout.write(f"No spool directory at {spool_dir}; nothing to replay.")
+            return
+
+        # Files of an earlier replay that failed midway are picked up too (see BufferedAuditLogWriter.replay_spool()).
+        spool_files = sorted(spool_dir.glob('audit-spool-*.jsonl')) + sorted(spool_dir.glob('audit-spool-*.replaying'))
+        if not spool_files:
+            self.stdout.write("No spooled audit log entries found.")
+            return
+
+        total = 0
+        for spool_file in spool_files:
+            try:
+                written = audit_log_writer.replay_spool(spool_file)
+            except Exception as e:
+                raise CommandError(f"Failed to replay {spool_file}: {e}") from e
+            total += written
+            self.stdout.write(f"Replayed {written} entries from {spool_file.name}.")
+        self.stdout.write(self.style.SUCCESS(f"Replayed {total} spooled audit log entries."))
@@ -1,48 +1,56 @@
 # audit_log/middleware.py
-import threading
-from django.utils.deprecation import MiddlewareMixin
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import HttpResponseBase
 
-# Thread-local storage for holding the current request.
-# This allows access to the request object (and thus the user)
-# in places where it's not directly available, like model signals.
-_thread_locals = threading.local()
+from .context import get_current_request, get_current_user, get_request_id, request_context # noqa: F401 (re-exported)
+from .writer import audit_log_writer
 
-class AuditLogMiddleware(MiddlewareMixin):
+class AuditLogMiddleware:
     """
-    Middleware to store the current request in thread-local storage.
-    This makes the request object accessible globally within the current thread,
-    which is useful for audit logging purposes, especially in signal handlers
-    where the request object isn't passed directly.
+    Middleware to store the current request (and a request id) in the audit request
+    context (see audit_log.context). This makes the request object accessible to
+    code running for that request, which is useful for audit logging purposes,
+    especially in signal handlers where the request object isn't passed directly.
+
+    Works in both sync (WSGI) and async (ASGI) middleware chains: Django picks the
+    matching mode, so async views are not forced through a thread.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        super().__init__(get_response)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         """
-        Processes the request. Stores the request in thread-local storage
-        before handling the request and clears it after the response is generated.
+        Processes the request with the request set as current, clearing it after
+        the response is generated. Audit entries still pending for an open
+        transaction are handed to the buffered writer once the response is ready.
         """
-        _thread_locals.request = request
-        response = self.get_response(request)
-        # Clean up the thread-local storage after the request is processed.
-        if hasattr(_thread_locals, 'request'):
-            del _thread_locals.request
-        return response
+        if self.async_mode:
+            return self.__acall__(request)
+        with request_context(request) as request_id:
+            try:
+                response = self.get_response(request)
+            finally:
+                audit_log_writer.flush_pending()
+        return self._add_request_id_header(response, request_id)
 
-def get_current_request():
-    """
-    Retrieves the current request object from thread-local storage.
-    Returns None if no request is found (e.g., in a non-request context).
-    """
-    return getattr(_thread_locals, 'request', None)
+    async def __acall__(self, request):
+        with request_context(request) as request_id:
+            try:
+                response = await self.get_response(request)
+            finally:
+                # Pending batches belong to the thread that ran the ORM calls; thread-sensitive
+                # sync_to_async runs on that same thread.
+                await sync_to_async(audit_log_writer.flush_pending)()
+        return self._add_request_id_header(response, request_id)
 
-def get_current_user():
-    """
-    Retrieves the currently authenticated user from the current request.
-    Returns None if no request is found or if the user is not authenticated.
-    """
-    request = get_current_request()
-    if request and hasattr(request, 'user') and request.user.is_authenticated:
-        return request.user
-    return None
+    @staticmethod
+    def _add_request_id_header(response, request_id):
+        if isinstance(response, HttpResponseBase) and not response.has_header('X-Request-ID'):
+            response['X-Request-ID'] = request_id
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-16 20:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_log', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlogentry',
+            name='attempted_identifier',
+            field=models.CharField(blank=True, help_text='Normalized email or username submitted with a failed login attempt.', max_length=254, verbose_name='Attempted Identifier'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(condition=models.Q(('action', 'LOGIN_FAILED')), fields=['attempted_identifier', 'timestamp'], name='auditlog_failed_ident_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(condition=models.Q(('action', 'LOGIN_FAILED')), fields=['ip_address', 'timestamp'], name='auditlog_failed_ip_idx'),
+        ),
+    ]
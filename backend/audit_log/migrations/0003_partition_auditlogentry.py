@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def partition_audit_log(apps, schema_editor):
+    """Converts the audit log table to monthly range partitions (PostgreSQL only)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return # Other backends use logical monthly partitions; see audit_log.partitioning
+    from audit_log.partitioning import convert_to_partitioned
+    convert_to_partitioned(schema_editor, apps.get_model('audit_log', 'AuditLogEntry'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_log', '0002_failed_login_identifier'),
+    ]
+
+    operations = [
+        # The partitioned table keeps the same columns and indexes, so the reverse
+        # migration leaves it in place.
+        migrations.RunPython(partition_audit_log, migrations.RunPython.noop),
+    ]
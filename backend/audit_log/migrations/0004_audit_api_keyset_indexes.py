@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-16 21:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_log', '0003_partition_auditlogentry'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='auditlogentry',
+            name='auditlog_target_idx',
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(fields=['-timestamp', '-id'], name='auditlog_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='auditlog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(fields=['action', '-timestamp', '-id'], name='auditlog_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(fields=['target_content_type', 'target_object_id', '-timestamp', '-id'], name='auditlog_target_ts_idx'),
+        ),
+    ]
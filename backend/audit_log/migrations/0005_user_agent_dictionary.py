@@ -0,0 +1,91 @@
+# Generated by Django 5.1.7 on 2026-10-16 21:05
+
+import django.db.models.deletion
+import hashlib
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def update_from_user_agents(schema_editor, AuditLogEntry, UserAgent, set_clause, join_clause, where_clause):
+    """Runs one set-based UPDATE of the audit table joined with the user agent table."""
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"UPDATE {quote(AuditLogEntry._meta.db_table)} AS entry SET {set_clause} "
+        f"FROM {quote(UserAgent._meta.db_table)} AS ua WHERE {join_clause} AND {where_clause}"
+    )
+
+
+def encode_user_agents(apps, schema_editor):
+    """
+    Moves each distinct user_agent string into UserAgent and points entries at it,
+    with one scan for the distinct strings, batched inserts, and a single joined
+    UPDATE rather than one UPDATE (and full scan of the unindexed column) per string.
+    """
+    AuditLogEntry = apps.get_model('audit_log', 'AuditLogEntry')
+    UserAgent = apps.get_model('audit_log', 'UserAgent')
+    db_alias = schema_editor.connection.alias
+    entries = AuditLogEntry.objects.using(db_alias)
+    values = entries.exclude(user_agent='').values_list('user_agent', flat=True).order_by().distinct()
+    UserAgent.objects.using(db_alias).bulk_create(
+        (UserAgent(digest=hashlib.sha256(value.encode('utf-8')).hexdigest(), value=value) for value in values.iterator()),
+        batch_size=BATCH_SIZE,
+    )
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'): # Both support UPDATE ... FROM
+        update_from_user_agents(
+            schema_editor, AuditLogEntry, UserAgent,
+            'user_agent_ref_id = ua.id', 'ua.value = entry.user_agent', "entry.user_agent <> ''",
+        )
+    else:
+        entries.exclude(user_agent='').update(user_agent_ref=models.Subquery(
+            UserAgent.objects.using(db_alias).filter(value=models.OuterRef('user_agent')).values('pk')[:1]
+        ))
+
+
+def decode_user_agents(apps, schema_editor):
+    AuditLogEntry = apps.get_model('audit_log', 'AuditLogEntry')
+    UserAgent = apps.get_model('audit_log', 'UserAgent')
+    db_alias = schema_editor.connection.alias
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        update_from_user_agents(
+            schema_editor, AuditLogEntry, UserAgent,
+            'user_agent = ua.value', 'ua.id = entry.user_agent_ref_id', 'entry.user_agent_ref_id IS NOT NULL',
+        )
+    else:
+        AuditLogEntry.objects.using(db_alias).filter(user_agent_ref__isnull=False).update(user_agent=models.Subquery(
+            UserAgent.objects.using(db_alias).filter(pk=models.OuterRef('user_agent_ref')).values('value')[:1]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_log', '0004_audit_api_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='SHA-256 of the user agent string, used for lookups.', max_length=64, unique=True, verbose_name='Digest')),
+                ('value', models.TextField(verbose_name='User Agent')),
+            ],
+            options={
+                'verbose_name': 'User Agent',
+                'verbose_name_plural': 'User Agents',
+            },
+        ),
+        migrations.AddField(
+            model_name='auditlogentry',
+            name='user_agent_ref',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='The User-Agent string of the client. Null when none was sent.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='audit_log.useragent', verbose_name='User Agent'),
+        ),
+        migrations.RunPython(encode_user_agents, decode_user_agents),
+        migrations.RemoveField(
+            model_name='auditlogentry',
+            name='user_agent',
+        ),
+    ]
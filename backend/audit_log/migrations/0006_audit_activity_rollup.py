@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_log', '0005_user_agent_dictionary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('CREATED', 'Created Record'), ('UPDATED', 'Updated Record'), ('DELETED', 'Deleted Record'), ('VIEWED', 'Viewed Record'), ('LOGIN_SUCCESS', 'Login Successful'), ('LOGIN_FAILED', 'Login Failed'), ('LOGOUT', 'Logout'), ('PASSWORD_CHANGED', 'Password Changed'), ('PASSWORD_RESET_REQUESTED', 'Password Reset Requested'), ('PASSWORD_RESET_COMPLETED', 'Password Reset Completed'), ('USER_REGISTERED', 'User Registered'), ('USER_PROFILE_UPDATED', 'User Profile Updated by Self'), ('ADMIN_USER_UPDATED', 'User Profile Updated by Admin'), ('ADMIN_USER_DELETED', 'User Account Deleted by Admin'), ('APPOINTMENT_SCHEDULED', 'Appointment Scheduled'), ('APPOINTMENT_UPDATED', 'Appointment Updated'), ('APPOINTMENT_CANCELLED', 'Appointment Cancelled'), ('APPOINTMENT_COMPLETED', 'Appointment Marked Completed'), ('APPOINTMENT_RESCHEDULED', 'Appointment Rescheduled'), ('INVOICE_GENERATED', 'Invoice Generated'), ('INVOICE_SENT', 'Invoice Sent'), ('INVOICE_UPDATED', 'Invoice Updated'), ('INVOICE_VOIDED', 'Invoice Voided'), ('PAYMENT_RECORDED', 'Payment Recorded'), ('PAYMENT_UPDATED', 'Payment Updated'), ('PAYMENT_DELETED', 'Payment Deleted'), ('PRESCRIPTION_ISSUED', 'Prescription Issued'), ('PRESCRIPTION_UPDATED', 'Prescription Updated'), ('PRESCRIPTION_DELETED', 'Prescription Deleted'), ('TREATMENT_RECORDED', 'Treatment Recorded'), ('TREATMENT_UPDATED', 'Treatment Updated'), ('TREATMENT_DELETED', 'Treatment Deleted'), ('OBSERVATION_LOGGED', 'Observation Logged'), ('OBSERVATION_UPDATED', 'Observation Updated'), ('OBSERVATION_DELETED', 'Observation Deleted'), ('PATIENT_PROFILE_CREATED', 'Patient Profile Created'), ('PATIENT_PROFILE_UPDATED', 'Patient Profile Updated'), ('MEDICAL_RECORD_CREATED', 'Medical Record Created'), ('MEDICAL_RECORD_UPDATED', 'Medical Record Updated'), ('MEDICAL_RECORD_DELETED', 'Medical Record Deleted'), ('TELEMED_SESSION_CREATED', 'Telemedicine Session Created'), ('TELEMED_SESSION_UPDATED', 'Telemedicine Session Updated'), ('TELEMED_SESSION_CANCELLED', 'Telemedicine Session Cancelled'), ('TELEMED_SESSION_COMPLETED', 'Telemedicine Session Completed'), ('TELEMED_SESSION_DELETED', 'Telemedicine Session Deleted'), ('INQUIRY_SUBMITTED', 'Inquiry Submitted'), ('INQUIRY_UPDATED', 'Inquiry Updated'), ('INQUIRY_CLOSED', 'Inquiry Closed'), ('INQUIRY_DELETED', 'Inquiry Deleted by Admin'), ('ADMIN_ACTION', 'Admin General Action'), ('SYSTEM_EVENT', 'System Event')], max_length=50, verbose_name='Action Performed')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Audit Activity Rollup',
+                'verbose_name_plural': 'Audit Activity Rollups',
+                'constraints': [models.UniqueConstraint(fields=('date', 'user', 'action'), name='auditrollup_date_user_action_uniq')],
+            },
+        ),
+    ]
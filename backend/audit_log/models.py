@@ -6,6 +6,10 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 
+from .writer import audit_log_writer
+from .partitioning import hot_window_start
+from .context import get_request_id
+
 class AuditLogAction(models.TextChoices):
     """
     Defines the set of actions that can be logged in the audit trail.
@@ -80,10 +84,67 @@ class AuditLogAction(models.TextChoices):
     ADMIN_ACTION = 'ADMIN_ACTION', _('Admin General Action')
     SYSTEM_EVENT = 'SYSTEM_EVENT', _('System Event')
 
+class UserAgent(models.Model):
+    """
+    A distinct User-Agent string, referenced by audit log entries by id
+    (dictionary encoding; see audit_log.interning).
+    """
+    digest = models.CharField(
+        max_length=64, unique=True, verbose_name=_("Digest"),
+        help_text=_("SHA-256 of the user agent string, used for lookups.")
+    )
+    value = models.TextField(verbose_name=_("User Agent"))
+
+    class Meta:
+        verbose_name = _("User Agent")
+        verbose_name_plural = _("User Agents")
+
+    def __str__(self):
+        return self.value
+
+class AuditActivityRollup(models.Model):
+    """
+    Number of audit log entries recorded per user, action and (local) day.
+    Maintained incrementally by the buffered audit writer's background thread
+    from the batches it has written (see audit_log.rollup) and rebuilt with `manage.py rollup_audit_activity`;
+    rollups outlive the archived months of the audit log itself.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_("User")
+    )
+    action = models.CharField(max_length=50, choices=AuditLogAction.choices, verbose_name=_("Action Performed"))
+    date = models.DateField(verbose_name=_("Date"))
+    count = models.PositiveIntegerField(default=0, verbose_name=_("Count"))
+
+    class Meta:
+        verbose_name = _("Audit Activity Rollup")
+        verbose_name_plural = _("Audit Activity Rollups")
+        constraints = [
+            # Leads with date, so date-range reports are a single index range scan.
+            models.UniqueConstraint(fields=['date', 'user', 'action'], name='auditrollup_date_user_action_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - User ID {self.user_id} - {self.action}: {self.count}"
+
+class AuditLogEntryQuerySet(models.QuerySet):
+    def recent(self, months=None):
+        """
+        Limits the queryset to the hot window (AUDIT_LOG_PARTITIONING['HOT_MONTHS']),
+        so PostgreSQL only scans the most recent monthly partitions.
+        """
+        return self.filter(timestamp__gte=hot_window_start(months))
+
 class AuditLogEntry(models.Model):
     """
     Represents a single entry in the audit log.
     Records user actions, system events, and changes to data.
+    On PostgreSQL the table is range-partitioned by month on `timestamp`
+    (see audit_log.partitioning); old months are archived with
+    `manage.py archive_audit_log`.
     """
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -112,9 +173,14 @@ class AuditLogEntry(models.Model):
         null=True, blank=True, verbose_name=_("IP Address"),
         help_text=_("The IP address from which the action was performed.")
     )
-    user_agent = models.TextField(
-        blank=True, verbose_name=_("User Agent"),
-        help_text=_("The User-Agent string of the client.")
+    user_agent_ref = models.ForeignKey(
+        UserAgent,
+        on_delete=models.PROTECT,
+        null=True, blank=True,
+        db_index=False, # Never filtered on directly; keeps the audit table's indexes small
+        related_name='+',
+        verbose_name=_("User Agent"),
+        help_text=_("The User-Agent string of the client. Null when none was sent.")
     )
     # Generic relation to link to any model instance
     target_content_type = models.ForeignKey(
@@ -137,14 +203,49 @@ class AuditLogEntry(models.Model):
         null=True, blank=True, verbose_name=_("Additional Information"),
         help_text=_("A JSON field to store any extra structured data related to the audit log entry.")
     )
+    attempted_identifier = models.CharField(
+        max_length=254, blank=True, verbose_name=_("Attempted Identifier"),
+        help_text=_("Normalized email or username submitted with a failed login attempt.")
+    )
+
+    objects = AuditLogEntryQuerySet.as_manager()
+
+    @property
+    def user_agent(self):
+        """The client's User-Agent string ('' if none). Select related 'user_agent_ref' when listing."""
+        pending = self.__dict__.get('_user_agent_value')
+        if pending is not None:
+            return pending
+        return self.user_agent_ref.value if self.user_agent_ref_id else ''
+
+    @user_agent.setter
+    def user_agent(self, value):
+        # Resolved to a UserAgent id by the buffered writer when the entry is written.
+        self._user_agent_value = value or ''
 
     class Meta:
         verbose_name = _("Audit Log Entry")
         verbose_name_plural = _("Audit Log Entries")
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['target_content_type', 'target_object_id'], name='auditlog_target_idx'),
             models.Index(fields=['user', 'action'], name='auditlog_user_action_idx'),
+            # Keyset pagination indexes for the audit API: each filter followed by the
+            # (timestamp, id) page order, so every page is a single index range scan.
+            models.Index(fields=['-timestamp', '-id'], name='auditlog_ts_id_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='auditlog_user_ts_idx'),
+            models.Index(fields=['action', '-timestamp', '-id'], name='auditlog_action_ts_idx'),
+            models.Index(
+                fields=['target_content_type', 'target_object_id', '-timestamp', '-id'], name='auditlog_target_ts_idx'
+            ), # Replaces auditlog_target_idx, which it covers
+            # Partial indexes for failed-login security queries (by account or by source IP)
+            models.Index(
+                fields=['attempted_identifier', 'timestamp'], name='auditlog_failed_ident_idx',
+                condition=models.Q(action='LOGIN_FAILED')
+            ),
+            models.Index(
+                fields=['ip_address', 'timestamp'], name='auditlog_failed_ip_idx',
+                condition=models.Q(action='LOGIN_FAILED')
+            ),
             # timestamp is already indexed due to ordering and date_hierarchy in admin
         ]
 
@@ -164,19 +265,25 @@ def create_audit_log_entry(
     additional_info: dict = None,
     target_content_type: ContentType = None,
     target_object_id = None, # Allow str or int
-    target_object_repr: str = None
+    target_object_repr: str = None,
+    attempted_identifier: str = ''
 ):
     """
     Helper function to create an AuditLogEntry.
     Simplifies the process of logging actions throughout the application.
+    The entry is queued on the buffered audit writer (see audit_log.writer) and
+    written in a batch once the surrounding transaction commits, rather than
+    being inserted immediately. Inside a request, the request id is recorded in
+    additional_info['request_id'] for correlation.
     """
     log_entry_data = {
         'user': user,
         'action': action.value if isinstance(action, AuditLogAction) else str(action),
         'details': details,
         'ip_address': ip_address,
-        'user_agent': user_agent,
+        'user_agent': user_agent or '', # Interned to a UserAgent row when the batch is written
         'additional_info': additional_info or {}, # Ensure it's a dict, not None
+        'attempted_identifier': (attempted_identifier or '').strip().lower()[:254],
     }
 
     if target_object:
@@ -188,4 +295,10 @@ def create_audit_log_entry(
         log_entry_data['target_object_id'] = str(target_object_id) # Ensure ID is string
         log_entry_data['target_object_repr'] = target_object_repr[:255] if target_object_repr else f"{target_content_type.model} ID: {target_object_id}"
     
-    AuditLogEntry.objects.create(**log_entry_data)
+    request_id = get_request_id()
+    if request_id and 'request_id' not in log_entry_data['additional_info']:
+        log_entry_data['additional_info'] = {**log_entry_data['additional_info'], 'request_id': request_id}
+
+    entry = AuditLogEntry(**log_entry_data)
+    audit_log_writer.enqueue(entry)
+    return entry
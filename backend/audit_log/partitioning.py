@@ -0,0 +1,301 @@
+# audit_log/partitioning.py
+"""
+Monthly partitioning and archiving of the audit log table.
+
+On PostgreSQL the table is natively range-partitioned by month on `timestamp`
+(see migration 0003); each month lives in its own child table named
+`<table>_pYYYYMM`, with a DEFAULT partition catching anything outside the
+pre-created range. On other backends a month is a logical partition: the same
+timestamp range on the single table. Both paths expose the same operations so
+`manage.py archive_audit_log` works everywhere.
+
+Future partitions are created once a day by premake_partitions(), a periodic task
+of the audit writer's flusher thread, and again whenever archive_audit_log runs,
+each time PREMAKE_MONTHS ahead of the current month. If entries still reach the
+DEFAULT partition for a month without its own partition (e.g. no worker ran for
+that long), they are moved into the month's partition when it is created.
+"""
+import datetime
+import gzip
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers import serialize
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOT_MONTHS = 3
+DEFAULT_RETENTION_MONTHS = 24
+DEFAULT_PREMAKE_MONTHS = 3
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+def get_partitioning_config():
+    return getattr(settings, 'AUDIT_LOG_PARTITIONING', {})
+
+
+def month_start(value):
+    """Returns the first day of the month containing `value` (a date or datetime)."""
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Shifts a first-of-month date by `count` months (may be negative)."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Returns the aware [start, end) datetimes of a month in the current time zone."""
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime(month.year, month.month, 1, tzinfo=tz)
+    next_month = add_months(month, 1)
+    return start, datetime.datetime(next_month.year, next_month.month, 1, tzinfo=tz)
+
+
+def hot_window_start(months=None):
+    """Start of the 'hot' window that routine queries are limited to."""
+    if months is None:
+        months = get_partitioning_config().get('HOT_MONTHS', DEFAULT_HOT_MONTHS)
+    return month_bounds(add_months(month_start(timezone.localdate()), -(months - 1)))[0]
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+# --- Native (PostgreSQL) partitions ---
+
+def is_natively_partitioned(model, using=None):
+    """Whether the model's table is a PostgreSQL partitioned table."""
+    connection = connections[using or router.db_for_write(model)]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def create_month_partition(connection, table, month):
+    """
+    Creates the child table for `month` if it does not exist yet. PostgreSQL refuses
+    to create a partition for rows the DEFAULT partition already holds, so any such
+    rows are moved into the new partition, with DEFAULT detached meanwhile.
+    """
+    partition = partition_name(table, month)
+    default = f"{table}_pdefault"
+    start, end = month_bounds(month)
+    qn = lambda name: _quote(connection, name)
+    create_sql = f"CREATE TABLE {qn(partition)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)"
+    in_month = "timestamp >= %s AND timestamp < %s"
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s), to_regclass(%s)", [partition, default])
+        partition_exists, default_exists = cursor.fetchone()
+        if partition_exists is not None:
+            return
+        if default_exists is not None:
+            cursor.execute(f"SELECT 1 FROM {qn(default)} WHERE {in_month} LIMIT 1", [start, end])
+            default_exists = cursor.fetchone() is not None
+        if not default_exists:
+            cursor.execute(create_sql, [start, end])
+            return
+        cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}")
+        cursor.execute(create_sql, [start, end])
+        cursor.execute(f"INSERT INTO {qn(partition)} SELECT * FROM {qn(default)} WHERE {in_month}", [start, end])
+        moved = cursor.rowcount
+        cursor.execute(f"DELETE FROM {qn(default)} WHERE {in_month}", [start, end])
+        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT")
+    logger.info("Moved %d audit log entries for %s out of the DEFAULT partition.", moved, f"{month:%Y-%m}")
+
+
+def ensure_partitions(model, months_ahead=None, using=None):
+    """
+    Makes sure partitions exist from the current month to `months_ahead` months
+    ahead, so new entries never land in the DEFAULT partition. No-op on backends
+    without native partitioning. Returns the months checked.
+    """
+    if months_ahead is None:
+        months_ahead = get_partitioning_config().get('PREMAKE_MONTHS', DEFAULT_PREMAKE_MONTHS)
+    using = using or router.db_for_write(model)
+    if not is_natively_partitioned(model, using):
+        return []
+    connection = connections[using]
+    current = month_start(timezone.localdate())
+    months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+    for month in months:
+        create_month_partition(connection, model._meta.db_table, month)
+    return months
+
+
+_premade_on = None
+
+
+def premake_partitions(final=False):
+    """
+    Periodic task of the audit writer's flusher thread (registered in
+    AuditLogConfig.ready): runs ensure_partitions() for the audit log once a day,
+    so partitions exist months before entries for them are written even when
+    archive_audit_log is not scheduled.
+    """
+    global _premade_on
+    today = timezone.localdate()
+    if final or _premade_on == today:
+        return
+    # Set first, so a failing database is retried the next day rather than on every flush check.
+    _premade_on = today
+    from .models import AuditLogEntry
+    ensure_partitions(AuditLogEntry)
+
+
+def convert_to_partitioned(schema_editor, model):
+    """
+    Rebuilds the audit log table as a table range-partitioned by month on
+    `timestamp`, copying existing rows and recreating its indexes and foreign
+    keys. The primary key becomes (id, timestamp), as PostgreSQL requires the
+    partition key in unique constraints; Django keeps addressing rows by id.
+    Used by migration 0003 on PostgreSQL only.
+    """
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    legacy = f"{table}_legacy"
+    qn = lambda name: _quote(connection, name)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [table, f"{table}_pkey"]
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'", [table]
+        )
+        is_identity = cursor.fetchone()[0] in ('a', 'd')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT MIN(timestamp) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} ("
+            f"LIKE {qn(legacy)} INCLUDING DEFAULTS {'INCLUDING IDENTITY' if is_identity else ''}, "
+            f"PRIMARY KEY (id, timestamp)"
+            f") PARTITION BY RANGE (timestamp)"
+        )
+        cursor.execute(f"CREATE TABLE {qn(table + '_pdefault')} PARTITION OF {qn(table)} DEFAULT")
+
+    current = month_start(timezone.localdate())
+    month = month_start(timezone.localtime(oldest)) if oldest else current
+    while month <= add_months(current, DEFAULT_PREMAKE_MONTHS):
+        create_month_partition(connection, table, month)
+        month = add_months(month, 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        if is_identity:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) "
+                f"FROM {qn(table)}", [table]
+            )
+        elif sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id")
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+        for definition in index_definitions:
+            # Read before the rename, so they already name the new table. Indexes created
+            # on the parent cascade to every current and future partition.
+            cursor.execute(definition)
+
+    for field in model._meta.concrete_fields:
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(schema_editor._create_fk_sql(
+                model, field, "_fk_%(to_table)s_%(to_column)s"
+            ))
+
+
+# --- Archiving (both backends) ---
+
+def list_months(model, using=None):
+    """Months that currently hold audit entries, oldest first."""
+    queryset = model._default_manager.using(using or router.db_for_read(model))
+    return [month_start(value) for value in queryset.dates('timestamp', 'month', order='ASC')]
+
+
+def archive_month(model, month, archive_dir, drop=True, using=None):
+    """
+    Streams one month of audit entries to `<archive_dir>/<table>_pYYYYMM.jsonl.gz`
+    (one serialized entry per line), then removes them from the database after
+    checking that the number of rows removed matches the number archived.
+
+    On PostgreSQL the month's partition is detached, counted and dropped; on other
+    backends the rows are deleted by timestamp range. Either way this happens in
+    one transaction, so if the counts differ nothing is removed and a ValueError
+    is raised; the archive file is kept for inspection.
+
+    Returns:
+        tuple: (archive path, number of entries archived)
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    start, end = month_bounds(month)
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = archive_dir / f"{partition_name(table, month)}.jsonl.gz"
+
+    queryset = model._default_manager.using(using).filter(timestamp__gte=start, timestamp__lt=end).order_by('pk')
+    archived = 0
+    with gzip.open(archive_path, 'wt', encoding='utf-8') as archive_file:
+        # iterator() streams rows with a server-side cursor instead of loading the month.
+        for entry in queryset.iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+            record = serialize('python', [entry])[0]
+            archive_file.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            archived += 1
+
+    if not drop:
+        return archive_path, archived
+
+    if is_natively_partitioned(model, using):
+        _drop_native_partition(connection, table, month, archived)
+    else:
+        with transaction.atomic(using=using):
+            removed, _ = queryset.delete()
+            if removed != archived:
+                raise ValueError(
+                    f"Archived {archived} audit entries for {month:%Y-%m} but {removed} would be removed; rolled back."
+                )
+    logger.info("Archived %d audit log entries for %s to %s.", archived, f"{month:%Y-%m}", archive_path)
+    return archive_path, archived
+
+
+def _drop_native_partition(connection, table, month, archived):
+    partition = partition_name(table, month)
+    qn = lambda name: _quote(connection, name)
+    # One transaction: if the counts differ, rolling back re-attaches the partition.
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [partition])
+        if cursor.fetchone()[0] is None:
+            # Rows for a month without its own partition live in the DEFAULT partition.
+            start, end = month_bounds(month)
+            cursor.execute(f"DELETE FROM {qn(table)} WHERE timestamp >= %s AND timestamp < %s", [start, end])
+            removed = cursor.rowcount
+        else:
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(partition)}")
+            cursor.execute(f"SELECT COUNT(*) FROM {qn(partition)}")
+            removed = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE {qn(partition)}")
+        if removed != archived:
+            raise ValueError(
+                f"Archived {archived} audit entries for {month:%Y-%m} but {removed} would be removed; rolled back."
+            )
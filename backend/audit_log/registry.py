@@ -0,0 +1,103 @@
+# audit_log/registry.py
+import logging
+
+from django.apps import apps
+from django.db.models.signals import post_save, pre_delete
+
+from .models import AuditLogAction
+
+logger = logging.getLogger(__name__)
+
+CRUD_ACTIONS = (AuditLogAction.CREATED, AuditLogAction.UPDATED, AuditLogAction.DELETED)
+
+
+class AuditedModelConfig:
+    """
+    Per-model audit settings.
+
+    Args:
+        model: The model class being audited.
+        fields (list, optional): Field names whose values are captured in
+            `additional_info['fields']`. When set, saves made with `update_fields`
+            that touch none of these fields are not audited. None captures no
+            values and audits every save.
+        actions (list, optional): Subset of CREATED, UPDATED and DELETED to emit.
+            Defaults to all three.
+    """
+    def __init__(self, model, fields=None, actions=None):
+        self.model = model
+        self.fields = tuple(fields) if fields is not None else None
+        self.actions = frozenset(AuditLogAction(action) for action in (actions or CRUD_ACTIONS))
+
+    def emits(self, action):
+        return action in self.actions
+
+    def is_relevant_update(self, update_fields):
+        """Whether a save restricted to `update_fields` should be audited."""
+        if self.fields is None or not update_fields:
+            return True
+        return not set(self.fields).isdisjoint(update_fields)
+
+    def capture(self, instance):
+        """Returns the configured field values of `instance` as JSON-friendly strings."""
+        if not self.fields:
+            return None
+        captured = {}
+        for field_name in self.fields:
+            field = instance._meta.get_field(field_name)
+            value = getattr(instance, field.attname, None)
+            captured[field_name] = str(value) if value is not None else None
+        return captured
+
+
+class AuditRegistry:
+    """
+    Registry of models audited for CRUD actions.
+    Receivers are connected with `sender=<model>` for registered models only, so
+    saves and deletes of any other model never reach the audit code.
+    """
+    def __init__(self):
+        self._configs = {}
+
+    def register(self, model_label, fields=None, actions=None):
+        """
+        Registers a model ('app_label.ModelName') for auditing.
+        Unknown models are skipped with a warning rather than failing start-up.
+        """
+        try:
+            model = apps.get_model(model_label)
+        except (LookupError, ValueError):
+            logger.warning("Audit registry: model '%s' not found; it will not be audited.", model_label)
+            return None
+        config = AuditedModelConfig(model, fields=fields, actions=actions)
+        self._configs[model] = config
+        return config
+
+    def get_config(self, model):
+        return self._configs.get(model)
+
+    def is_registered(self, model):
+        return model in self._configs
+
+    def connect(self):
+        """
+        Connects the CRUD audit receivers to each registered model.
+        Called from AuditLogConfig.ready(); dispatch_uid makes repeated calls harmless.
+        """
+        from .signals import audit_model_post_save_signal, audit_model_pre_delete_signal
+
+        for model, config in self._configs.items():
+            label = model._meta.label_lower
+            if config.emits(AuditLogAction.CREATED) or config.emits(AuditLogAction.UPDATED):
+                post_save.connect(
+                    audit_model_post_save_signal, sender=model,
+                    dispatch_uid=f'audit_log_post_save_{label}'
+                )
+            if config.emits(AuditLogAction.DELETED):
+                pre_delete.connect(
+                    audit_model_pre_delete_signal, sender=model,
+                    dispatch_uid=f'audit_log_pre_delete_{label}'
+                )
+
+
+audit_registry = AuditRegistry()
@@ -0,0 +1,151 @@
+# audit_log/rollup.py
+"""
+Daily per-user, per-action activity rollups of the audit log.
+
+Counting activity straight from AuditLogEntry at report time scans every entry
+in the period, so AuditActivityRollup keeps one row per (day, user, action) with
+the number of entries. Writing them is kept off the audit write path: once a
+batch of entries commits, the buffered writer adds its counts to the in-memory
+`pending_rollups`, and its background flusher thread adds those to the rollups
+every FLUSH_INTERVAL (one insert of missing keys plus one increment per
+distinct key), and at shutdown. Counts of a process that dies before then are
+lost, so the rollups are approximate until repaired. Entries without a user
+(system events) are not rolled up. `manage.py rollup_audit_activity`
+recomputes a date range from the entries still in the database, for backfills
+and repairs.
+"""
+import datetime
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .writer import audit_log_writer
+
+logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 2000
+
+
+def rollup_enabled():
+    return getattr(settings, 'AUDIT_LOG_BUFFER', {}).get('ACTIVITY_ROLLUP', True)
+
+
+def count_entries(entries):
+    """Counts audit entries by (local day, user, action), leaving out those without a user."""
+    return Counter(
+        (timezone.localdate(entry.timestamp), entry.user_id, entry.action)
+        for entry in entries if entry.user_id is not None
+    )
+
+
+def rollup_counts(counts, using):
+    """
+    Adds counts by (day, user id, action) to the daily rollups. Counts of users
+    deleted since are dropped, as their rollups were.
+    Returns the number of (day, user, action) keys updated.
+    """
+    from django.contrib.auth import get_user_model
+    from .models import AuditActivityRollup
+
+    user_ids = {user_id for _, user_id, _ in counts}
+    existing = set(get_user_model()._default_manager.using(using).filter(pk__in=user_ids).values_list('pk', flat=True))
+    counts = {key: count for key, count in counts.items() if key[1] in existing}
+    if not counts:
+        return 0
+    manager = AuditActivityRollup._default_manager.using(using)
+    # ignore_conflicts: the key may already exist or be created by another worker concurrently;
+    # the increments below are then row-locked updates, so no counts are lost.
+    manager.bulk_create(
+        [AuditActivityRollup(date=day, user_id=user_id, action=action) for day, user_id, action in counts],
+        ignore_conflicts=True
+    )
+    for (day, user_id, action), count in counts.items():
+        manager.filter(date=day, user_id=user_id, action=action).update(count=F('count') + count)
+    return len(counts)
+
+
+class PendingRollups:
+    """
+    Counts of committed audit entries not yet added to the rollups, per database.
+    """
+    def __init__(self):
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def add(self, entries, using):
+        """Counts entries whose transaction committed (called from an on_commit hook)."""
+        counts = count_entries(entries)
+        if counts:
+            with self._lock:
+                self._counts[using].update(counts)
+
+    def apply(self, final=False):
+        """
+        Periodic task of the audit writer's flusher thread: adds the pending counts to
+        the rollups, one transaction per database. Counts that fail to apply are kept
+        for the next run. Returns the number of keys updated.
+        """
+        with self._lock:
+            pending, self._counts = self._counts, defaultdict(Counter)
+        updated = 0
+        for using, counts in pending.items():
+            try:
+                with transaction.atomic(using=using):
+                    updated += rollup_counts(counts, using)
+            except Exception:
+                logger.exception("Failed to update %d audit activity rollups; retrying later.", len(counts))
+                with self._lock:
+                    self._counts[using].update(counts)
+        return updated
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+pending_rollups = PendingRollups()
+audit_log_writer.add_periodic_task(pending_rollups.apply)
+
+
+def rebuild_rollups(date_from, date_to, using=None):
+    """
+    Replaces the rollups of days `date_from`..`date_to` (inclusive) with counts
+    grouped from the audit entries of those days, in one transaction.
+    Days whose entries have been archived would be emptied, so callers should
+    keep the range within the months still in the database.
+    Returns the number of rollup rows written.
+    """
+    from .models import AuditActivityRollup, AuditLogEntry
+
+    using = using or router.db_for_write(AuditActivityRollup)
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime(date_from.year, date_from.month, date_from.day, tzinfo=tz)
+    day_after = date_to + datetime.timedelta(days=1)
+    end = datetime.datetime(day_after.year, day_after.month, day_after.day, tzinfo=tz)
+    grouped = AuditLogEntry._default_manager.using(using)\
+        .filter(timestamp__gte=start, timestamp__lt=end, user__isnull=False)\
+        .annotate(day=TruncDate('timestamp', tzinfo=tz))\
+        .values('day', 'user_id', 'action')\
+        .annotate(count=Count('id'))\
+        .order_by()
+    manager = AuditActivityRollup._default_manager.using(using)
+    written = 0
+    with transaction.atomic(using=using):
+        manager.filter(date__range=[date_from, date_to]).delete()
+        chunk = []
+        for row in grouped.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+            chunk.append(AuditActivityRollup(
+                date=row['day'], user_id=row['user_id'], action=row['action'], count=row['count']
+            ))
+            if len(chunk) >= REBUILD_CHUNK_SIZE:
+                written += len(manager.bulk_create(chunk))
+                chunk = []
+        if chunk:
+            written += len(manager.bulk_create(chunk))
+    return written
@@ -0,0 +1,28 @@
+# audit_log/serializers.py
+from rest_framework import serializers
+
+from .models import AuditLogEntry
+
+class AuditLogEntrySerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for audit log entries exposed by the audit API.
+    """
+    user_email = serializers.EmailField(source='user.email', read_only=True, default=None)
+    action_display = serializers.CharField(source='get_action_display', read_only=True)
+    user_agent = serializers.CharField(read_only=True)
+    target_content_type = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AuditLogEntry
+        fields = [
+            'id', 'timestamp', 'user', 'user_email', 'action', 'action_display', 'details',
+            'ip_address', 'user_agent', 'target_content_type', 'target_object_id',
+            'target_object_repr', 'attempted_identifier', 'additional_info',
+        ]
+        read_only_fields = fields
+
+    def get_target_content_type(self, obj):
+        # 'app_label.model', the same format accepted by the target_content_type filter
+        if obj.target_content_type_id is None:
+            return None
+        return f"{obj.target_content_type.app_label}.{obj.target_content_type.model}"
@@ -1,14 +1,17 @@
-from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.dispatch import receiver # Decorator to connect functions to signals
-from django.db.models.signals import post_save, pre_delete # Using pre_delete to capture state before deletion
 from django.contrib.auth import get_user_model
-from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType # For generic relations
+from django.db import transaction
+from django.db.models.signals import post_delete
 
-from .models import AuditLogEntry, AuditLogAction, create_audit_log_entry # Core audit log model and helper
-from .utils import get_client_ip, get_user_agent # Utility functions to get request metadata
+from .models import AuditLogAction, create_audit_log_entry # Core audit log model and helper
+from .utils import get_client_ip, get_user_agent, claim_dedup_window # Request metadata and login de-duplication
 from .middleware import get_current_request, get_current_user # Access request/user via middleware
+from .registry import audit_registry # Per-model CRUD audit configuration
+from .writer import audit_log_writer # Buffered writer holding entries not written yet
+from .access import read_access_log # Read counters not yet turned into entries
 
 UserModel = get_user_model()
 
@@ -19,18 +22,15 @@ def audit_user_logged_in_signal(sender, request, user, **kwargs):
     """
     Signal receiver for successful user logins.
     Creates an audit log entry when a user logs in.
-    A small time window check is added to prevent duplicate logs from rapid signal firing.
-    """
-    # Check if a similar log entry was created very recently to avoid duplicates
-    if not AuditLogEntry.objects.filter(
-        user=user, 
-        action=AuditLogAction.LOGIN_SUCCESS, 
-        timestamp__gte=timezone.now() - timedelta(seconds=5) # 5-second window
-    ).exists():
+    A short de-duplication window, kept in the shared cache, prevents duplicate
+    logs from rapid signal firing without querying the audit table.
+    """
+    ip_address = get_client_ip(request) # Get IP from the request object passed by the signal
+    if claim_dedup_window(AuditLogAction.LOGIN_SUCCESS, user.pk, ip_address):
         create_audit_log_entry(
             user=user,
             action=AuditLogAction.LOGIN_SUCCESS,
-            ip_address=get_client_ip(request), # Get IP from the request object passed by the signal
+            ip_address=ip_address,
             user_agent=get_user_agent(request),# Get User-Agent from request
             details=f"User {user.email} logged in successfully."
         )
@@ -43,15 +43,12 @@ def audit_user_logged_out_signal(sender, request, user, **kwargs):
     Checks if user exists as request.user might be AnonymousUser if session expired.
     """
     if user and user.is_authenticated: # Ensure user is valid and was authenticated
-        if not AuditLogEntry.objects.filter(
-            user=user, 
-            action=AuditLogAction.LOGOUT, 
-            timestamp__gte=timezone.now() - timedelta(seconds=5)
-        ).exists():
+        ip_address = get_client_ip(request)
+        if claim_dedup_window(AuditLogAction.LOGOUT, user.pk, ip_address):
             create_audit_log_entry(
                 user=user,
                 action=AuditLogAction.LOGOUT,
-                ip_address=get_client_ip(request),
+                ip_address=ip_address,
                 user_agent=get_user_agent(request),
                 details=f"User {user.email} logged out."
             )
@@ -62,41 +59,66 @@ def audit_user_login_failed_signal(sender, credentials, request, **kwargs):
     Signal receiver for failed login attempts.
     Creates an audit log entry detailing the failed attempt.
     'credentials' dict usually contains 'username' or 'email'.
+    The attempted identifier is stored in the indexed `attempted_identifier`
+    column so security queries can filter by account and IP without text scans.
     """
-    email_attempted = credentials.get('email') or credentials.get('username') or 'Unknown user (credentials not provided)'
-    # Check for recent similar failed attempts to avoid log flooding from brute-force attacks
-    if not AuditLogEntry.objects.filter(
-        action=AuditLogAction.LOGIN_FAILED,
-        details__icontains=f"Login attempt failed for: {email_attempted}", # Approximate check
-        timestamp__gte=timezone.now() - timedelta(seconds=10) # Wider window for failed attempts
-    ).exists():
+    identifier = credentials.get('email') or credentials.get('username') or ''
+    email_attempted = identifier or 'Unknown user (credentials not provided)'
+    ip_address = get_client_ip(request)
+    # Collapse repeated attempts (e.g. brute-force bursts) into one entry per window
+    if claim_dedup_window(AuditLogAction.LOGIN_FAILED, identifier, ip_address):
         create_audit_log_entry(
             user=None, # No authenticated user for a failed login
             action=AuditLogAction.LOGIN_FAILED,
-            ip_address=get_client_ip(request),
+            ip_address=ip_address,
             user_agent=get_user_agent(request),
             details=f"Login attempt failed for: {email_attempted}.",
-            additional_info={'credentials_provided': {'email': credentials.get('email')}} # Log only relevant parts
+            additional_info={'credentials_provided': {'email': credentials.get('email')}}, # Log only relevant parts
+            attempted_identifier=identifier
         )
 
+@receiver(post_delete, sender=UserModel)
+def detach_deleted_user_from_pending_audit_entries(sender, instance, using, **kwargs):
+    """
+    Signal receiver for user deletions.
+    Entries already written lose their user through on_delete=SET_NULL; those still
+    queued (or counted) in memory are detached here so they do not reference a
+    missing user when written. post_delete runs after the CRUD audit receivers,
+    so the entry logging the deletion is covered too.
+    """
+    user_id = instance.pk
+    audit_log_writer.detach_user(user_id, using)
+    transaction.on_commit(lambda: read_access_log.detach_user(user_id), using=using)
+
 # --- Model Change Audit Signals ---
 
-# Define which models should be audited for create, update, delete actions.
-# Format: 'app_label.ModelName'
-AUDITED_MODELS_CRUD = [
-    'users.CustomUser',
-    'patients.Patient', 
-    'patients.MedicalRecord',
-    'appointments.Appointment',
-    'medical_management.Prescription', 
-    'medical_management.Treatment', 
-    'medical_management.Observation',
-    'billing.Invoice', 
-    'billing.Payment',
-    'inquiries.Inquiry', # Assuming this is the correct model name from inquiries app
-    'telemedicine.TelemedicineSession', # Assuming this is the correct model name
-    # Add other models as needed
-]
+# Models audited for create, update and delete actions, with per-model options
+# (see audit_log.registry.AuditedModelConfig):
+#   'fields':  field values to capture; updates touching none of them are skipped.
+#   'actions': subset of CREATED/UPDATED/DELETED to emit (default: all).
+# Receivers are connected only to these models in AuditLogConfig.ready().
+# Override with settings.AUDIT_LOG_MODELS. Format: 'app_label.ModelName'
+AUDITED_MODELS_CRUD = {
+    'users.CustomUser': {'fields': ['email', 'role', 'is_active', 'is_staff', 'is_superuser']}, # Not last_login/password
+    'patients.Patient': {},
+    'patients.MedicalRecord': {},
+    'appointments.Appointment': {},
+    'medical_management.Prescription': {},
+    'medical_management.Treatment': {},
+    'medical_management.Observation': {},
+    'billing.Invoice': {'fields': ['status', 'total_amount', 'paid_amount', 'issue_date', 'due_date']},
+    'billing.Payment': {},
+    'inquiries.Inquiry': {},
+    'telemedicine.TelemedicineSession': {},
+}
+
+def register_audited_models():
+    """
+    Registers the configured models with the audit registry.
+    Called from AuditLogConfig.ready() before the receivers are connected.
+    """
+    for model_label, options in getattr(settings, 'AUDIT_LOG_MODELS', AUDITED_MODELS_CRUD).items():
+        audit_registry.register(model_label, **options)
 
 def get_model_instance_repr(instance):
     """
@@ -107,87 +129,82 @@ def get_model_instance_repr(instance):
         return "N/A"
     return f"{instance._meta.verbose_name.title()} '{str(instance)}' (ID: {instance.pk})"
 
-@receiver(post_save)
-def audit_model_post_save_signal(sender, instance, created, **kwargs):
+def audit_model_post_save_signal(sender, instance, created, update_fields=None, **kwargs):
     """
-    Signal receiver for post_save events on specified models.
-    Logs CREATED or UPDATED actions.
+    Signal receiver for post_save events on registered models.
+    Logs CREATED or UPDATED actions according to the model's audit config.
     Relies on AuditLogMiddleware to get the current user.
     """
-    model_path = f"{sender._meta.app_label}.{sender._meta.object_name}"
-    if model_path in AUDITED_MODELS_CRUD and not isinstance(instance, AuditLogEntry):
-        action = AuditLogAction.CREATED if created else AuditLogAction.UPDATED
-        details = f"{get_model_instance_repr(instance)} was {action.label.lower()}."
-
-        current_user = get_current_user() # Get user from middleware
-        current_request = get_current_request()
-        ip_address = get_client_ip(current_request)
-        user_agent = get_user_agent(current_request)
-
-        # Fallback for user if not available from request (e.g., in management commands)
-        # This part might need careful consideration based on how models are updated.
-        if not current_user:
-            if hasattr(instance, 'updated_by') and getattr(instance, 'updated_by'):
-                current_user = getattr(instance, 'updated_by')
-            elif hasattr(instance, 'created_by') and getattr(instance, 'created_by'):
-                current_user = getattr(instance, 'created_by')
-            elif hasattr(instance, 'user') and isinstance(getattr(instance, 'user'), UserModel): # e.g. Patient.user
-                 current_user = getattr(instance, 'user')
-        
-        # Avoid logging AuditLogEntry creations/updates to prevent recursion
-        if isinstance(instance, AuditLogEntry):
-            return
-
-        create_audit_log_entry(
-            user=current_user,
-            action=action,
-            target_object=instance, # Pass the instance itself
-            details=details,
-            ip_address=ip_address,
-            user_agent=user_agent
-            # 'changed_fields' could be added here if tracking field-level changes,
-            # but that requires more complex logic (e.g., comparing old and new values).
-        )
+    config = audit_registry.get_config(sender)
+    action = AuditLogAction.CREATED if created else AuditLogAction.UPDATED
+    if config is None or not config.emits(action):
+        return
+    if not created and not config.is_relevant_update(update_fields):
+        return
+
+    details = f"{get_model_instance_repr(instance)} was {action.label.lower()}."
+
+    current_user = get_current_user() # Get user from middleware
+    current_request = get_current_request()
+    ip_address = get_client_ip(current_request)
+    user_agent = get_user_agent(current_request)
+
+    # Fallback for user if not available from request (e.g., in management commands)
+    # This part might need careful consideration based on how models are updated.
+    if not current_user:
+        if hasattr(instance, 'updated_by') and getattr(instance, 'updated_by'):
+            current_user = getattr(instance, 'updated_by')
+        elif hasattr(instance, 'created_by') and getattr(instance, 'created_by'):
+            current_user = getattr(instance, 'created_by')
+        elif hasattr(instance, 'user') and isinstance(getattr(instance, 'user'), UserModel): # e.g. Patient.user
+             current_user = getattr(instance, 'user')
+
+    additional_info = {}
+    if update_fields and not created:
+        additional_info['changed_fields'] = sorted(update_fields)
+    captured_fields = config.capture(instance)
+    if captured_fields:
+        additional_info['fields'] = captured_fields
+
+    create_audit_log_entry(
+        user=current_user,
+        action=action,
+        target_object=instance, # Pass the instance itself
+        details=details,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        additional_info=additional_info
+    )
 
-@receiver(pre_delete) # Use pre_delete to access instance data before it's gone
 def audit_model_pre_delete_signal(sender, instance, **kwargs):
     """
-    Signal receiver for pre_delete events on specified models.
+    Signal receiver for pre_delete events on registered models.
     Logs DELETED actions. The instance still exists at this point.
     """
-    model_path = f"{sender._meta.app_label}.{sender._meta.object_name}"
-    if model_path in AUDITED_MODELS_CRUD and not isinstance(instance, AuditLogEntry):
-        details = f"{get_model_instance_repr(instance)} is about to be deleted."
-        
-        current_user = get_current_user()
-        current_request = get_current_request()
-        ip_address = get_client_ip(current_request)
-        user_agent = get_user_agent(current_request)
-
-        if isinstance(instance, AuditLogEntry): # Should not happen if not in AUDITED_MODELS_CRUD
-            return
-
-        # For deleted objects, target_object_repr and target_content_type/object_id are more robust
-        # as the instance will be gone after this signal.
-        target_content_type = ContentType.objects.get_for_model(instance)
-        target_object_id = instance.pk
-        target_object_repr = get_model_instance_repr(instance)
-
-
-        create_audit_log_entry(
-            user=current_user,
-            action=AuditLogAction.DELETED,
-            target_content_type=target_content_type,
-            target_object_id=target_object_id,
-            target_object_repr=target_object_repr, # Store representation
-            details=f"{target_object_repr} was deleted.", # Update details
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
-
-# Ensure the AuditLogConfig in apps.py imports these signals:
-# In audit_log/apps.py:
-# class AuditLogConfig(AppConfig):
-#     # ...
-#     def ready(self):
-#         import audit_log.signals # noqa
+    config = audit_registry.get_config(sender)
+    if config is None or not config.emits(AuditLogAction.DELETED):
+        return
+
+    current_user = get_current_user()
+    current_request = get_current_request()
+    ip_address = get_client_ip(current_request)
+    user_agent = get_user_agent(current_request)
+
+    # For deleted objects, target_object_repr and target_content_type/object_id are more robust
+    # as the instance will be gone after this signal.
+    target_content_type = ContentType.objects.get_for_model(instance)
+    target_object_id = instance.pk
+    target_object_repr = get_model_instance_repr(instance)
+    captured_fields = config.capture(instance)
+
+    create_audit_log_entry(
+        user=current_user,
+        action=AuditLogAction.DELETED,
+        target_content_type=target_content_type,
+        target_object_id=target_object_id,
+        target_object_repr=target_object_repr, # Store representation
+        details=f"{target_object_repr} was deleted.", # Update details
+        ip_address=ip_address,
+        user_agent=user_agent,
+        additional_info={'fields': captured_fields} if captured_fields else None
+    )
@@ -3,16 +3,55 @@ from django.test import TestCase, RequestFactory
 from django.contrib.auth import get_user_model
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.utils import timezone
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.db.models.signals import post_save, pre_delete
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from unittest.mock import patch # For mocking request attributes or middleware functions
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.core.management.base import CommandError
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from django.http import HttpResponse
+import asyncio
+from io import StringIO
+import gzip
+import json
+from pathlib import Path
+import tempfile
 
-from .models import AuditLogEntry, AuditLogAction, create_audit_log_entry
-from .middleware import get_client_ip, get_user_agent, AuditLogMiddleware, get_current_request, get_current_user
+from .models import AuditActivityRollup, AuditLogEntry, AuditLogAction, UserAgent, create_audit_log_entry
+from .interning import user_agent_ids
+from .rollup import pending_rollups
+from .middleware import AuditLogMiddleware, get_current_request, get_current_user
+from .context import get_request_id, request_context, wrap_with_context
+from .utils import get_client_ip, get_user_agent
+from .writer import audit_log_writer
+from .access import read_access_log
+from .registry import audit_registry
+from . import partitioning
+from .partitioning import add_months, month_bounds, month_start, premake_partitions
 from patients.models import Patient # Example model to use as a target_object
+from admin_dashboard.models import DashboardPreference # Example of a model that is not audited
 from users.models import UserRole # For creating users with roles
+from appointments.models import Appointment, AppointmentType # Model with its own domain audit signal
+from datetime import timedelta
 
 UserModel = get_user_model()
 
+@contextmanager
+def committed_audit_entries(test_case):
+    """
+    Runs the block in its own savepoint and then executes the on-commit hooks it
+    registered, so entries queued on the buffered audit writer get written.
+    """
+    with test_case.captureOnCommitCallbacks(execute=True) as callbacks, transaction.atomic():
+        yield callbacks
+
 class AuditLogUtilTests(TestCase):
     """Tests for utility functions in audit_log.utils and middleware."""
     def setUp(self):
@@ -34,22 +73,22 @@ class AuditLogUtilTests(TestCase):
         self.assertEqual(get_user_agent(None), '') # Test with None request
 
     def test_audit_log_middleware(self):
-        """Test that AuditLogMiddleware correctly sets and clears thread_locals.request."""
+        """Test that AuditLogMiddleware correctly sets and clears the current request."""
         def get_response_mock(request):
-            # Simulate accessing request from thread_locals during request processing
+            # Simulate accessing the current request during request processing
             self.assertEqual(get_current_request(), request)
             return "mock_response"
 
         middleware = AuditLogMiddleware(get_response_mock)
         request = self.factory.get('/')
         
-        # Before middleware call, request should not be in thread_locals
+        # Before middleware call, there should be no current request
         self.assertIsNone(get_current_request())
         
         response = middleware(request)
         
         self.assertEqual(response, "mock_response")
-        # After middleware call, request should be cleared from thread_locals
+        # After middleware call, the current request should be cleared
         self.assertIsNone(get_current_request())
 
 
@@ -65,6 +104,7 @@ class AuditLogSignalTests(TestCase):
         self.factory = RequestFactory()
         # Minimal patient profile for testing model signals
         self.patient_profile = Patient.objects.get(user=self.user)
+        cache.clear() # Login de-duplication windows live in the cache
 
 
     def test_user_logged_in_signal_creates_log(self):
@@ -72,7 +112,8 @@ class AuditLogSignalTests(TestCase):
         request.META['REMOTE_ADDR'] = '127.0.0.1'
         request.META['HTTP_USER_AGENT'] = 'TestAgent/Login'
         
-        user_logged_in.send(sender=self.user.__class__, request=request, user=self.user)
+        with committed_audit_entries(self): # Buffered entries are written on commit
+            user_logged_in.send(sender=self.user.__class__, request=request, user=self.user)
         
         log_entry = AuditLogEntry.objects.filter(user=self.user, action=AuditLogAction.LOGIN_SUCCESS).first()
         self.assertIsNotNone(log_entry)
@@ -85,7 +126,8 @@ class AuditLogSignalTests(TestCase):
         request.META['REMOTE_ADDR'] = '10.0.0.5'
         request.user = self.user # Simulate authenticated user for logout signal
         
-        user_logged_out.send(sender=self.user.__class__, request=request, user=self.user)
+        with committed_audit_entries(self):
+            user_logged_out.send(sender=self.user.__class__, request=request, user=self.user)
         
         log_entry = AuditLogEntry.objects.filter(user=self.user, action=AuditLogAction.LOGOUT).first()
         self.assertIsNotNone(log_entry)
@@ -96,12 +138,37 @@ class AuditLogSignalTests(TestCase):
         request = self.factory.post('/fake-login-fail', data=credentials)
         request.META['REMOTE_ADDR'] = '192.168.0.10'
         
-        user_login_failed.send(sender=UserModel, credentials=credentials, request=request)
+        with committed_audit_entries(self):
+            user_login_failed.send(sender=UserModel, credentials=credentials, request=request)
         
         log_entry = AuditLogEntry.objects.filter(action=AuditLogAction.LOGIN_FAILED, details__icontains=credentials['email']).first()
         self.assertIsNotNone(log_entry)
         self.assertIsNone(log_entry.user)
         self.assertEqual(log_entry.ip_address, '192.168.0.10')
+        self.assertEqual(log_entry.attempted_identifier, credentials['email'])
+
+    def test_repeated_login_signals_are_deduplicated_in_cache(self):
+        request = self.factory.post('/fake-login')
+        request.META['REMOTE_ADDR'] = '192.168.0.20'
+        credentials = {'email': 'Burst_Attempt@example.com'}
+
+        with committed_audit_entries(self), CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                user_logged_in.send(sender=self.user.__class__, request=request, user=self.user)
+                user_login_failed.send(sender=UserModel, credentials=credentials, request=request)
+        # The login path never reads the audit table
+        self.assertFalse([query for query in queries if AuditLogEntry._meta.db_table in query['sql']])
+        self.assertEqual(AuditLogEntry.objects.filter(user=self.user, action=AuditLogAction.LOGIN_SUCCESS).count(), 1)
+        failed = AuditLogEntry.objects.filter(
+            action=AuditLogAction.LOGIN_FAILED, attempted_identifier='burst_attempt@example.com', ip_address='192.168.0.20'
+        )
+        self.assertEqual(failed.count(), 1)
+
+        # A different source IP gets its own window
+        request.META['REMOTE_ADDR'] = '192.168.0.21'
+        with committed_audit_entries(self):
+            user_login_failed.send(sender=UserModel, credentials=credentials, request=request)
+        self.assertEqual(AuditLogEntry.objects.filter(attempted_identifier='burst_attempt@example.com').count(), 2)
 
     @patch('audit_log.signals.get_current_user') # Mock to simulate user context for model signals
     @patch('audit_log.signals.get_current_request') # Mock to simulate request context
@@ -115,9 +182,10 @@ class AuditLogSignalTests(TestCase):
         # Patient model is in AUDITED_MODELS_CRUD
         # Creating a new user with PATIENT role will trigger Patient.post_save via users.signals
         # which in turn creates a Patient profile. The Patient profile creation should be audited.
-        new_patient_user = UserModel.objects.create_user(
-            username='new_audit_patient', email='new_audit_patient@example.com', password='password', role=UserRole.PATIENT
-        )
+        with committed_audit_entries(self):
+            new_patient_user = UserModel.objects.create_user(
+                username='new_audit_patient', email='new_audit_patient@example.com', password='password', role=UserRole.PATIENT
+            )
         # The Patient profile is created by a signal in users.models or patients.models
         # We check if that creation was logged.
         created_patient_profile = Patient.objects.get(user=new_patient_user)
@@ -140,7 +208,8 @@ class AuditLogSignalTests(TestCase):
         mock_get_user.return_value = self.user
 
         self.patient_profile.address = "Updated Address 123"
-        self.patient_profile.save(update_fields=['address']) # Specify update_fields
+        with committed_audit_entries(self):
+            self.patient_profile.save(update_fields=['address']) # Specify update_fields
 
         log_entry = AuditLogEntry.objects.filter(
             target_content_type=ContentType.objects.get_for_model(Patient),
@@ -166,9 +235,11 @@ class AuditLogSignalTests(TestCase):
             username='patient_to_delete', email='patient_to_delete@example.com', password='password', role=UserRole.PATIENT
         )
         patient_to_delete_profile = Patient.objects.get(user=patient_to_delete_user)
-        patient_pk_str = str(patient_to_delete_profile.pk) # Get PK before deletion
+        patient_pk_str = str(patient_to_delete_profile.pk) # Get PKs before deletion
+        user_pk_str = str(patient_to_delete_user.pk)
         
-        patient_to_delete_profile.delete() # This will trigger CustomUser delete due to OneToOne cascade
+        with committed_audit_entries(self):
+            patient_to_delete_user.delete() # Cascades to the Patient profile (its OneToOne primary key)
 
         log_entry_patient = AuditLogEntry.objects.filter(
             target_content_type=ContentType.objects.get_for_model(Patient),
@@ -178,10 +249,10 @@ class AuditLogSignalTests(TestCase):
         self.assertIsNotNone(log_entry_patient, "Audit log for Patient deletion not found.")
         self.assertEqual(log_entry_patient.user, self.user) # User who initiated deletion
 
-        # Also check for CustomUser deletion log if CustomUser is in AUDITED_MODELS_CRUD
+        # CustomUser is audited too
         log_entry_user = AuditLogEntry.objects.filter(
             target_content_type=ContentType.objects.get_for_model(UserModel),
-            target_object_id=str(patient_to_delete_user.pk),
+            target_object_id=user_pk_str,
             action=AuditLogAction.DELETED
         ).first()
         self.assertIsNotNone(log_entry_user, "Audit log for CustomUser deletion not found.")
@@ -196,28 +267,30 @@ class AuditLogHelperFunctionTests(TestCase):
         self.patient_profile = Patient.objects.create(user=self.user) # User is also a patient for this test
 
     def test_create_audit_log_entry_with_target_object(self):
-        create_audit_log_entry(
-            user=self.user,
-            action=AuditLogAction.UPDATED,
-            target_object=self.patient_profile,
-            details="Patient profile was updated via helper.",
-            ip_address="127.0.0.1",
-            user_agent="TestHelperAgent"
-        )
+        with committed_audit_entries(self):
+            create_audit_log_entry(
+                user=self.user,
+                action=AuditLogAction.UPDATED,
+                target_object=self.patient_profile,
+                details="Patient profile was updated via helper.",
+                ip_address="127.0.0.1",
+                user_agent="TestHelperAgent"
+            )
         log_entry = AuditLogEntry.objects.latest('timestamp')
         self.assertEqual(log_entry.user, self.user)
         self.assertEqual(log_entry.action, AuditLogAction.UPDATED.value)
         self.assertEqual(log_entry.target_object, self.patient_profile)
-        self.assertIn(str(self.patient_profile.pk), log_entry.target_object_repr)
+        self.assertEqual(log_entry.target_object_repr, str(self.patient_profile)) # e.g. 'Patient Profile: <name>'
         self.assertEqual(log_entry.details, "Patient profile was updated via helper.")
 
     def test_create_audit_log_entry_without_user_or_target(self):
-        create_audit_log_entry(
-            user=None,
-            action=AuditLogAction.SYSTEM_EVENT,
-            details="System maintenance task executed.",
-            additional_info={'task_name': 'cleanup_temp_files'}
-        )
+        with committed_audit_entries(self):
+            create_audit_log_entry(
+                user=None,
+                action=AuditLogAction.SYSTEM_EVENT,
+                details="System maintenance task executed.",
+                additional_info={'task_name': 'cleanup_temp_files'}
+            )
         log_entry = AuditLogEntry.objects.latest('timestamp')
         self.assertIsNone(log_entry.user)
         self.assertEqual(log_entry.action, AuditLogAction.SYSTEM_EVENT.value)
@@ -227,18 +300,580 @@ class AuditLogHelperFunctionTests(TestCase):
 
     def test_create_audit_log_entry_with_deleted_target_info(self):
         ct = ContentType.objects.get_for_model(Patient)
-        deleted_patient_pk = "some-deleted-pk" # Example non-integer PK
-        deleted_patient_repr = "Deleted Patient Profile 'Old Name' (ID: some-deleted-pk)"
-        create_audit_log_entry(
-            user=self.user,
-            action=AuditLogAction.DELETED,
-            target_content_type=ct,
-            target_object_id=deleted_patient_pk,
-            target_object_repr=deleted_patient_repr,
-            details="A patient was deleted."
-        )
+        deleted_patient_pk = "999999" # No such patient; Patient's pk is an integer user id
+        deleted_patient_repr = "Deleted Patient Profile 'Old Name' (ID: 999999)"
+        with committed_audit_entries(self):
+            create_audit_log_entry(
+                user=self.user,
+                action=AuditLogAction.DELETED,
+                target_content_type=ct,
+                target_object_id=deleted_patient_pk,
+                target_object_repr=deleted_patient_repr,
+                details="A patient was deleted."
+            )
         log_entry = AuditLogEntry.objects.latest('timestamp')
         self.assertEqual(log_entry.target_content_type, ct)
         self.assertEqual(log_entry.target_object_id, deleted_patient_pk)
         self.assertEqual(log_entry.target_object_repr, deleted_patient_repr)
         self.assertIsNone(log_entry.target_object) # Target object should be None
+
+
+class BufferedAuditLogWriterTests(TestCase):
+    """Tests for the buffered audit log writer in audit_log.writer."""
+    def setUp(self):
+        self.user = UserModel.objects.create_user(
+            username='writer_user_audit', email='writer_audit@example.com', password='password', role=UserRole.ADMIN
+        )
+
+    def _log(self, details):
+        return create_audit_log_entry(user=self.user, action=AuditLogAction.SYSTEM_EVENT, details=details)
+
+    def test_entries_are_written_in_one_batch_on_commit(self):
+        with committed_audit_entries(self) as callbacks:
+            self._log("first")
+            self._log("second")
+            self.assertFalse(AuditLogEntry.objects.filter(details__in=["first", "second"]).exists())
+        self.assertEqual(len(callbacks), 1) # One commit hook per transaction, not per entry
+        self.assertEqual(AuditLogEntry.objects.filter(details__in=["first", "second"]).count(), 2)
+
+    def test_entries_from_rolled_back_savepoint_are_discarded(self):
+        with committed_audit_entries(self):
+            try:
+                with transaction.atomic():
+                    self._log("rolled back")
+                    raise RuntimeError("force rollback")
+            except RuntimeError:
+                pass
+            self._log("kept")
+        self.assertFalse(AuditLogEntry.objects.filter(details="rolled back").exists())
+        self.assertTrue(AuditLogEntry.objects.filter(details="kept").exists())
+
+    def test_middleware_writes_pending_entries_of_open_transaction(self):
+        def get_response_mock(request):
+            self._log("during request")
+            return "mock_response"
+
+        AuditLogMiddleware(get_response_mock)(RequestFactory().get('/'))
+        self.assertTrue(AuditLogEntry.objects.filter(details="during request").exists())
+
+    def test_entries_of_users_deleted_before_the_write_keep_no_user(self):
+        other = UserModel.objects.create_user(
+            username='writer_deleted_audit', email='writer_deleted_audit@example.com', password='password', role=UserRole.NURSE
+        )
+        with committed_audit_entries(self):
+            create_audit_log_entry(user=other, action=AuditLogAction.SYSTEM_EVENT, details="deleted user")
+            self._log("kept user")
+            other.delete()
+        self.assertIsNone(AuditLogEntry.objects.get(details="deleted user").user)
+        self.assertEqual(AuditLogEntry.objects.get(details="kept user").user, self.user)
+
+    def test_batch_failing_on_a_user_deleted_elsewhere_is_retried_without_it(self):
+        bulk_create = AuditLogEntry._default_manager.bulk_create
+        calls = []
+
+        def fail_first(entries, **kwargs):
+            calls.append([entry.user_id for entry in entries])
+            if len(calls) == 1:
+                raise IntegrityError("FOREIGN KEY constraint failed")
+            return bulk_create(entries, **kwargs)
+
+        with patch.object(AuditLogEntry._default_manager, 'bulk_create', side_effect=fail_first):
+            with committed_audit_entries(self):
+                self._log("kept user")
+                audit_log_writer.enqueue(AuditLogEntry(user_id=self.user.pk + 1000, action=AuditLogAction.SYSTEM_EVENT, details="gone user"))
+        self.assertEqual(calls[1], [self.user.pk, None])
+        self.assertIsNone(AuditLogEntry.objects.get(details="gone user").user)
+        self.assertEqual(AuditLogEntry.objects.get(details="kept user").user, self.user)
+
+    def test_failed_flush_is_spooled_and_replayed(self):
+        with tempfile.TemporaryDirectory() as spool_dir, \
+                self.settings(AUDIT_LOG_BUFFER={'SPOOL_DIR': spool_dir}):
+            with patch.object(AuditLogEntry._default_manager, 'bulk_create', side_effect=DatabaseError("db down")):
+                with committed_audit_entries(self):
+                    self._log("spooled")
+            self.assertFalse(AuditLogEntry.objects.filter(details="spooled").exists())
+
+            spool_files = list(Path(spool_dir).glob('audit-spool-*.jsonl'))
+            self.assertEqual(len(spool_files), 1)
+            self.assertEqual(audit_log_writer.replay_spool(spool_files[0]), 1)
+            self.assertTrue(AuditLogEntry.objects.filter(details="spooled", user=self.user).exists())
+            self.assertFalse(spool_files[0].exists())
+
+    def test_entries_spooled_during_a_replay_are_kept(self):
+        with tempfile.TemporaryDirectory() as spool_dir, \
+                self.settings(AUDIT_LOG_BUFFER={'SPOOL_DIR': spool_dir}):
+            audit_log_writer._spool([AuditLogEntry(user=self.user, action=AuditLogAction.SYSTEM_EVENT, details="first")])
+            spool_file, = Path(spool_dir).glob('audit-spool-*.jsonl')
+            write = audit_log_writer._write
+
+            def write_while_spooling(entries, **kwargs):
+                # The live process appends to its spool file while the replay is running.
+                audit_log_writer._spool([AuditLogEntry(user=self.user, action=AuditLogAction.SYSTEM_EVENT, details="second")])
+                return write(entries, **kwargs)
+
+            with patch.object(audit_log_writer, '_write', side_effect=write_while_spooling):
+                self.assertEqual(audit_log_writer.replay_spool(spool_file), 1)
+            self.assertEqual(list(Path(spool_dir).iterdir()), [spool_file]) # Only the new entry's file is left
+            self.assertEqual(audit_log_writer.replay_spool(spool_file), 1)
+            self.assertEqual(AuditLogEntry.objects.filter(details__in=["first", "second"]).count(), 2)
+
+
+class AuditRegistryTests(TestCase):
+    """Tests for per-model CRUD audit registration in audit_log.registry."""
+    def setUp(self):
+        self.user = UserModel.objects.create_user(
+            username='registry_user_audit', email='registry_audit@example.com', password='password', role=UserRole.ADMIN
+        )
+
+    def test_receivers_connected_only_to_registered_models(self):
+        self.assertTrue(audit_registry.is_registered(Patient))
+        self.assertTrue(post_save.has_listeners(Patient))
+        self.assertFalse(audit_registry.is_registered(DashboardPreference))
+        self.assertFalse(post_save.has_listeners(DashboardPreference))
+        self.assertFalse(pre_delete.has_listeners(DashboardPreference))
+
+    def test_update_outside_captured_fields_is_not_audited(self):
+        user_ct = ContentType.objects.get_for_model(UserModel)
+        with committed_audit_entries(self):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login']) # CustomUser only captures account fields
+        self.assertFalse(AuditLogEntry.objects.filter(
+            target_content_type=user_ct, target_object_id=str(self.user.pk), action=AuditLogAction.UPDATED
+        ).exists())
+
+        with committed_audit_entries(self):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+        log_entry = AuditLogEntry.objects.get(
+            target_content_type=user_ct, target_object_id=str(self.user.pk), action=AuditLogAction.UPDATED
+        )
+        self.assertEqual(log_entry.additional_info['changed_fields'], ['is_active'])
+        self.assertEqual(log_entry.additional_info['fields']['is_active'], 'False')
+        self.assertNotIn('password', log_entry.additional_info['fields'])
+
+
+class AuditCoalescingTests(TestCase):
+    """Tests for merging duplicate audit entries within a transaction (audit_log.coalesce)."""
+    def setUp(self):
+        self.admin_user = UserModel.objects.create_user(
+            username='coalesce_admin_audit', email='coalesce_admin_audit@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.doctor_user = UserModel.objects.create_user(
+            username='coalesce_doctor_audit', email='coalesce_doctor_audit@example.com', password='password', role=UserRole.DOCTOR
+        )
+        patient_user = UserModel.objects.create_user(
+            username='coalesce_patient_audit', email='coalesce_patient_audit@example.com', password='password', role=UserRole.PATIENT
+        )
+        self.patient_profile = Patient.objects.get(user=patient_user)
+        self.patient_ct = ContentType.objects.get_for_model(Patient)
+
+    def _patient_entries(self):
+        return AuditLogEntry.objects.filter(target_content_type=self.patient_ct, target_object_id=str(self.patient_profile.pk))
+
+    def test_generic_entry_is_folded_into_domain_entry(self):
+        with committed_audit_entries(self):
+            appointment = Appointment.objects.create(
+                patient=self.patient_profile, doctor=self.doctor_user,
+                appointment_type=AppointmentType.GENERAL_CONSULTATION,
+                appointment_date_time=timezone.now() + timedelta(days=3),
+                scheduled_by=self.admin_user
+            )
+        entries = AuditLogEntry.objects.filter(
+            target_content_type=ContentType.objects.get_for_model(Appointment), target_object_id=str(appointment.pk)
+        )
+        self.assertEqual(entries.count(), 1)
+        log_entry = entries.get()
+        self.assertEqual(log_entry.action, AuditLogAction.APPOINTMENT_SCHEDULED)
+        self.assertEqual(log_entry.additional_info['coalesced_actions'], [AuditLogAction.CREATED])
+        self.assertEqual(log_entry.additional_info['coalesced_count'], 2)
+
+    def test_repeated_updates_of_one_target_are_merged(self):
+        with committed_audit_entries(self):
+            for field_name in ('blood_group', 'allergies', 'blood_group'):
+                create_audit_log_entry(
+                    user=self.admin_user, action=AuditLogAction.UPDATED, target_object=self.patient_profile,
+                    details=f"Updated {field_name}", additional_info={'changed_fields': [field_name]}
+                )
+        log_entry = self._patient_entries().get()
+        self.assertEqual(log_entry.details, "Updated blood_group")
+        self.assertEqual(log_entry.additional_info['changed_fields'], ['allergies', 'blood_group'])
+        self.assertEqual(log_entry.additional_info['coalesced_count'], 3)
+
+    def test_distinct_actions_and_separate_transactions_are_kept(self):
+        with committed_audit_entries(self):
+            create_audit_log_entry(user=self.admin_user, action=AuditLogAction.UPDATED, target_object=self.patient_profile)
+            create_audit_log_entry(user=self.admin_user, action=AuditLogAction.DELETED, target_object=self.patient_profile)
+        with committed_audit_entries(self):
+            create_audit_log_entry(user=self.admin_user, action=AuditLogAction.UPDATED, target_object=self.patient_profile)
+        self.assertEqual(self._patient_entries().filter(action=AuditLogAction.UPDATED).count(), 2)
+        self.assertEqual(self._patient_entries().filter(action=AuditLogAction.DELETED).count(), 1)
+
+    def test_coalescing_can_be_disabled(self):
+        with self.settings(AUDIT_LOG_BUFFER={'COALESCE': False}), committed_audit_entries(self):
+            create_audit_log_entry(user=self.admin_user, action=AuditLogAction.UPDATED, target_object=self.patient_profile)
+            create_audit_log_entry(user=self.admin_user, action=AuditLogAction.UPDATED, target_object=self.patient_profile)
+        self.assertEqual(self._patient_entries().count(), 2)
+
+
+class AuditLogArchiveTests(TestCase):
+    """Tests for monthly archiving (audit_log.partitioning and the archive_audit_log command)."""
+    def setUp(self):
+        self.current_month = month_start(timezone.localdate())
+        self.old_month = add_months(self.current_month, -30)
+        old_start = month_bounds(self.old_month)[0]
+        AuditLogEntry.objects.bulk_create(
+            [AuditLogEntry(action=AuditLogAction.SYSTEM_EVENT, details=f"old {i}", timestamp=old_start + timedelta(days=i))
+             for i in range(3)]
+            + [AuditLogEntry(action=AuditLogAction.SYSTEM_EVENT, details="current", timestamp=timezone.now())]
+        )
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+
+    def _archive(self, *args):
+        out = StringIO()
+        call_command('archive_audit_log', '--retention-months=24', f'--archive-dir={self.archive_dir.name}', *args, stdout=out)
+        return out.getvalue()
+
+    def test_old_months_are_archived_and_removed(self):
+        self._archive()
+        self.assertFalse(AuditLogEntry.objects.filter(details__startswith="old").exists())
+        self.assertTrue(AuditLogEntry.objects.filter(details="current").exists())
+
+        archive_path = Path(self.archive_dir.name) / f"{AuditLogEntry._meta.db_table}_p{self.old_month:%Y%m}.jsonl.gz"
+        with gzip.open(archive_path, 'rt', encoding='utf-8') as archive_file:
+            records = [json.loads(line) for line in archive_file]
+        self.assertEqual(sorted(record['fields']['details'] for record in records), ["old 0", "old 1", "old 2"])
+        self.assertEqual(records[0]['model'], 'audit_log.auditlogentry')
+
+    def test_dry_run_and_keep_leave_rows_in_place(self):
+        output = self._archive('--dry-run')
+        self.assertIn(f"Would archive {self.old_month:%Y-%m}", output)
+        self.assertFalse(any(Path(self.archive_dir.name).iterdir()))
+        self._archive('--keep')
+        self.assertEqual(AuditLogEntry.objects.filter(details__startswith="old").count(), 3)
+        self.assertEqual(len(list(Path(self.archive_dir.name).glob('*.jsonl.gz'))), 1)
+
+    def test_count_mismatch_aborts_without_deleting(self):
+        with patch('django.db.models.query.QuerySet.delete', return_value=(2, {})):
+            with self.assertRaises(CommandError):
+                self._archive()
+        self.assertEqual(AuditLogEntry.objects.filter(details__startswith="old").count(), 3)
+
+    def test_flusher_premakes_partitions_once_a_day(self):
+        self.assertIn(premake_partitions, audit_log_writer._tasks)
+        with patch.object(partitioning, '_premade_on', None), \
+                patch('audit_log.partitioning.ensure_partitions') as ensure:
+            premake_partitions(final=True)
+            ensure.assert_not_called()
+            premake_partitions()
+            premake_partitions()
+            ensure.assert_called_once_with(AuditLogEntry)
+            with patch('audit_log.partitioning.timezone.localdate', return_value=timezone.localdate() + timedelta(days=1)):
+                premake_partitions()
+            self.assertEqual(ensure.call_count, 2)
+
+    def test_recent_queryset_excludes_old_months(self):
+        self.assertEqual(list(AuditLogEntry.objects.recent().values_list('details', flat=True)), ["current"])
+
+
+class AuditLogAPITests(TestCase):
+    """Tests for the read-only, keyset-paginated audit log API."""
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = UserModel.objects.create_user(
+            username='api_admin_audit', email='api_admin_audit@example.com', password='password', role=UserRole.ADMIN
+        )
+        self.doctor_user = UserModel.objects.create_user(
+            username='api_doctor_audit', email='api_doctor_audit@example.com', password='password', role=UserRole.DOCTOR
+        )
+        patient_user = UserModel.objects.create_user(
+            username='api_patient_audit', email='api_patient_audit@example.com', password='password', role=UserRole.PATIENT
+        )
+        self.patient_profile = Patient.objects.get(user=patient_user)
+        audit_log_writer.flush_pending() # Write, then discard, the entries for the setup objects
+        AuditLogEntry.objects.all().delete()
+        now = timezone.now()
+        patient_ct = ContentType.objects.get_for_model(Patient)
+        # Seven entries, two of which share a timestamp to exercise the id tie-breaker
+        self.entries = AuditLogEntry.objects.bulk_create([
+            AuditLogEntry(
+                user=self.doctor_user if i % 2 else None, action=AuditLogAction.VIEWED if i % 2 else AuditLogAction.SYSTEM_EVENT,
+                timestamp=now - timedelta(minutes=min(i, 5)), details=f"entry {i}",
+                target_content_type=patient_ct if i < 3 else None, target_object_id=str(self.patient_profile.pk) if i < 3 else None,
+            ) for i in range(7)
+        ])
+        self.list_url = reverse('audit_log:auditlog-list')
+
+    def _collect_pages(self, params):
+        details, url, pages = [], self.list_url, 0
+        while url:
+            response = self.client.get(url, params if pages == 0 else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+            details.extend(item['details'] for item in response.data['results'])
+            url, pages = response.data['next'], pages + 1
+        return details, pages
+
+    def test_only_admins_can_read_the_audit_log(self):
+        self.client.force_authenticate(user=self.doctor_user)
+        self.assertEqual(self.client.get(self.list_url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin_user)
+        self.assertEqual(self.client.get(self.list_url).status_code, status.HTTP_200_OK)
+
+    def test_keyset_pages_cover_every_entry_once_in_order(self):
+        self.client.force_authenticate(user=self.admin_user)
+        details, pages = self._collect_pages({'page_size': 2})
+        expected = [entry.details for entry in sorted(self.entries, key=lambda e: (e.timestamp, e.pk), reverse=True)]
+        self.assertEqual(details, expected)
+        self.assertEqual(pages, 4)
+
+    def test_filters(self):
+        self.client.force_authenticate(user=self.admin_user)
+        details, _ = self._collect_pages({'user': self.doctor_user.pk, 'action': AuditLogAction.VIEWED})
+        self.assertEqual(sorted(details), ["entry 1", "entry 3", "entry 5"])
+        details, _ = self._collect_pages({'target_content_type': 'patients.patient', 'target_object_id': self.patient_profile.pk})
+        self.assertEqual(sorted(details), ["entry 0", "entry 1", "entry 2"])
+        details, _ = self._collect_pages({'since': (timezone.now() - timedelta(minutes=2, seconds=30)).isoformat()})
+        self.assertEqual(sorted(details), ["entry 0", "entry 1", "entry 2"])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UserAgentInterningTests(TestCase):
+    """Tests for dictionary-encoded user agents (audit_log.interning)."""
+    def setUp(self):
+        user_agent_ids.clear()
+
+    def _log(self, user_agent, details="interning"):
+        create_audit_log_entry(user=None, action=AuditLogAction.SYSTEM_EVENT, details=details, user_agent=user_agent)
+
+    def test_identical_user_agents_share_one_row(self):
+        with committed_audit_entries(self):
+            self._log("Mozilla/5.0 (Interning)")
+            self._log("Mozilla/5.0 (Interning)")
+            self._log("")
+        entries = AuditLogEntry.objects.filter(details="interning").select_related('user_agent_ref')
+        self.assertEqual(UserAgent.objects.filter(value="Mozilla/5.0 (Interning)").count(), 1)
+        self.assertEqual(sorted(entry.user_agent for entry in entries), ["", "Mozilla/5.0 (Interning)", "Mozilla/5.0 (Interning)"])
+        self.assertEqual(entries.filter(user_agent_ref__isnull=True).count(), 1)
+
+    def test_known_user_agents_are_resolved_from_the_lru(self):
+        with committed_audit_entries(self):
+            self._log("Mozilla/5.0 (Cached)")
+        with committed_audit_entries(self), CaptureQueriesContext(connection) as queries:
+            self._log("Mozilla/5.0 (Cached)")
+        self.assertFalse([query for query in queries if UserAgent._meta.db_table in query['sql']])
+        self.assertEqual(AuditLogEntry.objects.filter(user_agent_ref__value="Mozilla/5.0 (Cached)").count(), 2)
+
+    def test_user_agent_survives_spooling(self):
+        with tempfile.TemporaryDirectory() as spool_dir, \
+                self.settings(AUDIT_LOG_BUFFER={'SPOOL_DIR': spool_dir}):
+            with patch.object(AuditLogEntry._default_manager, 'bulk_create', side_effect=DatabaseError("db down")):
+                with committed_audit_entries(self):
+                    self._log("Mozilla/5.0 (Spooled)", details="spooled ua")
+            spool_file = next(Path(spool_dir).glob('audit-spool-*.jsonl'))
+            audit_log_writer.replay_spool(spool_file)
+        self.assertEqual(AuditLogEntry.objects.get(details="spooled ua").user_agent, "Mozilla/5.0 (Spooled)")
+
+
+class AuditRequestContextTests(TestCase):
+    """Tests for the contextvar-based request context (audit_log.context) and middleware modes."""
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    async def test_async_middleware_isolates_concurrent_requests(self):
+        seen = {}
+
+        async def get_response(request):
+            await asyncio.sleep(0.01) # Let the other request run in between
+            seen[request.path] = (get_current_request(), get_request_id())
+            return HttpResponse("ok")
+
+        middleware = AuditLogMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        first, second = self.factory.get('/first'), self.factory.get('/second', HTTP_X_REQUEST_ID='req-second')
+        responses = await asyncio.gather(middleware(first), middleware(second))
+
+        self.assertIs(seen['/first'][0], first)
+        self.assertIs(seen['/second'][0], second)
+        self.assertEqual(seen['/second'][1], 'req-second')
+        self.assertEqual(responses[1]['X-Request-ID'], 'req-second')
+        self.assertEqual(responses[0]['X-Request-ID'], first.request_id)
+        self.assertIsNone(get_current_request())
+
+    def test_invalid_incoming_request_id_is_replaced(self):
+        request = self.factory.get('/', HTTP_X_REQUEST_ID='bad id\nwith newline')
+        response = AuditLogMiddleware(lambda request: HttpResponse("ok"))(request)
+        self.assertNotIn('\n', response['X-Request-ID'])
+        self.assertEqual(len(response['X-Request-ID']), 32)
+
+    def test_context_reaches_thread_pool_only_when_wrapped(self):
+        request = self.factory.get('/')
+        with request_context(request, request_id='pool-req'), ThreadPoolExecutor(max_workers=1) as executor:
+            wrapped = executor.submit(wrap_with_context(get_current_request)).result()
+            unwrapped = executor.submit(get_current_request).result()
+        self.assertIs(wrapped, request)
+        self.assertIsNone(unwrapped)
+
+    def test_entries_record_the_request_id(self):
+        with request_context(self.factory.get('/'), request_id='audit-req-1'), committed_audit_entries(self):
+            create_audit_log_entry(user=None, action=AuditLogAction.SYSTEM_EVENT, details="with request id")
+        self.assertEqual(AuditLogEntry.objects.get(details="with request id").additional_info['request_id'], 'audit-req-1')
+
+
+class ReadAccessAuditTests(TestCase):
+    """Tests for the aggregated, sampled VIEWED entries of patient-data reads."""
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor_user = UserModel.objects.create_user(
+            username='read_doctor_audit', email='read_doctor_audit@example.com', password='password', role=UserRole.DOCTOR
+        )
+        self.patient_user = UserModel.objects.create_user(
+            username='read_patient_audit', email='read_patient_audit@example.com', password='password', role=UserRole.PATIENT
+        )
+        # Discard reads counted by earlier tests, including the bucket they opened
+        read_access_log._counters.clear()
+        read_access_log._oldest_bucket = None
+        read_access_log._force_flush = False
+        audit_log_writer.flush_pending()
+        # The tests flush explicitly: keep the flusher thread from queueing the counters when a bucket closes,
+        # and drop what it queued for earlier tests.
+        tasks = patch.object(audit_log_writer, '_tasks', [])
+        tasks.start()
+        self.addCleanup(tasks.stop)
+        with audit_log_writer._lock:
+            audit_log_writer._buffer.clear()
+        AuditLogEntry.objects.all().delete()
+
+    def viewed_entries(self):
+        with committed_audit_entries(self):
+            read_access_log.flush(force=True)
+        return AuditLogEntry.objects.filter(action=AuditLogAction.VIEWED)
+
+    def test_repeated_reads_are_aggregated_into_one_counted_entry(self):
+        self.client.force_authenticate(user=self.doctor_user)
+        url = reverse('patients:patient-detail', kwargs={'user__id': self.patient_user.pk})
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        entry = self.viewed_entries().get()
+        self.assertEqual(entry.user, self.doctor_user)
+        self.assertEqual(entry.target_object_id, str(self.patient_user.pk))
+        self.assertEqual(entry.additional_info['count'], 3)
+        self.assertEqual(entry.additional_info['endpoint'], 'patients:patient-detail')
+        self.assertNotIn('sample_rate', entry.additional_info)
+
+    def test_own_reads_are_sampled(self):
+        self.client.force_authenticate(user=self.patient_user)
+        with self.settings(AUDIT_LOG_READ_ACCESS={'DEFAULT_SAMPLE_RATE': 0}):
+            self.assertEqual(self.client.get(reverse('patients:patient-profile-me')).status_code, status.HTTP_200_OK)
+        self.assertFalse(self.viewed_entries().exists())
+
+        with self.settings(AUDIT_LOG_READ_ACCESS={'SAMPLE_RATES': {'patients:patient-profile-me': 1.0}}):
+            self.client.get(reverse('patients:patient-profile-me'))
+        self.assertEqual(self.viewed_entries().get().target_object_id, str(self.patient_user.pk))
+
+    def test_failed_reads_and_writes_are_not_counted(self):
+        self.client.force_authenticate(user=self.patient_user)
+        other = UserModel.objects.create_user(
+            username='read_other_audit', email='read_other_audit@example.com', password='password', role=UserRole.PATIENT
+        )
+        response = self.client.get(reverse('patients:patient-detail', kwargs={'user__id': other.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(self.viewed_entries().exists())
+
+    def test_record_gives_up_when_the_lock_is_busy(self):
+        with read_access_log._lock:
+            counted = read_access_log.record(self.doctor_user, self.patient_user.pk, 'test-endpoint')
+        self.assertFalse(counted)
+        self.assertEqual(read_access_log.dropped, 1)
+        self.assertFalse(self.viewed_entries().exists())
+        self.assertEqual(read_access_log.dropped, 0)
+
+    def test_closed_buckets_are_left_to_the_writer_thread(self):
+        with self.settings(AUDIT_LOG_READ_ACCESS={'BUCKET_SECONDS': 60}), patch('audit_log.access.time.time') as now, \
+                patch.object(audit_log_writer, 'wake') as wake, \
+                patch.object(audit_log_writer, 'enqueue', wraps=audit_log_writer.enqueue) as enqueue:
+            now.return_value = 1_000_000.0
+            read_access_log.record(self.doctor_user, self.patient_user.pk, 'test-endpoint')
+            now.return_value += 60
+            read_access_log.record(self.doctor_user, self.patient_user.pk, 'test-endpoint')
+            wake.assert_called_once() # The read only wakes the flusher thread...
+            enqueue.assert_not_called() # ...which queues the closed bucket, not the request
+
+            with committed_audit_entries(self):
+                read_access_log.flush_due()
+            self.assertEqual(AuditLogEntry.objects.filter(action=AuditLogAction.VIEWED).count(), 1)
+            self.assertEqual(len(read_access_log._counters), 1) # The open bucket is still pending
+
+
+class AuditActivityRollupTests(TestCase):
+    """Tests for the daily activity rollups (audit_log.rollup and the rollup_audit_activity command)."""
+    def setUp(self):
+        self.user = UserModel.objects.create_user(
+            username='rollup_user_audit', email='rollup_audit@example.com', password='password', role=UserRole.NURSE
+        )
+        pending_rollups.clear() # Discard counts of earlier tests' entries
+
+    def _log(self, action=AuditLogAction.SYSTEM_EVENT, user=None):
+        create_audit_log_entry(user=user or self.user, action=action, details="rollup")
+
+    def _counts(self):
+        return {(r.date, r.action): r.count for r in AuditActivityRollup.objects.filter(user=self.user)}
+
+    def test_written_batches_increment_the_daily_counts(self):
+        with committed_audit_entries(self):
+            self._log()
+            self._log()
+            self._log(AuditLogAction.ADMIN_ACTION)
+        with committed_audit_entries(self):
+            self._log()
+        self.assertFalse(AuditActivityRollup.objects.exists()) # Left to the writer's flusher thread
+        self.assertEqual(pending_rollups.apply(), 2)
+        today = timezone.localdate()
+        self.assertEqual(self._counts(), {(today, 'SYSTEM_EVENT'): 3, (today, 'ADMIN_ACTION'): 1})
+
+    def test_entries_written_before_the_commit_are_counted_once(self):
+        with committed_audit_entries(self):
+            self._log()
+            audit_log_writer.flush_pending() # As AuditLogMiddleware does at the end of a request
+            self._log()
+        pending_rollups.apply()
+        self.assertEqual(self._counts(), {(timezone.localdate(), 'SYSTEM_EVENT'): 2})
+
+    def test_the_commit_path_only_inserts_the_entries(self):
+        with CaptureQueriesContext(connection) as queries, committed_audit_entries(self):
+            self._log()
+        statements = [query['sql'].split()[0] for query in queries]
+        self.assertEqual([statement for statement in statements if statement not in ('SAVEPOINT', 'RELEASE')], ['INSERT'])
+
+    def test_system_entries_and_rolled_back_batches_are_not_counted(self):
+        with committed_audit_entries(self):
+            create_audit_log_entry(user=None, action=AuditLogAction.SYSTEM_EVENT, details="system")
+            try:
+                with transaction.atomic():
+                    self._log()
+                    raise RuntimeError("force rollback")
+            except RuntimeError:
+                pass
+        self.assertEqual(pending_rollups.apply(), 0)
+        self.assertFalse(AuditActivityRollup.objects.exists())
+
+    def test_rebuild_recomputes_the_range_from_the_audit_log(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        AuditLogEntry.objects.bulk_create( # Bypasses the writer, as a backfill would
+            [AuditLogEntry(user=self.user, action=AuditLogAction.SYSTEM_EVENT, timestamp=yesterday) for _ in range(2)]
+        )
+        AuditActivityRollup.objects.create(
+            user=self.user, action=AuditLogAction.LOGOUT, date=timezone.localdate(yesterday), count=7
+        )
+        out = StringIO()
+        call_command('rollup_audit_activity', stdout=out)
+        self.assertIn("Rebuilt 1 activity rollup rows", out.getvalue())
+        self.assertEqual(self._counts(), {(timezone.localdate(yesterday), 'SYSTEM_EVENT'): 2})
+
+    def test_rebuild_rejects_an_inverted_range(self):
+        with self.assertRaises(CommandError):
+            call_command('rollup_audit_activity', '--date-from=2025-02-01', '--date-to=2025-01-01', stdout=StringIO())
@@ -0,0 +1,12 @@
+from django.urls import path
+from .views import AuditLogEntryListAPIView, AuditLogEntryDetailAPIView
+
+app_name = 'audit_log'  # Namespace for these URLs
+
+urlpatterns = [
+    # Read-only, keyset-paginated audit trail (GET), filterable by user, action, target and time range
+    path('', AuditLogEntryListAPIView.as_view(), name='auditlog-list'),
+
+    # A single audit log entry (GET)
+    path('<int:id>/', AuditLogEntryDetailAPIView.as_view(), name='auditlog-detail'),
+]
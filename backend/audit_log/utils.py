@@ -1,4 +1,17 @@
 # audit_log/utils.py
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOGIN_DEDUP_WINDOWS = { # Seconds, per AuditLogAction value
+    'LOGIN_SUCCESS': 5,
+    'LOGOUT': 5,
+    'LOGIN_FAILED': 10, # Wider window for failed attempts
+}
 
 def get_client_ip(request):
     """
@@ -37,3 +50,32 @@ def get_user_agent(request):
     if not request:
         return '' # Return empty string for consistency if request is None
     return request.META.get('HTTP_USER_AGENT', '') # Default to empty string
+
+def claim_dedup_window(action, identity, ip_address):
+    """
+    Claims the de-duplication window for an authentication event in the shared cache.
+    Used by the login/logout signal receivers so repeated signals (or a burst of
+    failed attempts) within the window produce one audit entry, without reading
+    the audit table on the login path.
+
+    Args:
+        action (str): The AuditLogAction value, e.g. 'LOGIN_FAILED'.
+        identity: The user id or attempted email/username.
+        ip_address (str): The client IP address, or None.
+
+    Returns:
+        bool: True if the caller should log the event (no entry in the window yet).
+    """
+    config = getattr(settings, 'AUDIT_LOG_LOGIN_DEDUP', {})
+    window = config.get('WINDOWS', DEFAULT_LOGIN_DEDUP_WINDOWS).get(action)
+    if not window:
+        return True
+    raw_key = f"{action}|{str(identity).strip().lower()}|{ip_address or ''}"
+    # Hashed so emails and IPv6 addresses are always valid (memcached-safe) keys.
+    key = 'audit_log:dedup:' + hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+    try:
+        # add() only sets the key if it is absent, so concurrent workers race safely.
+        return caches[config.get('CACHE_ALIAS', 'default')].add(key, 1, timeout=window)
+    except Exception:
+        logger.warning("Audit login de-duplication cache unavailable; logging the event.", exc_info=True)
+        return True
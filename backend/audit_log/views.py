@@ -0,0 +1,31 @@
+# audit_log/views.py
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import generics, permissions
+
+from .filters import AuditLogEntryFilter
+from .models import AuditLogEntry
+from .pagination import AuditLogKeysetPagination
+from .serializers import AuditLogEntrySerializer
+from users.permissions import IsHospitalAdmin # Only hospital administrators may read the audit trail
+
+class AuditLogEntryListAPIView(generics.ListAPIView):
+    """
+    Read-only, keyset-paginated list of audit log entries, newest first.
+    Supports filtering by user, action (repeatable), target_content_type,
+    target_object_id and a since/until timestamp range.
+    """
+    queryset = AuditLogEntry.objects.select_related('user', 'target_content_type', 'user_agent_ref')
+    serializer_class = AuditLogEntrySerializer
+    permission_classes = [permissions.IsAuthenticated, IsHospitalAdmin]
+    pagination_class = AuditLogKeysetPagination
+    filter_backends = [DjangoFilterBackend] # No search/ordering: keyset pagination fixes the order
+    filterset_class = AuditLogEntryFilter
+
+class AuditLogEntryDetailAPIView(generics.RetrieveAPIView):
+    """
+    Read-only view of a single audit log entry.
+    """
+    queryset = AuditLogEntry.objects.select_related('user', 'target_content_type', 'user_agent_ref')
+    serializer_class = AuditLogEntrySerializer
+    permission_classes = [permissions.IsAuthenticated, IsHospitalAdmin]
+    lookup_field = 'id'
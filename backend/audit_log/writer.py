@@ -0,0 +1,363 @@
+# audit_log/writer.py
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connections, router, transaction
+
+from .coalesce import EntryCoalescer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0 # Seconds
+DEFAULT_SPOOL_DIR = '/var/spool/hms/audit'
+
+
+class _TransactionBatch:
+    """
+    Audit entries recorded on one connection at one savepoint depth of a transaction.
+    The batch's commit hook is registered with Django's on_commit(), so Django drops
+    it when the transaction (or an enclosing savepoint) rolls back; a batch whose
+    hook is no longer queued on the connection belongs to a finished transaction.
+    With COALESCE enabled, entries for the same target are merged as they are
+    added (see audit_log.coalesce).
+    """
+    def __init__(self, writer, using, coalesce=True):
+        self.using = using
+        self.entries = EntryCoalescer(enabled=coalesce)
+        self.written = [] # Entries flush_pending() already wrote inside the transaction
+        self.hook = lambda: writer._commit_batch(self)
+
+    def is_open(self):
+        connection = connections[self.using]
+        return connection.in_atomic_block and \
+            any(func is self.hook for _, func, _ in connection.run_on_commit)
+
+
+class BufferedAuditLogWriter:
+    """
+    Queues AuditLogEntry instances in-process and writes them with bulk_create.
+
+    Entries created inside a transaction are held until that transaction commits
+    (and dropped if it rolls back), coalescing duplicates for the same target,
+    then moved to the shared buffer and flushed.
+    Entries created in autocommit mode go straight to the shared buffer, which is
+    flushed once it reaches BATCH_SIZE or FLUSH_INTERVAL seconds have passed.
+    Only the insert runs on the commit path: the counts of committed batches are
+    added to the daily activity rollups by a periodic task (see audit_log.rollup).
+    A daemon thread covers idle periods and runs the periodic tasks that produce
+    entries off the request path (see add_periodic_task()); an atexit hook drains
+    the buffer on worker shutdown; neither is set up when AUDIT_LOG_BACKGROUND_FLUSH is
+    off, as under tests.
+    Batches that cannot be written are spooled to disk as JSON lines and can be replayed
+    with `manage.py flush_audit_spool`.
+    """
+    def __init__(self):
+        self._buffer = []
+        self._lock = threading.Lock() # Guards _buffer and _last_flush
+        self._flush_lock = threading.Lock() # Serialises database writes
+        self._local = threading.local() # Per-thread open transaction batches
+        self._last_flush = time.monotonic()
+        self._flusher = None
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._tasks = []
+
+    # --- Configuration ---
+
+    @property
+    def config(self):
+        return getattr(settings, 'AUDIT_LOG_BUFFER', {})
+
+    @property
+    def batch_size(self):
+        return self.config.get('BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    @property
+    def flush_interval(self):
+        return self.config.get('FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    @property
+    def spool_dir(self):
+        spool_dir = self.config.get('SPOOL_DIR')
+        return Path(spool_dir or DEFAULT_SPOOL_DIR)
+
+    @property
+    def coalesce(self):
+        return self.config.get('COALESCE', True)
+
+    # --- Queueing ---
+
+    def enqueue(self, entry, defer_flush=False):
+        """
+        Queues an unsaved audit entry for writing. With `defer_flush`, an entry
+        queued outside a transaction never triggers a write in the calling thread;
+        a due buffer is left to the background flusher instead.
+        """
+        using = router.db_for_write(type(entry))
+        connection = connections[using]
+        if connection.in_atomic_block:
+            # One batch per savepoint depth, so a savepoint rollback drops exactly its own entries.
+            key = (using, tuple(connection.savepoint_ids))
+            batch = self._batches().get(key)
+            if batch is None or not batch.is_open():
+                batch = self._batches()[key] = _TransactionBatch(self, using, coalesce=self.coalesce)
+                transaction.on_commit(batch.hook, using=using)
+            batch.entries.add(entry)
+        else:
+            self._add_to_buffer([entry], defer_flush=defer_flush)
+
+    def add_periodic_task(self, task):
+        """
+        Registers `task(final)` to run on the background flusher thread before each
+        flush check, and once with final=True at shutdown, e.g. to queue aggregated
+        entries without holding up the request that triggered them.
+        """
+        if task not in self._tasks:
+            self._tasks.append(task)
+
+    def wake(self):
+        """Asks the background flusher to run its periodic tasks and flush check now."""
+        self._ensure_flusher()
+        self._wakeup.set()
+
+    def detach_user(self, user_id, using=None):
+        """
+        Clears the user of queued entries when that user is deleted, as on_delete=SET_NULL
+        does for the entries already written: now for the current thread's open
+        transactions, and once the deletion commits for the shared buffer.
+        """
+        for batch in self._batches().values():
+            self._clear_user(batch.entries.entries, user_id)
+
+        def detach_buffered():
+            with self._lock:
+                self._clear_user(self._buffer, user_id)
+        transaction.on_commit(detach_buffered, using=using)
+
+    @staticmethod
+    def _clear_user(entries, user_id):
+        for entry in entries:
+            if entry.user_id == user_id:
+                entry.user_id = None
+
+    def _run_tasks(self, final=False):
+        for task in self._tasks:
+            try:
+                task(final)
+            except Exception:
+                logger.exception("Audit log periodic task %r failed.", task)
+
+    def _batches(self):
+        if not hasattr(self._local, 'batches'):
+            self._local.batches = {}
+        return self._local.batches
+
+    def _commit_batch(self, batch):
+        """on_commit callback: the batch's transaction committed, so its entries can be written."""
+        for key, open_batch in list(self._batches().items()):
+            if open_batch is batch:
+                del self._batches()[key]
+        entries = batch.entries.take()
+        if batch.written:
+            self._count_for_rollups(batch.written)
+        if entries:
+            self._add_to_buffer(entries, flush_now=True)
+
+    def _add_to_buffer(self, entries, flush_now=False, defer_flush=False):
+        with self._lock:
+            self._buffer.extend(entries)
+            due = flush_now or len(self._buffer) >= self.batch_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval
+        self._ensure_flusher()
+        if due and defer_flush:
+            self._wakeup.set()
+        elif due:
+            self.flush()
+
+    # --- Flushing ---
+
+    def flush(self):
+        """
+        Writes every buffered (committed) entry to the database.
+        Returns the number of entries taken from the buffer.
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+                self._last_flush = time.monotonic()
+            if entries and self._write(entries):
+                self._count_for_rollups(entries)
+            return len(entries)
+
+    def flush_pending(self):
+        """
+        Writes the entries pending in the current thread's still-open transactions
+        right away, inside those transactions, exactly as a direct INSERT would have
+        been. Batches of transactions that rolled back are dropped.
+        AuditLogMiddleware calls this at the end of every request so that a request
+        running inside a wrapping atomic block (or a test case) sees its entries.
+        """
+        for key, batch in list(self._batches().items()):
+            if not batch.is_open():
+                del self._batches()[key]
+            elif batch.entries:
+                entries = batch.entries.take()
+                self._write(entries, spool_on_error=False)
+                batch.written.extend(entries) # Counted for the rollups by the batch's commit hook
+
+    def _count_for_rollups(self, entries):
+        """Hands committed entries to the daily activity rollups, which the flusher thread updates."""
+        from .rollup import pending_rollups, rollup_enabled
+
+        if rollup_enabled():
+            pending_rollups.add(entries, router.db_for_write(type(entries[0])))
+            self._ensure_flusher()
+
+    def _write(self, entries, spool_on_error=True):
+        """Inserts `entries`; returns True if they were written, False if they were spooled instead."""
+        from .interning import intern_user_agents
+
+        model = type(entries[0])
+        using = router.db_for_write(model)
+
+        def insert():
+            # The savepoint keeps a failed write from breaking a surrounding transaction.
+            with transaction.atomic(using=using):
+                intern_user_agents(entries, using)
+                model._default_manager.bulk_create(entries, batch_size=self.batch_size)
+
+        try:
+            try:
+                insert()
+            except IntegrityError:
+                # A user deleted after their entries were queued (e.g. by another process) fails the
+                # whole batch: retry once without the users that no longer exist.
+                if not self._detach_deleted_users(entries, using):
+                    raise
+                for entry in entries:
+                    entry.pk, entry._state.adding = None, True
+                insert()
+        except Exception:
+            if not spool_on_error:
+                raise
+            logger.exception("Failed to write %d audit log entries; spooling them to disk.", len(entries))
+            self._spool(entries)
+            return False
+        return True
+
+    @staticmethod
+    def _detach_deleted_users(entries, using):
+        """
+        Clears the user of entries whose user no longer exists. Returns whether any was cleared.
+        """
+        from django.contrib.auth import get_user_model
+
+        user_ids = {entry.user_id for entry in entries if entry.user_id is not None}
+        existing = set(get_user_model()._default_manager.using(using).filter(pk__in=user_ids).values_list('pk', flat=True))
+        deleted = user_ids - existing
+        for entry in entries:
+            if entry.user_id in deleted:
+                entry.user_id = None
+        return bool(deleted)
+
+    def _spool(self, entries):
+        """
+        Appends entries to this process's spool file as one JSON line. The user agent
+        string is stored with each record, as its UserAgent id may not exist yet.
+        """
+        try:
+            records = serializers.serialize('python', entries)
+            for record, entry in zip(records, entries):
+                record['fields']['user_agent_ref'] = None
+                record['fields']['user_agent'] = entry.user_agent
+            spool_dir = self.spool_dir
+            spool_dir.mkdir(parents=True, exist_ok=True)
+            with open(spool_dir / f"audit-spool-{os.getpid()}.jsonl", 'a', encoding='utf-8') as spool_file:
+                spool_file.write(json.dumps(records, cls=DjangoJSONEncoder) + '\n')
+        except (OSError, TypeError, ValueError):
+            logger.critical(
+                "Could not spool %d audit log entries: %s", len(entries),
+                [str(entry) for entry in entries], exc_info=True
+            )
+
+    def replay_spool(self, spool_path):
+        """
+        Writes the entries stored in a spool file in one transaction and removes the
+        file. Returns the number of entries written.
+        The file is first renamed to a `.replaying` name, so entries a live process
+        appends meanwhile go to a new spool file instead of being deleted unread; a
+        `.replaying` file left by a failed replay is replayed as it is.
+        """
+        spool_path = Path(spool_path)
+        if spool_path.suffix != '.replaying':
+            replaying_path = spool_path.with_name(f"{spool_path.name}.{time.time_ns()}.replaying")
+            os.replace(spool_path, replaying_path)
+            spool_path = replaying_path
+        written = 0
+        with open(spool_path, encoding='utf-8') as spool_file, transaction.atomic():
+            for line in spool_file:
+                if not line.strip():
+                    continue
+                entries = []
+                for record in json.loads(line):
+                    user_agent = record['fields'].pop('user_agent', '')
+                    entry = next(serializers.deserialize('python', [record])).object
+                    entry.user_agent = user_agent
+                    entries.append(entry)
+                if entries:
+                    self._write(entries, spool_on_error=False)
+                    transaction.on_commit(lambda entries=entries: self._count_for_rollups(entries))
+                    written += len(entries)
+        spool_path.unlink()
+        return written
+
+    # --- Background flushing and shutdown ---
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self._stopped or not getattr(settings, 'AUDIT_LOG_BACKGROUND_FLUSH', True):
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name='audit-log-flusher', daemon=True)
+            self._flusher.start()
+            atexit.register(self.shutdown)
+
+    def _run_flusher(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            if self._stopped:
+                break
+            self._wakeup.clear()
+            try:
+                self._run_tasks()
+                with self._lock:
+                    idle_for = time.monotonic() - self._last_flush
+                    pending = len(self._buffer)
+                if pending and (idle_for >= self.flush_interval or pending >= self.batch_size):
+                    self.flush()
+            finally:
+                connections.close_all() # This thread's connections are not request-managed
+
+    def shutdown(self):
+        """
+        Stops the background flusher and drains the buffer. Registered with atexit
+        so queued entries survive a normal worker shutdown.
+        """
+        self._stopped = True
+        self._wakeup.set()
+        self._run_tasks(final=True) # Queues what the tasks still hold in memory
+        self.flush()
+        self._run_tasks(final=True) # Handles what the last flush left them, e.g. its rollup counts
+
+
+audit_log_writer = BufferedAuditLogWriter()
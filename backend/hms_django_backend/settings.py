@@ -1,10 +1,12 @@
 from pathlib import Path
 import os
+import sys
 import environ  # For loading environment variables
 from django.utils.translation import gettext_lazy as _
 from dotenv import load_dotenv  # For loading .env file
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test' # Running `manage.py test`
 
 env_path = BASE_DIR / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -35,7 +37,9 @@ env = environ.Env(
     DJANGO_ADMINS=(str, ''), # Format: "Admin Name <admin@example.com>,Another Admin <another@example.com>"
     DJANGO_LOG_LEVEL=(str, 'INFO'),
     DJANGO_LOG_LEVEL_DJANGO=(str, 'INFO'),
-    SEED_DEFAULT_PASSWORD=(str, "PasswordHMS123!") # Default password for seeder
+    SEED_DEFAULT_PASSWORD=(str, "PasswordHMS123!"), # Default password for seeder
+    DJANGO_CACHE_URL=(str, 'locmemcache://'), # e.g. redis://localhost:6379/1 in production (shared across workers)
+    AUDIT_LOG_SPOOL_DIR=(str, '/var/spool/hms/audit'), # Outside the source tree; must be writable by the web workers
 )
 
 # Quick-start development settings - unsuitable for production
@@ -139,6 +143,13 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Used for throttling and audit login de-duplication; use a shared backend (Redis) with multiple workers.
+CACHES = {
+    'default': env.cache('DJANGO_CACHE_URL'),
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.CustomUser'  # Specifies the custom user model
 
@@ -393,3 +404,78 @@ REDOC_SETTINGS = {
 
 # Custom setting for seeder command
 SEED_DEFAULT_PASSWORD = env('SEED_DEFAULT_PASSWORD') # For the seed_database command
+
+# Buffered audit log writer (see audit_log/writer.py)
+AUDIT_LOG_BUFFER = {
+    'BATCH_SIZE': 500,  # Rows per bulk_create; the buffer is flushed when it reaches this size
+    'FLUSH_INTERVAL': 5.0,  # Seconds committed entries may wait in memory before being written
+    'SPOOL_DIR': env('AUDIT_LOG_SPOOL_DIR'),  # Entries that cannot be written are spooled here (see flush_audit_spool)
+    'COALESCE': True,  # Merge entries for the same target and action within one transaction
+    'USER_AGENT_CACHE_SIZE': 1024,  # Process-local LRU of interned user agent ids
+    'ACTIVITY_ROLLUP': True,  # Maintain per-user, per-action daily counts (see audit_log/rollup.py)
+}
+
+# Background flusher thread and atexit drain of the audit writer. Off under tests: the drain would run after the
+# test database is gone and spool the test run's entries for `manage.py flush_audit_spool` to replay.
+AUDIT_LOG_BACKGROUND_FLUSH = not TESTING
+
+# Audit de-duplication of login/logout/failed-login events (see audit_log/utils.py)
+AUDIT_LOG_LOGIN_DEDUP = {
+    'CACHE_ALIAS': 'default',
+    'WINDOWS': {'LOGIN_SUCCESS': 5, 'LOGOUT': 5, 'LOGIN_FAILED': 10},  # Seconds per action
+}
+
+# Monthly audit log partitions and archiving (see audit_log/partitioning.py)
+AUDIT_LOG_PARTITIONING = {
+    'HOT_MONTHS': 3,  # Months routine queries (e.g. the admin list) are limited to by default
+    'RETENTION_MONTHS': 24,  # Months kept in the database by `manage.py archive_audit_log`
+    'PREMAKE_MONTHS': 3,  # Future monthly partitions created ahead of time, daily by the audit writer (PostgreSQL)
+    'ARCHIVE_DIR': BASE_DIR / 'audit_archive',  # Compressed JSONL archives of dropped months
+}
+
+# Incoming request id header (as a META key) reused by AuditLogMiddleware; a new id is generated otherwise
+AUDIT_LOG_REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+
+# Aggregated read-access (VIEWED) audit logging of patient data (see audit_log/access.py)
+AUDIT_LOG_READ_ACCESS = {
+    'ENABLED': True,
+    'BUCKET_SECONDS': 300,  # Reads per (user, patient, endpoint) are counted per 5-minute bucket
+    'DEFAULT_SAMPLE_RATE': 0.1,  # Sampling of non-sensitive reads (patients viewing their own data)
+    'SAMPLE_RATES': {},  # Per-endpoint overrides for non-sensitive reads, e.g. {'patients:patient-profile-me': 0.05}
+    'MAX_RECORD_LATENCY_MS': 2,  # Hard cap on time a request waits to record a read; the read is dropped beyond it
+    'MAX_PENDING_KEYS': 10000,  # Write counters early once this many are pending
+}
+
+# Admin dashboard reports (see admin_dashboard/views.py)
+ADMIN_DASHBOARD_REPORTS = {
+    'PATIENT_AGE_BUCKET_EDGES': [18, 41, 61],  # Ages starting a new bucket: under_18, 18_40, 41_60, over_60
+    'EXPORT_CHUNK_SIZE': 2000,  # Rows fetched per server-side cursor round trip when streaming exports
+    'DETAIL_PAGE_SIZE': 100,  # Rows per page of a report's detail sections in JSON responses (?page_size= overrides)
+    'CACHE_ALIAS': 'default',  # Cache holding report data; use a shared backend so single-flight spans workers
+    'CACHE_TIMEOUT': 300,  # Seconds a cached report is reused when no relevant rows change
+    'STALE_TIMEOUT': 3600,  # Seconds the dashboard overview may be served stale while it is recomputed
+    'COMPUTE_LOCK_TIMEOUT': 60,  # Seconds identical requests wait for the one computing a report
+    'FANOUT_WORKERS': 4,  # Threads (each with its own DB connection) running a report's independent queries; 1 disables
+    'JOB_WORKERS': 2,  # Threads rendering background report jobs in each web process
+    'JOB_REUSE_TIMEOUT': 300,  # Seconds a completed job is returned for an identical submission
+    'JOB_STALE_TIMEOUT': 3600,  # Seconds before an unfinished job (e.g. lost in a restart) is marked failed
+    'JOB_DOWNLOAD_ACCEL_PREFIX': None,  # e.g. '/protected-media' to serve job files via X-Accel-Redirect
+    'TREND_DEFAULT_DAYS': 90,  # Days shown by the trend reports when no date_from is given
+    'TREND_ROLLING_WINDOWS': [7, 28],  # Trailing windows (days) of the trend reports' rolling averages
+    'RUN_RATE_DAYS': 30,  # Trailing days the revenue run-rate is projected from
+}
+
+# Free-slot search across doctors (see appointments.availability)
+APPOINTMENT_AVAILABILITY = {
+    'SLOT_MINUTES': 15,  # Resolution of the availability bitmaps; slots start on this grid
+    # Working hours per weekday (0 = Monday), in the TIME_ZONE; weekdays not listed are days off
+    'WORKING_HOURS': {weekday: [('09:00', '17:00')] for weekday in range(5)},
+    'MAX_SEARCH_DAYS': 31,  # Longest date range one search may cover
+    'CACHE_ALIAS': 'default',  # Cache holding the per-doctor, per-day busy bitmaps
+    'CACHE_TIMEOUT': 3600,  # Seconds a bitmap is kept; bookings invalidate it sooner
+}
+
+# Recurring appointment series (see appointments.series)
+APPOINTMENT_SERIES = {
+    'WINDOW_DAYS': 90,  # Occurrences are booked this far ahead; `manage.py materialize_appointment_series` rolls the window on
+}
@@ -39,6 +39,7 @@ urlpatterns = [
     path('api/v1/telemedicine/', include('telemedicine.urls', namespace='telemedicine-v1')),
     path('api/v1/inquiries/', include('inquiries.urls', namespace='inquiries-v1')),
     path('api/v1/dashboard/', include('admin_dashboard.urls', namespace='admin_dashboard-v1')), # Admin reports
+    path('api/v1/audit/', include('audit_log.urls', namespace='audit_log-v1')), # Read-only audit trail
 
     # API Authentication (if using DRF's built-in token views, typically within users.urls)
     # path('api/v1/auth/', include('rest_framework.urls', namespace='rest_framework')), # For session auth if needed
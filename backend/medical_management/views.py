@@ -8,6 +8,7 @@ from .models import Prescription, Treatment, Observation
 from .serializers import PrescriptionSerializer, TreatmentSerializer, ObservationSerializer
 from users.models import UserRole
 from patients.models import Patient
+from audit_log.access import AuditReadAccessMixin # Aggregated VIEWED (read-access) audit logging
 
 # Audit logging is handled by signals in audit_log.signals.py
 # from audit_log.models import AuditLogAction, create_audit_log_entry
@@ -68,7 +69,7 @@ class CanViewPatientMedicalInfo(permissions.BasePermission):
         return False
 
 
-class BasePatientMedicalRecordListView(generics.ListCreateAPIView):
+class BasePatientMedicalRecordListView(AuditReadAccessMixin, generics.ListCreateAPIView):
     """
     Abstract base class for listing and creating medical records (Prescription, Treatment, Observation)
     for a specific patient. Handles patient retrieval and common permission checks.
@@ -96,7 +97,7 @@ class BasePatientMedicalRecordListView(generics.ListCreateAPIView):
         # context['patient'] = self.get_patient() # Pass patient to serializer if needed for validation
         return context
 
-class BasePatientMedicalRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
+class BasePatientMedicalRecordDetailView(AuditReadAccessMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Abstract base class for retrieving, updating, and deleting specific medical records.
     """
@@ -11,6 +11,7 @@ from .serializers import (
     MedicalRecordSerializer,
 )
 from users.models import UserRole # CustomUser is implicitly used via Patient.user
+from audit_log.access import AuditReadAccessMixin # Aggregated VIEWED (read-access) audit logging
 
 # Audit logging is handled by signals in audit_log.signals.py
 # from audit_log.models import AuditLogAction, create_audit_log_entry
@@ -96,7 +97,7 @@ class PatientListAPIView(generics.ListAPIView):
     filterset_fields = ['gender', 'user__is_active', 'user__date_joined']
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'phone_number']
 
-class PatientDetailAPIView(generics.RetrieveUpdateAPIView):
+class PatientDetailAPIView(AuditReadAccessMixin, generics.RetrieveUpdateAPIView):
     """
     API endpoint for retrieving or updating a patient's profile.
     Supports '/me/' for authenticated patient's own profile, or '/<user_id>/' for staff access.
@@ -140,7 +141,7 @@ class PatientDetailAPIView(generics.RetrieveUpdateAPIView):
         # is handled by signals.py based on AUDITED_MODELS_CRUD (CustomUser or Patient).
         serializer.save()
 
-class MedicalRecordListCreateAPIView(generics.ListCreateAPIView):
+class MedicalRecordListCreateAPIView(AuditReadAccessMixin, generics.ListCreateAPIView):
     """
     API endpoint for listing and creating medical records for a specific patient.
     """
@@ -171,7 +172,7 @@ class MedicalRecordListCreateAPIView(generics.ListCreateAPIView):
         # context['patient'] = self.get_patient() # Pass patient to serializer if needed for validation
         return context
 
-class MedicalRecordDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class MedicalRecordDetailAPIView(AuditReadAccessMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint for retrieving, updating, and deleting a specific medical record.
     """
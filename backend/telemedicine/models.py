@@ -19,6 +19,16 @@ class TelemedicineSessionStatus(models.TextChoices):
     CANCELLED = 'CANCELLED', _('Cancelled')
     FAILED = 'FAILED', _('Failed') # e.g., technical issues
 
+# Sessions holding the doctor's time; only these can conflict.
+ACTIVE_SESSION_STATUSES = [
+    TelemedicineSessionStatus.SCHEDULED,
+    TelemedicineSessionStatus.AWAITING_HOST,
+    TelemedicineSessionStatus.AWAITING_GUEST,
+    TelemedicineSessionStatus.IN_PROGRESS,
+]
+# Duration assumed for sessions without an estimate or an end time.
+DEFAULT_SESSION_DURATION_MINUTES = 30
+
 class TelemedicineSession(models.Model):
     """
     Represents a telemedicine (virtual) consultation session.
@@ -101,18 +111,13 @@ class TelemedicineSession(models.Model):
             models.UniqueConstraint(
                 fields=['doctor', 'session_start_time'],
                 name='unique_doctor_telemedicine_time',
-                condition=Q(status__in=[ # This Q object is correctly placed
-                    TelemedicineSessionStatus.SCHEDULED,
-                    TelemedicineSessionStatus.AWAITING_HOST,
-                    TelemedicineSessionStatus.AWAITING_GUEST,
-                    TelemedicineSessionStatus.IN_PROGRESS
-                ])
+                condition=Q(status__in=ACTIVE_SESSION_STATUSES)
             )
         ]
 
     def __str__(self):
-        patient_name = self.patient.user.full_name if self.patient and self.patient.user else _("N/A")
-        doctor_name = self.doctor.full_name if self.doctor else _("N/A")
+        patient_name = self.patient.user.full_name_display if self.patient and self.patient.user else _("N/A")
+        doctor_name = self.doctor.full_name_display if self.doctor else _("N/A")
         start_time_str = self.session_start_time.strftime('%Y-%m-%d %H:%M') if self.session_start_time else _("N/A")
         return _("Telemedicine: %(patient)s with Dr. %(doctor)s on %(date)s (%(status)s)") % {
             'patient': patient_name, 'doctor': doctor_name, 'date': start_time_str, 'status': self.get_status_display()
@@ -126,6 +131,18 @@ class TelemedicineSession(models.Model):
         return self.estimated_duration_minutes or 0
     duration_minutes.fget.short_description = _("Actual/Estimated Duration (min)")
 
+    def get_busy_span(self):
+        """
+        The (start, end) of the doctor's time this session holds, or None if it holds none.
+        It ends at the actual end time if set, else after the estimated (or default) duration.
+        """
+        if self.status not in ACTIVE_SESSION_STATUSES or not self.doctor_id or not self.session_start_time:
+            return None
+        if self.session_end_time and self.session_end_time > self.session_start_time:
+            return self.session_start_time, self.session_end_time
+        duration = self.estimated_duration_minutes or DEFAULT_SESSION_DURATION_MINUTES
+        return self.session_start_time, self.session_start_time + timezone.timedelta(minutes=duration)
+
     def clean(self):
         super().clean()
         if self.session_end_time and self.session_start_time and self.session_end_time < self.session_start_time:
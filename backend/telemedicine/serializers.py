@@ -3,6 +3,7 @@ from rest_framework import serializers
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.db import transaction # For atomic operations if needed
+from django.db.models import Q
 
 from .models import TelemedicineSession, TelemedicineSessionStatus
 from patients.serializers import PatientSerializer
@@ -11,13 +12,19 @@ from appointments.serializers import AppointmentSerializer # For linked appointm
 
 from users.models import CustomUser, UserRole # Patient model is NOT here
 from patients.models import Patient # Correct import for Patient model
-from appointments.models import Appointment, AppointmentType # For validation
+from appointments.busy import conflict_message, find_conflict, lock_doctor_schedule
+from appointments.models import Appointment, AppointmentType, BusySource # For validation
 
 class TelemedicineSessionSerializer(serializers.ModelSerializer):
     """
     Serializer for the TelemedicineSession model.
     Handles creation, validation, and representation of telemedicine session data.
+    Saving an active session checks the doctor's other sessions and appointments
+    for overlaps (see check_doctor_availability).
     """
+    # Changes to these fields can create an overlap with another session or appointment.
+    SCHEDULING_FIELDS = ('doctor', 'appointment', 'session_start_time', 'session_end_time', 'estimated_duration_minutes', 'status')
+
     patient_details = PatientSerializer(source='patient', read_only=True)
     doctor_details = CustomUserSerializer(source='doctor', read_only=True)
     appointment_details = AppointmentSerializer(source='appointment', read_only=True, required=False, allow_null=True)
@@ -60,6 +67,9 @@ class TelemedicineSessionSerializer(serializers.ModelSerializer):
             'patient_details', 'doctor_details', 'appointment_details',
             'status_display', 'duration_minutes'
         )
+        # The unique_doctor_telemedicine_time constraint's exact-start clashes are overlaps too,
+        # reported by check_doctor_availability with the conflicting session's times.
+        validators = []
         extra_kwargs = {
             'estimated_duration_minutes': {'min_value': 1, 'required': False, 'allow_null': True},
             'session_url': {'max_length': 512, 'required': False, 'allow_blank': True, 'allow_null': True},
@@ -125,7 +135,6 @@ class TelemedicineSessionSerializer(serializers.ModelSerializer):
         Cross-field validation for TelemedicineSession data.
         - Auto-fills session details from linked appointment if not provided.
         - Checks for doctor/patient self-booking.
-        - Checks for doctor schedule conflicts (both telemedicine and regular appointments).
         """
         # Get current values or values from instance if updating and not in payload
         appointment = data.get('appointment', getattr(self.instance, 'appointment', None))
@@ -156,51 +165,48 @@ class TelemedicineSessionSerializer(serializers.ModelSerializer):
                 _("A doctor cannot have a telemedicine session with themselves as the patient.")
             )
 
-        # Check for doctor schedule conflicts (DB constraint 'unique_doctor_telemedicine_time' handles some cases)
-        # This serializer validation provides earlier feedback.
-        if doctor and session_start_time:
-            estimated_duration = data.get('estimated_duration_minutes', getattr(self.instance, 'estimated_duration_minutes', TelemedicineSession._meta.get_field('estimated_duration_minutes').default) or 30)
-            session_end_time_calc = session_start_time + timezone.timedelta(minutes=estimated_duration)
-            
-            current_session_id = self.instance.id if self.instance else None
-            active_statuses = [
-                TelemedicineSessionStatus.SCHEDULED, TelemedicineSessionStatus.AWAITING_HOST,
-                TelemedicineSessionStatus.AWAITING_GUEST, TelemedicineSessionStatus.IN_PROGRESS
-            ]
-
-            # Check conflicting TelemedicineSessions
-            conflicting_tele_sessions = TelemedicineSession.objects.filter(
-                doctor=doctor, status__in=active_statuses,
-                session_start_time__lt=session_end_time_calc, # Existing starts before new one ends
-            ).exclude(pk=current_session_id)
-            for ts in conflicting_tele_sessions:
-                existing_ts_end_time = ts.session_start_time + timezone.timedelta(minutes=ts.estimated_duration_minutes or 30)
-                if session_start_time < existing_ts_end_time: # New one starts before existing one ends
-                    raise serializers.ValidationError(
-                        _("Dr. %(doctor_name)s has a conflicting telemedicine session (ID: %(ts_id)s) from %(start)s to %(end)s.") %
-                        {'doctor_name': doctor.full_name, 'ts_id': ts.id, 'start': ts.session_start_time.strftime('%H:%M'), 'end': existing_ts_end_time.strftime('%H:%M')}
-                    )
-
-            # Check conflicting regular Appointments
-            conflicting_appointments = Appointment.objects.filter(
-                doctor=doctor,
-                status__in=[Appointment.AppointmentStatus.SCHEDULED, Appointment.AppointmentStatus.CONFIRMED],
-                appointment_date_time__lt=session_end_time_calc
-            ).exclude(pk=appointment.id if appointment else None) # Exclude the linked appointment
-            for appt in conflicting_appointments:
-                existing_appt_end_time = appt.appointment_date_time + timezone.timedelta(minutes=appt.estimated_duration_minutes)
-                if session_start_time < existing_appt_end_time:
-                     raise serializers.ValidationError(
-                        _("Dr. %(doctor_name)s has a conflicting regular appointment (ID: %(appt_id)s) from %(start)s to %(end)s.") %
-                        {'doctor_name': doctor.full_name, 'appt_id': appt.id, 'start': appt.appointment_date_time.strftime('%H:%M'), 'end': existing_appt_end_time.strftime('%H:%M')}
-                    )
+        # Doctor schedule conflicts are checked when saving (see check_doctor_availability),
+        # in the transaction that writes the session, so concurrent bookings cannot both pass.
         return data
 
+    def check_doctor_availability(self, validated_data):
+        """
+        Raises a ValidationError if the doctor's time overlaps the session being saved:
+        another active session or an appointment other than the linked one. Must run in the
+        transaction that saves it, which locks the doctor's schedule first; the overlap is
+        one bounded query of the busy-interval index (see appointments.busy).
+        """
+        instance = self.instance
+        if instance is not None and not any(field in validated_data for field in self.SCHEDULING_FIELDS):
+            return # e.g. notes or feedback
+
+        def value(field):
+            return validated_data[field] if field in validated_data else getattr(instance, field, None)
+
+        session = TelemedicineSession(
+            doctor=value('doctor'), session_start_time=value('session_start_time'),
+            session_end_time=value('session_end_time'), estimated_duration_minutes=value('estimated_duration_minutes'),
+            status=value('status') or TelemedicineSessionStatus.SCHEDULED,
+        )
+        span = session.get_busy_span()
+        if span is None:
+            return
+
+        exclude = Q(source=BusySource.TELEMEDICINE, source_id=instance.pk) if instance is not None else Q()
+        appointment = value('appointment')
+        if appointment is not None:
+            exclude |= Q(linked_appointment_id=appointment.pk)
+        lock_doctor_schedule(session.doctor)
+        conflict = find_conflict(session.doctor, *span, exclude or None)
+        if conflict is not None:
+            raise serializers.ValidationError({'session_start_time': [conflict_message(session.doctor, conflict)]})
+
     @transaction.atomic
     def create(self, validated_data):
         # Auto-fill from appointment is handled in validate()
         # Set scheduled_by if applicable (though TelemedicineSession doesn't have this field directly)
         # The user creating the session is implicitly the actor.
+        self.check_doctor_availability(validated_data)
         session = super().create(validated_data)
         # Model's save method handles updating linked Appointment status if session is COMPLETED.
         return session
@@ -208,6 +214,7 @@ class TelemedicineSessionSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def update(self, instance, validated_data):
         # Auto-fill from appointment is handled in validate()
+        self.check_doctor_availability(validated_data)
         session = super().update(instance, validated_data)
         # Model's save method handles updating linked Appointment status if session is COMPLETED.
         return session
@@ -1,9 +1,11 @@
 # telemedicine/signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import TelemedicineSession, TelemedicineSessionStatus
-from appointments.models import Appointment, AppointmentStatus as ApptStatus # Alias to avoid conflict
+from appointments.availability import invalidate_availability
+from appointments.busy import delete_busy_intervals, sync_busy_intervals
+from appointments.models import Appointment, AppointmentStatus as ApptStatus, BusySource # Alias to avoid conflict
 # from audit_log.models import create_audit_log_entry, AuditLogAction # For audit logging
 # from some_notification_service import send_notification # Example notification import
 
@@ -25,7 +27,7 @@ def telemedicine_session_post_save_handler(sender, instance, created, **kwargs):
     else:
         # Logic for updated telemedicine sessions
         # Example: If status changes to COMPLETED, also update the linked Appointment status
-        if 'status' in kwargs.get('update_fields', {}) or not kwargs.get('update_fields'): # Check if status was updated or if all fields updated
+        if not kwargs.get('update_fields') or 'status' in kwargs['update_fields']: # Check if status was updated or if all fields updated
             if instance.status == TelemedicineSessionStatus.COMPLETED and instance.appointment:
                 if instance.appointment.status != ApptStatus.COMPLETED:
                     instance.appointment.status = ApptStatus.COMPLETED
@@ -59,6 +61,24 @@ def telemedicine_session_pre_save_handler(sender, instance, **kwargs):
     pass
 
 
+# Fields that decide the doctor's busy interval for a session (see appointments.busy).
+BUSY_INTERVAL_FIELDS = {'doctor', 'appointment', 'session_start_time', 'session_end_time', 'estimated_duration_minutes', 'status'}
+
+@receiver(post_save, sender=TelemedicineSession)
+def telemedicine_session_busy_interval_handler(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """Keeps the doctor busy-interval index, and the cached availability built from it, in step with the session."""
+    if raw or (update_fields is not None and not BUSY_INTERVAL_FIELDS & set(update_fields)):
+        return
+    if update_fields is not None:
+        # Only update_fields were written; the instance may hold unsaved changes to the other fields.
+        instance = sender._default_manager.using(using).get(pk=instance.pk)
+    invalidate_availability(sync_busy_intervals(BusySource.TELEMEDICINE, instance, using), using)
+
+@receiver(post_delete, sender=TelemedicineSession)
+def telemedicine_session_busy_interval_delete_handler(sender, instance, using=None, **kwargs):
+    invalidate_availability(delete_busy_intervals(BusySource.TELEMEDICINE, instance.pk, using), using)
+
+
 # Add other signal handlers relevant to the telemedicine app below.
 # For example:
 # - Sending reminders before a telemedicine session.
@@ -0,0 +1,12 @@
+# users/permissions.py
+from rest_framework import permissions
+
+from .models import UserRole
+
+class IsHospitalAdmin(permissions.BasePermission):
+    """
+    Custom permission to only allow access to hospital administrators.
+    Shared by the admin dashboard reports and the audit log API.
+    """
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.role == UserRole.ADMIN